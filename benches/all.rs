@@ -4,12 +4,21 @@ pub mod color_bench;
 use color_bench::{bench_blend_f32, bench_blend_i16, bench_blend_u8};
 
 pub mod bench_bertex_buffer;
+pub mod depth_prepass_bench;
+use depth_prepass_bench::bench_depth_prepass;
 pub mod min_bench;
+pub mod raster_material_bench;
+use raster_material_bench::bench_raster_material;
+pub mod texture_layout_bench;
+use texture_layout_bench::bench_texture_layout;
 fn all_benchs(c: &mut Criterion) {
     bench_mvp(c);
     bench_blend_u8(c);
     bench_blend_i16(c);
     bench_blend_f32(c);
+    bench_raster_material(c);
+    bench_depth_prepass(c);
+    bench_texture_layout(c);
 }
 
 criterion_group!(benches, all_benchs);
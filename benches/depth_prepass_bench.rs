@@ -0,0 +1,103 @@
+use criterion::Criterion;
+use nalgebra_glm::{Vec2, Vec3, Vec4};
+use std::hint::black_box;
+use tt3de::drawbuffer::drawbuffer::DrawBuffer;
+use tt3de::primitivbuffer::primitivbuffer::PrimitiveBuffer;
+use tt3de::raster::vertex::Vertex;
+use tt3de::raster::{raster_all, raster_all_depth_prepass};
+use tt3de::vertexbuffer::vertex_buffer::VertexBuffer;
+
+const ROWS: usize = 120;
+const COLS: usize = 400;
+
+fn vertex(x: f32, y: f32, z: f32) -> Vertex {
+    Vertex::new(
+        Vec4::new(x, y, z, 1.0),
+        Vec3::new(0.0, 0.0, 1.0),
+        Vec2::new(x / COLS as f32, y / ROWS as f32),
+        Vec3::new(x, y, z),
+    )
+}
+
+/// Rows of building facades, like `demos/3d/city_02.py` seen from the street: each
+/// row of buildings is nearer and hides most of the previous ones.
+///
+/// `back_to_front` submits the farthest row first, the worst case for overdraw.
+fn make_city(back_to_front: bool) -> PrimitiveBuffer {
+    let mut primitives = PrimitiveBuffer::new(4096);
+    let street_count = 12;
+    let mut streets: Vec<usize> = (0..street_count).collect();
+    if !back_to_front {
+        streets.reverse();
+    }
+    for street in streets {
+        let z = 0.9 - 0.07 * street as f32;
+        let width = 24.0 + 2.0 * street as f32;
+        let mut x = -(street as f32 * 5.0) % width;
+        let mut building = 0;
+        while x < COLS as f32 {
+            let height = 30.0 + ((building * 37 + street * 11) % 60) as f32;
+            let (x0, x1) = (x, x + width - 2.0);
+            let (y0, y1) = (ROWS as f32 - height, ROWS as f32);
+            primitives.add_triangle(
+                0,
+                1,
+                1,
+                vertex(x0, y0, z),
+                vertex(x1, y0, z),
+                vertex(x0, y1, z),
+                false,
+            );
+            primitives.add_triangle(
+                0,
+                1,
+                1,
+                vertex(x1, y0, z),
+                vertex(x1, y1, z),
+                vertex(x0, y1, z),
+                false,
+            );
+            x += width;
+            building += 1;
+        }
+    }
+    primitives
+}
+
+/// Single raster against the depth pre-pass on a city-like scene, in the worst and
+/// best submission orders.
+pub fn bench_depth_prepass(c: &mut Criterion) {
+    let vertices = VertexBuffer::<Vec4>::with_capacity(1);
+
+    let mut group = c.benchmark_group("depth_prepass_400x120");
+    group.throughput(criterion::Throughput::Elements((ROWS * COLS) as u64));
+
+    for back_to_front in [true, false] {
+        let order = if back_to_front {
+            "back_to_front"
+        } else {
+            "front_to_back"
+        };
+        let primitives = make_city(back_to_front);
+        let mut db = DrawBuffer::<1, f32>::new(ROWS, COLS, 10.0, false, true);
+
+        group.bench_function(format!("single_{order}"), |b| {
+            b.iter(|| {
+                db.clear_depth(10.0);
+                db.clear_pixinfo();
+                raster_all(&primitives, &vertices, &mut db, None);
+                black_box(db.get_depth_buffer_cell(ROWS / 2, COLS / 2));
+            })
+        });
+
+        group.bench_function(format!("prepass_{order}"), |b| {
+            b.iter(|| {
+                db.clear_depth(10.0);
+                db.clear_pixinfo();
+                raster_all_depth_prepass(&primitives, &vertices, &mut db, None, false);
+                black_box(db.get_depth_buffer_cell(ROWS / 2, COLS / 2));
+            })
+        });
+    }
+    group.finish();
+}
@@ -0,0 +1,127 @@
+use criterion::Criterion;
+use nalgebra_glm::{Vec2, Vec3, Vec4};
+use std::hint::black_box;
+use tt3de::drawbuffer::drawbuffer::{apply_material_on, DrawBuffer};
+use tt3de::material::MaterialBuffer;
+use tt3de::primitivbuffer::primitivbuffer::PrimitiveBuffer;
+use tt3de::raster::raster_all;
+use tt3de::raster::vertex::Vertex;
+use tt3de::texturebuffer::texture_buffer::TextureBuffer;
+use tt3de::texturebuffer::RGBA;
+use tt3de::vertexbuffer::uv_buffer::UVBuffer;
+use tt3de::vertexbuffer::vertex_buffer::VertexBuffer;
+
+// Typical terminal size, in cells.
+const ROWS: usize = 120;
+const COLS: usize = 400;
+
+fn vertex(x: f32, y: f32, z: f32) -> Vertex {
+    Vertex::new(
+        Vec4::new(x, y, z, 1.0),
+        Vec3::new(0.0, 0.0, 1.0),
+        Vec2::new(x / COLS as f32, y / ROWS as f32),
+        Vec3::zeros(),
+    )
+}
+
+/// Overlapping triangles covering the screen a few times, so that the depth test
+/// rejects and replaces fragments like in a real scene.
+fn make_scene() -> PrimitiveBuffer {
+    let mut primitives = PrimitiveBuffer::new(1024);
+    let step = 20.0;
+    for layer in 0..3 {
+        let z = 0.3 + 0.2 * ((layer * 7) % 3) as f32;
+        let shift = layer as f32 * 7.0;
+        let mut y = -step;
+        while y < ROWS as f32 {
+            let mut x = -step;
+            while x < COLS as f32 {
+                let (x0, y0) = (x + shift, y + shift * 0.5);
+                let (x1, y1) = (x0 + 2.0 * step, y0 + step);
+                primitives.add_triangle(
+                    0,
+                    1,
+                    1,
+                    vertex(x0, y0, z),
+                    vertex(x1, y0, z),
+                    vertex(x0, y1, z),
+                    false,
+                );
+                primitives.add_triangle(
+                    0,
+                    1,
+                    1,
+                    vertex(x1, y0, z),
+                    vertex(x1, y1, z),
+                    vertex(x0, y1, z),
+                    false,
+                );
+                x += 2.0 * step;
+            }
+            y += step;
+        }
+    }
+    primitives
+}
+
+fn make_materials() -> MaterialBuffer {
+    let mut materials = MaterialBuffer::new(4, None);
+    let color = RGBA {
+        r: 200,
+        g: 120,
+        b: 40,
+        a: 255,
+    };
+    materials.add_static(color, color, 0);
+    materials.add_static(color, color, 1);
+    materials
+}
+
+/// Raster and material passes over a full screen.
+///
+/// Compare memory layouts with criterion baselines, e.g.
+/// `cargo bench --bench all -- raster_material --save-baseline before` on the old
+/// tree, then `--baseline before` on the new one.
+pub fn bench_raster_material(c: &mut Criterion) {
+    let primitives = make_scene();
+    let vertices = VertexBuffer::<Vec4>::with_capacity(1);
+    let materials = make_materials();
+    let textures: TextureBuffer<256> = TextureBuffer::new(1);
+    let uvs = UVBuffer::<f32>::new(1);
+
+    let mut group = c.benchmark_group("raster_material_400x120");
+    group.throughput(criterion::Throughput::Elements((ROWS * COLS) as u64));
+
+    for visibility in [false, true] {
+        let mode = if visibility { "visibility" } else { "direct" };
+        let mut db = DrawBuffer::<1, f32>::new(ROWS, COLS, 10.0, false, true);
+        db.set_visibility_mode(visibility);
+
+        group.bench_function(format!("clear_raster_{mode}"), |b| {
+            b.iter(|| {
+                db.clear_depth(10.0);
+                db.clear_pixinfo();
+                raster_all(&primitives, &vertices, &mut db, None);
+                black_box(db.get_depth_buffer_cell(ROWS / 2, COLS / 2));
+            })
+        });
+
+        group.bench_function(format!("material_{mode}"), |b| {
+            b.iter(|| {
+                apply_material_on(&mut db, &materials, &textures, &uvs, &primitives);
+                black_box(db.get_canvas_cell(ROWS / 2, COLS / 2));
+            })
+        });
+
+        group.bench_function(format!("frame_{mode}"), |b| {
+            b.iter(|| {
+                db.clear_depth(10.0);
+                db.clear_pixinfo();
+                raster_all(&primitives, &vertices, &mut db, None);
+                apply_material_on(&mut db, &materials, &textures, &uvs, &primitives);
+                black_box(db.get_canvas_cell(ROWS / 2, COLS / 2));
+            })
+        });
+    }
+    group.finish();
+}
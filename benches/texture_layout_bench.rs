@@ -0,0 +1,79 @@
+use criterion::Criterion;
+use std::hint::black_box;
+use tt3de::texturebuffer::texture_buffer::TextureBuffer;
+use tt3de::texturebuffer::{FilterMode, TexelLayout, RGBA};
+
+// Typical terminal size, in cells; one sample per cell.
+const ROWS: usize = 120;
+const COLS: usize = 400;
+
+fn noise_pixels(width: usize, height: usize) -> impl Iterator<Item = RGBA> {
+    (0..width * height).map(|i| {
+        let h = (i as u32).wrapping_mul(2_654_435_761);
+        RGBA::new(h as u8, (h >> 8) as u8, (h >> 16) as u8, 255)
+    })
+}
+
+/// A 256x256 texture (`TextureType::Fixed`) and a 200x150 one (`TextureType::Custom`).
+fn make_textures(layout: TexelLayout) -> TextureBuffer<256> {
+    let mut textures = TextureBuffer::new(2);
+    for (width, height) in [(256, 256), (200, 150)] {
+        let idx = textures.add_texture_from_iter(
+            width,
+            height,
+            noise_pixels(width, height),
+            true,
+            true,
+            FilterMode::Bilinear,
+        );
+        textures.set_layout(idx, layout).unwrap();
+    }
+    textures
+}
+
+/// Walk the screen like the rasterizer does, along rows of cells, with the texture
+/// stretched over it at `angle` (radians): 0 walks the texture along its rows,
+/// pi/2 along its columns.
+fn sample_screen(textures: &TextureBuffer<256>, idx: usize, angle: f32) -> u32 {
+    let (sin, cos) = angle.sin_cos();
+    let scale = 1.0 / ROWS as f32;
+    let mut sum = 0u32;
+    for row in 0..ROWS {
+        for col in 0..COLS {
+            let (x, y) = (col as f32 * scale, row as f32 * scale);
+            let u = x * cos - y * sin;
+            let v = x * sin + y * cos;
+            sum += textures.get_rgba_at(idx, u, v, 0).r as u32;
+        }
+    }
+    sum
+}
+
+/// Bilinear sampling of a full screen, linear against tiled texels.
+///
+/// Compare the `linear` and `tiled` lines of each pattern, e.g.
+/// `cargo bench --bench all -- texture_layout`.
+pub fn bench_texture_layout(c: &mut Criterion) {
+    let mut group = c.benchmark_group("texture_layout_400x120");
+    group.throughput(criterion::Throughput::Elements((ROWS * COLS) as u64));
+
+    let patterns = [
+        ("horizontal", 0.0),
+        ("vertical", std::f32::consts::FRAC_PI_2),
+        ("rotated", 0.5),
+    ];
+    for (layout_name, layout) in [
+        ("linear", TexelLayout::Linear),
+        ("tiled", TexelLayout::Tiled),
+    ] {
+        let textures = make_textures(layout);
+        for (texture_name, idx) in [("fixed", 0), ("custom", 1)] {
+            for (pattern, angle) in patterns {
+                group.bench_function(format!("{pattern}_{texture_name}_{layout_name}"), |b| {
+                    b.iter(|| black_box(sample_screen(&textures, idx, black_box(angle))))
+                });
+            }
+        }
+    }
+    group.finish();
+}
@@ -8,7 +8,7 @@ from textual.widgets import (
     Header,
 )
 
-from tt3de.asset_fastloader import fast_load
+from tt3de.asset_bake import add_baked_asset, ensure_baked
 
 
 from tt3de.textual.debugged_view import DebuggedView
@@ -19,6 +19,7 @@ from tt3de.tt3de import (
     MaterialBufferPy,
     TextureBufferPy,
     find_glyph_indices_py,
+    load_baked_asset,
     materials,
 )
 from tt3de.tt3de import toglyphmethod
@@ -26,6 +27,9 @@ from tt3de.tt3de import toglyphmethod
 
 class GLMTester(TT3DFpsView):
     def initialize(self):
+        # the buildings hide each other: raster nearest first, so that the coarse
+        # depth test skips most of the hidden ones
+        self.rc.front_to_back = True
         # prepare a bunch of material
         self.rc.material_buffer = MaterialBufferPy()
 
@@ -33,10 +37,34 @@ class GLMTester(TT3DFpsView):
         SPACE = find_glyph_indices_py(" ")
         self.rc.material_buffer.add_static((200, 10, 10), (50, 50, 50), SPACE) # background color
 
-        img = fast_load("models/cities/TownColor_256.bmp")
-        tex_idx = self.rc.texture_buffer.add_texture(
-            img.image_width, img.image_height, img.chained_data(), True, True
+        # create a root 3D node
+        self.root3Dnode = TT3DNode()
+        self.rc.append_root(self.root3Dnode)
+        self.city = None
+
+        # baked once, then memory-mapped on the next starts; both off the render
+        # thread, the city shows up once loaded
+        self.asset_loader.submit(
+            "Town_1",
+            lambda: load_baked_asset(
+                ensure_baked(
+                    "models/cities/Town_1.obj",
+                    flip_triangles=True,
+                    extra_textures=["models/cities/TownColor_256.bmp"],
+                )
+            ),
+            lambda asset: add_baked_asset(
+                asset, self.rc.texture_buffer, self.rc.material_buffer
+            ),
+            self.add_city,
         )
+
+        # setup a time reference, to avoid trigonometry issues
+        self.reftime = time()
+
+    def add_city(self, result):
+        meshes, texture_ids = result
+        tex_idx = texture_ids[-1]
         HALF_BLOCK = find_glyph_indices_py("▀")
         mat_id = self.rc.material_buffer.add_base_texture(
             materials.BaseTexturePy(
@@ -54,23 +82,21 @@ class GLMTester(TT3DFpsView):
             )
         )
 
-        # create a root 3D node
-        self.root3Dnode = TT3DNode()
-
-        self.city = fast_load(
-            "models/cities/Town_1.obj",
-            flip_triangles=True,
-        )
-        self.city.material_id = mat_id
+        # one mesh per submesh; those without a textured material use the atlas
+        self.city = TT3DNode()
+        for mesh in meshes.values():
+            if mesh.material_id == 0:
+                mesh.material_id = mat_id
+            self.city.add_child(mesh)
         self.root3Dnode.add_child(self.city)
-
-        # final append
-        self.rc.append_root(self.root3Dnode)
-
-        # setup a time reference, to avoid trigonometry issues
-        self.reftime = time()
+        # the root is already in the render context
+        self.city.insert_in(self.rc)
 
     def update_step(self, timediff):
+        if self.city is None:
+            self.app.sub_title = f"loading {self.asset_loader.progress():.0%}"
+            return
+        self.app.sub_title = ""
         self.city.set_local_transform(
             glm.rotate(time() - self.reftime, glm.vec3(0, 1, 0))
         )
@@ -23,6 +23,9 @@ class GLMTester(TT3DFpsView):
         super().__init__(*args, vertex_buffer_size=4096 * 3, **kwargs)
 
     def initialize(self):
+        # the buildings hide each other: raster nearest first, so that the coarse
+        # depth test skips most of the hidden ones
+        self.rc.front_to_back = True
         # prepare a bunch of material
         img = fast_load("models/cities/TownColor_256.bmp")
         tex_idx = self.rc.texture_buffer.add_texture(
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""Background asset loading.
+
+Files are read, decoded and parsed on a thread pool (the native loaders release
+the GIL), while the buffers are only touched on the render thread, by
+`AsyncAssetLoader.commit_ready` between two frames. `TT3DViewStandAlone` owns a
+loader and commits before every frame, so an app can queue its assets in
+`initialize`, draw a loading screen from `progress()` and render the scene as
+its parts arrive:
+
+    def initialize(self):
+        self.asset_loader.load_baked("models/cities/Town_1.tt3d", self.add_town)
+
+    def add_town(self, result):
+        meshes, texture_ids = result
+        for mesh in meshes.values():
+            self.rc.append_root(mesh)
+"""
+
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from time import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from tt3de.asset_bake import add_baked_asset
+from tt3de.obj_loader import obj_materials
+from tt3de.tt3de import decode_image_file, load_baked_asset, load_obj_native
+from tt3de.tt_3dnodes import TT3DMesh
+
+logger = logging.getLogger(__name__)
+
+
+class AssetJob:
+    """An asset queued on an `AsyncAssetLoader`.
+
+    `result` is set once the asset is committed to the buffers, `error` when
+    loading it, or its `on_ready`, raised.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        future: Future,
+        commit: Callable[[Any], Any],
+        on_ready: Optional[Callable[[Any], None]],
+    ):
+        self.name = name
+        self.future = future
+        self.commit = commit
+        self.on_ready = on_ready
+        self.done = False
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class AsyncAssetLoader:
+    def __init__(self, rc, max_workers: Optional[int] = None):
+        """
+        Load assets for the render context ``rc`` on ``max_workers`` threads.
+
+        The buffers are looked up on ``rc`` when a job is committed, so an app may
+        still replace them in ``initialize``.
+        """
+        self.rc = rc
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: List[AssetJob] = []
+        self.total = 0
+        self.finished = 0
+        self.errors: List[Tuple[str, BaseException]] = []
+
+    def submit(
+        self,
+        name: str,
+        work: Callable[[], Any],
+        commit: Callable[[Any], Any],
+        on_ready: Optional[Callable[[Any], None]] = None,
+    ) -> AssetJob:
+        """
+        Run ``work`` on the pool; ``commit(work())`` then runs on the render thread,
+        and ``on_ready`` gets what it returns.
+
+        ``work`` must not touch the buffers of the render context.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="tt3de-assets"
+            )
+        job = AssetJob(name, self._executor.submit(work), commit, on_ready)
+        self._pending.append(job)
+        self.total += 1
+        return job
+
+    def load_texture(
+        self,
+        path,
+        on_ready: Optional[Callable[[int], None]] = None,
+        repeat_width=True,
+        repeat_height=True,
+        filter_mode="bilinear",
+        transparent_colors: Optional[List[Tuple[int, int, int]]] = None,
+    ) -> AssetJob:
+        """Decode a BMP or PNG file; the result is its index in the texture buffer."""
+
+        def commit(image) -> int:
+            return self.rc.texture_buffer.add_decoded_image(
+                image, repeat_width, repeat_height, filter_mode
+            )
+
+        return self.submit(
+            str(path),
+            lambda: decode_image_file(path, transparent_colors),
+            commit,
+            on_ready,
+        )
+
+    def load_obj(
+        self,
+        path,
+        on_ready: Optional[Callable[[Dict[str, TT3DMesh]], None]] = None,
+        flip_triangles=False,
+        glyph: int = 95,
+    ) -> AssetJob:
+        """
+        Parse an OBJ file, its MTL materials and their textures, like
+        `obj_loader.load_obj_meshes`.
+
+        The result is one TT3DMesh per material; the meshes reach the vertex buffer
+        when they are appended to the render context.
+        """
+
+        def work():
+            mesh = load_obj_native(path, flip_triangles)
+            materials = [
+                (
+                    obj_material.name,
+                    None if texture_path is None else decode_image_file(texture_path),
+                )
+                for _, obj_material, texture_path in obj_materials(path, mesh.mtllibs())
+            ]
+            return mesh, materials
+
+        def commit(loaded) -> Dict[str, TT3DMesh]:
+            mesh, materials = loaded
+            material_ids: Dict[str, int] = {}
+            for name, image in materials:
+                if image is not None:
+                    texture = self.rc.texture_buffer.add_decoded_image(image)
+                    material_ids[name] = self.rc.material_buffer.add_textured(
+                        texture, glyph
+                    )
+            return {
+                name: TT3DMesh(mesh, submesh, material_id=material_ids.get(name, 0))
+                for submesh, name in enumerate(mesh.material_names())
+            }
+
+        return self.submit(str(path), work, commit, on_ready)
+
+    def load_baked(
+        self,
+        path,
+        on_ready: Optional[
+            Callable[[Tuple[Dict[str, TT3DMesh], List[int]]], None]
+        ] = None,
+    ) -> AssetJob:
+        """Map a baked asset; the result is that of `asset_bake.load_baked`."""
+
+        def commit(asset):
+            return add_baked_asset(
+                asset, self.rc.texture_buffer, self.rc.material_buffer
+            )
+
+        return self.submit(str(path), lambda: load_baked_asset(path), commit, on_ready)
+
+    def progress(self) -> float:
+        """Share of the queued jobs that are committed or failed, 1.0 when idle."""
+        if self.total == 0:
+            return 1.0
+        return self.finished / self.total
+
+    def is_loading(self) -> bool:
+        return len(self._pending) > 0
+
+    def commit_ready(self, time_budget: Optional[float] = 0.008) -> int:
+        """
+        Commit the loaded jobs to the buffers, in submission order among those
+        ready, and call their ``on_ready``. Call it from the render thread. A job
+        is committed once: the errors of ``commit`` and ``on_ready`` both go to
+        ``job.error`` and ``errors``, and are logged.
+
+        Stops once ``time_budget`` seconds are spent (at least one job is committed;
+        ``None`` commits every ready job). Returns the number of jobs committed.
+        """
+        start = time()
+        committed = 0
+        still_pending: List[AssetJob] = []
+        for job in self._pending:
+            out_of_time = (
+                committed > 0
+                and time_budget is not None
+                and time() - start > time_budget
+            )
+            if out_of_time or not job.future.done():
+                still_pending.append(job)
+                continue
+            try:
+                job.result = job.commit(job.future.result())
+                if job.on_ready is not None:
+                    job.on_ready(job.result)
+            except Exception as e:
+                job.error = e
+                self.errors.append((job.name, e))
+                logger.error("Loading asset %s failed", job.name, exc_info=e)
+            job.done = True
+            self.finished += 1
+            committed += 1
+        self._pending = still_pending
+        return committed
+
+    def wait(self):
+        """Block until every queued job is loaded, then commit them all."""
+        while self._pending:
+            self._pending[0].future.exception()
+            self.commit_ready(None)
+
+    def shutdown(self):
+        """Drop the jobs not committed yet and stop the worker threads."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        # the dropped jobs no longer count in the progress
+        self.total -= len(self._pending)
+        self._pending = []
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""Pre-baked binary assets.
+
+`bake_asset` parses an OBJ file, its MTL materials and their textures once and
+writes them to a binary file; `load_baked` memory-maps that file and copies the
+arrays straight into the buffers, without parsing anything at startup.
+
+    python -m tt3de.asset_bake models/cities/Town_1.obj Town_1.tt3d
+"""
+
+import argparse
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from tt3de.asset_load import load_bmp
+from tt3de.obj_loader import obj_materials, read_png
+from tt3de.richtexture import ImageTexture
+from tt3de.tt3de import (
+    BakedAssetPy,
+    MaterialBufferPy,
+    TextureBufferPy,
+    load_baked_asset,
+    load_obj_native,
+    write_baked_asset,
+)
+from tt3de.tt_3dnodes import TT3DMesh
+
+BAKED_EXTENSION = ".tt3d"
+
+
+def read_image(file_path) -> ImageTexture:
+    if file_path.endswith(".bmp"):
+        with open(file_path, "rb") as fin:
+            return ImageTexture(load_bmp(fin))
+    elif file_path.endswith(".png"):
+        return read_png(file_path)
+    raise ValueError(f"Unsupported texture format: {file_path}")
+
+
+def rgba_bytes(img: ImageTexture) -> bytes:
+    """Pixels of an image as RGBA bytes, row by row."""
+    pixels = bytearray()
+    for pixel in img.chained_data():
+        if isinstance(pixel, int):
+            pixels.extend((pixel, pixel, pixel, 255))
+        elif len(pixel) == 3:
+            pixels.extend((*pixel, 255))
+        else:
+            pixels.extend(pixel)
+    return bytes(pixels)
+
+
+def bake_asset(
+    obj_path,
+    out_path,
+    flip_triangles=False,
+    extra_textures: Iterable[str] = (),
+    glyph: int = 95,
+):
+    """Bake an OBJ file, its materials and their textures into `out_path`.
+
+    Textured materials get the glyph `glyph`, like `load_mtl`; MTL files that are
+    missing are skipped. `extra_textures` are image files embedded after the
+    textures of the materials, for the materials built by the application.
+
+    The OBJ, MTL and image files are recorded in the baked file, for
+    `is_baked_stale`.
+    """
+    mesh = load_obj_native(obj_path, flip_triangles)
+    # the missing MTL files too: creating one makes the baked file stale
+    sources = [obj_path]
+    sources.extend(os.path.join(os.path.dirname(obj_path), m) for m in mesh.mtllibs())
+
+    materials: List[Tuple[str, Optional[int], int]] = []
+    textures: List[Tuple[int, int, bytes, bool, bool]] = []
+
+    def add_texture(file_path):
+        sources.append(file_path)
+        img = read_image(file_path)
+        textures.append(
+            (img.image_width, img.image_height, rgba_bytes(img), True, True)
+        )
+        return len(textures) - 1
+
+    for _, obj_material, texture_path in obj_materials(obj_path, mesh.mtllibs()):
+        texture = None if texture_path is None else add_texture(texture_path)
+        materials.append((obj_material.name, texture, glyph))
+
+    for file_path in extra_textures:
+        add_texture(file_path)
+
+    directory = os.path.dirname(os.path.abspath(out_path))
+    write_baked_asset(
+        out_path,
+        mesh,
+        materials,
+        textures,
+        [_relative_path(source, directory) for source in dict.fromkeys(sources)],
+    )
+
+
+def _relative_path(path, directory) -> str:
+    try:
+        return os.path.relpath(path, directory)
+    except ValueError:
+        # on another drive
+        return os.path.abspath(path)
+
+
+def baked_path_for(obj_path) -> str:
+    return os.path.splitext(obj_path)[0] + BAKED_EXTENSION
+
+
+def is_baked_stale(baked_path, sources: Iterable[str] = ()) -> bool:
+    """True when `baked_path` is missing or unreadable, or older than one of
+    `sources` or of the existing files it was baked from (OBJ, MTL and images)."""
+    if not os.path.exists(baked_path):
+        return True
+    try:
+        recorded = load_baked_asset(baked_path).sources()
+    except (OSError, ValueError):
+        # e.g. written by an older version
+        return True
+    directory = os.path.dirname(os.path.abspath(baked_path))
+    baked_time = os.path.getmtime(baked_path)
+    return any(
+        os.path.exists(path) and os.path.getmtime(path) > baked_time
+        for path in [*sources, *(os.path.join(directory, s) for s in recorded)]
+    )
+
+
+def ensure_baked(obj_path, out_path=None, **bake_kwargs) -> str:
+    """Bake `obj_path` unless an up-to-date baked file exists (see
+    `is_baked_stale`); return the path of the baked file."""
+    if out_path is None:
+        out_path = baked_path_for(obj_path)
+    if is_baked_stale(out_path, [obj_path, *bake_kwargs.get("extra_textures", ())]):
+        bake_asset(obj_path, out_path, **bake_kwargs)
+    return out_path
+
+
+def load_baked(
+    path,
+    texture_buffer: TextureBufferPy,
+    material_buffer: MaterialBufferPy,
+) -> Tuple[Dict[str, TT3DMesh], List[int]]:
+    """Load a baked asset: its textures go to `texture_buffer` and its textured
+    materials to `material_buffer`.
+
+    Returns one TT3DMesh per material, and the index of every embedded texture in
+    `texture_buffer`. Meshes without a textured material keep the material 0.
+    """
+    return add_baked_asset(load_baked_asset(path), texture_buffer, material_buffer)
+
+
+def add_baked_asset(
+    asset: BakedAssetPy,
+    texture_buffer: TextureBufferPy,
+    material_buffer: MaterialBufferPy,
+) -> Tuple[Dict[str, TT3DMesh], List[int]]:
+    """The buffer part of `load_baked`, for an asset already loaded."""
+    texture_ids = [
+        asset.add_texture_to(texture_buffer, texture)
+        for texture in range(asset.texture_count())
+    ]
+    material_ids: Dict[str, int] = {}
+    for name, texture, glyph in asset.materials():
+        if texture is not None:
+            material_ids[name] = material_buffer.add_textured(
+                texture_ids[texture], glyph
+            )
+
+    meshes: Dict[str, TT3DMesh] = {}
+    for submesh, material_name in enumerate(asset.material_names()):
+        meshes[material_name] = TT3DMesh(
+            asset, submesh, material_id=material_ids.get(material_name, 0)
+        )
+    return meshes, texture_ids
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bake an OBJ file for tt3de.")
+    parser.add_argument("obj_path")
+    parser.add_argument("out_path", nargs="?")
+    parser.add_argument("--flip-triangles", action="store_true")
+    parser.add_argument("--texture", action="append", default=[])
+    args = parser.parse_args()
+    bake_asset(
+        args.obj_path,
+        args.out_path or baked_path_for(args.obj_path),
+        flip_triangles=args.flip_triangles,
+        extra_textures=args.texture,
+    )
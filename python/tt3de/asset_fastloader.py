@@ -153,20 +153,9 @@ class MaterialPerfab:
         """
         texture_buffer = TextureBufferPy(32)
 
-        img: ImageTexture = fast_load("models/test_screen256.bmp")
-        texture_buffer.add_texture(
-            img.image_width, img.image_height, img.chained_data(), True, True
-        )
-
-        img: ImageTexture = fast_load("models/test_screen256.bmp")
-        texture_buffer.add_texture(
-            img.image_width, img.image_height, img.chained_data(), False, False
-        )
-
-        img: ImageTexture = fast_load("models/sky1.bmp")
-        texture_buffer.add_texture(
-            img.image_width, img.image_height, img.chained_data(), True, True
-        )
+        texture_buffer.add_texture_from_file("models/test_screen256.bmp", True, True)
+        texture_buffer.add_texture_from_file("models/test_screen256.bmp", False, False)
+        texture_buffer.add_texture_from_file("models/sky1.bmp", True, True)
 
         img: ImageTexture = ImageTexture(
             load_bmp(
@@ -179,14 +168,8 @@ class MaterialPerfab:
             img.image_width, img.image_height, img.chained_data(), 32, 32
         )
 
-        img: ImageTexture = fast_load("models/cubetest2.bmp")
-        texture_buffer.add_texture(
-            img.image_width, img.image_height, img.chained_data(), True, True
-        )
-        img: ImageTexture = fast_load("models/car/car5_taxi.bmp")
-        texture_buffer.add_texture(
-            img.image_width, img.image_height, img.chained_data(), True, True
-        )
+        texture_buffer.add_texture_from_file("models/cubetest2.bmp", True, True)
+        texture_buffer.add_texture_from_file("models/car/car5_taxi.bmp", True, True)
 
         HALF_UPPER_BLOCK = find_glyph_indices_py("▀")
         FULL_BLOCK = find_glyph_indices_py("█")
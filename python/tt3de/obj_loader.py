@@ -2,14 +2,14 @@
 
 
 import os
-from typing import List, Tuple, Dict, Any
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from pyglm import glm
 
 from tt3de.points import Point2D, Point3D
 from tt3de.richtexture import ImageTexture
-from tt3de.tt3de import MaterialBufferPy, TextureBufferPy
-from tt3de.tt_3dnodes import TT3DPolygon
+from tt3de.tt3de import MaterialBufferPy, TextureBufferPy, load_obj_native
+from tt3de.tt_3dnodes import TT3DMesh, TT3DPolygon
 import png
 
 
@@ -236,27 +236,13 @@ class OBJMaterial:
             # load the texture
             # return the texture
         elif texture_full_path.endswith(".png"):
-            pixel_data: List[List[int]] = []
-            reader = png.Reader(filename=texture_full_path)
-            width, height, rows, metadata = reader.read()
-
-            pixel_format = metadata["planes"]
-            for row in rows:
-                row_pixel = []
-                for col in range(width):
-                    if pixel_format == 1:
-                        pixel = row[col]
-                        row_pixel.append(pixel)
-                    elif pixel_format == 3:
-                        r, g, b = row[col * 3 : col * 3 + 3]
-                        row_pixel.append((r, g, b))
-                    elif pixel_format == 4:
-                        r, g, b, a = row[col * 4 : col * 4 + 4]
-                        row_pixel.append((r, g, b, a))
-                pixel_data.append(row_pixel)
-            img: ImageTexture = ImageTexture(list(reversed(pixel_data)))
+            img = read_png(texture_full_path)
             index_in_buffer = texture_buffer.add_texture(
-                width, height, img.chained_data(), repeat_width, repeat_height
+                img.image_width,
+                img.image_height,
+                img.chained_data(),
+                repeat_width,
+                repeat_height,
             )
             self.texture_index = index_in_buffer
         else:
@@ -284,9 +270,29 @@ class OBJFace:
             return triangles
 
 
-def load_mtl(
-    file_path, texture_buffer: TextureBufferPy, material_buffer: MaterialBufferPy
-):
+def read_png(file_path) -> ImageTexture:
+    pixel_data: List[List[int]] = []
+    reader = png.Reader(filename=file_path)
+    width, height, rows, metadata = reader.read()
+
+    pixel_format = metadata["planes"]
+    for row in rows:
+        row_pixel = []
+        for col in range(width):
+            if pixel_format == 1:
+                pixel = row[col]
+                row_pixel.append(pixel)
+            elif pixel_format == 3:
+                r, g, b = row[col * 3 : col * 3 + 3]
+                row_pixel.append((r, g, b))
+            elif pixel_format == 4:
+                r, g, b, a = row[col * 4 : col * 4 + 4]
+                row_pixel.append((r, g, b, a))
+        pixel_data.append(row_pixel)
+    return ImageTexture(list(reversed(pixel_data)))
+
+
+def parse_mtl(file_path) -> List[OBJMaterial]:
     materials: List[OBJMaterial] = []
     current_material = None
     with open(file_path, "r") as f:
@@ -311,6 +317,36 @@ def load_mtl(
 
     if current_material is not None:
         materials.append(current_material)
+    return materials
+
+
+def obj_materials(
+    obj_path, mtllibs: Iterable[str]
+) -> List[Tuple[str, OBJMaterial, Optional[str]]]:
+    """The materials of the ``mtllib`` files of an OBJ file.
+
+    Returns (MTL path, material, texture path or None) for every material. The
+    paths in `mtllibs` are relative to the OBJ file and the textures relative to
+    their MTL file; MTL files that are missing are skipped.
+    """
+    directory = os.path.dirname(obj_path)
+    materials = []
+    for mtllib in mtllibs:
+        mtl_path = os.path.join(directory, mtllib)
+        if not os.path.exists(mtl_path):
+            continue
+        for material in parse_mtl(mtl_path):
+            texture_path = None
+            if material.texture:
+                texture_path = os.path.join(os.path.dirname(mtl_path), material.texture)
+            materials.append((mtl_path, material, texture_path))
+    return materials
+
+
+def load_mtl(
+    file_path, texture_buffer: TextureBufferPy, material_buffer: MaterialBufferPy
+):
+    materials = parse_mtl(file_path)
     for material in materials:
         material.load_texture(texture_buffer, os.path.dirname(file_path))
         material.load_material(material_buffer)
@@ -360,3 +396,31 @@ def load_obj(
     # for obj_group in obj_data.groups:
     #    obj_group.triangulate(obj_data)
     return obj_data
+
+
+def load_obj_meshes(
+    file_path,
+    texture_buffer: TextureBufferPy,
+    material_buffer: MaterialBufferPy,
+    flip_triangles=False,
+    glyph: int = 95,
+) -> Dict[str, TT3DMesh]:
+    """Load an OBJ file with the native loader; one TT3DMesh per material.
+
+    Same result as `load_obj(...).merge_by_material(...)`, without building python
+    objects for every vertex. The textures of the `obj_materials` are decoded
+    natively; faces without a textured material keep the material 0.
+    """
+    mesh = load_obj_native(file_path, flip_triangles)
+    material_ids: Dict[str, int] = {}
+    for _, obj_material, texture_path in obj_materials(file_path, mesh.mtllibs()):
+        if texture_path is not None:
+            texture = texture_buffer.add_texture_from_file(texture_path)
+            material_ids[obj_material.name] = material_buffer.add_textured(
+                texture, glyph
+            )
+
+    return {
+        name: TT3DMesh(mesh, submesh, material_id=material_ids.get(name, 0))
+        for submesh, name in enumerate(mesh.material_names())
+    }
@@ -8,7 +8,7 @@ if TYPE_CHECKING:
     from tt3de.tt_2dnodes import TT2DNode
     from tt3de.tt_3dnodes import TT3DNode
 
-from typing import List
+from typing import Dict, Iterable, List, Tuple
 
 from pyglm import glm
 from textual.geometry import Region
@@ -26,10 +26,47 @@ from tt3de.tt3de import (
     apply_material_py,
     apply_material_py_parallel,
     build_primitives_py,
+    compact_buffers_py,
     raster_all_py,
 )
 
 
+class RenderTarget:
+    """
+    An offscreen pass of a `RustRenderContext`: the scene seen by ``camera``,
+    drawn into a drawing buffer of its own and copied into the texture
+    ``texture_idx`` before the main pass. See `RustRenderContext.add_render_target`.
+    """
+
+    def __init__(
+        self,
+        camera: GLMCamera,
+        drawing_buffer: DrawingBufferPy,
+        primitive_buffer: PrimitiveBufferPy,
+        texture_idx: int,
+        depends_on: Iterable["RenderTarget"] = (),
+        every: int = 1,
+    ):
+        self.camera = camera
+        self.drawing_buffer = drawing_buffer
+        self.primitive_buffer = primitive_buffer
+        self.texture_idx = texture_idx
+        # targets whose texture this one shows, rendered before it
+        self.depends_on: List[RenderTarget] = list(depends_on)
+        # render on one frame out of ``every``; the texture keeps the last result
+        self.every = every
+        self.enabled = True
+        self._frames = 0
+
+    @property
+    def width(self) -> int:
+        return self.drawing_buffer.get_col_count()
+
+    @property
+    def height(self) -> int:
+        return self.drawing_buffer.get_row_count()
+
+
 class RustRenderContext:
     def __init__(
         self,
@@ -43,39 +80,63 @@ class RustRenderContext:
         transform_buffer_size=64,
         texture_buffer_size=32,
         material_buffer_size=32,
-        material_parallel_threads: int | None = 8,
+        material_parallel_threads: int | None = -1,
+        hard_caps: Dict[str, int] | None = None,
+        visibility_buffer: bool = False,
     ):
         """
         Create buffers for Rust-backed rasterization.
 
-        ``material_parallel_threads``: ``None`` runs the material pass on one thread;
-        a positive integer builds a per-context Rayon pool with that many threads (default ``8``).
-        Values ``<= 0`` are treated like ``None`` (serial).
+        The ``*_size`` arguments are initial capacities: the vertex, geometry,
+        primitive, transform and material buffers grow on demand. ``hard_caps`` bounds
+        them, keyed by ``"vertex"``, ``"geometry"``, ``"primitive"``, ``"transform"``
+        and ``"material"``; see ``buffer_stats`` to right-size a configuration.
+
+        ``material_parallel_threads``: ``-1`` (default) runs the material pass on the
+        process-wide engine pool, shared by every context (see
+        ``configure_engine_pool_py``); a positive integer builds a per-context Rayon
+        pool with that many threads. ``None`` and other values ``<= 0`` run it on
+        one thread.
+
+        ``visibility_buffer``: rasterize triangles into a visibility buffer (depth,
+        primitive id and barycentrics) and rebuild the attributes of the visible
+        fragments only, before the material pass.
         """
         self.width = screen_width
         self.height = screen_height
-        if material_parallel_threads is not None and material_parallel_threads < 1:
-            material_parallel_threads = None
-        self._material_parallel_threads = material_parallel_threads
+        if material_parallel_threads is None or material_parallel_threads < -1:
+            material_parallel_threads = 0
+        self._visibility_buffer = visibility_buffer
 
         self.texture_buffer = TextureBufferPy(texture_buffer_size)
-        self.material_buffer = MaterialBufferPy(material_buffer_size)
+        hard_caps = hard_caps or {}
+        self.material_buffer = MaterialBufferPy(
+            material_buffer_size, hard_cap=hard_caps.get("material")
+        )
         self.vertex_buffer = VertexBufferPy(
-            vertex_buffer_size, uv_buffer_size, vertex_2d_buffer_size
+            vertex_buffer_size,
+            uv_buffer_size,
+            vertex_2d_buffer_size,
+            hard_cap=hard_caps.get("vertex"),
+        )
+        self.geometry_buffer: GeometryBufferPy = GeometryBufferPy(
+            geometry_buffer_size, hard_cap=hard_caps.get("geometry")
         )
-        self.geometry_buffer: GeometryBufferPy = GeometryBufferPy(geometry_buffer_size)
         self.geometry_buffer.add_point_3d(0, 0, node_id=0, material_id=0)
-        self.primitive_buffer = PrimitiveBufferPy(primitive_buffer_size)
-        self.transform_buffer = TransformPackPy(transform_buffer_size)
+        self.primitive_buffer = PrimitiveBufferPy(
+            primitive_buffer_size, hard_cap=hard_caps.get("primitive")
+        )
+        self.transform_buffer = TransformPackPy(
+            transform_buffer_size, hard_cap=hard_caps.get("transform")
+        )
         self.drawing_buffer: DrawingBufferPy = DrawingBufferPy(
             max_row=self.height,
             max_col=self.width,
-            material_parallel_threads=(
-                0
-                if self._material_parallel_threads is None
-                else self._material_parallel_threads
-            ),
+            material_parallel_threads=material_parallel_threads,
         )
+        # thread count of the material pass, None when serial
+        self._material_parallel_threads = self.drawing_buffer.material_parallel_threads
+        self.drawing_buffer.set_visibility_mode(self._visibility_buffer)
 
         self.global_bit_size = 4
         # self.drawing_buffer.set_bit_size_front(self.global_bit_size,self.global_bit_size,self.global_bit_size)
@@ -84,89 +145,374 @@ class RustRenderContext:
         self.drawing_buffer.hard_clear(1000.0)
         self.roots_nodes: List[Union["TT3DNode", "TT2DNode"]] = []
 
+        # nodes with a pending transform or material change, in insertion order
+        self._dirty_nodes: Dict[Union["TT3DNode", "TT2DNode"], None] = {}
+        # global transforms waiting for the next batched upload
+        self._pending_node_ids: List[int] = []
+        self._pending_node_matrices: List[glm.mat4] = []
+
+        # raster opaque primitives nearest first, so that the coarse depth test
+        # rejects as much of the hidden ones as possible. Worth it on scenes with a
+        # lot of overdraw; costs a sort of the opaque primitives per frame.
+        self.front_to_back = False
+        # rasterize opaque primitives twice, depth first: the pixel info is then only
+        # written for the visible fragments. Worth it on scenes with a lot of overdraw.
+        self.depth_prepass = False
+        # shade the opaque pass material by material, on the calling thread. Worth it
+        # on scenes mixing many materials; replaces the parallel material pass.
+        self.material_sorted = False
+
+        # whole-frame short-circuit: when nothing the frame depends on changed,
+        # the canvas of the previous frame is kept as is.
+        self.frame_cache_enabled = True
+        self.last_frame_skipped = False
+        self._last_frame_key = None
+        self._clear_pending = False
+
+        # offscreen passes, rendered before the main one
+        self.render_targets: List[RenderTarget] = []
+        self._primitive_buffer_size = primitive_buffer_size
+        self._primitive_hard_cap = hard_caps.get("primitive")
+
     def update_wh(self, w, h):
         if w != self.width or h != self.height:
             self.width, self.height = w, h
-            self.drawing_buffer = DrawingBufferPy(
-                max_row=self.height,
-                max_col=self.width,
-                material_parallel_threads=(
-                    0
-                    if self._material_parallel_threads is None
-                    else self._material_parallel_threads
-                ),
-            )
-            # self.drawing_buffer.set_bit_size_front(self.global_bit_size,self.global_bit_size,self.global_bit_size)
-            # self.drawing_buffer.set_bit_size_back(self.global_bit_size,self.global_bit_size,self.global_bit_size)
+            # in place: keeps the material thread pool and the segment cache
+            self.drawing_buffer.resize(self.height, self.width)
             self.drawing_buffer.hard_clear(1000.0)
+            self._last_frame_key = None
+            self._clear_pending = False
 
     def clear_canvas(self):
-        self.drawing_buffer.hard_clear(1000.0)
+        """
+        Request a clear of the canvas before the next frame.
 
-    def render(self, camera: GLMCamera):
-        self.transform_buffer.set_view_matrix_glm(camera.view_matrix_2D)
+        The clear is deferred to ``render`` so an unchanged frame can keep the
+        previous canvas instead of clearing and drawing the same content again.
+        """
+        self._clear_pending = True
+
+    def _flush_pending_clear(self):
+        if self._clear_pending:
+            self.drawing_buffer.hard_clear(1000.0)
+            self._clear_pending = False
+
+    def buffer_stats(self) -> Dict[str, Tuple[int, int]]:
+        """``(capacity, high_water_mark)`` of every growable buffer."""
+        vertex_3d, uv, vertex_2d, _ = self.vertex_buffer.high_water_marks()
+        return {
+            "vertex": (self.vertex_buffer.get_3d_capacity(), vertex_3d),
+            "vertex_2d": (self.vertex_buffer.get_2d_capacity(), vertex_2d),
+            "uv": (self.vertex_buffer.get_uv_max_content() // 3, uv),
+            "geometry": (
+                self.geometry_buffer.capacity(),
+                self.geometry_buffer.high_water_mark(),
+            ),
+            "primitive": (
+                self.primitive_buffer.capacity(),
+                self.primitive_buffer.high_water_mark(),
+            ),
+            "transform": (
+                self.transform_buffer.capacity(),
+                self.transform_buffer.high_water_mark(),
+            ),
+            "material": (
+                self.material_buffer.capacity(),
+                self.material_buffer.high_water_mark(),
+            ),
+        }
+
+    def allocate_range(
+        self, node: Union["TT3DNode", "TT2DNode"], kind: str, count: int
+    ) -> int:
+        """
+        Reserve ``count`` elements of ``kind`` ("3d", "2d", "uv" or "triangle") of
+        the vertex buffer for ``node`` and return the first index.
+
+        The ranges of removed nodes are reused first. The range is recorded in
+        ``node.buffer_ranges`` and given back by ``remove_geometry``.
+        """
+        start = self.vertex_buffer.allocate_range(kind, count)
+        node.buffer_ranges.append((kind, start, count))
+        return start
+
+    def remove_geometry(self, node: Union["TT3DNode", "TT2DNode"]):
+        """
+        Stop drawing the geometry of ``node`` and free its slot for the next insert.
+
+        The vertex buffer ranges of the node are released, so the next inserted
+        nodes reuse them instead of growing the buffers.
+        """
+        geom_id = getattr(node, "geom_id", None)
+        if geom_id is not None:
+            self.geometry_buffer.remove_geometry(geom_id)
+            node.geom_id = None
+        for kind, start, count in node.buffer_ranges:
+            self.vertex_buffer.release_range(kind, start, count)
+        node.buffer_ranges = []
+
+    def remove_node(self, node: Union["TT3DNode", "TT2DNode"]):
+        """
+        Remove ``node`` and its subtree from the context.
+
+        The node is detached from its parent, or from the roots. The geometries,
+        vertex buffer ranges and transform slots of the subtree are released, so
+        spawning and removing nodes every few frames does not grow the buffers. The
+        subtree keeps its own structure and can be appended again.
+        """
+        if node.parent is not None:
+            node.parent.elements.remove(node)
+            node.parent = None
+        elif node in self.roots_nodes:
+            self.roots_nodes.remove(node)
+
+        node_ids: List[int] = []
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            stack.extend(current.elements)
+            self.remove_geometry(current)
+            self._dirty_nodes.pop(current, None)
+            if current.node_id is not None:
+                node_ids.append(current.node_id)
+            current.node_id = None
+            current.rc = None
+        # descendants first, so that none of them is turned into a root on the way
+        for node_id in reversed(node_ids):
+            self.transform_buffer.remove_node(node_id)
+
+        # the slots are reused by the next inserts: drop their queued transforms
+        removed = set(node_ids)
+        pending = [
+            (node_id, matrix)
+            for node_id, matrix in zip(
+                self._pending_node_ids, self._pending_node_matrices
+            )
+            if node_id not in removed
+        ]
+        self._pending_node_ids = [node_id for node_id, _ in pending]
+        self._pending_node_matrices = [matrix for _, matrix in pending]
+
+    def compact(self):
+        """
+        Pack the geometry and vertex buffers, dropping removed geometries.
+
+        Geometry ids change; the ``geom_id`` and ``buffer_ranges`` of the inserted
+        nodes are updated.
+        """
+        mapping = compact_buffers_py(self.geometry_buffer, self.vertex_buffer)
+        stack = list(self.roots_nodes)
+        while stack:
+            node = stack.pop()
+            stack.extend(node.elements)
+            geom_id = getattr(node, "geom_id", None)
+            if geom_id is not None and geom_id < len(mapping):
+                geom_id = node.geom_id = mapping[geom_id]
+            # the data moved, and the packed buffers only keep what geometries use
+            node.buffer_ranges = (
+                self.geometry_buffer.geometry_ranges(geom_id)
+                if geom_id is not None
+                else []
+            )
+
+    def add_render_target(
+        self,
+        camera: GLMCamera,
+        width: int,
+        height: int,
+        depends_on: Iterable[RenderTarget] = (),
+        every: int = 1,
+        filter_mode: str = "bilinear",
+    ) -> RenderTarget:
+        """
+        Render the scene seen by ``camera`` into a texture at every frame, before
+        the main pass, e.g. for a mirror, a minimap or a monitor.
+
+        The offscreen pass is ``width`` x ``height`` cells, usually far less than
+        the screen; the texture gets two texels per cell, an upper and a lower one.
+        Targets whose texture is visible from this one go in ``depends_on`` and
+        are rendered first. ``every`` renders the target on one frame out of that
+        many. The texture is used like any other, e.g. with
+        ``material_buffer.add_textured(target.texture_idx, glyph)``.
+        """
+        drawing_buffer = DrawingBufferPy(
+            max_row=height,
+            max_col=width,
+            # the shared engine pool rather than a pool per target
+            material_parallel_threads=(
+                0 if self._material_parallel_threads is None else -1
+            ),
+        )
+        drawing_buffer.set_visibility_mode(self._visibility_buffer)
+        target = RenderTarget(
+            camera,
+            drawing_buffer,
+            PrimitiveBufferPy(
+                self._primitive_buffer_size, hard_cap=self._primitive_hard_cap
+            ),
+            self.texture_buffer.add_render_target(width, 2 * height, filter_mode),
+            depends_on=depends_on,
+            every=every,
+        )
+        self.render_targets.append(target)
+        return target
+
+    def remove_render_target(self, target: RenderTarget):
+        """Stop rendering ``target``; its texture keeps the last frame."""
+        self.render_targets.remove(target)
+        for other in self.render_targets:
+            if target in other.depends_on:
+                other.depends_on.remove(target)
+
+    def scheduled_render_targets(self) -> List[RenderTarget]:
+        """The enabled render targets, each after the targets it depends on."""
+        ordered: List[RenderTarget] = []
+        visiting: Dict[int, None] = {}
+        done: Dict[int, None] = {}
+
+        def visit(target: RenderTarget):
+            if id(target) in done:
+                return
+            if id(target) in visiting:
+                raise ValueError("Render targets depend on each other in a cycle")
+            visiting[id(target)] = None
+            for dependency in target.depends_on:
+                visit(dependency)
+            del visiting[id(target)]
+            done[id(target)] = None
+            if target.enabled:
+                ordered.append(target)
 
+        for target in self.render_targets:
+            visit(target)
+        return ordered
+
+    def _set_camera(self, camera: GLMCamera):
+        self.transform_buffer.set_view_matrix_glm(camera.view_matrix_2D)
         self.transform_buffer.set_view_matrix_3d(
             glm.inverse(camera._rot) * glm.translate(-camera._pos)
         )
-        # transform_buffer.set_view_matrix_3d(glm.inverse(camera._rot)) # camera.view_matrix_3D())
-        # node_id = transform_buffer.add_node_transform(glm.translate(-camera._pos))#glm.mat4(1.0) )
-
         self.transform_buffer.set_projection_matrix(camera.perspective_matrix)
 
-        # build the primitives in the primitive buffer using the projected geometry
-        self.primitive_buffer.clear()
+    def _render_render_targets(self):
+        for target in self.scheduled_render_targets():
+            target._frames += 1
+            if (target._frames - 1) % max(target.every, 1) != 0:
+                continue
+            self._set_camera(target.camera)
+            target.drawing_buffer.hard_clear(1000.0)
+            self._draw(target.drawing_buffer, target.primitive_buffer)
+            self.texture_buffer.update_render_target(
+                target.texture_idx, target.drawing_buffer
+            )
+
+    def frame_key(self) -> tuple:
+        """Version stamps of everything a frame depends on, and the render toggles."""
+        return (
+            self.transform_buffer.version(),
+            self.geometry_buffer.version(),
+            self.vertex_buffer.version(),
+            self.material_buffer.version(),
+            self.texture_buffer.version(),
+            self.width,
+            self.height,
+            self.front_to_back,
+            self.depth_prepass,
+            self.material_sorted,
+            self.drawing_buffer.get_visibility_mode(),
+        )
+
+    def render(self, camera: GLMCamera):
+        """
+        Render the scene seen by ``camera`` into the drawing buffer.
+
+        When ``frame_cache_enabled`` is set and neither the camera, the nodes, the
+        geometry, the materials, the textures nor the render toggles
+        (``front_to_back``, ``depth_prepass``, ``material_sorted``, the visibility
+        buffer mode) changed since the previous frame (and no shader reads time or
+        frame inputs), raster and shading are skipped and the previous canvas is
+        kept; ``last_frame_skipped`` tells which path was taken.
 
+        The render targets are drawn first, in dependency order. A frame with
+        render targets is never skipped: each pass moves the camera matrices.
+        """
         self.process_dirty()
+        self._render_render_targets()
+        self._set_camera(camera)
+
+        frame_key = self.frame_key()
+        if (
+            self.frame_cache_enabled
+            and frame_key == self._last_frame_key
+            and not self.material_buffer.has_time_dependent_shader()
+        ):
+            self._clear_pending = False
+            self.last_frame_skipped = True
+            return
+        self._last_frame_key = frame_key
+        self.last_frame_skipped = False
+        self._flush_pending_clear()
+        self._draw(self.drawing_buffer, self.primitive_buffer)
 
+    def _draw(
+        self, drawing_buffer: DrawingBufferPy, primitive_buffer: PrimitiveBufferPy
+    ):
+        """Draw the scene with the current camera matrices into ``drawing_buffer``."""
+        # build the primitives in the primitive buffer using the projected geometry
+        primitive_buffer.clear()
         build_primitives_py(
             self.geometry_buffer,
             self.vertex_buffer,
             self.transform_buffer,
-            self.drawing_buffer,
-            self.primitive_buffer,
+            drawing_buffer,
+            primitive_buffer,
         )
         raster_all_py(
-            self.primitive_buffer,
+            primitive_buffer,
             self.vertex_buffer,
-            self.drawing_buffer,
+            drawing_buffer,
             pass_filter="opaque",
+            front_to_back=self.front_to_back,
+            depth_prepass=self.depth_prepass,
+            material_buffer=self.material_buffer,
         )
-        if self._material_parallel_threads is None:
+        if drawing_buffer.material_parallel_threads is None or self.material_sorted:
             apply_material_py(
                 self.material_buffer,
                 self.texture_buffer,
                 self.vertex_buffer,
-                self.primitive_buffer,
-                self.drawing_buffer,
+                primitive_buffer,
+                drawing_buffer,
                 pass_filter="opaque",
+                sorted=self.material_sorted,
             )
         else:
             apply_material_py_parallel(
                 self.material_buffer,
                 self.texture_buffer,
                 self.vertex_buffer,
-                self.primitive_buffer,
-                self.drawing_buffer,
+                primitive_buffer,
+                drawing_buffer,
                 pass_filter="opaque",
             )
 
         raster_all_py(
-            self.primitive_buffer,
+            primitive_buffer,
             self.vertex_buffer,
-            self.drawing_buffer,
+            drawing_buffer,
             pass_filter="transparent",
         )
         apply_material_py(
             self.material_buffer,
             self.texture_buffer,
             self.vertex_buffer,
-            self.primitive_buffer,
-            self.drawing_buffer,
+            primitive_buffer,
+            drawing_buffer,
             pass_filter="transparent",
         )
 
     def to_textual_2(self, region: Region) -> List[Strip]:
+        self._flush_pending_clear()
         res = self.drawing_buffer.to_textual_2(
             min_x=region.x,
             max_x=region.x + region.width,
@@ -176,9 +522,37 @@ class RustRenderContext:
 
         return [Strip(line) for line in res]
 
+    def mark_dirty(self, node: Union["TT3DNode", "TT2DNode"]):
+        """Schedule ``node`` for the next ``process_dirty``."""
+        self._dirty_nodes[node] = None
+
+    def queue_node_transform(self, node_id: int, matrix: glm.mat4):
+        """Queue a local transform; uploaded in one batch by ``process_dirty``."""
+        self._pending_node_ids.append(node_id)
+        self._pending_node_matrices.append(matrix)
+
     def process_dirty(self):
-        for elem in self.roots_nodes:
-            elem.sync_in_context(self)
+        """
+        Sync the dirty nodes into the buffers.
+
+        Only nodes registered through ``mark_dirty`` are visited. Their local
+        transforms are uploaded with a single ``set_node_transforms`` call, then the
+        transform buffer composes the global transforms of the changed subtrees.
+        """
+        if self._dirty_nodes:
+            dirty_nodes = self._dirty_nodes
+            self._dirty_nodes = {}
+            for node in dirty_nodes:
+                node.sync_in_context(self)
+
+        if self._pending_node_ids:
+            self.transform_buffer.set_node_transforms(
+                self._pending_node_ids,
+                b"".join(bytes(m) for m in self._pending_node_matrices),
+            )
+            self._pending_node_ids = []
+            self._pending_node_matrices = []
+        self.transform_buffer.update_global_transforms()
 
     def append_root(self, elem: Union["TT3DNode", "TT2DNode"]):
         """
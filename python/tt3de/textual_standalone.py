@@ -9,6 +9,7 @@ from textual.containers import Container
 from textual.geometry import Region
 from textual.strip import Strip
 
+from tt3de.asset_async import AsyncAssetLoader
 from tt3de.glm_camera import GLMCamera
 from tt3de.render_context_rust import RustRenderContext
 
@@ -47,6 +48,7 @@ class TT3DViewStandAlone(Container):
         transform_buffer_size=64,
         texture_buffer_size=32,
         material_buffer_size=256,
+        buffer_hard_caps: dict | None = None,
         # parameters for the camera
         use_left_hand_perspective=True,
         zoom_2d: float = 1.0,
@@ -80,7 +82,10 @@ class TT3DViewStandAlone(Container):
             transform_buffer_size=transform_buffer_size,
             texture_buffer_size=texture_buffer_size,
             material_buffer_size=material_buffer_size,
+            hard_caps=buffer_hard_caps,
         )
+        # assets queued in initialize are committed between frames, see update_frame
+        self.asset_loader = AsyncAssetLoader(self.rc)
 
         self.initialize()
         self.last_frame_time: float = float(time() - 1.0)
@@ -94,6 +99,9 @@ class TT3DViewStandAlone(Container):
         if self.target_dt is not None:
             self.auto_refresh = self.target_dt
 
+    def on_unmount(self):
+        self.asset_loader.shutdown()
+
     async def on_event(self, event: events.Event):
         if isinstance(event, events.Resize):
             w = max(self.size.width, 3)
@@ -160,6 +168,7 @@ class TT3DViewStandAlone(Container):
         if self.is_debugged():
             return self.update_frame_debugged()
         if self.size.width > 1 and self.size.height > 1:
+            self.asset_loader.commit_ready()
             ts = time()
             self.update_step(
                 min(ts - self.last_frame_time, 0.5)
@@ -178,6 +187,7 @@ class TT3DViewStandAlone(Container):
 
     def update_frame_debugged(self):
         if self.size.width > 1 and self.size.height > 1:
+            self.asset_loader.commit_ready()
             ts = time()
             self.update_step(
                 min(ts - self.last_frame_time, 0.5)
@@ -1,5 +1,4 @@
-from ast import List
-from typing import Dict, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 from pyglm import glm
 
 from tt3de.tt3de.materials import (
@@ -46,8 +45,11 @@ class TextureBufferPy:
         image_width: int,
         image_height: int,
         chained_data: List[int],
-        repeat_width: bool,
-        repeat_height: bool,
+        repeat_width: bool = True,
+        repeat_height: bool = True,
+        filter_mode: str = "bilinear",
+        mipmaps: bool = False,
+        layout: str = "linear",
     ) -> int:
         """
         Adds a texture to the buffer.
@@ -58,6 +60,11 @@ class TextureBufferPy:
             chained_data (List[int]): The image data.
             repeat_width (bool): Whether to repeat the texture horizontally.
             repeat_height (bool): Whether to repeat the texture vertically.
+            mipmaps (bool): Whether to build the mip chain used when the texture
+                is minified.
+            layout (str): ``"linear"`` (row after row) or ``"tiled"`` (4x4 blocks
+                of texels, faster when the texture is walked vertically or
+                diagonally).
 
         Returns:
             int: The index of the texture.
@@ -84,6 +91,175 @@ class TextureBufferPy:
         """
         ...
 
+    def add_noise_texture(
+        self,
+        seed: int,
+        int_config: int,
+        bake_size: Optional[int] = None,
+        frames: int = 1,
+        filter_mode: str = "bilinear",
+    ) -> int:
+        """
+        Adds a grey noise texture (``int_config`` 0: OpenSimplex2, 1: Cellular,
+        2: Perlin, 3: Value).
+
+        Without ``bake_size`` the noise is computed at every sample. With it, the
+        noise is computed once into a repeating ``bake_size`` square texture,
+        sampled like the others; ``frames`` > 1 bakes the frames of an animation
+        into an atlas of ``bake_size`` tiles, the sub-texture index picking the
+        frame.
+
+        Returns:
+            int: The index of the texture.
+        """
+        ...
+
+    def add_texture_from_bytes(
+        self,
+        width: int,
+        height: int,
+        rgba_bytes: bytes,
+        repeat_width: bool = True,
+        repeat_height: bool = True,
+        filter_mode: str = "bilinear",
+        transparent_colors: Optional[List[Tuple[int, int, int]]] = None,
+        mipmaps: bool = False,
+        layout: str = "linear",
+    ) -> int:
+        """
+        Adds a texture from raw RGBA bytes, in the row order of ``add_texture``.
+
+        Args:
+            width (int): The width of the texture.
+            height (int): The height of the texture.
+            rgba_bytes (bytes): ``width * height * 4`` bytes.
+            transparent_colors: RGB colors that become fully transparent.
+
+        Returns:
+            int: The index of the texture.
+        """
+        ...
+
+    def add_texture_from_file(
+        self,
+        path: str,
+        repeat_width: bool = True,
+        repeat_height: bool = True,
+        filter_mode: str = "bilinear",
+        transparent_colors: Optional[List[Tuple[int, int, int]]] = None,
+        alpha: int = 255,
+        mipmaps: bool = False,
+        layout: str = "linear",
+    ) -> int:
+        """
+        Decodes a BMP (24 or 32-bit, uncompressed) or PNG file natively and adds
+        it as a texture.
+
+        Args:
+            path (str): The image file.
+            transparent_colors: RGB colors that become fully transparent.
+            alpha (int): The alpha of the pixels of files without alpha channel.
+
+        Returns:
+            int: The index of the texture.
+        """
+        ...
+
+    def add_decoded_image(
+        self,
+        image: "DecodedImagePy",
+        repeat_width: bool = True,
+        repeat_height: bool = True,
+        filter_mode: str = "bilinear",
+        mipmaps: bool = False,
+        layout: str = "linear",
+    ) -> int:
+        """
+        Adds an image decoded by ``decode_image_file``.
+
+        Returns:
+            int: The index of the texture.
+        """
+        ...
+
+    def build_mipmaps(self, idx: int) -> None:
+        """
+        Builds the mip chain of a texture, like the ``mipmaps`` argument of the
+        ``add_texture`` methods. Raises ValueError for atlas and noise textures.
+        """
+        ...
+
+    def set_layout(self, idx: int, layout: str) -> None:
+        """
+        Reorders the texels of a texture, like the ``layout`` argument of the
+        ``add_texture`` methods. Raises ValueError for atlas and noise textures,
+        BufferError while ``texture_as_buffer`` views are alive.
+        """
+        ...
+
+    def update_texture_region(
+        self, idx: int, x: int, y: int, w: int, h: int, rgba_bytes
+    ) -> None:
+        """
+        Overwrites a region of a texture in place.
+
+        Args:
+            idx (int): The index of the texture.
+            x (int): The first column of the region.
+            y (int): The first row of the region, in the row order of
+                ``add_texture``.
+            w (int): The width of the region.
+            h (int): The height of the region.
+            rgba_bytes: ``w * h * 4`` bytes, as bytes, bytearray, memoryview or a
+                uint8 NumPy array.
+        """
+        ...
+
+    def texture_as_buffer(self, idx: int) -> memoryview:
+        """
+        Returns a writable memoryview of the texels of a texture, shaped
+        ``(height, width, 4)`` in the row order of ``add_texture``.
+
+        Only plain textures in the linear layout can be viewed. Writes through
+        the view do not refresh mipmaps; while a view is alive, ``version()``
+        changes on every call, and the methods that add textures or change
+        texels raise BufferError.
+        """
+        ...
+
+    def version(self) -> int:
+        """
+        Returns the version stamp of the last change of any texture.
+        """
+        ...
+
+    def add_render_target(
+        self, width: int, height: int, filter_mode: str = "bilinear"
+    ) -> int:
+        """
+        Adds a texture that receives the canvas of an offscreen drawing buffer,
+        transparent until ``update_render_target`` is called.
+
+        Returns:
+            int: The index of the texture.
+        """
+        ...
+
+    def update_render_target(self, idx: int, drawing_buffer: "DrawingBufferPy") -> None:
+        """
+        Copies the canvas of ``drawing_buffer`` into the render target ``idx``:
+        each cell gives an upper and a lower texel, so the texture becomes
+        ``col_count`` x ``2 * row_count``.
+        """
+        ...
+
+    def mip_level_count(self, idx: int) -> int:
+        """
+        Returns the number of mip levels of a texture, itself included; 1 when it
+        has no mip chain.
+        """
+        ...
+
     def get_rgba_at(
         self, texture_idx: int, u: float, v: float
     ) -> Tuple[int, int, int, int]:
@@ -99,12 +275,43 @@ class TextureBufferPy:
         """
         ...
 
+class DecodedImagePy:
+    """
+    Image decoded by ``decode_image_file``, waiting for
+    ``TextureBufferPy.add_decoded_image``.
+    """
+
+    def width(self) -> int: ...
+    def height(self) -> int: ...
+
+class TexelsViewPy:
+    """
+    Buffer exporter behind ``TextureBufferPy.texture_as_buffer``.
+    """
+
 class MaterialBufferPy:
-    def __init__(self, max_size=64):
+    def __init__(self, max_size=64, hard_cap: Optional[int] = None):
         """
         Initializes the material buffer.
         Args:
-            max_size (int): The maximum number of materials that can be stored.
+            max_size (int): The initial number of material slots; grows on demand.
+            hard_cap (Optional[int]): Maximum number of materials. Adding past it
+                raises ``ValueError``.
+        """
+        ...
+
+    def capacity(self) -> int:
+        """
+        Returns:
+            int: The number of allocated slots. The buffer grows on demand up to its hard cap.
+        """
+        ...
+
+    def high_water_mark(self) -> int:
+        """
+        Returns:
+            int: The highest number of materials stored at once, across clears. Use it
+            to right-size the initial ``max_size`` of a production configuration.
         """
         ...
 
@@ -216,6 +423,20 @@ class MaterialBufferPy:
         """Updates ``tt_Far`` for a shader material (far clip distance, engine units)."""
         ...
 
+    def version(self) -> int:
+        """
+        Version stamp of the last change of any material, or of a shader uniform
+        the shader actually reads.
+        """
+        ...
+
+    def has_time_dependent_shader(self) -> bool:
+        """
+        Returns:
+            bool: True when a shader material reads ``tt_Time``, ``tt_DeltaTime`` or ``tt_Frame``.
+        """
+        ...
+
     def add_textured(self, albedo_texture_idx: int, glyph_idx: int) -> int:
         """
         Adds a textured material to the buffer.
@@ -230,12 +451,29 @@ class MaterialBufferPy:
         ...
 
 class GeometryBufferPy:
-    def __init__(self, max_size=64):
+    def __init__(self, max_size=64, hard_cap: Optional[int] = None):
         """
         Initializes the geometry buffer.
 
         Args:
-            max_size (int): The maximum number of geometries that can be stored.
+            max_size (int): The initial number of geometry slots; grows on demand.
+            hard_cap (Optional[int]): Maximum number of geometries. Adding past it
+                raises ``ValueError``.
+        """
+        ...
+
+    def capacity(self) -> int:
+        """
+        Returns:
+            int: The number of allocated slots. The buffer grows on demand up to its hard cap.
+        """
+        ...
+
+    def high_water_mark(self) -> int:
+        """
+        Returns:
+            int: The highest number of geometries stored at once, across clears. Use it
+            to right-size the initial ``max_size`` of a production configuration.
         """
         ...
 
@@ -260,7 +498,73 @@ class GeometryBufferPy:
     def geometry_count(self) -> int:
         """
         Returns:
-            int: The current number of geometries stored.
+            int: The current number of geometry slots used, removed ones included.
+        """
+        ...
+
+    def alive_count(self) -> int:
+        """
+        Returns:
+            int: The number of geometries in use, removed slots excluded.
+        """
+        ...
+
+    def is_alive(self, geom_idx: int) -> bool:
+        """
+        Returns:
+            bool: False for removed or out of range geometries.
+        """
+        ...
+
+    def geometry_ranges(self, geom_idx: int) -> List[Tuple[str, int, int]]:
+        """
+        Returns:
+            List[Tuple[str, int, int]]: The ``(kind, start, count)`` vertex buffer
+            ranges the geometry uses (kinds as in ``VertexBufferPy.allocate_range``),
+            the ranges ``compact_buffers_py`` keeps for it.
+        """
+        ...
+
+    def remove_geometry(self, geom_idx: int) -> None:
+        """
+        Removes a geometry.
+
+        The slot is skipped by ``build_primitives_py`` and reused by the next add.
+        The vertex data it used stays in place; release it with
+        ``VertexBufferPy.release_range`` or drop it with ``compact_buffers_py``.
+
+        Args:
+            geom_idx (int): The geometry to remove. Slot 0 is reserved.
+
+        Raises:
+            ValueError: When ``geom_idx`` is not a live geometry.
+        """
+        ...
+
+    def replace_geometry(self, geom_idx: int, source_idx: int) -> None:
+        """
+        Replaces a geometry by another one, keeping ``geom_idx`` stable.
+
+        The geometry ``source_idx`` (typically just added) moves into ``geom_idx``
+        and its own slot is freed.
+
+        Raises:
+            ValueError: When either index is not a live geometry.
+        """
+        ...
+
+    def version(self) -> int:
+        """
+        Version stamp of the last change of the buffer (add, clear, material update).
+        """
+        ...
+
+    def geometry_version(self, geom_idx: int) -> int:
+        """
+        Version stamp of the last write of a single geometry.
+
+        Raises:
+            ValueError: If ``geom_idx`` is not a stored geometry.
         """
         ...
 
@@ -420,14 +724,87 @@ class GeometryBufferPy:
         ...
 
 class VertexBufferPy:
-    def __init__(self, max_vertex_size=1024, max_uv_size=1024, max_vertex_2d_size=1024):
+    def __init__(
+        self,
+        max_vertex_size=1024,
+        max_uv_size=1024,
+        max_vertex_2d_size=1024,
+        hard_cap: Optional[int] = None,
+    ):
         """
         Initializes the vertex buffer.
 
         Args:
-            max_vertex_size (int): The maximum number of 3D vertices that can be stored.
-            max_uv_size (int): The maximum number of UV sets that can be stored.
-            max_vertex_2d_size (int): The maximum number of 2D vertices that can be stored.
+            max_vertex_size (int): The initial number of 3D vertex slots.
+            max_uv_size (int): The initial number of UV set slots.
+            max_vertex_2d_size (int): The initial number of 2D vertex slots.
+            hard_cap (Optional[int]): Maximum size of each of the 3D vertex, UV,
+                2D vertex and triangle buffers, which otherwise grow on demand.
+                Adding past it raises ``ValueError``.
+        """
+        ...
+
+    def high_water_marks(self) -> Tuple[int, int, int, int]:
+        """
+        Returns:
+            Tuple[int, int, int, int]: The highest number of 3D vertices, UV sets,
+            2D vertices and triangles stored at once.
+        """
+        ...
+
+    def allocate_range(self, kind: str, count: int) -> int:
+        """
+        Reserves ``count`` consecutive elements and returns the first index.
+
+        Released ranges are reused first-fit, otherwise zeroed elements are
+        appended. Fill them with ``set_3d_vertex``, ``set_2d_vertex``, ``set_uv``
+        or ``set_3d_triangle``.
+
+        Args:
+            kind (str): One of ``"3d"``, ``"2d"``, ``"uv"`` or ``"triangle"``.
+            count (int): The number of elements.
+        """
+        ...
+
+    def release_range(self, kind: str, start: int, count: int) -> None:
+        """
+        Gives a range back for reuse by ``allocate_range``.
+
+        Remove the geometries using the range first; the data stays in place until
+        the range is reused or the buffers are compacted.
+        """
+        ...
+
+    def free_count(self, kind: str) -> int:
+        """
+        Returns:
+            int: The number of released elements of ``kind`` waiting for reuse.
+        """
+        ...
+
+    def set_3d_vertex(self, idx: int, x: float, y: float, z: float) -> None:
+        """
+        Overwrites a 3D vertex.
+        """
+        ...
+
+    def set_2d_vertex(self, idx: int, x: float, y: float, z: float) -> None:
+        """
+        Overwrites a 2D vertex.
+        """
+        ...
+
+    def set_uv(self, idx: int, uva: glm.vec2, uvb: glm.vec2, uvc: glm.vec2) -> None:
+        """
+        Overwrites a UV set.
+        """
+        ...
+
+    def set_3d_triangle(
+        self, idx: int, v0: int, v1: int, v2: int, normal: glm.vec3
+    ) -> None:
+        """
+        Overwrites a triangle; ``v0``, ``v1`` and ``v2`` are vertex indices.
         """
         ...
 
@@ -497,6 +874,12 @@ class VertexBufferPy:
         """
         ...
 
+    def version(self) -> int:
+        """
+        Version stamp of the vertex, uv and triangle inputs; changes on every add.
+        """
+        ...
+
     def get_2d_capacity(self) -> int:
         """
         Returns:
@@ -587,13 +970,115 @@ class VertexBufferPy:
         """
         ...
 
+    def add_obj_submesh(
+        self, mesh: Union["ObjMeshPy", "BakedAssetPy"], submesh: int
+    ) -> Tuple[int, int, int, int, int]:
+        """
+        Adds a submesh of a mesh loaded by ``load_obj_native`` or of a baked asset:
+        its vertices, then one UV set and one triangle, with its face normal, per
+        triangle.
+
+        Returns:
+            (int, int, int, int, int): The vertex start, vertex count, UV start,
+            triangle start and triangle count, as taken by
+            ``GeometryBufferPy.add_polygon_3d``.
+        """
+        ...
+
+class ObjMeshPy:
+    """
+    Indexed mesh returned by ``load_obj_native``, with one submesh per material in
+    order of use. The vertices of a submesh are its distinct (v, vt, vn) corners.
+    """
+
+    def mtllibs(self) -> List[str]:
+        """Material libraries named by the file, relative to it."""
+        ...
+
+    def material_names(self) -> List[str]:
+        """``usemtl`` name of every submesh; empty for faces without material."""
+        ...
+
+    def submesh_count(self) -> int: ...
+    def vertex_count(self, submesh: int) -> int: ...
+    def triangle_count(self, submesh: int) -> int: ...
+    def positions(self, submesh: int) -> List[float]:
+        """x, y, z of every vertex."""
+        ...
+
+    def uvs(self, submesh: int) -> List[float]:
+        """u, v of every vertex; 0 when the face gives none."""
+        ...
+
+    def normals(self, submesh: int) -> List[float]:
+        """x, y, z of the normal of every vertex; 0 when the face gives none."""
+        ...
+
+    def indices(self, submesh: int) -> List[int]:
+        """Three vertex indices per triangle."""
+        ...
+
+class BakedAssetPy:
+    """
+    Baked asset returned by ``load_baked_asset``. The vertex, index and pixel
+    arrays stay in the memory-mapped file until they are copied in a buffer.
+    """
+
+    def submesh_count(self) -> int: ...
+    def material_names(self) -> List[str]:
+        """``usemtl`` name of every submesh; empty for faces without material."""
+        ...
+
+    def materials(self) -> List[Tuple[str, Optional[int], int]]:
+        """(name, texture index in the asset or None, glyph) of every material."""
+        ...
+
+    def vertex_count(self, submesh: int) -> int: ...
+    def triangle_count(self, submesh: int) -> int: ...
+    def texture_count(self) -> int: ...
+    def sources(self) -> List[str]:
+        """The files the asset was baked from, as given to ``write_baked_asset``."""
+        ...
+
+    def texture_info(self, texture: int) -> Tuple[int, int, bool, bool]:
+        """Width, height, repeat_width and repeat_height of a texture."""
+        ...
+
+    def add_texture_to(
+        self, texture_buffer: TextureBufferPy, texture: int, filter_mode="bilinear"
+    ) -> int:
+        """
+        Copies a texture of the asset in ``texture_buffer``.
+
+        Returns:
+            int: The index of the texture in ``texture_buffer``.
+        """
+        ...
+
 class TransformPackPy:
-    def __init__(self, max_size=64):
+    def __init__(self, max_size=64, hard_cap: Optional[int] = None):
         """
         Initializes the transform pack.
 
         Args:
-            max_size (int): The maximum number of transforms that can be stored.
+            max_size (int): The initial number of node slots; grows on demand.
+            hard_cap (Optional[int]): Maximum number of nodes. Adding past it raises
+                ``ValueError``.
+        """
+        ...
+
+    def capacity(self) -> int:
+        """
+        Returns:
+            int: The number of allocated slots. The buffer grows on demand up to its hard cap.
+        """
+        ...
+
+    def high_water_mark(self) -> int:
+        """
+        Returns:
+            int: The highest number of nodes stored at once, across clears. Use it
+            to right-size the initial ``max_size`` of a production configuration.
         """
         ...
 
@@ -606,25 +1091,71 @@ class TransformPackPy:
     def node_count(self) -> int:
         """
         Returns:
-            int: The current number of stored node transforms.
+            int: The current number of stored node transforms, removed nodes excluded.
         """
         ...
 
-    def add_node_transform(self, value: glm.mat4) -> int:
+    def add_node_transform(self, value: glm.mat4, parent: Optional[int] = None) -> int:
         """
-        Append a node transform.
+        Append a node transform, in the slot of the last removed node if any.
 
         Args:
-            value (glm.mat4): A 4x4 transform matrix (flat 16-length or 4x4 nested).
+            value (glm.mat4): The local 4x4 transform matrix (flat 16-length or 4x4 nested).
+            parent (Optional[int]): An already added node to attach the new node under.
 
         Returns:
             int: The index of the newly added node.
+
+        Raises:
+            ValueError: If ``parent`` is out of range.
+        """
+        ...
+
+    def remove_node(self, idx: int) -> None:
+        """
+        Remove a node. Its slot is reused by the next ``add_node_transform`` and its
+        children become roots; remove them first to drop a whole subtree.
+
+        Raises:
+            ValueError: If ``idx`` is not a live node.
+        """
+        ...
+
+    def set_node_parent(self, idx: int, parent: Optional[int] = None) -> None:
+        """
+        Attach a node under ``parent``, or make it a root with ``None``.
+
+        Raises:
+            ValueError: On an out-of-range index or if the link would create a cycle.
+        """
+        ...
+
+    def get_node_parent(self, idx: int) -> Optional[int]:
+        """
+        Returns:
+            Optional[int]: The parent of the node, ``None`` for a root.
+        """
+        ...
+
+    def update_global_transforms(self) -> None:
+        """
+        Compose the global transforms of every node whose local transform, or one of
+        whose ancestors, changed since the last update. Parents are resolved level by
+        level before their children; large levels are composed in parallel.
+
+        ``build_primitives_py`` calls this before reading the transforms.
+        """
+        ...
+
+    def set_parallel_update(self, enabled: bool) -> None:
+        """
+        Enable or disable the parallel composition of large hierarchy levels.
         """
         ...
 
     def set_node_transform(self, idx: int, value: glm.mat4) -> None:
         """
-        Overwrite a node transform at a given index.
+        Overwrite the local transform of a node at a given index.
 
         Args:
             idx (int): The node index to set.
@@ -632,9 +1163,35 @@ class TransformPackPy:
         """
         ...
 
+    def set_node_transforms(self, node_ids: List[int], matrices: bytes) -> None:
+        """
+        Set many node transforms in one call.
+
+        Args:
+            node_ids (List[int]): The nodes to update.
+            matrices: Any buffer of ``16 * len(node_ids)`` float32 values, one column-major
+                matrix per node (``b"".join(bytes(m) for m in mats)``, ``array("f")``, numpy).
+
+        Raises:
+            ValueError: On a size mismatch or an out-of-range node index.
+        """
+        ...
+
     def get_node_transform(self, idx: int) -> glm.mat4:
         """
-        Fetch a node transform.
+        Fetch the global transform of a node, as of the last ``update_global_transforms``.
+
+        Args:
+            idx (int): The node index to read.
+
+        Returns:
+            glm.mat4: A 4x4 transform matrix.
+        """
+        ...
+
+    def get_local_transform(self, idx: int) -> glm.mat4:
+        """
+        Fetch the local transform of a node.
 
         Args:
             idx (int): The node index to read.
@@ -698,9 +1255,41 @@ class TransformPackPy:
         """
         ...
 
+    def version(self) -> int:
+        """
+        Version stamp of the last effective change of the pack.
+
+        Setting a matrix to its current value does not change the version.
+        """
+        ...
+
+    def node_version(self, idx: int) -> int:
+        """
+        Version stamp of the last change of a node transform.
+
+        Raises:
+            ValueError: If ``idx`` is not a stored node.
+        """
+        ...
+
+    def view_versions(self) -> Tuple[int, int, int]:
+        """
+        Returns:
+            tuple: Version stamps of the 2D view, 3D view and projection matrices.
+        """
+        ...
+
 class DrawingBufferPy:
+    material_parallel_threads: Optional[int]
+    """Threads of the parallel material pass, ``None`` when serial-only."""
+
     def __init__(
-        self, max_row: int, max_col: int, flip_x: bool = False, flip_y: bool = False
+        self,
+        max_row: int,
+        max_col: int,
+        flip_x: bool = False,
+        flip_y: bool = True,
+        material_parallel_threads: int = -1,
     ):
         """
         Initializes the drawing buffer.
@@ -708,6 +1297,9 @@ class DrawingBufferPy:
         Args:
             max_row (int): The maximum number of rows.
             max_col (int): The maximum number of columns.
+            material_parallel_threads (int): ``-1`` shades on the shared engine pool
+                (see ``configure_engine_pool_py``), ``0`` serially, and a positive
+                count on a pool of its own with that many threads.
         """
         ...
 
@@ -715,11 +1307,35 @@ class DrawingBufferPy:
         """
         Clears the drawing buffer with a default depth value.
 
+        The depth and pixel info are only reset in the 8x8 tiles written since the
+        previous clear, unless the default depth changes.
+
         Args:
             default_depth (float): The default depth value to set.
         """
         ...
 
+    def material_pass_stats(self) -> Tuple[int, List[int], int]:
+        """
+        Returns:
+            tuple: ``(wall, busy, chunks)`` of the last ``apply_material_py_parallel``
+            opaque pass: its wall-clock time, the time every thread of the pool spent
+            shading, both in nanoseconds, and the number of work items. Busy times far
+            apart show a load imbalance.
+        """
+        ...
+
+    def resize(self, max_row: int, max_col: int) -> None:
+        """
+        Resizes the buffer in place, keeping its material thread pool and segment
+        cache. The content is reset as in a new buffer.
+
+        Args:
+            max_row (int): The new number of rows.
+            max_col (int): The new number of columns.
+        """
+        ...
+
     def get_row_count(self) -> int:
         """
         Returns:
@@ -766,6 +1382,32 @@ class DrawingBufferPy:
         """
         ...
 
+    def get_visibility_mode(self) -> bool:
+        """
+        Returns:
+            bool: Whether triangles are rasterized into the visibility buffer.
+        """
+        ...
+
+    def set_visibility_mode(self, enabled: bool) -> None:
+        """
+        Rasterize triangles into a visibility buffer: only depth, primitive id and
+        barycentric coordinates are stored, and the attributes of the visible
+        fragments are rebuilt from the primitive buffer before the material pass.
+
+        Args:
+            enabled (bool): Whether to use the visibility buffer.
+        """
+        ...
+
+    def coarse_depth_stats(self) -> Tuple[int, int, int]:
+        """
+        Returns:
+            tuple: ``(tested, rejected, cells_skipped)`` of the 8x8 tile depth test of
+            the triangle rasterizer, over both passes, since the last ``hard_clear``.
+        """
+        ...
+
     def get_cache_size(self) -> int:
         """
         Returns:
@@ -810,12 +1452,37 @@ class DrawingBufferPy:
         ...
 
 class PrimitiveBufferPy:
-    def __init__(self, max_size=64):
+    def __init__(self, max_size=64, hard_cap: Optional[int] = None):
         """
         Initializes the primitive buffer.
 
         Args:
-            max_size (int): The maximum number of primitives that can be stored.
+            max_size (int): The initial number of primitive slots; grows on demand.
+            hard_cap (Optional[int]): Maximum number of primitives. Primitives built
+                past it are dropped and counted by ``dropped_count``.
+        """
+        ...
+
+    def capacity(self) -> int:
+        """
+        Returns:
+            int: The number of allocated slots. The buffer grows on demand up to its hard cap.
+        """
+        ...
+
+    def high_water_mark(self) -> int:
+        """
+        Returns:
+            int: The highest number of primitives stored at once, across clears. Use it
+            to right-size the initial ``max_size`` of a production configuration.
+        """
+        ...
+
+    def dropped_count(self) -> int:
+        """
+        Returns:
+            int: The number of primitives dropped at the hard cap since the last
+            build or clear.
         """
         ...
 
@@ -832,6 +1499,27 @@ class PrimitiveBufferPy:
         """
         ...
 
+    def set_cache_enabled(self, enabled: bool) -> None:
+        """
+        Enable or disable reuse of the primitives of unchanged geometries between
+        two ``build_primitives_py`` calls (enabled by default).
+        """
+        ...
+
+    def cache_enabled(self) -> bool: ...
+    def cache_stats(self) -> Tuple[int, int]:
+        """
+        Returns:
+            tuple: ``(hits, misses)`` of the primitive cache during the last build.
+        """
+        ...
+
+    def invalidate_cache(self) -> None:
+        """
+        Forget the cached primitive ranges; the next build rebuilds every geometry.
+        """
+        ...
+
     def get_all_as_dicts(self) -> List[Dict]:
         """
         Fetches all primitives as a list of dictionaries.
@@ -865,6 +1553,118 @@ def build_primitives_py(
     """
     ...
 
+def compact_buffers_py(
+    geometry_buffer: GeometryBufferPy,
+    vertex_buffer: VertexBufferPy,
+) -> List[Optional[int]]:
+    """
+    Drops removed geometries and the vertices, UV sets and triangles no live
+    geometry uses, packing the buffers in place.
+
+    Data not referenced by any geometry yet is dropped as well. Released ranges of
+    the vertex buffer are forgotten.
+
+    Returns:
+        List[Optional[int]]: The new index of every former geometry slot, ``None``
+        for removed ones.
+    """
+    ...
+
+def configure_engine_pool_py(
+    num_threads: Optional[int] = None,
+    thread_name: Optional[str] = None,
+    chunk_rows: Optional[int] = None,
+) -> None:
+    """
+    Configures the process-wide thread pool shared by the parallel passes of every
+    render context. Arguments left to ``None`` keep their current value.
+
+    Args:
+        num_threads (int): Worker count, 8 by default.
+        thread_name (str): Workers are named ``{thread_name}-{index}``.
+        chunk_rows (int): Rows of cells per work item of the parallel cell passes;
+            ``0`` (default) picks about 8 items per thread, stolen by idle threads.
+    """
+    ...
+
+def engine_pool_config_py() -> Dict[str, Union[int, str]]:
+    """
+    Returns:
+        dict: ``num_threads``, ``thread_name`` and ``chunk_rows`` of the engine pool.
+    """
+    ...
+
+def load_obj_native(path: str, flip_triangles: bool = False) -> ObjMeshPy:
+    """
+    Loads an OBJ file into an indexed mesh.
+
+    The file is memory-mapped, parsed and fan-triangulated on the engine pool, and
+    the (v, vt, vn) corners of every material are deduplicated.
+
+    Args:
+        path (str): The OBJ file.
+        flip_triangles (bool): Reverse the winding of every triangle.
+
+    Raises:
+        OSError: The file can't be read.
+        ValueError: The file is not a valid OBJ file.
+    """
+    ...
+
+def decode_image_file(
+    path: str,
+    transparent_colors: Optional[List[Tuple[int, int, int]]] = None,
+    alpha: int = 255,
+) -> DecodedImagePy:
+    """
+    Decodes a BMP or PNG file like ``TextureBufferPy.add_texture_from_file``,
+    without the GIL, so that it can run on a worker thread.
+
+    Raises:
+        OSError: The file can't be read.
+        ValueError: The file is not a supported image.
+    """
+    ...
+
+def write_baked_asset(
+    out_path: str,
+    mesh: ObjMeshPy,
+    materials: List[Tuple[str, Optional[int], int]],
+    textures: List[Tuple[int, int, bytes, bool, bool]],
+    sources: Optional[List[str]] = None,
+) -> None:
+    """
+    Writes a mesh, its materials and their textures as a baked asset.
+
+    Args:
+        out_path (str): The file to write.
+        mesh (ObjMeshPy): The mesh; submeshes refer to the material of their name.
+        materials: (name, texture index or None, glyph) of every material.
+        textures: (width, height, RGBA bytes, repeat_width, repeat_height) of every
+            texture.
+        sources: The files the asset is baked from, returned by
+            ``BakedAssetPy.sources`` to tell when the asset is out of date.
+
+    The file is written next to ``out_path`` and renamed over it, so the assets
+    already loaded from ``out_path`` keep reading the previous content.
+
+    Raises:
+        OSError: The file can't be written. On Windows, also when a loaded
+            ``BakedAssetPy`` or a mesh using it still maps ``out_path``: drop them
+            before baking again.
+    """
+    ...
+
+def load_baked_asset(path: str) -> BakedAssetPy:
+    """
+    Memory-maps a file written by ``write_baked_asset``. Only the records are read.
+
+    Raises:
+        OSError: The file can't be read.
+        ValueError: The file is not a valid baked asset.
+    """
+    ...
+
 def ttsl_run(*args) -> Tuple[glm.vec4, glm.vec4, int]:
     """
     Runs the TTSL bytecode with the provided registers.
@@ -36,6 +36,24 @@ class ToGlyphMethodPyMap4Luminance(ToGlyphMethodPy):
         self, glyph_set: tuple[int, int, int, int]
     ) -> "ToGlyphMethodPyMap4Luminance": ...
 
+class ToGlyphMethodPyMapNLuminance(ToGlyphMethodPy):
+    glyph_ramp: list[int]
+
+    def __init__(self, glyph_ramp: list[int]) -> "ToGlyphMethodPyMapNLuminance":
+        """
+        Map the luminance over ``glyph_ramp`` (1 to 256 glyph indices, darkest
+        first), through a table built once: any ramp costs the same as Map4.
+        """
+        ...
+
+    @staticmethod
+    def from_chars(chars: str) -> "ToGlyphMethodPyMapNLuminance":
+        """
+        The ramp of the glyphs of ``chars``, e.g. ``" .:-=+*#%@"``; raises
+        ValueError for a character missing from the glyph set.
+        """
+        ...
+
 class BaseTexturePy(MaterialPy):
     albedo_texture_idx: int
     albedo_texture_subid: int
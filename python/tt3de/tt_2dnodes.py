@@ -47,6 +47,12 @@ class DirtyProcessor:
     def sync_in_context(self, rc: "RustRenderContext"):
         pass
 
+    def mark_dirty(self):
+        """Register the node in the dirty set of its render context, if inserted."""
+        rc = getattr(self, "rc", None)
+        if rc is not None:
+            rc.mark_dirty(self)
+
 
 class Transform2DMixin:
     """
@@ -125,8 +131,7 @@ class TT2DNode(TreeNode, DirtyProcessor, Transform2DMixin):
             transform if transform is not None else glm.mat4(1.0)
         )
 
-        self.global_transform_dirty: bool = True
-        self.global_transform_matrix: glm.mat4 = self.local_transform
+        self._global_transform_dirty: bool = True
 
         # will be set when inserted in the render context
         self.node_id: int | None = None
@@ -134,6 +139,9 @@ class TT2DNode(TreeNode, DirtyProcessor, Transform2DMixin):
         # declared here for type checking purposes
         self.elements: List[TT2DNode] = []
         self.parent: TT2DNode = None
+        # (kind, start, count) vertex buffer ranges owned by the node,
+        # see RustRenderContext.allocate_range
+        self.buffer_ranges: List[Tuple[str, int, int]] = []
 
     def add_child(self, child: "TT2DNode"):  # type: ignore
         """
@@ -144,10 +152,37 @@ class TT2DNode(TreeNode, DirtyProcessor, Transform2DMixin):
         """
         # call the super add_child to set the parent
         super().add_child(child)
+        child._attach_in_context()
         child.global_transform_dirty = True
 
+    @property
+    def global_transform_dirty(self) -> bool:
+        return self._global_transform_dirty
+
+    @global_transform_dirty.setter
+    def global_transform_dirty(self, value: bool) -> None:
+        self._global_transform_dirty = value
+        if value:
+            self.mark_dirty()
+
     def global_transform(self) -> glm.mat4:
-        return self.global_transform_matrix
+        """
+        Global transform of the node.
+
+        Once the node is inserted, it is read back from the transform buffer, which
+        composes the hierarchy natively (see
+        ``TransformPackPy.update_global_transforms``); the pending changes of the
+        context are synced first. Before that, it is composed from the ancestors.
+        """
+        if self.node_id is not None and self.rc is not None:
+            self.rc.process_dirty()
+            return glm.mat4(*self.rc.transform_buffer.get_node_transform(self.node_id))
+        return self.to_global_transform()
+
+    @property
+    def global_transform_matrix(self) -> glm.mat4:
+        """Global transform of the node, see ``global_transform``."""
+        return self.global_transform()
 
     def to_global_transform(self) -> glm.mat4:
         if self.parent is not None:
@@ -155,30 +190,28 @@ class TT2DNode(TreeNode, DirtyProcessor, Transform2DMixin):
         else:
             return self.local_transform
 
-    def __recalc_global_transform(self):
-        self.global_transform_matrix = self.to_global_transform()
+    def _attach_in_context(self):
+        """Mirror the parent link in the transform buffer when both nodes are inserted."""
+        if (
+            self.node_id is not None
+            and getattr(self.parent, "node_id", None) is not None
+        ):
+            self.rc.transform_buffer.set_node_parent(self.node_id, self.parent.node_id)
 
     def set_local_transform(self, transform: glm.mat4):
         self.local_transform = transform
         self.global_transform_dirty = True
 
     def get_position(self) -> glm.vec3:
-        pos_vec = self.global_transform_matrix[3]
+        pos_vec = self.global_transform()[3]
         return glm.vec3(pos_vec.x, pos_vec.y, pos_vec.z)
 
     def sync_in_context(self, rc: "RustRenderContext"):
-        if self.global_transform_dirty:
+        if self._global_transform_dirty:
             assert self.node_id is not None
-            self.__recalc_global_transform()
-            rc.transform_buffer.set_node_transform(
-                self.node_id, self.global_transform_matrix
-            )
-            self.global_transform_dirty = False
-            for child in self.elements:
-                child.global_transform_dirty = True
-
-        for child in self.elements:
-            child.sync_in_context(rc)
+            # only the local transform is uploaded; the subtree is composed natively
+            rc.queue_node_transform(self.node_id, self.local_transform)
+            self._global_transform_dirty = False
 
     def insert_in(
         self,
@@ -186,9 +219,12 @@ class TT2DNode(TreeNode, DirtyProcessor, Transform2DMixin):
     ):
         self.rc = rc
         self.node_id = rc.transform_buffer.add_node_transform(
-            self.global_transform_matrix
+            self.local_transform,
+            parent=getattr(self.parent, "node_id", None),
         )
-        self.global_transform_dirty = True
+        # the local transform is already uploaded, only the rest needs a sync
+        self._global_transform_dirty = False
+        self.mark_dirty()
 
         for e in self.elements:
             e.insert_in(rc)
@@ -198,19 +234,29 @@ class WithMaterialID(DirtyProcessor):
     def __init__(self, material_id=0, **kwargs):
         super().__init__(**kwargs)
         self.material_id = material_id
-        self.dirty_material = True
+        self._dirty_material = True
         self.transparent: bool = False
         # will be set when inserted in the render context
         self.geom_id = None
 
+    @property
+    def dirty_material(self) -> bool:
+        return self._dirty_material
+
+    @dirty_material.setter
+    def dirty_material(self, value: bool) -> None:
+        self._dirty_material = value
+        if value:
+            self.mark_dirty()
+
     def sync_in_context(self, rc: "RustRenderContext"):
-        assert isinstance(self.geom_id, int)
-        if self.dirty_material:
+        # geom_id is None once the geometry was removed from the context
+        if self._dirty_material and self.geom_id is not None:
             rc.geometry_buffer.update_geometry_material(
                 self.geom_id,
                 self.material_id,
             )
-            self.dirty_material = False
+            self._dirty_material = False
         super().sync_in_context(rc)
 
     def set_material_id(self, material_id: int):
@@ -236,16 +282,18 @@ class TT2DPoints(WithMaterialID, TT2DNode):
         super().insert_in(rc)
         assert self.node_id is not None
 
-        self.vert_idx = [
-            rc.vertex_buffer.add_2d_vertex(p3d.x, p3d.y, p3d.z)
-            for p3d in self.point_list
-        ]
         self.allocated_verts = len(self.point_list)
+        start_idx = rc.allocate_range(self, "2d", self.allocated_verts)
+        self.vert_idx = list(range(start_idx, start_idx + self.allocated_verts))
+        for vertex_idx, p3d in zip(self.vert_idx, self.point_list):
+            rc.vertex_buffer.set_2d_vertex(vertex_idx, p3d.x, p3d.y, p3d.z)
+        # one (zeroed) uv triplet per point, as the geometry reads them
+        start_uv = rc.allocate_range(self, "uv", self.allocated_verts)
 
         self.geom_id = rc.geometry_buffer.add_points_2d(
             self.vert_idx[0],
             self.allocated_verts,
-            0,
+            start_uv,
             self.node_id,
             self.material_id,
             self.transparent,
@@ -282,16 +330,20 @@ class TT2DLines(TT2DNode):
         super().insert_in(rc)
         assert self.node_id is not None
         # insert all points as vertices
-        self.vertex_indices = [
-            rc.vertex_buffer.add_2d_vertex(p3d.x, p3d.y, p3d.z)
-            for p3d in self.point_list
-        ]
-        self.segment_idx = [
-            rc.vertex_buffer.add_uv(
-                glm.vec2(uva.x, uva.y), glm.vec2(uvb.x, uvb.y), glm.vec2(0.0, 0.0)
+        start_idx = rc.allocate_range(self, "2d", len(self.point_list))
+        self.vertex_indices = list(range(start_idx, start_idx + len(self.point_list)))
+        for vertex_idx, p3d in zip(self.vertex_indices, self.point_list):
+            rc.vertex_buffer.set_2d_vertex(vertex_idx, p3d.x, p3d.y, p3d.z)
+
+        start_uv = rc.allocate_range(self, "uv", len(self.segment_uv))
+        self.segment_idx = list(range(start_uv, start_uv + len(self.segment_uv)))
+        for uv_idx, (uva, uvb) in zip(self.segment_idx, self.segment_uv):
+            rc.vertex_buffer.set_uv(
+                uv_idx,
+                glm.vec2(uva.x, uva.y),
+                glm.vec2(uvb.x, uvb.y),
+                glm.vec2(0.0, 0.0),
             )
-            for (uva, uvb) in self.segment_uv
-        ]
 
         self.geom_id = rc.geometry_buffer.add_line2d(
             self.vertex_indices[0],
@@ -330,36 +382,33 @@ class TT2DPolygon(WithMaterialID, TT2DNode):
         assert self.node_id is not None
 
         # add all points as vertices
-        self.vertex_indices = [
-            rc.vertex_buffer.add_2d_vertex(p3d.x, p3d.y, p3d.z)
-            for p3d in self.vertex_list
-        ]
+        start_idx = rc.allocate_range(self, "2d", len(self.vertex_list))
+        self.vertex_indices = list(range(start_idx, start_idx + len(self.vertex_list)))
+        for vertex_idx, p3d in zip(self.vertex_indices, self.vertex_list):
+            rc.vertex_buffer.set_2d_vertex(vertex_idx, p3d.x, p3d.y, p3d.z)
 
         # insert all triangles
         triangle_count = len(self.triangles)
         assert triangle_count == len(self.uvmap)
-        start_uv = None
-        triangle_start = None
+        start_uv = rc.allocate_range(self, "uv", triangle_count)
+        triangle_start = rc.allocate_range(self, "triangle", triangle_count)
+        normal = glm.vec3(0, 0, 1)
         for triangle_idx, ((uva, uvb, uvc), (idx_a, idx_b, idx_c)) in enumerate(
             zip(self.uvmap, self.triangles)
         ):
-            normal = glm.vec3(0, 0, 1)
-            uv_idx, triangle_idx = rc.vertex_buffer.add_3d_triangle(
-                self.vertex_indices[idx_a],
-                self.vertex_indices[idx_b],
-                self.vertex_indices[idx_c],
+            rc.vertex_buffer.set_uv(
+                start_uv + triangle_idx,
                 p2d_tovec2(uva),
                 p2d_tovec2(uvb),
                 p2d_tovec2(uvc),
-                normal=normal,
             )
-            if start_uv is None:
-                start_uv = uv_idx
-            if triangle_start is None:
-                triangle_start = triangle_idx
-
-        assert start_uv is not None
-        assert triangle_start is not None
+            rc.vertex_buffer.set_3d_triangle(
+                triangle_start + triangle_idx,
+                self.vertex_indices[idx_a],
+                self.vertex_indices[idx_b],
+                self.vertex_indices[idx_c],
+                normal,
+            )
 
         self.geom_id = rc.geometry_buffer.add_polygon2d(
             self.vertex_indices[0],
@@ -424,13 +473,16 @@ class TT2DRect(TT2DNode):
         super().insert_in(rc)
         assert self.node_id is not None
         # add rectangle vertices
-        self.vertex_indices = []
-        for x, y in [(0, 0), (self.width, self.height)]:
-            vertex_idx = rc.vertex_buffer.add_2d_vertex(x, y, 0.0)
-            self.vertex_indices.append(vertex_idx)
+        start_idx = rc.allocate_range(self, "2d", 2)
+        self.vertex_indices = [start_idx, start_idx + 1]
+        for vertex_idx, (x, y) in zip(
+            self.vertex_indices, [(0, 0), (self.width, self.height)]
+        ):
+            rc.vertex_buffer.set_2d_vertex(vertex_idx, x, y, 0.0)
 
-        uv_start_index = rc.vertex_buffer.add_uv(
-            glm.vec2(0, 0), glm.vec2(1, 1), glm.vec2(0.0, 0.0)
+        uv_start_index = rc.allocate_range(self, "uv", 1)
+        rc.vertex_buffer.set_uv(
+            uv_start_index, glm.vec2(0, 0), glm.vec2(1, 1), glm.vec2(0.0, 0.0)
         )
 
         self.geom_id = rc.geometry_buffer.add_rect2d(
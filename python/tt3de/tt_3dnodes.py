@@ -5,6 +5,7 @@ from pyglm import glm
 
 from tt3de.points import Point2D, Point3D
 from tt3de.render_context_rust import RustRenderContext
+from tt3de.tt3de import BakedAssetPy, ObjMeshPy
 from tt3de.tt_2dnodes import DirtyProcessor, TreeNode, WithMaterialID
 from tt3de.utils import p2d_tovec2, random_node_id
 
@@ -19,11 +20,13 @@ class TT3DNode(TreeNode, DirtyProcessor):
         self.local_transform: glm.mat4 = (
             transform if transform is not None else glm.mat4(1.0)
         )
-        self.global_transform_dirty: bool = True
-        self.global_transform_matrix: glm.mat4 = self.local_transform
+        self._global_transform_dirty: bool = True
         self.node_id = None
         self.elements: List[TT3DNode] = []
         self.parent: TT3DNode = None
+        # (kind, start, count) vertex buffer ranges owned by the node,
+        # see RustRenderContext.allocate_range
+        self.buffer_ranges: List[Tuple[str, int, int]] = []
 
     def add_child(self, child: "TT3DNode"):  # type: ignore
         """
@@ -33,9 +36,36 @@ class TT3DNode(TreeNode, DirtyProcessor):
             child: The child element to be added.
         """
         super().add_child(child)
+        child._attach_in_context()
+
+    @property
+    def global_transform_dirty(self) -> bool:
+        return self._global_transform_dirty
+
+    @global_transform_dirty.setter
+    def global_transform_dirty(self, value: bool) -> None:
+        self._global_transform_dirty = value
+        if value:
+            self.mark_dirty()
 
     def global_transform(self) -> glm.mat4:
-        return self.global_transform_matrix
+        """
+        Global transform of the node.
+
+        Once the node is inserted, it is read back from the transform buffer, which
+        composes the hierarchy natively (see
+        ``TransformPackPy.update_global_transforms``); the pending changes of the
+        context are synced first. Before that, it is composed from the ancestors.
+        """
+        if self.node_id is not None and self.rc is not None:
+            self.rc.process_dirty()
+            return glm.mat4(*self.rc.transform_buffer.get_node_transform(self.node_id))
+        return self.to_global_transform()
+
+    @property
+    def global_transform_matrix(self) -> glm.mat4:
+        """Global transform of the node, see ``global_transform``."""
+        return self.global_transform()
 
     def to_global_transform(self) -> glm.mat4:
         if self.parent is not None:
@@ -43,8 +73,13 @@ class TT3DNode(TreeNode, DirtyProcessor):
         else:
             return self.local_transform
 
-    def __recalc_global_transform(self):
-        self.global_transform_matrix = self.to_global_transform()
+    def _attach_in_context(self):
+        """Mirror the parent link in the transform buffer when both nodes are inserted."""
+        if (
+            self.node_id is not None
+            and getattr(self.parent, "node_id", None) is not None
+        ):
+            self.rc.transform_buffer.set_node_parent(self.node_id, self.parent.node_id)
 
     def set_local_transform(self, transform: glm.mat4):
         self.local_transform = transform
@@ -55,18 +90,11 @@ class TT3DNode(TreeNode, DirtyProcessor):
         self.global_transform_dirty = True
 
     def sync_in_context(self, rc: "RustRenderContext"):
-        if self.global_transform_dirty:
+        if self._global_transform_dirty:
             assert self.node_id is not None
-            self.__recalc_global_transform()
-            rc.transform_buffer.set_node_transform(
-                self.node_id, self.global_transform_matrix
-            )
-            self.global_transform_dirty = False
-            for child in self.elements:
-                child.global_transform_dirty = True
-
-        for child in self.elements:
-            child.sync_in_context(rc)
+            # only the local transform is uploaded; the subtree is composed natively
+            rc.queue_node_transform(self.node_id, self.local_transform)
+            self._global_transform_dirty = False
 
     def insert_in(self, rc: "RustRenderContext"):
         """
@@ -80,9 +108,12 @@ class TT3DNode(TreeNode, DirtyProcessor):
             raise ValueError("Already inserted in context")
         self.rc = rc
         self.node_id = rc.transform_buffer.add_node_transform(
-            self.global_transform_matrix
+            self.local_transform,
+            parent=getattr(self.parent, "node_id", None),
         )
-        self.global_transform_dirty = True
+        # the local transform is already uploaded, only the rest needs a sync
+        self._global_transform_dirty = False
+        self.mark_dirty()
 
         for e in self.elements:
             e.insert_in(rc)
@@ -106,19 +137,15 @@ class TT3DPolygonFan(WithMaterialID, TT3DNode):
     def insert_in(self, rc: "RustRenderContext"):
         super().insert_in(rc)
 
-        start_idx = None
-        for p3d in self.vertex_list:
-            vertex_idx = rc.vertex_buffer.add_3d_vertex(p3d.x, p3d.y, p3d.z)
-            if start_idx is None:
-                start_idx = vertex_idx
+        start_idx = rc.allocate_range(self, "3d", len(self.vertex_list))
+        for i, p3d in enumerate(self.vertex_list):
+            rc.vertex_buffer.set_3d_vertex(start_idx + i, p3d.x, p3d.y, p3d.z)
 
-        start_uv = None
-        for uva, uvb, uvc in self.uvmap:
-            idx = rc.vertex_buffer.add_uv(
-                p2d_tovec2(uva), p2d_tovec2(uvb), p2d_tovec2(uvc)
+        start_uv = rc.allocate_range(self, "uv", len(self.uvmap))
+        for i, (uva, uvb, uvc) in enumerate(self.uvmap):
+            rc.vertex_buffer.set_uv(
+                start_uv + i, p2d_tovec2(uva), p2d_tovec2(uvb), p2d_tovec2(uvc)
             )
-            if start_uv is None:
-                start_uv = idx
 
         # rc.geometry_buffer.add_line3d(start_idx, self.node_id, self.material_id, 0)
         # rc.geometry_buffer.add_line3d(start_idx+1, self.node_id, self.material_id, 0)
@@ -155,17 +182,15 @@ class TT3DPolygon(WithMaterialID, TT3DNode):
         assert self.node_id is not None
 
         # insert all vertices
-        vertex_index_list = [
-            rc.vertex_buffer.add_3d_vertex(p3d.x, p3d.y, p3d.z)
-            for p3d in self.vertex_list
-        ]
-        start_idx = vertex_index_list[0]
+        start_idx = rc.allocate_range(self, "3d", len(self.vertex_list))
+        for i, p3d in enumerate(self.vertex_list):
+            rc.vertex_buffer.set_3d_vertex(start_idx + i, p3d.x, p3d.y, p3d.z)
 
         # insert all triangles
         triangle_count = len(self.triangles)
         assert triangle_count == len(self.uvmap)
-        triangle_start = None
-        start_uv = None
+        start_uv = rc.allocate_range(self, "uv", triangle_count)
+        triangle_start = rc.allocate_range(self, "triangle", triangle_count)
         for triangle_idx, ((uva, uvb, uvc), (idx_a, idx_b, idx_c)) in enumerate(
             zip(self.uvmap, self.triangles)
         ):
@@ -177,24 +202,70 @@ class TT3DPolygon(WithMaterialID, TT3DNode):
             normal = glm.normalize(glm.cross(ab, ac))
             if self.flipped_normals:
                 normal = -normal
-            uv_idx, triangle_idx = rc.vertex_buffer.add_3d_triangle(
-                vertex_index_list[idx_a],
-                vertex_index_list[idx_b],
-                vertex_index_list[idx_c],
+            rc.vertex_buffer.set_uv(
+                start_uv + triangle_idx,
                 p2d_tovec2(uva),
                 p2d_tovec2(uvb),
                 p2d_tovec2(uvc),
-                normal=normal,
             )
-            if start_uv is None:
-                start_uv = uv_idx
-            if triangle_start is None:
-                triangle_start = triangle_idx
-        assert start_uv is not None
-        assert triangle_start is not None
+            rc.vertex_buffer.set_3d_triangle(
+                triangle_start + triangle_idx,
+                start_idx + idx_a,
+                start_idx + idx_b,
+                start_idx + idx_c,
+                normal,
+            )
+        self.geom_id = rc.geometry_buffer.add_polygon_3d(
+            start_idx,
+            len(self.vertex_list),
+            start_uv,
+            triangle_start,
+            triangle_count,
+            self.node_id,
+            self.material_id,
+            self.transparent,
+        )
+
+
+class TT3DMesh(WithMaterialID, TT3DNode):
+    """Submesh of a mesh loaded by `load_obj_native` or of a baked asset; its
+    vertices, uvs and triangles go to the vertex buffer in one call."""
+
+    def __init__(
+        self,
+        mesh: ObjMeshPy | BakedAssetPy,
+        submesh: int = 0,
+        name: str | None = None,
+        transform: Optional[glm.mat4] = None,
+        material_id=0,
+    ):
+        super().__init__(name=name, transform=transform, material_id=material_id)
+        self.mesh = mesh
+        self.submesh = submesh
+        self.geom_id = None
+        self.transparent: bool = False
+
+    def insert_in(self, rc: "RustRenderContext"):
+        super().insert_in(rc)
+        if self.geom_id is not None:
+            raise ValueError("Already inserted in GeometryBuffer")
+        assert self.node_id is not None
+
+        (
+            start_idx,
+            vertex_count,
+            start_uv,
+            triangle_start,
+            triangle_count,
+        ) = rc.vertex_buffer.add_obj_submesh(self.mesh, self.submesh)
+        self.buffer_ranges += [
+            ("3d", start_idx, vertex_count),
+            ("uv", start_uv, triangle_count),
+            ("triangle", triangle_start, triangle_count),
+        ]
         self.geom_id = rc.geometry_buffer.add_polygon_3d(
             start_idx,
-            len(vertex_index_list),
+            vertex_count,
             start_uv,
             triangle_start,
             triangle_count,
@@ -220,22 +291,17 @@ class TT3DPoint(WithMaterialID, TT3DNode):
     def insert_in(self, rc: "RustRenderContext"):
         super().insert_in(rc)
         assert self.node_id is not None
+        assert self.vertex_list and self.uvmap
 
-        start_idx = None
-        for p3d in self.vertex_list:
-            vertex_idx = rc.vertex_buffer.add_3d_vertex(p3d.x, p3d.y, p3d.z)
-            if start_idx is None:
-                start_idx = vertex_idx
+        start_idx = rc.allocate_range(self, "3d", len(self.vertex_list))
+        for i, p3d in enumerate(self.vertex_list):
+            rc.vertex_buffer.set_3d_vertex(start_idx + i, p3d.x, p3d.y, p3d.z)
 
-        start_uv = None
-        for uva, uvb, uvc in self.uvmap:
-            idx = rc.vertex_buffer.add_uv(
-                p2d_tovec2(uva), p2d_tovec2(uvb), p2d_tovec2(uvc)
+        start_uv = rc.allocate_range(self, "uv", len(self.uvmap))
+        for i, (uva, uvb, uvc) in enumerate(self.uvmap):
+            rc.vertex_buffer.set_uv(
+                start_uv + i, p2d_tovec2(uva), p2d_tovec2(uvb), p2d_tovec2(uvc)
             )
-            if start_uv is None:
-                start_uv = idx
-        assert start_idx is not None
-        assert start_uv is not None
         self.geom_id = rc.geometry_buffer.add_point_3d(
             start_idx, start_uv, self.node_id, self.material_id, self.transparent
         )
@@ -256,16 +322,20 @@ class TT3DLine(WithMaterialID, TT3DNode):
 
     def insert_in(self, rc: "RustRenderContext"):
         super().insert_in(rc)
-        self.vertex_indices = [
-            rc.vertex_buffer.add_3d_vertex(p3d.x, p3d.y, p3d.z)
-            for p3d in self.vertex_list
-        ]
-        self.segment_idx = [
-            rc.vertex_buffer.add_uv(
-                glm.vec2(uva.x, uva.y), glm.vec2(uvb.x, uvb.y), glm.vec2(0.0, 0.0)
+        start_idx = rc.allocate_range(self, "3d", len(self.vertex_list))
+        self.vertex_indices = list(range(start_idx, start_idx + len(self.vertex_list)))
+        for vertex_idx, p3d in zip(self.vertex_indices, self.vertex_list):
+            rc.vertex_buffer.set_3d_vertex(vertex_idx, p3d.x, p3d.y, p3d.z)
+
+        start_uv = rc.allocate_range(self, "uv", len(self.segment_uv))
+        self.segment_idx = list(range(start_uv, start_uv + len(self.segment_uv)))
+        for uv_idx, (uva, uvb) in zip(self.segment_idx, self.segment_uv):
+            rc.vertex_buffer.set_uv(
+                uv_idx,
+                glm.vec2(uva.x, uva.y),
+                glm.vec2(uvb.x, uvb.y),
+                glm.vec2(0.0, 0.0),
             )
-            for (uva, uvb) in self.segment_uv
-        ]
         assert self.node_id is not None
         self.geom_id = rc.geometry_buffer.add_line3d(
             self.vertex_indices[0],
@@ -0,0 +1,548 @@
+//! Binary pre-baked assets: the indexed mesh of an OBJ file, its material table and
+//! the RGBA pixels of its textures, laid out so that a memory-mapped file can be
+//! read in place.
+//!
+//! Layout, all numbers little-endian:
+//!
+//! | part              | content                                                   |
+//! |-------------------|-----------------------------------------------------------|
+//! | header (32 bytes) | magic, version, counts, offset of the source file list    |
+//! | submesh records   | material, counts, offsets of the arrays and of the name   |
+//! | material records  | offset and length of the name, texture, glyph             |
+//! | texture records   | width, height, repeat flags, offset of the pixels         |
+//! | blobs             | the arrays, names, pixels and source file list, each      |
+//! |                   | aligned on 16 bytes                                       |
+
+use std::borrow::Cow;
+use std::mem::{align_of, size_of};
+
+use crate::assets::{obj::ObjMesh, SubmeshView};
+
+pub const BAKED_MAGIC: [u8; 8] = *b"TT3DBAKE";
+pub const BAKED_VERSION: u32 = 3;
+
+/// Material or texture reference of a record that has none.
+const NONE_INDEX: u32 = u32::MAX;
+
+const HEADER_SIZE: usize = 32;
+const SUBMESH_RECORD_SIZE: usize = 56;
+const MATERIAL_RECORD_SIZE: usize = 24;
+const TEXTURE_RECORD_SIZE: usize = 24;
+const BLOB_ALIGN: usize = 16;
+
+const REPEAT_WIDTH: u32 = 1;
+const REPEAT_HEIGHT: u32 = 2;
+
+/// Values stored as-is in a baked file: little-endian scalars, or arrays of them.
+///
+/// # Safety
+/// Every bit pattern must be a valid value and the type must have no padding, so
+/// that aligned file bytes can be viewed as a slice of it.
+pub unsafe trait Plain: Copy + Send + Sync + 'static {
+    fn read_le(bytes: &[u8]) -> Self;
+    fn write_le(&self, out: &mut Vec<u8>);
+}
+
+unsafe impl Plain for u32 {
+    fn read_le(bytes: &[u8]) -> Self {
+        u32::from_le_bytes(bytes[..4].try_into().unwrap())
+    }
+    fn write_le(&self, out: &mut Vec<u8>) {
+        out.extend_from_slice(&self.to_le_bytes());
+    }
+}
+
+unsafe impl Plain for f32 {
+    fn read_le(bytes: &[u8]) -> Self {
+        f32::from_le_bytes(bytes[..4].try_into().unwrap())
+    }
+    fn write_le(&self, out: &mut Vec<u8>) {
+        out.extend_from_slice(&self.to_le_bytes());
+    }
+}
+
+unsafe impl<T: Plain, const N: usize> Plain for [T; N] {
+    fn read_le(bytes: &[u8]) -> Self {
+        std::array::from_fn(|i| T::read_le(&bytes[i * size_of::<T>()..]))
+    }
+    fn write_le(&self, out: &mut Vec<u8>) {
+        for value in self {
+            value.write_le(out);
+        }
+    }
+}
+
+/// View `bytes` as a slice of `T` without copying when the platform is
+/// little-endian and the bytes are aligned; decode a copy otherwise.
+pub fn plain_slice<T: Plain>(bytes: &[u8]) -> Cow<'_, [T]> {
+    let count = bytes.len() / size_of::<T>();
+    if cfg!(target_endian = "little") && bytes.as_ptr() as usize % align_of::<T>() == 0 {
+        // SAFETY: T is plain data, the pointer is aligned and the `count` values
+        // are within `bytes`
+        Cow::Borrowed(unsafe { std::slice::from_raw_parts(bytes.as_ptr() as *const T, count) })
+    } else {
+        Cow::Owned(bytes.chunks_exact(size_of::<T>()).map(T::read_le).collect())
+    }
+}
+
+#[derive(Clone, Debug, PartialEq)]
+pub struct BakedMaterial {
+    pub name: String,
+    /// index in the texture table of the asset
+    pub texture: Option<u32>,
+    pub glyph: u32,
+}
+
+#[derive(Clone, Debug, PartialEq)]
+pub struct BakedTexture {
+    pub width: u32,
+    pub height: u32,
+    pub repeat_width: bool,
+    pub repeat_height: bool,
+    /// RGBA pixels, row by row
+    pub pixels: Vec<u8>,
+}
+
+/// Append `blob` aligned on [`BLOB_ALIGN`] and return its offset.
+fn push_blob(out: &mut Vec<u8>, blob: &[u8]) -> u64 {
+    out.resize(out.len().next_multiple_of(BLOB_ALIGN), 0);
+    let offset = out.len() as u64;
+    out.extend_from_slice(blob);
+    offset
+}
+
+fn plain_bytes<T: Plain>(values: &[T]) -> Vec<u8> {
+    let mut out = Vec::with_capacity(values.len() * size_of::<T>());
+    for value in values {
+        value.write_le(&mut out);
+    }
+    out
+}
+
+/// Serialize a mesh with its materials and textures. The submeshes keep their
+/// `usemtl` name and refer to the material of the same name, if any. `sources`
+/// are the files the asset was baked from, kept to tell when it is out of date.
+pub fn bake(
+    mesh: &ObjMesh,
+    materials: &[BakedMaterial],
+    textures: &[BakedTexture],
+    sources: &[String],
+) -> Result<Vec<u8>, String> {
+    for texture in textures {
+        if texture.pixels.len() != texture.width as usize * texture.height as usize * 4 {
+            return Err(format!(
+                "texture of {}x{} needs {} bytes of RGBA pixels, got {}",
+                texture.width,
+                texture.height,
+                texture.width as usize * texture.height as usize * 4,
+                texture.pixels.len()
+            ));
+        }
+    }
+    if let Some(material) = materials
+        .iter()
+        .find(|m| m.texture.is_some_and(|t| t as usize >= textures.len()))
+    {
+        return Err(format!(
+            "material {:?} refers to a missing texture",
+            material.name
+        ));
+    }
+
+    let records_size = HEADER_SIZE
+        + mesh.submeshes.len() * SUBMESH_RECORD_SIZE
+        + materials.len() * MATERIAL_RECORD_SIZE
+        + textures.len() * TEXTURE_RECORD_SIZE;
+    // blobs first, behind room left for the records
+    let mut out = vec![0u8; records_size];
+    let submesh_blobs: Vec<[u64; 5]> = mesh
+        .submeshes
+        .iter()
+        .map(|s| {
+            [
+                push_blob(&mut out, &plain_bytes(&s.positions)),
+                push_blob(&mut out, &plain_bytes(&s.uvs)),
+                push_blob(&mut out, &plain_bytes(&s.normals)),
+                push_blob(&mut out, &plain_bytes(&s.triangles)),
+                push_blob(&mut out, s.material.as_bytes()),
+            ]
+        })
+        .collect();
+    let name_blobs: Vec<u64> = materials
+        .iter()
+        .map(|m| push_blob(&mut out, m.name.as_bytes()))
+        .collect();
+    let pixel_blobs: Vec<u64> = textures
+        .iter()
+        .map(|t| push_blob(&mut out, &t.pixels))
+        .collect();
+    // count, then the length and bytes of every path
+    let mut source_list = Vec::new();
+    (sources.len() as u32).write_le(&mut source_list);
+    for source in sources {
+        (source.len() as u32).write_le(&mut source_list);
+        source_list.extend_from_slice(source.as_bytes());
+    }
+    let sources_blob = push_blob(&mut out, &source_list);
+
+    let mut records = Vec::with_capacity(records_size);
+    records.extend_from_slice(&BAKED_MAGIC);
+    for value in [
+        BAKED_VERSION,
+        mesh.submeshes.len() as u32,
+        materials.len() as u32,
+        textures.len() as u32,
+    ] {
+        value.write_le(&mut records);
+    }
+    records.extend_from_slice(&sources_blob.to_le_bytes());
+    for (submesh, blobs) in mesh.submeshes.iter().zip(&submesh_blobs) {
+        let material = materials
+            .iter()
+            .position(|m| m.name == submesh.material)
+            .map_or(NONE_INDEX, |idx| idx as u32);
+        for value in [
+            material,
+            submesh.positions.len() as u32,
+            submesh.triangles.len() as u32,
+            submesh.material.len() as u32,
+        ] {
+            value.write_le(&mut records);
+        }
+        for offset in blobs {
+            records.extend_from_slice(&offset.to_le_bytes());
+        }
+    }
+    for (material, offset) in materials.iter().zip(&name_blobs) {
+        records.extend_from_slice(&offset.to_le_bytes());
+        for value in [
+            material.name.len() as u32,
+            material.texture.unwrap_or(NONE_INDEX),
+            material.glyph,
+            0,
+        ] {
+            value.write_le(&mut records);
+        }
+    }
+    for (texture, offset) in textures.iter().zip(&pixel_blobs) {
+        let flags = (texture.repeat_width as u32 * REPEAT_WIDTH)
+            | (texture.repeat_height as u32 * REPEAT_HEIGHT);
+        for value in [texture.width, texture.height, flags, 0] {
+            value.write_le(&mut records);
+        }
+        records.extend_from_slice(&offset.to_le_bytes());
+    }
+    out[..records_size].copy_from_slice(&records);
+    Ok(out)
+}
+
+/// Reads the records of a baked file in order.
+struct RecordReader<'a> {
+    bytes: &'a [u8],
+    pos: usize,
+}
+
+impl<'a> RecordReader<'a> {
+    fn take(&mut self, len: usize) -> Result<&'a [u8], String> {
+        let bytes = self
+            .bytes
+            .get(self.pos..self.pos + len)
+            .ok_or("baked asset is truncated")?;
+        self.pos += len;
+        Ok(bytes)
+    }
+    fn u32(&mut self) -> Result<u32, String> {
+        Ok(u32::read_le(self.take(4)?))
+    }
+    fn u64(&mut self) -> Result<u64, String> {
+        Ok(u64::from_le_bytes(self.take(8)?.try_into().unwrap()))
+    }
+}
+
+/// Byte range of a blob of `len` bytes at `offset`, checked against `file_len`.
+fn blob_range(offset: u64, len: usize, file_len: usize) -> Result<std::ops::Range<usize>, String> {
+    let start = usize::try_from(offset).map_err(|e| e.to_string())?;
+    match start.checked_add(len) {
+        Some(end) if end <= file_len => Ok(start..end),
+        _ => Err("baked asset blob out of bounds".to_string()),
+    }
+}
+
+#[derive(Clone, Debug)]
+struct SubmeshRecord {
+    /// `usemtl` name of the submesh
+    name: String,
+    material: Option<usize>,
+    positions: std::ops::Range<usize>,
+    uvs: std::ops::Range<usize>,
+    normals: std::ops::Range<usize>,
+    triangles: std::ops::Range<usize>,
+}
+
+#[derive(Clone, Debug)]
+struct TextureRecord {
+    width: usize,
+    height: usize,
+    repeat_width: bool,
+    repeat_height: bool,
+    pixels: std::ops::Range<usize>,
+}
+
+/// A baked file, read in place.
+///
+/// Only the records are decoded when loading; the vertex, index and pixel arrays
+/// are borrowed from the bytes when they are used.
+pub struct BakedAsset<B: AsRef<[u8]>> {
+    bytes: B,
+    submeshes: Vec<SubmeshRecord>,
+    pub materials: Vec<BakedMaterial>,
+    textures: Vec<TextureRecord>,
+    /// files the asset was baked from
+    pub sources: Vec<String>,
+}
+
+impl<B: AsRef<[u8]>> BakedAsset<B> {
+    /// Check the header and every record of `bytes`, so that reading the arrays
+    /// afterwards can't go out of bounds.
+    pub fn parse(bytes: B) -> Result<Self, String> {
+        let data = bytes.as_ref();
+        let mut reader = RecordReader {
+            bytes: data,
+            pos: 0,
+        };
+        if reader.take(BAKED_MAGIC.len())? != BAKED_MAGIC {
+            return Err("not a baked asset".to_string());
+        }
+        let version = reader.u32()?;
+        if version != BAKED_VERSION {
+            return Err(format!(
+                "baked asset version {version} is not supported (expected {BAKED_VERSION})"
+            ));
+        }
+        let submesh_count = reader.u32()? as usize;
+        let material_count = reader.u32()? as usize;
+        let texture_count = reader.u32()? as usize;
+        let sources_offset = reader.u64()?;
+
+        let mut submeshes = Vec::with_capacity(submesh_count.min(data.len()));
+        for _ in 0..submesh_count {
+            let material = reader.u32()?;
+            let vertex_count = reader.u32()? as usize;
+            let triangle_count = reader.u32()? as usize;
+            let name_len = reader.u32()? as usize;
+            let positions = blob_range(reader.u64()?, vertex_count * 12, data.len())?;
+            let uvs = blob_range(reader.u64()?, vertex_count * 8, data.len())?;
+            let normals = blob_range(reader.u64()?, vertex_count * 12, data.len())?;
+            let triangles = blob_range(reader.u64()?, triangle_count * 12, data.len())?;
+            let name = &data[blob_range(reader.u64()?, name_len, data.len())?];
+            let record = SubmeshRecord {
+                name: String::from_utf8(name.to_vec()).map_err(|e| e.to_string())?,
+                material: (material != NONE_INDEX).then_some(material as usize),
+                positions,
+                uvs,
+                normals,
+                triangles,
+            };
+            if record.material.is_some_and(|m| m >= material_count) {
+                return Err("baked submesh material out of range".to_string());
+            }
+            let triangles = plain_slice::<[u32; 3]>(&data[record.triangles.clone()]);
+            if triangles
+                .iter()
+                .flatten()
+                .any(|&v| v as usize >= vertex_count)
+            {
+                return Err("baked triangle vertex out of range".to_string());
+            }
+            submeshes.push(record);
+        }
+
+        let mut materials = Vec::with_capacity(material_count.min(data.len()));
+        for _ in 0..material_count {
+            let name_offset = reader.u64()?;
+            let name_len = reader.u32()? as usize;
+            let texture = reader.u32()?;
+            let glyph = reader.u32()?;
+            reader.u32()?;
+            let name = &data[blob_range(name_offset, name_len, data.len())?];
+            if texture != NONE_INDEX && texture as usize >= texture_count {
+                return Err("baked material texture out of range".to_string());
+            }
+            materials.push(BakedMaterial {
+                name: String::from_utf8(name.to_vec()).map_err(|e| e.to_string())?,
+                texture: (texture != NONE_INDEX).then_some(texture),
+                glyph,
+            });
+        }
+
+        let mut textures = Vec::with_capacity(texture_count.min(data.len()));
+        for _ in 0..texture_count {
+            let width = reader.u32()? as usize;
+            let height = reader.u32()? as usize;
+            let flags = reader.u32()?;
+            reader.u32()?;
+            textures.push(TextureRecord {
+                width,
+                height,
+                repeat_width: flags & REPEAT_WIDTH != 0,
+                repeat_height: flags & REPEAT_HEIGHT != 0,
+                pixels: blob_range(reader.u64()?, width * height * 4, data.len())?,
+            });
+        }
+
+        let mut sources_reader = RecordReader {
+            bytes: data,
+            pos: usize::try_from(sources_offset).map_err(|e| e.to_string())?,
+        };
+        let source_count = sources_reader.u32()? as usize;
+        let mut sources = Vec::with_capacity(source_count.min(data.len()));
+        for _ in 0..source_count {
+            let len = sources_reader.u32()? as usize;
+            let source = sources_reader.take(len)?;
+            sources.push(String::from_utf8(source.to_vec()).map_err(|e| e.to_string())?);
+        }
+
+        Ok(BakedAsset {
+            bytes,
+            submeshes,
+            materials,
+            textures,
+            sources,
+        })
+    }
+
+    pub fn submesh_count(&self) -> usize {
+        self.submeshes.len()
+    }
+
+    /// `usemtl` name of a submesh, whether the asset has a material of that name or
+    /// not; empty for the faces before any `usemtl`.
+    pub fn submesh_material(&self, submesh: usize) -> &str {
+        &self.submeshes[submesh].name
+    }
+
+    /// The material of a submesh in [`Self::materials`], if the asset has one of
+    /// its name.
+    pub fn submesh_material_index(&self, submesh: usize) -> Option<usize> {
+        self.submeshes[submesh].material
+    }
+
+    pub fn submesh(&self, submesh: usize) -> SubmeshView<'_> {
+        let record = &self.submeshes[submesh];
+        let data = self.bytes.as_ref();
+        SubmeshView {
+            positions: plain_slice(&data[record.positions.clone()]),
+            uvs: plain_slice(&data[record.uvs.clone()]),
+            triangles: plain_slice(&data[record.triangles.clone()]),
+        }
+    }
+
+    pub fn submesh_normals(&self, submesh: usize) -> Cow<'_, [[f32; 3]]> {
+        plain_slice(&self.bytes.as_ref()[self.submeshes[submesh].normals.clone()])
+    }
+
+    pub fn texture_count(&self) -> usize {
+        self.textures.len()
+    }
+
+    /// Width, height and repeat flags of a texture.
+    pub fn texture_info(&self, texture: usize) -> (usize, usize, bool, bool) {
+        let record = &self.textures[texture];
+        (
+            record.width,
+            record.height,
+            record.repeat_width,
+            record.repeat_height,
+        )
+    }
+
+    /// RGBA pixels of a texture, row by row.
+    pub fn texture_pixels(&self, texture: usize) -> &[u8] {
+        &self.bytes.as_ref()[self.textures[texture].pixels.clone()]
+    }
+}
+
+#[cfg(test)]
+mod test_baked {
+    use super::*;
+    use crate::assets::obj::parse_obj;
+
+    fn sample() -> (ObjMesh, Vec<BakedMaterial>, Vec<BakedTexture>) {
+        let mesh = parse_obj(
+            b"v 0 0 0\nv 1 0 0\nv 1 1 0\nv 0 1 0\nvt 0 0\nvt 1 1\nvn 0 0 1\n\
+              usemtl wood\nf 1/1/1 2/2/1 3/2/1 4/1/1\nusemtl plain\nf 1 2 3\n",
+            false,
+        )
+        .unwrap();
+        let materials = vec![BakedMaterial {
+            name: "wood".to_string(),
+            texture: Some(0),
+            glyph: 95,
+        }];
+        let textures = vec![BakedTexture {
+            width: 2,
+            height: 1,
+            repeat_width: true,
+            repeat_height: false,
+            pixels: vec![1, 2, 3, 255, 4, 5, 6, 255],
+        }];
+        (mesh, materials, textures)
+    }
+
+    #[test]
+    fn test_bake_round_trip() {
+        let (mesh, materials, textures) = sample();
+        let sources = vec!["tri.obj".to_string(), "wood.png".to_string()];
+        let bytes = bake(&mesh, &materials, &textures, &sources).unwrap();
+        let asset = BakedAsset::parse(bytes).unwrap();
+        assert_eq!(asset.sources, sources);
+
+        assert_eq!(asset.submesh_count(), 2);
+        assert_eq!(asset.submesh_material(0), "wood");
+        assert_eq!(asset.submesh_material(1), "plain");
+        assert_eq!(asset.submesh_material_index(0), Some(0));
+        assert_eq!(asset.submesh_material_index(1), None);
+        assert_eq!(asset.materials, materials);
+        for (idx, submesh) in mesh.submeshes.iter().enumerate() {
+            let view = asset.submesh(idx);
+            assert_eq!(&*view.positions, &submesh.positions[..]);
+            assert_eq!(&*view.uvs, &submesh.uvs[..]);
+            assert_eq!(&*view.triangles, &submesh.triangles[..]);
+            assert_eq!(&*asset.submesh_normals(idx), &submesh.normals[..]);
+        }
+        assert_eq!(asset.texture_info(0), (2, 1, true, false));
+        assert_eq!(asset.texture_pixels(0), &textures[0].pixels[..]);
+    }
+
+    #[test]
+    fn test_plain_slice_borrows_aligned_bytes() {
+        let values: Vec<u32> = vec![1, 2, 3, 4];
+        let bytes: &[u8] = unsafe { std::slice::from_raw_parts(values.as_ptr() as *const u8, 16) };
+        assert!(
+            matches!(plain_slice::<u32>(bytes), Cow::Borrowed(_)) == cfg!(target_endian = "little")
+        );
+        // misaligned bytes are decoded in a copy
+        let shifted = [&[0u8][..], &plain_bytes(&values)].concat();
+        let copy = plain_slice::<u32>(&shifted[1..]);
+        assert_eq!(&*copy, &values[..]);
+    }
+
+    #[test]
+    fn test_parse_rejects_bad_files() {
+        let (mesh, materials, textures) = sample();
+        let bytes = bake(&mesh, &materials, &textures, &[]).unwrap();
+        assert!(BakedAsset::parse(&bytes[..bytes.len() - 1]).is_err());
+        assert!(BakedAsset::parse(&b"TT3DOBJ\0"[..]).is_err());
+
+        let mut corrupted = bytes.clone();
+        let indices = u64::from_le_bytes(corrupted[72..80].try_into().unwrap()) as usize;
+        corrupted[indices..indices + 4].copy_from_slice(&9u32.to_le_bytes());
+        assert!(BakedAsset::parse(corrupted).is_err());
+
+        let bad_texture = BakedTexture {
+            pixels: vec![0; 3],
+            ..textures[0].clone()
+        };
+        assert!(bake(&mesh, &materials, &[bad_texture], &[]).is_err());
+    }
+}
@@ -0,0 +1,166 @@
+use std::path::PathBuf;
+
+use memmap2::Mmap;
+use pyo3::{
+    exceptions::{PyIOError, PyIndexError, PyValueError},
+    prelude::*,
+    types::PyBytes,
+};
+
+use crate::{
+    assets::{
+        baked::{bake, BakedAsset, BakedMaterial, BakedTexture},
+        map_file,
+        obj_py::ObjMeshPy,
+        replace_file, SubmeshView,
+    },
+    texturebuffer::{parse_filter_mode, TextureBufferPy, RGBA},
+};
+
+/// Baked asset loaded by `load_baked_asset`; the arrays stay in the mapped file.
+#[pyclass]
+pub struct BakedAssetPy {
+    pub asset: BakedAsset<Mmap>,
+}
+
+impl BakedAssetPy {
+    pub fn submesh(&self, submesh: usize) -> PyResult<SubmeshView<'_>> {
+        if submesh >= self.asset.submesh_count() {
+            return Err(PyIndexError::new_err("submesh index out of range"));
+        }
+        Ok(self.asset.submesh(submesh))
+    }
+}
+
+#[pymethods]
+impl BakedAssetPy {
+    fn submesh_count(&self) -> usize {
+        self.asset.submesh_count()
+    }
+    /// `usemtl` name of every submesh; empty for the faces without material
+    fn material_names(&self) -> Vec<String> {
+        (0..self.asset.submesh_count())
+            .map(|idx| self.asset.submesh_material(idx).to_string())
+            .collect()
+    }
+    /// (name, texture index in the asset or None, glyph) of every material
+    fn materials(&self) -> Vec<(String, Option<u32>, u32)> {
+        self.asset
+            .materials
+            .iter()
+            .map(|m| (m.name.clone(), m.texture, m.glyph))
+            .collect()
+    }
+    fn vertex_count(&self, submesh: usize) -> PyResult<usize> {
+        Ok(self.submesh(submesh)?.positions.len())
+    }
+    fn triangle_count(&self, submesh: usize) -> PyResult<usize> {
+        Ok(self.submesh(submesh)?.triangles.len())
+    }
+    fn texture_count(&self) -> usize {
+        self.asset.texture_count()
+    }
+    /// files the asset was baked from, as given to `write_baked_asset`
+    fn sources(&self) -> Vec<String> {
+        self.asset.sources.clone()
+    }
+    /// width, height, repeat_width and repeat_height of a texture
+    fn texture_info(&self, texture: usize) -> PyResult<(usize, usize, bool, bool)> {
+        if texture >= self.asset.texture_count() {
+            return Err(PyIndexError::new_err("texture index out of range"));
+        }
+        Ok(self.asset.texture_info(texture))
+    }
+
+    /// Copy texture `texture` of the asset in `texture_buffer`, straight from the
+    /// mapped file, and return its index there.
+    #[pyo3(signature = (texture_buffer, texture, filter_mode="bilinear"))]
+    fn add_texture_to(
+        &self,
+        mut texture_buffer: PyRefMut<TextureBufferPy>,
+        texture: usize,
+        filter_mode: &str,
+    ) -> PyResult<usize> {
+        let (width, height, repeat_width, repeat_height) = self.texture_info(texture)?;
+        let filter_mode = parse_filter_mode(filter_mode)?;
+        texture_buffer.check_room()?;
+        let buffer = &mut texture_buffer.data;
+        let pixels = self
+            .asset
+            .texture_pixels(texture)
+            .chunks_exact(4)
+            .map(|p| RGBA::new(p[0], p[1], p[2], p[3]));
+        Ok(buffer.add_texture_from_iter(
+            width,
+            height,
+            pixels,
+            repeat_width,
+            repeat_height,
+            filter_mode,
+        ))
+    }
+}
+
+/// Memory-map a file written by `write_baked_asset`. Only the records are read;
+/// the arrays are used in place by `VertexBufferPy.add_obj_submesh` and
+/// `BakedAssetPy.add_texture_to`.
+#[pyfunction]
+pub fn load_baked_asset(py: Python, path: PathBuf) -> PyResult<BakedAssetPy> {
+    py.detach(|| {
+        let bytes = map_file(&path)
+            .map_err(|e| PyIOError::new_err(format!("{}: {}", path.display(), e)))?;
+        let asset = BakedAsset::parse(bytes)
+            .map_err(|e| PyValueError::new_err(format!("{}: {}", path.display(), e)))?;
+        Ok(BakedAssetPy { asset })
+    })
+}
+
+/// Write `mesh` with its materials and textures to `out_path` as a baked asset.
+///
+/// The file is replaced atomically, so assets already loaded from `out_path` keep
+/// reading the previous content. On Windows, a file still mapped by a loaded asset
+/// can't be replaced: an `OSError` is raised and the file is left as is.
+///
+/// `materials` are (name, texture index or None, glyph) tuples, `textures` are
+/// (width, height, RGBA bytes, repeat_width, repeat_height) tuples; `sources` are
+/// the files the asset is baked from, kept to tell when it is out of date.
+#[pyfunction]
+#[pyo3(signature = (out_path, mesh, materials, textures, sources=None))]
+pub fn write_baked_asset(
+    py: Python,
+    out_path: PathBuf,
+    mesh: PyRef<ObjMeshPy>,
+    materials: Vec<(String, Option<u32>, u32)>,
+    textures: Vec<(u32, u32, Py<PyBytes>, bool, bool)>,
+    sources: Option<Vec<String>>,
+) -> PyResult<()> {
+    let materials: Vec<BakedMaterial> = materials
+        .into_iter()
+        .map(|(name, texture, glyph)| BakedMaterial {
+            name,
+            texture,
+            glyph,
+        })
+        .collect();
+    let textures: Vec<BakedTexture> = textures
+        .into_iter()
+        .map(
+            |(width, height, pixels, repeat_width, repeat_height)| BakedTexture {
+                width,
+                height,
+                repeat_width,
+                repeat_height,
+                pixels: pixels.as_bytes(py).to_vec(),
+            },
+        )
+        .collect();
+    let bytes = bake(
+        &mesh.mesh,
+        &materials,
+        &textures,
+        &sources.unwrap_or_default(),
+    )
+    .map_err(PyValueError::new_err)?;
+    replace_file(&out_path, &bytes)
+        .map_err(|e| PyIOError::new_err(format!("{}: {}", out_path.display(), e)))
+}
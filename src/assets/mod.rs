@@ -0,0 +1,58 @@
+use std::{borrow::Cow, fs, fs::File, io, path::Path};
+
+use memmap2::Mmap;
+
+pub mod baked;
+#[cfg(feature = "python-binding")]
+pub mod baked_py;
+pub mod obj;
+#[cfg(feature = "python-binding")]
+pub mod obj_py;
+
+/// Map a file read-only in memory.
+///
+/// The parsers read the mapped bytes directly instead of copying the whole file in
+/// a buffer first. An OBJ map only lives for the duration of a load, but a baked
+/// asset keeps its map for as long as its `BakedAssetPy` or a mesh using it is
+/// alive; the file must not be truncated or rewritten in place meanwhile.
+pub fn map_file(path: &Path) -> io::Result<Mmap> {
+    let file = File::open(path)?;
+    // SAFETY: the map is read-only, and the files tt3de writes are replaced with
+    // `replace_file`, never modified in place, so a live map keeps the old content
+    unsafe { Mmap::map(&file) }
+}
+
+/// Write `bytes` to `path` through a temporary file in the same directory renamed
+/// over it, so that maps of the previous file stay valid.
+///
+/// Windows refuses to replace a file that is still mapped: there, the error tells
+/// to drop the assets loaded from `path` first, and `path` is left untouched.
+pub fn replace_file(path: &Path, bytes: &[u8]) -> io::Result<()> {
+    let mut tmp_name = path.file_name().unwrap_or_default().to_os_string();
+    tmp_name.push(format!(".{}.tmp", std::process::id()));
+    let tmp_path = path.with_file_name(tmp_name);
+    fs::write(&tmp_path, bytes)
+        .and_then(|_| fs::rename(&tmp_path, path))
+        .map_err(|e| {
+            let _ = fs::remove_file(&tmp_path);
+            if cfg!(windows) && e.kind() == io::ErrorKind::PermissionDenied {
+                io::Error::new(
+                    e.kind(),
+                    format!(
+                        "{e} (a file mapped by a loaded asset can't be replaced on \
+                         Windows: drop the BakedAssetPy and the meshes using it first)"
+                    ),
+                )
+            } else {
+                e
+            }
+        })
+}
+
+/// Vertices and triangles of one submesh, borrowed from a loaded mesh or a baked
+/// file.
+pub struct SubmeshView<'a> {
+    pub positions: Cow<'a, [[f32; 3]]>,
+    pub uvs: Cow<'a, [[f32; 2]]>,
+    pub triangles: Cow<'a, [[u32; 3]]>,
+}
@@ -0,0 +1,407 @@
+use std::{borrow::Cow, collections::HashMap};
+
+use rayon::prelude::*;
+
+use crate::{assets::SubmeshView, utils::engine_pool::engine_pool};
+
+/// Texture coordinate or normal index of a face corner that has none.
+const NO_INDEX: u32 = u32::MAX;
+
+/// Size under which a file is not split into more parse chunks.
+const MIN_CHUNK_BYTES: usize = 64 * 1024;
+
+/// Triangles of one material, indexed into their own deduplicated vertices.
+#[derive(Clone, Debug, Default, PartialEq)]
+pub struct ObjSubmesh {
+    /// `usemtl` name of the triangles; empty for the faces before any `usemtl`
+    pub material: String,
+    pub positions: Vec<[f32; 3]>,
+    /// texture coordinates of every vertex, `[0, 0]` when the corner has none
+    pub uvs: Vec<[f32; 2]>,
+    /// normal of every vertex, zero when the corner has none
+    pub normals: Vec<[f32; 3]>,
+    pub triangles: Vec<[u32; 3]>,
+}
+
+impl ObjSubmesh {
+    pub fn view(&self) -> SubmeshView<'_> {
+        SubmeshView {
+            positions: Cow::Borrowed(&self.positions),
+            uvs: Cow::Borrowed(&self.uvs),
+            triangles: Cow::Borrowed(&self.triangles),
+        }
+    }
+}
+
+/// Content of an OBJ file: one indexed submesh per material, in order of first use.
+#[derive(Clone, Debug, Default, PartialEq)]
+pub struct ObjMesh {
+    /// material libraries named by `mtllib`, relative to the OBJ file
+    pub mtllibs: Vec<String>,
+    pub submeshes: Vec<ObjSubmesh>,
+}
+
+impl ObjMesh {
+    pub fn triangle_count(&self) -> usize {
+        self.submeshes.iter().map(|s| s.triangles.len()).sum()
+    }
+}
+
+// corners as (v, vt, vn) indices, 0-based
+type Corner = [u32; 3];
+
+/// Elements counted in a chunk, and the material in use at its end.
+#[derive(Clone, Copy, Default)]
+struct ChunkCounts<'a> {
+    positions: usize,
+    uvs: usize,
+    normals: usize,
+    material: Option<&'a str>,
+}
+
+#[derive(Default)]
+struct ChunkData<'a> {
+    positions: Vec<[f32; 3]>,
+    uvs: Vec<[f32; 2]>,
+    normals: Vec<[f32; 3]>,
+    mtllibs: Vec<&'a str>,
+    /// materials used by the chunk; triangles refer to them by position
+    materials: Vec<&'a str>,
+    triangles: Vec<(usize, [Corner; 3])>,
+}
+
+/// Split `text` in about `chunk_count` chunks of whole lines.
+fn split_lines(text: &str, chunk_count: usize) -> Vec<&str> {
+    let bytes = text.as_bytes();
+    let target = (bytes.len() / chunk_count.max(1)).max(MIN_CHUNK_BYTES);
+    let mut chunks = Vec::new();
+    let mut start = 0;
+    while start < bytes.len() {
+        let end = (start + target).min(bytes.len());
+        let end = match bytes[end..].iter().position(|&b| b == b'\n') {
+            Some(offset) => end + offset + 1,
+            None => bytes.len(),
+        };
+        chunks.push(&text[start..end]);
+        start = end;
+    }
+    chunks
+}
+
+/// Keyword and arguments of every non-empty line.
+fn statements(chunk: &str) -> impl Iterator<Item = (&str, &str)> {
+    chunk.lines().filter_map(|line| {
+        let line = line.trim();
+        let keyword = line.split_ascii_whitespace().next()?;
+        Some((keyword, line[keyword.len()..].trim()))
+    })
+}
+
+fn count_chunk(chunk: &str) -> ChunkCounts<'_> {
+    let mut counts = ChunkCounts::default();
+    for (keyword, args) in statements(chunk) {
+        match keyword {
+            "v" => counts.positions += 1,
+            "vt" => counts.uvs += 1,
+            "vn" => counts.normals += 1,
+            "usemtl" => counts.material = Some(args),
+            _ => {}
+        }
+    }
+    counts
+}
+
+fn parse_floats<const N: usize>(
+    args: &str,
+    keyword: &str,
+    required: usize,
+) -> Result<[f32; N], String> {
+    let mut values = [0.0; N];
+    let mut count = 0;
+    for (value, token) in values.iter_mut().zip(args.split_ascii_whitespace()) {
+        *value = token
+            .parse()
+            .map_err(|_| format!("invalid number {token:?} in {keyword:?} statement"))?;
+        count += 1;
+    }
+    if count < required {
+        return Err(format!(
+            "{keyword:?} statement needs {required} values, got {args:?}"
+        ));
+    }
+    Ok(values)
+}
+
+/// 0-based index of a 1-based (or negative, relative) OBJ reference. Positive
+/// references may point anywhere in the file, negative ones before the statement.
+fn resolve_index(token: &str, defined: usize, total: usize, what: &str) -> Result<u32, String> {
+    let value: i64 = token
+        .parse()
+        .map_err(|_| format!("invalid {what} index {token:?}"))?;
+    let index = match value {
+        v if v > 0 && (v as usize) <= total => v - 1,
+        v if v < 0 && v.unsigned_abs() as usize <= defined => defined as i64 + v,
+        _ => return Err(format!("{what} index {value} out of range")),
+    };
+    Ok(index as u32)
+}
+
+fn parse_chunk<'a>(
+    chunk: &'a str,
+    start: ChunkCounts<'a>,
+    totals: ChunkCounts<'a>,
+    flip_triangles: bool,
+) -> Result<ChunkData<'a>, String> {
+    let mut data = ChunkData::default();
+    let mut material = match start.material {
+        Some(name) => {
+            data.materials.push(name);
+            Some(0)
+        }
+        None => None,
+    };
+    let mut corners: Vec<Corner> = Vec::new();
+    for (keyword, args) in statements(chunk) {
+        match keyword {
+            "v" => data.positions.push(parse_floats(args, keyword, 3)?),
+            "vt" => data.uvs.push(parse_floats(args, keyword, 1)?),
+            "vn" => data.normals.push(parse_floats(args, keyword, 3)?),
+            "usemtl" => {
+                material = Some(match data.materials.iter().position(|&m| m == args) {
+                    Some(idx) => idx,
+                    None => {
+                        data.materials.push(args);
+                        data.materials.len() - 1
+                    }
+                });
+            }
+            "mtllib" => data.mtllibs.push(args),
+            "f" => {
+                let defined = [
+                    start.positions + data.positions.len(),
+                    start.uvs + data.uvs.len(),
+                    start.normals + data.normals.len(),
+                ];
+                let total = [totals.positions, totals.uvs, totals.normals];
+                corners.clear();
+                for token in args.split_ascii_whitespace() {
+                    let mut corner = [NO_INDEX; 3];
+                    for (k, part) in token.split('/').take(3).enumerate() {
+                        if !part.is_empty() {
+                            let what = ["vertex", "texture coordinate", "normal"][k];
+                            corner[k] = resolve_index(part, defined[k], total[k], what)?;
+                        }
+                    }
+                    if corner[0] == NO_INDEX {
+                        return Err(format!("face corner {token:?} has no vertex"));
+                    }
+                    corners.push(corner);
+                }
+                // the faces before any usemtl go to the unnamed material
+                let material = *material.get_or_insert_with(|| {
+                    data.materials.push("");
+                    data.materials.len() - 1
+                });
+                // fan triangulation, like the python loaders
+                for i in 1..corners.len().saturating_sub(1) {
+                    let triangle = if flip_triangles {
+                        [corners[0], corners[i + 1], corners[i]]
+                    } else {
+                        [corners[0], corners[i], corners[i + 1]]
+                    };
+                    data.triangles.push((material, triangle));
+                }
+            }
+            _ => {}
+        }
+    }
+    Ok(data)
+}
+
+fn build_submesh(
+    material: &str,
+    triangles: &[[Corner; 3]],
+    positions: &[[f32; 3]],
+    uvs: &[[f32; 2]],
+    normals: &[[f32; 3]],
+) -> ObjSubmesh {
+    let mut submesh = ObjSubmesh {
+        material: material.to_string(),
+        triangles: Vec::with_capacity(triangles.len()),
+        ..Default::default()
+    };
+    let mut vertex_of: HashMap<Corner, u32> = HashMap::with_capacity(triangles.len() * 2);
+    for triangle in triangles {
+        let indices = triangle.map(|corner| {
+            *vertex_of.entry(corner).or_insert_with(|| {
+                let [v, vt, vn] = corner;
+                submesh.positions.push(positions[v as usize]);
+                submesh
+                    .uvs
+                    .push(uvs.get(vt as usize).copied().unwrap_or_default());
+                submesh
+                    .normals
+                    .push(normals.get(vn as usize).copied().unwrap_or_default());
+                (submesh.positions.len() - 1) as u32
+            })
+        });
+        submesh.triangles.push(indices);
+    }
+    submesh
+}
+
+/// Parse an OBJ file and triangulate its faces on the engine pool, then deduplicate
+/// the (v, vt, vn) corners of every material into an indexed submesh.
+///
+/// The file is split in chunks of whole lines. A first pass counts the vertices of
+/// every chunk, so that the second one can resolve relative indices and the material
+/// in use while parsing the chunks independently.
+pub fn parse_obj(bytes: &[u8], flip_triangles: bool) -> Result<ObjMesh, String> {
+    let text = std::str::from_utf8(bytes).map_err(|e| format!("OBJ file is not UTF-8: {e}"))?;
+    let pool = engine_pool();
+    pool.install(|| -> Result<ObjMesh, String> {
+        let chunks = split_lines(text, rayon::current_num_threads() * 4);
+        let counts: Vec<ChunkCounts> = chunks.par_iter().map(|chunk| count_chunk(chunk)).collect();
+
+        let mut starts = Vec::with_capacity(chunks.len());
+        let mut totals = ChunkCounts::default();
+        for counts in &counts {
+            starts.push(totals);
+            totals.positions += counts.positions;
+            totals.uvs += counts.uvs;
+            totals.normals += counts.normals;
+            totals.material = counts.material.or(totals.material);
+        }
+
+        let parsed = chunks
+            .par_iter()
+            .zip(starts.into_par_iter())
+            .map(|(chunk, start)| parse_chunk(chunk, start, totals, flip_triangles))
+            .collect::<Result<Vec<_>, _>>()?;
+
+        let mut mesh = ObjMesh::default();
+        let mut positions = Vec::with_capacity(totals.positions);
+        let mut uvs = Vec::with_capacity(totals.uvs);
+        let mut normals = Vec::with_capacity(totals.normals);
+        let mut materials: Vec<&str> = Vec::new();
+        let mut groups: Vec<Vec<[Corner; 3]>> = Vec::new();
+        for chunk in parsed {
+            positions.extend_from_slice(&chunk.positions);
+            uvs.extend_from_slice(&chunk.uvs);
+            normals.extend_from_slice(&chunk.normals);
+            mesh.mtllibs
+                .extend(chunk.mtllibs.iter().map(|name| name.to_string()));
+            let group_of: Vec<usize> = chunk
+                .materials
+                .iter()
+                .map(|&name| match materials.iter().position(|&m| m == name) {
+                    Some(group) => group,
+                    None => {
+                        materials.push(name);
+                        groups.push(Vec::new());
+                        groups.len() - 1
+                    }
+                })
+                .collect();
+            for (material, triangle) in chunk.triangles {
+                groups[group_of[material]].push(triangle);
+            }
+        }
+
+        mesh.submeshes = materials
+            .par_iter()
+            .zip(groups.par_iter())
+            .filter(|(_, triangles)| !triangles.is_empty())
+            .map(|(material, triangles)| {
+                build_submesh(material, triangles, &positions, &uvs, &normals)
+            })
+            .collect();
+        Ok(mesh)
+    })
+}
+
+#[cfg(test)]
+mod test_obj {
+    use super::*;
+
+    const QUAD: &str = "\
+mtllib scene.mtl
+v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+vt 0 0
+vt 1 0
+vt 1 1
+vt 0 1
+vn 0 0 1
+usemtl red
+f 1/1/1 2/2/1 3/3/1 4/4/1
+usemtl blue
+f -4/-4/-1 -2/-2/-1 -1/-1/-1
+usemtl red
+f 1//1 3//1 4//1
+";
+
+    #[test]
+    fn test_parse_quad() {
+        let mesh = parse_obj(QUAD.as_bytes(), false).unwrap();
+        assert_eq!(mesh.mtllibs, vec!["scene.mtl".to_string()]);
+        assert_eq!(mesh.submeshes.len(), 2);
+        assert_eq!(mesh.triangle_count(), 4);
+
+        let red = &mesh.submeshes[0];
+        assert_eq!(red.material, "red");
+        // the fan of the quad shares corners 1 and 3; the last face has no uv
+        assert_eq!(red.triangles, vec![[0, 1, 2], [0, 2, 3], [4, 5, 6]]);
+        assert_eq!(red.positions.len(), 7);
+        assert_eq!(red.uvs[1], [1.0, 0.0]);
+        assert_eq!(red.uvs[4], [0.0, 0.0]);
+        assert_eq!(red.normals[0], [0.0, 0.0, 1.0]);
+
+        let blue = &mesh.submeshes[1];
+        assert_eq!(blue.material, "blue");
+        assert_eq!(
+            blue.positions,
+            vec![[0.0, 0.0, 0.0], [1.0, 1.0, 0.0], [0.0, 1.0, 0.0]]
+        );
+    }
+
+    #[test]
+    fn test_parse_chunks_match_single_pass() {
+        // enough lines for several chunks, with usemtl and relative indices across them
+        let mut text = String::new();
+        for i in 0..20000 {
+            text.push_str(&format!(
+                "v {i} 0 0\nv {i} 1 0\nv {i} 1 1\nvt 0.5 0.{}\n",
+                i % 10
+            ));
+            if i % 7000 == 0 {
+                text.push_str(&format!("usemtl m{}\n", i / 7000));
+            }
+            text.push_str("f -3/-1 -2/-1 -1/-1\n");
+        }
+        let mesh = parse_obj(text.as_bytes(), true).unwrap();
+        assert!(split_lines(&text, 8).len() > 1);
+        assert_eq!(mesh.submeshes.len(), 3);
+        assert_eq!(mesh.triangle_count(), 20000);
+        let first = &mesh.submeshes[0];
+        assert_eq!(first.material, "m0");
+        // flipped: the corners 2 and 3 are swapped
+        assert_eq!(
+            first.positions[first.triangles[0][1] as usize],
+            [0.0, 1.0, 1.0]
+        );
+        let last = &mesh.submeshes[2];
+        let vertex = last.triangles.last().unwrap()[0] as usize;
+        assert_eq!(last.positions[vertex], [19999.0, 0.0, 0.0]);
+        assert_eq!(last.uvs[vertex], [0.5, 0.9]);
+    }
+
+    #[test]
+    fn test_parse_errors() {
+        assert!(parse_obj(b"v 0 0 0\nf 1 2 3\n", false).is_err());
+        assert!(parse_obj(b"v 0 0\n", false).is_err());
+        assert!(parse_obj(b"v 0 0 0\nf 1/x 1 1\n", false).is_err());
+    }
+}
@@ -0,0 +1,84 @@
+use std::path::PathBuf;
+
+use pyo3::{
+    exceptions::{PyIOError, PyIndexError, PyValueError},
+    prelude::*,
+};
+
+use crate::assets::{
+    map_file,
+    obj::{parse_obj, ObjMesh, ObjSubmesh},
+};
+
+/// Indexed mesh loaded by `load_obj_native`, one submesh per material.
+#[pyclass]
+pub struct ObjMeshPy {
+    pub mesh: ObjMesh,
+}
+
+impl ObjMeshPy {
+    pub fn submesh(&self, submesh: usize) -> PyResult<&ObjSubmesh> {
+        self.mesh
+            .submeshes
+            .get(submesh)
+            .ok_or_else(|| PyIndexError::new_err("submesh index out of range"))
+    }
+}
+
+#[pymethods]
+impl ObjMeshPy {
+    /// material libraries named by the file, relative to it
+    fn mtllibs(&self) -> Vec<String> {
+        self.mesh.mtllibs.clone()
+    }
+    /// `usemtl` name of every submesh; empty for the faces without material
+    fn material_names(&self) -> Vec<String> {
+        self.mesh
+            .submeshes
+            .iter()
+            .map(|s| s.material.clone())
+            .collect()
+    }
+    fn submesh_count(&self) -> usize {
+        self.mesh.submeshes.len()
+    }
+    fn vertex_count(&self, submesh: usize) -> PyResult<usize> {
+        Ok(self.submesh(submesh)?.positions.len())
+    }
+    fn triangle_count(&self, submesh: usize) -> PyResult<usize> {
+        Ok(self.submesh(submesh)?.triangles.len())
+    }
+    /// x, y, z of every vertex of the submesh
+    fn positions(&self, submesh: usize) -> PyResult<Vec<f32>> {
+        Ok(self.submesh(submesh)?.positions.concat())
+    }
+    /// u, v of every vertex of the submesh
+    fn uvs(&self, submesh: usize) -> PyResult<Vec<f32>> {
+        Ok(self.submesh(submesh)?.uvs.concat())
+    }
+    /// x, y, z of the normal of every vertex of the submesh
+    fn normals(&self, submesh: usize) -> PyResult<Vec<f32>> {
+        Ok(self.submesh(submesh)?.normals.concat())
+    }
+    /// three vertex indices per triangle of the submesh
+    fn indices(&self, submesh: usize) -> PyResult<Vec<u32>> {
+        Ok(self.submesh(submesh)?.triangles.concat())
+    }
+}
+
+/// Load an OBJ file into an indexed mesh.
+///
+/// The file is memory-mapped, then parsed and triangulated on the engine pool;
+/// `flip_triangles` reverses the winding of every triangle. The GIL is released
+/// meanwhile, so other python threads keep running.
+#[pyfunction]
+#[pyo3(signature = (path, flip_triangles=false))]
+pub fn load_obj_native(py: Python, path: PathBuf, flip_triangles: bool) -> PyResult<ObjMeshPy> {
+    py.detach(|| {
+        let bytes = map_file(&path)
+            .map_err(|e| PyIOError::new_err(format!("{}: {}", path.display(), e)))?;
+        let mesh = parse_obj(&bytes, flip_triangles)
+            .map_err(|e| PyValueError::new_err(format!("{}: {}", path.display(), e)))?;
+        Ok(ObjMeshPy { mesh })
+    })
+}
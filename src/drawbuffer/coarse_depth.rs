@@ -0,0 +1,221 @@
+use nalgebra_glm::Number;
+
+use super::drawbuffer::DepthBufferCell;
+
+/// Side of the square tiles of the coarse depth buffer, in cells.
+pub const COARSE_TILE_SIZE: usize = 8;
+
+/// Counters of the coarse depth test since the last clear.
+#[derive(Clone, Copy, Debug, Default, PartialEq, Eq)]
+pub struct CoarseDepthStats {
+    /// tile (or triangle bounding box) tests performed
+    pub tested: usize,
+    /// tests that rejected the fragments
+    pub rejected: usize,
+    /// cells skipped by the rejections
+    pub cells_skipped: usize,
+}
+
+/// Farthest stored depth of every 8x8 tile of a depth buffer.
+///
+/// A fragment can only land in a cell when it is nearer than the last depth layer
+/// of that cell, so anything at or behind the farthest of those depths over a tile
+/// is hidden in the whole tile. The tile value only ever decreases between clears;
+/// writes just flag the tile and the value is recomputed lazily on the next test,
+/// a stale value being conservative.
+///
+/// The tiles written since the last [`Self::forget_written`] are listed too, so that
+/// a clear only has to reset those.
+pub struct CoarseDepth<A: Number> {
+    pub tile_rows: usize,
+    pub tile_cols: usize,
+    farthest: Box<[A]>,
+    dirty: Box<[bool]>,
+    written: Box<[bool]>,
+    written_tiles: Vec<u32>,
+    pub stats: CoarseDepthStats,
+}
+
+impl<A: Number> CoarseDepth<A> {
+    pub fn new(row_count: usize, col_count: usize, depth: A) -> Self {
+        let tile_rows = row_count.div_ceil(COARSE_TILE_SIZE);
+        let tile_cols = col_count.div_ceil(COARSE_TILE_SIZE);
+        let count = tile_rows * tile_cols;
+        CoarseDepth {
+            tile_rows,
+            tile_cols,
+            farthest: vec![depth; count].into_boxed_slice(),
+            dirty: vec![false; count].into_boxed_slice(),
+            written: vec![false; count].into_boxed_slice(),
+            written_tiles: Vec::new(),
+            stats: CoarseDepthStats::default(),
+        }
+    }
+
+    pub fn clear(&mut self, depth: A) {
+        self.farthest.fill(depth);
+        self.dirty.fill(false);
+        self.stats = CoarseDepthStats::default();
+    }
+
+    /// Flag the tile of `(row, col)` after a depth write.
+    #[inline(always)]
+    pub fn touch(&mut self, row: usize, col: usize) {
+        let tile = (row / COARSE_TILE_SIZE) * self.tile_cols + col / COARSE_TILE_SIZE;
+        self.dirty[tile] = true;
+        if !self.written[tile] {
+            self.written[tile] = true;
+            self.written_tiles.push(tile as u32);
+        }
+    }
+
+    pub fn tile_count(&self) -> usize {
+        self.farthest.len()
+    }
+
+    /// Tiles touched since the last [`Self::forget_written`], in touch order.
+    pub fn written_tiles(&self) -> &[u32] {
+        &self.written_tiles
+    }
+
+    pub fn forget_written(&mut self) {
+        for &tile in &self.written_tiles {
+            self.written[tile as usize] = false;
+        }
+        self.written_tiles.clear();
+    }
+
+    /// Cells `([row_start, row_end), [col_start, col_end))` of a tile.
+    pub fn tile_cells(
+        &self,
+        tile: usize,
+        row_count: usize,
+        col_count: usize,
+    ) -> ((usize, usize), (usize, usize)) {
+        let row_start = (tile / self.tile_cols) * COARSE_TILE_SIZE;
+        let col_start = (tile % self.tile_cols) * COARSE_TILE_SIZE;
+        (
+            (row_start, (row_start + COARSE_TILE_SIZE).min(row_count)),
+            (col_start, (col_start + COARSE_TILE_SIZE).min(col_count)),
+        )
+    }
+
+    fn tile_farthest<const L: usize>(
+        &mut self,
+        cells: &[DepthBufferCell<A, L>],
+        row_count: usize,
+        col_count: usize,
+        tile_row: usize,
+        tile_col: usize,
+    ) -> A {
+        let tile = tile_row * self.tile_cols + tile_col;
+        if self.dirty[tile] {
+            let row_start = tile_row * COARSE_TILE_SIZE;
+            let col_start = tile_col * COARSE_TILE_SIZE;
+            let col_end = (col_start + COARSE_TILE_SIZE).min(col_count);
+            let mut farthest = A::min_value();
+            for row in row_start..(row_start + COARSE_TILE_SIZE).min(row_count) {
+                for cell in &cells[row * col_count + col_start..row * col_count + col_end] {
+                    let depth = cell.depth[L - 1];
+                    if depth > farthest {
+                        farthest = depth;
+                    }
+                }
+            }
+            self.farthest[tile] = farthest;
+            self.dirty[tile] = false;
+        }
+        self.farthest[tile]
+    }
+
+    /// True when fragments no nearer than `nearest` are hidden in every tile
+    /// overlapping the cells `[row_start, row_end) x [col_start, col_end)`.
+    pub fn rejects<const L: usize>(
+        &mut self,
+        cells: &[DepthBufferCell<A, L>],
+        row_count: usize,
+        col_count: usize,
+        (row_start, row_end): (usize, usize),
+        (col_start, col_end): (usize, usize),
+        nearest: A,
+    ) -> bool {
+        if row_start >= row_end || col_start >= col_end {
+            return false;
+        }
+        self.stats.tested += 1;
+        for tile_row in row_start / COARSE_TILE_SIZE..=(row_end - 1) / COARSE_TILE_SIZE {
+            for tile_col in col_start / COARSE_TILE_SIZE..=(col_end - 1) / COARSE_TILE_SIZE {
+                let farthest = self.tile_farthest(cells, row_count, col_count, tile_row, tile_col);
+                if nearest < farthest {
+                    return false;
+                }
+            }
+        }
+        self.stats.rejected += 1;
+        self.stats.cells_skipped += (row_end - row_start) * (col_end - col_start);
+        true
+    }
+}
+
+#[cfg(test)]
+mod test_coarse_depth {
+    use super::*;
+
+    fn cells(rows: usize, cols: usize, depth: f32) -> Vec<DepthBufferCell<f32, 1>> {
+        let mut cell = DepthBufferCell::<f32, 1>::new();
+        cell.depth[0] = depth;
+        vec![cell; rows * cols]
+    }
+
+    #[test]
+    fn test_reject_behind_tile() {
+        let (rows, cols) = (10, 20);
+        let mut depth = cells(rows, cols, 10.0);
+        let mut coarse = CoarseDepth::new(rows, cols, 10.0f32);
+        assert_eq!((coarse.tile_rows, coarse.tile_cols), (2, 3));
+        assert!(!coarse.rejects(&depth, rows, cols, (0, 8), (0, 8), 5.0));
+
+        // fill the first tile with near fragments
+        for row in 0..8 {
+            for col in 0..8 {
+                depth[row * cols + col].depth[0] = 1.0;
+                coarse.touch(row, col);
+            }
+        }
+        assert!(coarse.rejects(&depth, rows, cols, (0, 8), (0, 8), 2.0));
+        assert!(!coarse.rejects(&depth, rows, cols, (0, 8), (0, 8), 0.5));
+        // spanning the next tile, still empty
+        assert!(!coarse.rejects(&depth, rows, cols, (0, 8), (4, 12), 2.0));
+
+        assert_eq!(
+            coarse.stats,
+            CoarseDepthStats {
+                tested: 4,
+                rejected: 1,
+                cells_skipped: 64
+            }
+        );
+        coarse.clear(10.0);
+        assert_eq!(coarse.stats, CoarseDepthStats::default());
+    }
+
+    #[test]
+    fn test_written_tiles() {
+        let (rows, cols) = (10, 20);
+        let mut coarse = CoarseDepth::new(rows, cols, 10.0f32);
+        assert_eq!(coarse.tile_count(), 6);
+        coarse.touch(9, 19);
+        coarse.touch(0, 0);
+        coarse.touch(9, 17);
+        assert_eq!(coarse.written_tiles(), &[5, 0]);
+        assert_eq!(coarse.tile_cells(5, rows, cols), ((8, 10), (16, 20)));
+
+        // the written tiles outlive the depth clears
+        coarse.clear(10.0);
+        assert_eq!(coarse.written_tiles(), &[5, 0]);
+        coarse.forget_written();
+        assert!(coarse.written_tiles().is_empty());
+        coarse.touch(0, 0);
+        assert_eq!(coarse.written_tiles(), &[0]);
+    }
+}
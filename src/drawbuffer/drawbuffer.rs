@@ -1,4 +1,6 @@
 use std::borrow::BorrowMut;
+use std::sync::atomic::{AtomicU64, Ordering};
+use std::time::Instant;
 
 use nalgebra_glm::clamp_vec;
 use nalgebra_glm::floor;
@@ -12,12 +14,20 @@ use nalgebra_glm::Vec3;
 use nalgebra_glm::Vec4;
 
 use super::super::texturebuffer::texture_buffer::TextureBuffer;
-use crate::material::{apply_material, bump_material_apply_generation_for_pass};
+use crate::material::{
+    apply_material, apply_material_bucket, bump_material_apply_generation_for_pass,
+};
 use crate::material::MaterialBuffer;
-use crate::primitivbuffer::primitivbuffer::PrimitiveBuffer;
+use crate::primitivbuffer::primitivbuffer::{
+    PrimitivReferences, PrimitiveBuffer, PrimitiveElements,
+};
+use crate::raster::raster_triangle_tomato::BarycentricPlane;
 use crate::texturebuffer::RGBA;
 use crate::vertexbuffer::uv_buffer::UVBuffer;
 use super::blend::{blend_front, GlyphPolicy};
+use super::coarse_depth::CoarseDepth;
+use super::glyphset::{FULL_BLOCK, HALF_LOWER_BLOCK, HALF_UPPER_BLOCK};
+use crate::utils::engine_pool::chunk_rows;
 
 /// Twice the signed area of triangle `(a,b,c)` in the plane with **X = column**, **Y = row**
 /// (same axes as vertex `pos.x` / `pos.y` during rasterization).
@@ -60,6 +70,7 @@ pub fn triangle_front_facing_submission_order_xy(
 /// - `uv`: A 2D vector representing the primary texture coordinates of the pixel.
 /// - `uv_1`: A 2D vector representing secondary texture coordinates of the pixel
 /// - `material_id`: An identifier for the material, typically used to reference a material in a materials database or array.
+///   Ids are stored as `u32` to keep the record compact; they index buffers far below that range.
 /// - `primitive_id`: An identifier for the primitive (e.g., a geometric primitive like a triangle or sphere).
 /// - `node_id`: An identifier for the node, possibly in a scene graph or spatial partitioning structure.
 /// - `geometry_id`: An identifier for the geometry, which could refer to a specific geometric object or model.
@@ -72,6 +83,10 @@ pub fn triangle_front_facing_submission_order_xy(
 ///   ``0.0`` when the primitive is not a line or the engine does not define an interpolation.
 /// - `point_coord`: Coordinates within a rasterized point sprite (TTSL ``tt_PointCoord``), typically in \[0, 1\];
 ///   ``(0, 0)`` when the primitive is not a point or the engine does not define coordinates.
+/// - `preshaded`: The canvas cell was already filled at raster time by a constant material
+///   (see [`DrawBuffer::set_depth_fill`]); the material pass skips the fragment.
+/// - `uv_footprint`: Change of `u` and of `v` from one sample of `uv` to the next (see
+///   [`uv_footprint`]), used to pick a mip level; zero when the primitive does not provide it.
 #[derive(Clone, Copy, Debug)]
 pub struct PixInfo<InfoAccuracy: nalgebra_glm::Number> {
     pub uv: TVec2<InfoAccuracy>,
@@ -79,13 +94,15 @@ pub struct PixInfo<InfoAccuracy: nalgebra_glm::Number> {
     pub frag_pos: Vec2,
     pub normal: Vec3,
     pub view_pos: Vec3,
-    pub front_facing: bool,
     pub line_coord: f32,
     pub point_coord: Vec2,
-    pub material_id: usize,
-    pub primitive_id: usize,
-    pub node_id: usize,
-    pub geometry_id: usize,
+    pub material_id: u32,
+    pub primitive_id: u32,
+    pub node_id: u32,
+    pub geometry_id: u32,
+    pub front_facing: bool,
+    pub preshaded: bool,
+    pub uv_footprint: Vec2,
 }
 
 impl<T: nalgebra_glm::Number> Default for PixInfo<T> {
@@ -102,13 +119,15 @@ impl<T: nalgebra_glm::Number> PixInfo<T> {
             frag_pos: Vec2::zeros(),
             normal: Vec3::new(0.0, 0.0, 1.0),
             view_pos: Vec3::zeros(),
-            front_facing: true,
             line_coord: 0.0,
             point_coord: Vec2::zeros(),
             material_id: 0,
             primitive_id: 0,
             node_id: 0,
             geometry_id: 0,
+            front_facing: true,
+            preshaded: false,
+            uv_footprint: Vec2::zeros(),
         }
     }
     fn clear(&mut self) {
@@ -117,8 +136,10 @@ impl<T: nalgebra_glm::Number> PixInfo<T> {
         self.node_id = 0;
         self.geometry_id = 0;
         self.front_facing = true;
+        self.preshaded = false;
         self.line_coord = 0.0;
         self.point_coord = Vec2::zeros();
+        self.uv_footprint = Vec2::zeros();
     }
     pub fn set_uv(&mut self, uv: TVec2<T>) {
         self.uv = uv;
@@ -128,6 +149,42 @@ impl<T: nalgebra_glm::Number> PixInfo<T> {
     }
 }
 
+/// Texture footprint of a sample: the largest change of `u` and of `v` to the next column
+/// (`duv_dcol`) or to the other sample of the cell (`duv_dsample`, half a row down).
+#[inline]
+pub fn uv_footprint(duv_dcol: Vec2, duv_dsample: Vec2) -> Vec2 {
+    Vec2::new(
+        duv_dcol.x.abs().max(duv_dsample.x.abs()),
+        duv_dcol.y.abs().max(duv_dsample.y.abs()),
+    )
+}
+
+/// Fragment of the visibility-buffer mode: the triangle that covers the cell and the
+/// screen-space barycentric coordinates of the cell center in it.
+///
+/// The full [`PixInfo`] is rebuilt from the primitive by [`DrawBuffer::resolve_visibility`],
+/// once per visible fragment instead of once per rasterized one.
+#[derive(Clone, Copy, Debug)]
+pub struct VisibilitySample {
+    pub primitive_id: u32,
+    pub b1: f32,
+    pub b2: f32,
+}
+
+impl VisibilitySample {
+    /// Marks a slot whose [`PixInfo`] is already complete (cleared, resolved, or written
+    /// by a non-triangle primitive).
+    pub const RESOLVED: u32 = u32::MAX;
+
+    pub const fn resolved() -> Self {
+        VisibilitySample {
+            primitive_id: Self::RESOLVED,
+            b1: 0.0,
+            b2: 0.0,
+        }
+    }
+}
+
 #[derive(Clone, Copy, PartialEq, Debug)]
 pub struct Color {
     pub r: u8,
@@ -237,6 +294,176 @@ mod test_frag_pos_ndc {
     }
 }
 
+#[cfg(test)]
+mod test_fast_clear {
+    use super::*;
+
+    fn write(db: &mut DrawBuffer<2, f32>, row: usize, col: usize, depth: f32) {
+        db.set_depth_content(
+            row,
+            col,
+            depth,
+            Vec3::new(0.0, 0.0, 1.0),
+            Vec3::zeros(),
+            vec2(0.0, 0.0),
+            vec2(0.0, 0.0),
+            1,
+            2,
+            3,
+            4,
+            true,
+            0.0,
+            vec2(0.0, 0.0),
+        );
+    }
+
+    #[test]
+    fn fast_clear_resets_written_tiles() {
+        let mut db = DrawBuffer::<2, f32>::new(20, 30, 9999.0, false, false);
+        write(&mut db, 3, 4, 0.5);
+        write(&mut db, 3, 4, 0.25);
+        write(&mut db, 19, 29, 0.5);
+        assert_eq!(db.coarse.written_tiles().len(), 2);
+
+        let fresh = DrawBuffer::<2, f32>::new(20, 30, 9999.0, false, false);
+        for value in [9999.0, 1000.0] {
+            db.fast_clear(value);
+            assert!(db.coarse.written_tiles().is_empty());
+            for row in 0..20 {
+                for col in 0..30 {
+                    let cell = db.get_depth_buffer_cell(row, col);
+                    assert_eq!(cell.depth, [value; 2]);
+                    assert_eq!(cell.pixinfo, fresh.get_depth_buffer_cell(row, col).pixinfo);
+                    for layer in 0..2 {
+                        let pixinfo = db.get_pix_buffer_content_at_row_col(row, col, layer);
+                        assert_eq!(pixinfo.material_id, 0);
+                    }
+                }
+            }
+            write(&mut db, 10, 10, 0.5);
+        }
+    }
+}
+
+#[cfg(test)]
+mod test_sorted_material {
+    use super::*;
+
+    fn shade(sorted: bool) -> DrawBuffer<2, f32> {
+        let mut materials = MaterialBuffer::new(8, None);
+        for idx in 0..5u8 {
+            let front = RGBA::new(idx * 40, 0, 255 - idx * 40, 255);
+            let back = RGBA::new(0, idx * 50, 0, 255);
+            materials.add_static(front, back, idx + 1);
+        }
+        let textures = TextureBuffer::<256>::new(1);
+        let uvs = UVBuffer::new(1);
+        let primitives = PrimitiveBuffer::new(4);
+
+        let mut db = DrawBuffer::<2, f32>::new(12, 17, 9999.0, false, false);
+        for row in 0..12 {
+            for col in 0..17 {
+                // two fragments on most cells, with interleaved materials
+                for (depth, material_id) in [(0.5, (row * 3 + col) % 5), (0.25, (row + col) % 4)] {
+                    if (row + 2 * col) % 7 != 0 {
+                        db.set_depth_content(
+                            row,
+                            col,
+                            depth,
+                            Vec3::zeros(),
+                            Vec3::zeros(),
+                            vec2(0.0, 0.0),
+                            vec2(0.0, 0.0),
+                            1,
+                            1,
+                            material_id,
+                            0,
+                            true,
+                            0.0,
+                            vec2(0.0, 0.0),
+                        );
+                    }
+                }
+            }
+        }
+        if sorted {
+            apply_material_on_sorted(&mut db, &materials, &textures, &uvs, &primitives);
+        } else {
+            apply_material_on(&mut db, &materials, &textures, &uvs, &primitives);
+        }
+        db
+    }
+
+    #[test]
+    fn sorted_pass_matches_cell_order_pass() {
+        let expected = shade(false);
+        let db = shade(true);
+        for row in 0..12 {
+            for col in 0..17 {
+                let cell = db.get_canvas_cell(row, col);
+                let expected = expected.get_canvas_cell(row, col);
+                assert_eq!(cell.front_color, expected.front_color);
+                assert_eq!(cell.back_color, expected.back_color);
+                assert_eq!(cell.glyph, expected.glyph);
+            }
+        }
+        // one group per material slot; the last one ends with the canvas
+        assert_eq!(db.material_ends.len(), 9);
+        assert_eq!(db.material_ends[8] as usize, 12 * 17);
+    }
+}
+
+#[cfg(test)]
+mod test_resize {
+    use super::*;
+
+    #[test]
+    fn resize_keeps_allocations_when_shrinking() {
+        let mut db = DrawBuffer::<2, f32>::new(20, 30, 10.0, false, true);
+        db.set_visibility_mode(true);
+        let capacity = db.pixbuffer.capacity();
+
+        db.resize(5, 7, 1000.0);
+        assert_eq!((db.row_count, db.col_count), (5, 7));
+        assert_eq!(db.depthbuffer.len(), 35);
+        assert_eq!(db.pixbuffer.len(), 70);
+        assert_eq!(db.visibility.as_ref().map(|v| v.len()), Some(70));
+        assert_eq!(db.pixbuffer.capacity(), capacity);
+        assert_eq!(db.coarse.tile_count(), 1);
+        let cell = db.get_depth_buffer_cell(4, 6);
+        assert_eq!(cell.depth, [1000.0; 2]);
+        assert_eq!(cell.pixinfo, [68, 69]);
+        // same as a new buffer of that size
+        let fresh = DrawBuffer::<2, f32>::new(5, 7, 1000.0, false, true);
+        assert_eq!(db.cell_center_to_ndc(3, 2), fresh.cell_center_to_ndc(3, 2));
+
+        db.resize(40, 60, 10.0);
+        assert_eq!(db.canvas.len(), 2400);
+        assert!(db.pixbuffer.capacity() >= 4800);
+    }
+}
+
+#[cfg(test)]
+mod test_canvas_texels {
+    use super::*;
+
+    #[test]
+    fn test_cells_split_in_two_texels() {
+        let mut db = DrawBuffer::<1, f32>::new(2, 2, 10.0, false, true);
+        let red = Color::new(255, 0, 0, 255);
+        let blue = Color::new(0, 0, 255, 255);
+        db.set_canvas_content(0, 0, red, blue, HALF_UPPER_BLOCK);
+        db.set_canvas_content(0, 1, red, blue, HALF_LOWER_BLOCK);
+        db.set_canvas_content(1, 0, red, blue, FULL_BLOCK);
+        db.set_canvas_content(1, 1, red, blue, 40);
+
+        let texels: Vec<RGBA> = db.canvas_texels().collect();
+        let (r, b) = (RGBA::new(255, 0, 0, 255), RGBA::new(0, 0, 255, 255));
+        // bottom row of cells first, lower halves first
+        assert_eq!(texels, vec![r, b, r, b, b, r, r, b]);
+    }
+}
+
 #[cfg(test)]
 mod test_front_facing_winding {
     //! Documents the engine winding convention for [`super::triangle_front_facing_submission_order_xy`]:
@@ -369,7 +596,7 @@ impl CanvasCell {
 
 #[derive(Clone, Copy)]
 pub struct DepthBufferCell<A: Number, const L: usize> {
-    pub pixinfo: [usize; L], // referencing pixel info per index
+    pub pixinfo: [u32; L], // referencing pixel info per index
     pub depth: [A; L],
 }
 impl<DepthAccuracy: Number, const DEPTHLAYERCOUNT: usize> Default
@@ -394,6 +621,19 @@ impl<DepthAccuracy: Number, const DEPTHLAYERCOUNT: usize>
         self.depth[layer]
     }
 
+    /// Index in the pixel info buffer of `layer`, for the cell at `cell_idx`.
+    ///
+    /// With a single layer the pixel info is laid out like the cells, so the
+    /// indirection through `pixinfo` is skipped.
+    #[inline(always)]
+    pub fn pix_index(&self, cell_idx: usize, layer: usize) -> usize {
+        if DEPTHLAYERCOUNT == 1 {
+            cell_idx
+        } else {
+            self.pixinfo[layer] as usize
+        }
+    }
+
     fn new_set(value: DepthAccuracy) -> Self {
         DepthBufferCell {
             pixinfo: [0; DEPTHLAYERCOUNT],
@@ -408,14 +648,14 @@ impl<DepthAccuracy: Number, const DEPTHLAYERCOUNT: usize>
             .enumerate()
         {
             *d = value;
-            *p = idx + layeridx;
+            *p = (idx + layeridx) as u32;
         }
     }
 
     fn set_init_pix_ref(&mut self, idx: usize) {
         for layer in 0..DEPTHLAYERCOUNT {
             let lol = &mut (self.pixinfo[layer]);
-            *(lol) = idx + layer
+            *(lol) = (idx + layer) as u32
         }
     }
 }
@@ -435,12 +675,25 @@ pub const CANVAS_CELL_INIT: CanvasCell = CanvasCell {
     },
     glyph: 0,
 };
+/// What the depth writes of the raster store; see [`DrawBuffer::set_depth_pass`].
+#[derive(Clone, Copy, Debug, Default, PartialEq, Eq)]
+pub enum DepthPass {
+    /// depth test, then depth and pixel info writes
+    #[default]
+    Full,
+    /// depth test and depth write only
+    DepthOnly,
+    /// pixel info writes for the fragments at exactly the stored depth, once per cell
+    EqualDepth,
+}
+
 /// Stores the depth buffer, canvas, and pixel information for a drawing buffer.
 /// Template parameters are used to specify the number of depth layers and the accuracy of the depth buffer.
 pub struct DrawBuffer<const DEPTH_LAYER_COUNT: usize, DepthBufferAccuracy: Number> {
-    pub depthbuffer: Box<[DepthBufferCell<DepthBufferAccuracy, DEPTH_LAYER_COUNT>]>,
-    pub canvas: Box<[CanvasCell]>,
-    pub pixbuffer: Box<[PixInfo<f32>]>,
+    // vectors rather than boxed slices, so that a resize keeps the allocations
+    pub depthbuffer: Vec<DepthBufferCell<DepthBufferAccuracy, DEPTH_LAYER_COUNT>>,
+    pub canvas: Vec<CanvasCell>,
+    pub pixbuffer: Vec<PixInfo<f32>>,
     pub row_count: usize,
     pub col_count: usize,
     #[allow(dead_code)]
@@ -449,6 +702,24 @@ pub struct DrawBuffer<const DEPTH_LAYER_COUNT: usize, DepthBufferAccuracy: Numbe
     pub flip_x: bool,
     pub flip_y: bool,
     scale: Vec2,
+    /// Compact fragments of the visibility-buffer mode, indexed like `pixbuffer`;
+    /// `None` when the mode is off.
+    pub visibility: Option<Vec<VisibilitySample>>,
+    /// Farthest depth per tile, to reject hidden spans before the per-cell test.
+    pub coarse: CoarseDepth<DepthBufferAccuracy>,
+    depth_pass: DepthPass,
+    /// Depth of the cells outside the written tiles of `coarse`, which also hold a
+    /// cleared pixel info; `None` when unknown.
+    clean_depth: Option<DepthBufferAccuracy>,
+    /// Pixel info slots already written by the current [`DepthPass::EqualDepth`] pass.
+    equal_written: Box<[bool]>,
+    /// Scratch of [`apply_material_on_sorted`]: cell indices grouped by material, and
+    /// the end of each material's group.
+    material_order: Vec<u32>,
+    material_ends: Vec<u32>,
+    /// Cell written at raster time for each material id, for the constant materials
+    /// (see [`Self::set_constant_fills`]).
+    constant_fills: Vec<Option<CanvasCell>>,
 }
 fn flip_to_vec(flip_x: bool, flip_y: bool) -> Vec2 {
     let x = if flip_x { -1.0 } else { 1.0 };
@@ -466,15 +737,14 @@ impl<const L: usize, DEPTHACC: Number> DrawBuffer<L, DEPTHACC> {
         flip_y: bool,
     ) -> Self {
         // this store the depth for every cell, for every "layer" + and index
-        let mut depthbuffer =
-            vec![DepthBufferCell::new_set(default_depth); row_count * col_count].into_boxed_slice();
+        let mut depthbuffer = vec![DepthBufferCell::new_set(default_depth); row_count * col_count];
 
         // this store specific propertiees in RxCxL. The index inside the depth buffer is actually pointing into this
         // array.
         // reason is that we will often do "compare and move/swap"; by using the index I guess the swap is just "swaping u8, instead of swapping the whole struc";
 
         let inipix: PixInfo<f32> = PixInfo::new();
-        let pixbuffer = vec![inipix; row_count * col_count * L].into_boxed_slice();
+        let pixbuffer = vec![inipix; row_count * col_count * L];
 
         // we init the depth buffer with the pixel info.
         // each cell has L layers of depth,
@@ -489,7 +759,7 @@ impl<const L: usize, DEPTHACC: Number> DrawBuffer<L, DEPTHACC> {
         }
 
         // this stores the actually pixel "color pair + glyph"
-        let canvas = vec![CANVAS_CELL_INIT; row_count * col_count].into_boxed_slice();
+        let canvas = vec![CANVAS_CELL_INIT; row_count * col_count];
 
         DrawBuffer {
             depthbuffer,
@@ -502,8 +772,85 @@ impl<const L: usize, DEPTHACC: Number> DrawBuffer<L, DEPTHACC> {
             flip_x: flip_x,
             flip_y: flip_y,
             scale: flip_to_vec(flip_x, flip_y),
+            visibility: None,
+            coarse: CoarseDepth::new(row_count, col_count, default_depth),
+            depth_pass: DepthPass::Full,
+            clean_depth: Some(default_depth),
+            equal_written: Box::default(),
+            material_order: Vec::new(),
+            material_ends: Vec::new(),
+            constant_fills: Vec::new(),
         }
     }
+
+    /// Select what the following depth writes store.
+    ///
+    /// A depth pre-pass rasterizes everything once with [`DepthPass::DepthOnly`], then
+    /// again with [`DepthPass::EqualDepth`]: the pixel info is then written once per
+    /// cell, for the visible fragment only, instead of for every overdrawn one.
+    pub fn set_depth_pass(&mut self, pass: DepthPass) {
+        if pass == DepthPass::EqualDepth {
+            if self.equal_written.len() == self.pixbuffer.len() {
+                self.equal_written.fill(false);
+            } else {
+                self.equal_written = vec![false; self.pixbuffer.len()].into_boxed_slice();
+            }
+        }
+        self.depth_pass = pass;
+    }
+
+    #[inline]
+    pub fn depth_pass(&self) -> DepthPass {
+        self.depth_pass
+    }
+
+    /// Change the size of the buffer in place; the content is reset as by
+    /// [`Self::clear_depth`] and [`Self::clear_pixinfo`], with a blank canvas.
+    ///
+    /// The allocations are kept when shrinking and grow geometrically, so that
+    /// interactive resizing does not reallocate on every step.
+    pub fn resize(&mut self, row_count: usize, col_count: usize, default_depth: DEPTHACC) {
+        let cell_count = row_count * col_count;
+        self.depthbuffer
+            .resize(cell_count, DepthBufferCell::new_set(default_depth));
+        for (idx, depth_cell) in self.depthbuffer.iter_mut().enumerate() {
+            depth_cell.clear(default_depth, idx * L);
+        }
+        self.pixbuffer.resize(cell_count * L, PixInfo::new());
+        self.pixbuffer.fill(PixInfo::new());
+        self.canvas.resize(cell_count, CANVAS_CELL_INIT);
+        self.canvas.fill(CANVAS_CELL_INIT);
+        if let Some(visibility) = self.visibility.as_mut() {
+            visibility.resize(cell_count * L, VisibilitySample::resolved());
+            visibility.fill(VisibilitySample::resolved());
+        }
+
+        self.row_count = row_count;
+        self.col_count = col_count;
+        self.size = Vec2::new(col_count as f32, row_count as f32);
+        self.half_size = Vec2::new(col_count as f32 / 2.0, row_count as f32 / 2.0);
+        self.coarse = CoarseDepth::new(row_count, col_count, default_depth);
+        self.clean_depth = Some(default_depth);
+    }
+
+    /// Switch the visibility-buffer mode: triangles then only store depth, primitive id
+    /// and barycentric coordinates, and [`Self::resolve_visibility`] rebuilds the pixel
+    /// info of the visible fragments before shading.
+    pub fn set_visibility_mode(&mut self, enabled: bool) {
+        if enabled == self.visibility_enabled() {
+            return;
+        }
+        self.visibility = if enabled {
+            Some(vec![VisibilitySample::resolved(); self.pixbuffer.len()])
+        } else {
+            None
+        };
+    }
+
+    #[inline]
+    pub fn visibility_enabled(&self) -> bool {
+        self.visibility.is_some()
+    }
     pub fn set_flip_x(&mut self, v: bool) {
         self.flip_x = v;
         self.scale = flip_to_vec(self.flip_x, self.flip_y);
@@ -516,6 +863,72 @@ impl<const L: usize, DEPTHACC: Number> DrawBuffer<L, DEPTHACC> {
         for (idx, depth_cell) in self.depthbuffer.iter_mut().enumerate() {
             depth_cell.clear(value, idx * L);
         }
+        if let Some(visibility) = self.visibility.as_mut() {
+            visibility.fill(VisibilitySample::resolved());
+        }
+        self.coarse.clear(value);
+        self.clean_depth = Some(value);
+    }
+
+    /// Same as [`Self::clear_depth`] followed by [`Self::clear_pixinfo`], but only
+    /// resetting the tiles written since the previous clear, so that the cost follows
+    /// the drawn area rather than the buffer size.
+    ///
+    /// Falls back to the full clears when the depth value changes or when most of the
+    /// tiles were written.
+    pub fn fast_clear(&mut self, value: DEPTHACC) {
+        let written_count = self.coarse.written_tiles().len();
+        if self.clean_depth != Some(value) || written_count * 2 > self.coarse.tile_count() {
+            self.clear_depth(value);
+            self.clear_pixinfo();
+        } else {
+            for written_idx in 0..written_count {
+                let tile = self.coarse.written_tiles()[written_idx] as usize;
+                self.clear_tile(tile, value);
+            }
+            self.coarse.clear(value);
+        }
+        self.coarse.forget_written();
+    }
+
+    fn clear_tile(&mut self, tile: usize, value: DEPTHACC) {
+        let (rows, cols) = self.coarse.tile_cells(tile, self.row_count, self.col_count);
+        for row in rows.0..rows.1 {
+            for idx in row * self.col_count + cols.0..row * self.col_count + cols.1 {
+                self.depthbuffer[idx].clear(value, idx * L);
+                for pixinfo in &mut self.pixbuffer[idx * L..(idx + 1) * L] {
+                    pixinfo.clear();
+                }
+                if let Some(visibility) = self.visibility.as_mut() {
+                    visibility[idx * L..(idx + 1) * L].fill(VisibilitySample::resolved());
+                }
+            }
+        }
+    }
+
+    /// Coarse depth test: true when nothing at `nearest` or farther can land in the
+    /// cells `[row_start, row_end) x [col_start, col_end)`.
+    ///
+    /// Always false in the [`DepthPass::EqualDepth`] pass, where the visible fragments
+    /// sit exactly at the farthest depth of their tile.
+    #[inline]
+    pub fn coarse_rejects(
+        &mut self,
+        rows: (usize, usize),
+        cols: (usize, usize),
+        nearest: DEPTHACC,
+    ) -> bool {
+        if self.depth_pass == DepthPass::EqualDepth {
+            return false;
+        }
+        self.coarse.rejects(
+            &self.depthbuffer,
+            self.row_count,
+            self.col_count,
+            rows,
+            cols,
+            nearest,
+        )
     }
     pub fn clear_pixinfo(&mut self) {
         for pixinfo in self.pixbuffer.iter_mut() {
@@ -571,14 +984,45 @@ impl<const L: usize, DEPTHACC: Number> DrawBuffer<L, DEPTHACC> {
         col: usize,
         layer_idx: usize,
     ) -> &PixInfo<f32> {
-        let depth_buffer_cell = self.depthbuffer[row * self.col_count + col];
+        let cell_idx = row * self.col_count + col;
+        let depth_buffer_cell = &self.depthbuffer[cell_idx];
 
-        (&self.pixbuffer[depth_buffer_cell.pixinfo[layer_idx]]) as _
+        (&self.pixbuffer[depth_buffer_cell.pix_index(cell_idx, layer_idx)]) as _
     }
     pub fn get_canvas_cell(&self, row: usize, col: usize) -> CanvasCell {
         self.canvas[row * self.col_count + col]
     }
 
+    /// The canvas as `col_count` x `2 * row_count` texels, bottom row first like
+    /// the texture rows: each cell gives an upper and a lower texel.
+    ///
+    /// Half and full blocks split a cell between its front and back colors; any
+    /// other glyph is reduced to its back color.
+    pub fn canvas_texels(&self) -> impl Iterator<Item = RGBA> + '_ {
+        let to_rgba = |c: &Color| RGBA::new(c.r, c.g, c.b, c.a);
+        self.canvas
+            .chunks_exact(self.col_count.max(1))
+            .rev()
+            .flat_map(move |row| {
+                let halves = move |lower: bool| {
+                    row.iter().map(move |cell| {
+                        let front = match cell.glyph {
+                            FULL_BLOCK => true,
+                            HALF_UPPER_BLOCK => !lower,
+                            HALF_LOWER_BLOCK => lower,
+                            _ => false,
+                        };
+                        if front {
+                            to_rgba(&cell.front_color)
+                        } else {
+                            to_rgba(&cell.back_color)
+                        }
+                    })
+                };
+                halves(true).chain(halves(false))
+            })
+    }
+
     pub fn get_min_max_depth(&self, layer: usize) -> (DEPTHACC, DEPTHACC) {
         let mut min_value: DEPTHACC = DEPTHACC::max_value();
         let mut max_value: DEPTHACC = DEPTHACC::min_value();
@@ -612,6 +1056,66 @@ impl<const L: usize, DEPTHACC: Number> DrawBuffer<L, DEPTHACC> {
         stuff.glyph = glyph;
     }
 
+    /// Depth test of a fragment at `(row, col)`, according to the current
+    /// [`DepthPass`]. Returns the pixel info slot to write, if any.
+    #[inline]
+    fn insert_depth(&mut self, row: usize, col: usize, depth: DEPTHACC) -> Option<usize> {
+        match self.depth_pass {
+            DepthPass::Full => self.write_depth(row, col, depth),
+            DepthPass::DepthOnly => {
+                self.write_depth(row, col, depth);
+                None
+            }
+            DepthPass::EqualDepth => self.match_depth(row, col, depth),
+        }
+    }
+
+    /// Slot of the first layer of the cell at `(row, col)` holding exactly `depth`
+    /// and not written yet since [`Self::set_depth_pass`].
+    #[inline]
+    fn match_depth(&mut self, row: usize, col: usize, depth: DEPTHACC) -> Option<usize> {
+        let point = row * self.col_count + col;
+        let the_cell = &self.depthbuffer[point];
+        let pix_index = (0..L)
+            .filter(|&layer| depth == the_cell.depth[layer])
+            .map(|layer| the_cell.pix_index(point, layer))
+            .find(|&pix_index| !self.equal_written[pix_index])?;
+        self.equal_written[pix_index] = true;
+        self.coarse.touch(row, col);
+        Some(pix_index)
+    }
+
+    /// Insert `depth` into the layers of the cell at `(row, col)`.
+    ///
+    /// The farther layers are shifted down one level and the last one is dropped; its
+    /// pixel info slot is recycled for the new fragment. Returns that slot, or `None`
+    /// when the fragment is behind every layer.
+    #[inline]
+    fn write_depth(&mut self, row: usize, col: usize, depth: DEPTHACC) -> Option<usize> {
+        let point = row * self.col_count + col;
+        let the_cell = &mut self.depthbuffer[point];
+        if L == 1 {
+            // single layer: no shifting and the pixel info slot is the cell itself
+            if depth < the_cell.depth[0] {
+                the_cell.depth[0] = depth;
+                self.coarse.touch(row, col);
+                return Some(point);
+            }
+            return None;
+        }
+        let the_layer = (0..L).find(|&layer| depth < the_cell.depth[layer])?;
+
+        let last_pix_index = the_cell.pixinfo[L - 1];
+        for moving_layer_idx in (the_layer + 1..L).rev() {
+            the_cell.pixinfo[moving_layer_idx] = the_cell.pixinfo[moving_layer_idx - 1];
+            the_cell.depth[moving_layer_idx] = the_cell.depth[moving_layer_idx - 1];
+        }
+        the_cell.pixinfo[the_layer] = last_pix_index;
+        the_cell.depth[the_layer] = depth;
+        self.coarse.touch(row, col);
+        Some(last_pix_index as usize)
+    }
+
     /// The set_depth_content function is responsible for setting a new depth value into a
     /// layered depth buffer while ensuring that the existing values are correctly shifted to
     /// maintain the order.
@@ -632,79 +1136,173 @@ impl<const L: usize, DEPTHACC: Number> DrawBuffer<L, DEPTHACC> {
         front_facing: bool,
         line_coord: f32,
         point_coord: Vec2,
-    ) {
+    ) -> Option<usize> {
         let frag_pos_ndc = self.cell_center_to_ndc(col, row);
-        let the_point = row * self.col_count + col;
-        let mut the_layer = 0; // starting at layer 0
-
-        let the_cell = &mut self.depthbuffer[the_point];
-        while the_layer < L {
-            let _pix_info_at_layer = self.pixbuffer[the_cell.pixinfo[the_layer]];
-
-            let depth_at_layer = the_cell.depth[the_layer];
-
-            if depth < depth_at_layer {
-                // we are closer to this level of depth. So we can locate the new
-                // value here.
-                // the existing value need to be pushed "down the layers";
-                // Like, if we currently set layer 1;
-                // then the new value of the layer 2 is the previous layer1 ; the new of 3 is 2 etc.. :
-                // like a shifting operation of +1 index.
-                // the last element will be "droped" ; so we keep the pixel idx of the last layer before doing anything
-                if the_layer <= L {
-                    let last_pix_index = the_cell.pixinfo[L - 1];
-                    for moving_layer_idx in (the_layer + 1..L).rev() {
-                        the_cell.pixinfo[moving_layer_idx] = the_cell.pixinfo[moving_layer_idx - 1];
-                        the_cell.depth[moving_layer_idx] = the_cell.depth[moving_layer_idx - 1];
-                    }
+        let pix_index = self.insert_depth(row, col, depth)?;
+        if let Some(visibility) = self.visibility.as_mut() {
+            visibility[pix_index] = VisibilitySample::resolved();
+        }
+
+        let pix_info_dest = &mut self.pixbuffer[pix_index];
+        pix_info_dest.normal = normal;
+        pix_info_dest.view_pos = view_pos;
+        pix_info_dest.front_facing = front_facing;
+        pix_info_dest.line_coord = line_coord;
+        pix_info_dest.point_coord = point_coord;
+        pix_info_dest.primitive_id = primitive_id as u32;
+        pix_info_dest.geometry_id = geom_id as u32;
+        pix_info_dest.node_id = node_id as u32;
+        pix_info_dest.material_id = material_id as u32;
+        pix_info_dest.preshaded = false;
+
+        // Store the vectors
+        pix_info_dest.uv = uv;
+        pix_info_dest.uv_1 = uv_1;
+        pix_info_dest.uv_footprint = Vec2::zeros();
+        pix_info_dest.frag_pos = frag_pos_ndc;
+        Some(pix_index)
+    }
+
+    /// Set the cell each material id fills at raster time, `None` for the materials that
+    /// need the material pass; an empty table turns the raster-time fill off.
+    pub fn set_constant_fills(&mut self, fills: Vec<Option<CanvasCell>>) {
+        self.constant_fills = fills;
+    }
 
-                    // now I grab the pix idx for me :)
-                    the_cell.pixinfo[the_layer] = last_pix_index;
-
-                    // and now I can set the content at the right location
-                    let pix_info_dest = &mut (self.pixbuffer[last_pix_index]);
-                    the_cell.depth[the_layer] = depth; // Set the depth
-                    pix_info_dest.normal = normal;
-                    pix_info_dest.view_pos = view_pos;
-                    pix_info_dest.front_facing = front_facing;
-                    pix_info_dest.line_coord = line_coord;
-                    pix_info_dest.point_coord = point_coord;
-                    pix_info_dest.primitive_id = primitive_id;
-                    pix_info_dest.geometry_id = geom_id;
-                    pix_info_dest.node_id = node_id;
-                    pix_info_dest.material_id = material_id;
-
-                    // Store the vectors
-                    pix_info_dest.uv = uv;
-                    pix_info_dest.uv_1 = uv_1;
-                    pix_info_dest.frag_pos = frag_pos_ndc;
-
-                    return;
-                } else {
-                    // we are at the last layer. There is no way to push down anything; we just will replace.
-                    the_cell.depth[the_layer] = depth; // Set the depth
-                    let pix_info_dest = (self.pixbuffer[the_cell.pixinfo[the_layer]]).borrow_mut();
-                    pix_info_dest.normal = normal;
-                    pix_info_dest.view_pos = view_pos;
-                    pix_info_dest.front_facing = front_facing;
-                    pix_info_dest.line_coord = line_coord;
-                    pix_info_dest.point_coord = point_coord;
-                    pix_info_dest.primitive_id = primitive_id;
-                    pix_info_dest.geometry_id = geom_id;
-                    pix_info_dest.node_id = node_id;
-                    pix_info_dest.material_id = material_id;
-
-                    // Store the vectors
-                    pix_info_dest.uv = uv;
-                    pix_info_dest.uv_1 = uv_1;
-                    pix_info_dest.frag_pos = frag_pos_ndc;
-
-                    return;
+    /// The cell the fragments of `material_id` fill at raster time, if any. Only single
+    /// layer buffers without visibility buffer fill at raster time: deeper layers are
+    /// blended in the material pass, and the visibility buffer defers every write.
+    #[inline]
+    pub fn constant_fill(&self, material_id: usize) -> Option<CanvasCell> {
+        if L != 1 || self.visibility.is_some() {
+            return None;
+        }
+        self.constant_fills.get(material_id).copied().flatten()
+    }
+
+    /// Fast path of [`Self::set_depth_content`] for the fragments of a constant material
+    /// (see [`Self::constant_fill`]): when the fragment passes the depth test, only its
+    /// ids are stored and the canvas cell is written right away, so the interpolated
+    /// attributes and the material pass are skipped.
+    #[inline]
+    pub fn set_depth_fill(
+        &mut self,
+        row: usize,
+        col: usize,
+        depth: DEPTHACC,
+        prim_ref: &PrimitivReferences,
+        fill: CanvasCell,
+    ) {
+        let Some(pix_index) = self.insert_depth(row, col, depth) else {
+            return;
+        };
+        let pix_info_dest = &mut self.pixbuffer[pix_index];
+        pix_info_dest.primitive_id = prim_ref.primitive_id as u32;
+        pix_info_dest.geometry_id = prim_ref.geometry_id as u32;
+        pix_info_dest.node_id = prim_ref.node_id as u32;
+        pix_info_dest.material_id = prim_ref.material_id as u32;
+        pix_info_dest.preshaded = true;
+        self.canvas[row * self.col_count + col] = fill;
+    }
+
+    /// Visibility-buffer counterpart of [`Self::set_depth_content`] for triangles: only
+    /// the depth, the primitive id and the barycentric coordinates `(b1, b2)` of the cell
+    /// center are stored. Requires [`Self::set_visibility_mode`].
+    #[inline]
+    pub fn set_depth_visibility(
+        &mut self,
+        row: usize,
+        col: usize,
+        depth: DEPTHACC,
+        primitive_id: usize,
+        b1: f32,
+        b2: f32,
+    ) {
+        if let Some(pix_index) = self.insert_depth(row, col, depth) {
+            if let Some(visibility) = self.visibility.as_mut() {
+                visibility[pix_index] = VisibilitySample {
+                    primitive_id: primitive_id as u32,
+                    b1,
+                    b2,
+                };
+            }
+        }
+    }
+
+    /// Rebuild the pixel info of the fragments stored by [`Self::set_depth_visibility`].
+    ///
+    /// Attributes are interpolated from the triangle vertices and perspective-corrected
+    /// exactly like the regular raster, including the upper (`uv`) and lower (`uv_1`)
+    /// samples of the cell. Does nothing when the mode is off.
+    pub fn resolve_visibility(&mut self, primitive_buffer: &PrimitiveBuffer) {
+        let Some(mut visibility) = self.visibility.take() else {
+            return;
+        };
+        for (cell_idx, depth_cell) in self.depthbuffer.iter().enumerate() {
+            for layer in 0..L {
+                let pix_index = depth_cell.pix_index(cell_idx, layer);
+                let sample = visibility[pix_index];
+                if sample.primitive_id == VisibilitySample::RESOLVED {
+                    continue;
                 }
-            } else {
-                the_layer += 1;
+                visibility[pix_index] = VisibilitySample::resolved();
+
+                let primitive_id = sample.primitive_id as usize;
+                if primitive_id >= primitive_buffer.current_size {
+                    continue;
+                }
+                let PrimitiveElements::Triangle3D(t) = &primitive_buffer.content[primitive_id]
+                else {
+                    continue;
+                };
+                let Some(plane) = BarycentricPlane::new(&t.pa, &t.pb, &t.pc) else {
+                    continue;
+                };
+
+                // the cell holds two samples, a quarter row above and below its center
+                let (db1, db2) = plane.row_step();
+                let upper = plane.interpolate(
+                    &t.pa,
+                    &t.pb,
+                    &t.pc,
+                    sample.b1 - 0.25 * db1,
+                    sample.b2 - 0.25 * db2,
+                );
+                let lower = plane.interpolate(
+                    &t.pa,
+                    &t.pb,
+                    &t.pc,
+                    sample.b1 + 0.25 * db1,
+                    sample.b2 + 0.25 * db2,
+                );
+                let upper_attr = upper * (1.0f32 / upper.pos.w);
+                let lower_attr = lower * (1.0f32 / lower.pos.w);
+                // derivative of the upper uv along the row, as in the raster
+                let (dc1, dc2) = plane.col_step();
+                let col_step = (t.pb - t.pa) * dc1 + (t.pc - t.pa) * dc2;
+                let duv_dcol =
+                    (col_step.uv - upper_attr.uv * col_step.pos.w) * (1.0f32 / upper.pos.w);
+
+                let frag_pos =
+                    self.cell_center_to_ndc(cell_idx % self.col_count, cell_idx / self.col_count);
+                let prim_ref = &t.primitive_reference;
+                let pix_info_dest = &mut self.pixbuffer[pix_index];
+                pix_info_dest.normal = upper_attr.normal;
+                pix_info_dest.view_pos = upper_attr.view_pos;
+                pix_info_dest.front_facing = plane.front_facing;
+                pix_info_dest.line_coord = 0.0;
+                pix_info_dest.point_coord = Vec2::zeros();
+                pix_info_dest.primitive_id = prim_ref.primitive_id as u32;
+                pix_info_dest.geometry_id = prim_ref.geometry_id as u32;
+                pix_info_dest.node_id = prim_ref.node_id as u32;
+                pix_info_dest.material_id = prim_ref.material_id as u32;
+                pix_info_dest.uv = upper_attr.uv;
+                pix_info_dest.uv_1 = lower_attr.uv;
+                pix_info_dest.uv_footprint = uv_footprint(duv_dcol, lower_attr.uv - upper_attr.uv);
+                pix_info_dest.frag_pos = frag_pos;
             }
         }
+        self.visibility = Some(visibility);
     }
 }
 
@@ -716,14 +1314,16 @@ pub fn apply_material_on<const TEXTURESIZE: usize, const DEPTHLAYER: usize>(
     uv_buffer: &UVBuffer<f32>,
     primitive_buffer: &PrimitiveBuffer,
 ) {
+    draw_buffer.resolve_visibility(primitive_buffer);
     bump_material_apply_generation_for_pass();
-    for (depth_cell, canvascell) in draw_buffer
+    for (cell_idx, (depth_cell, canvascell)) in draw_buffer
         .depthbuffer
         .iter()
         .zip(draw_buffer.canvas.iter_mut())
+        .enumerate()
     {
         for depth_layer in (0..DEPTHLAYER).rev() {
-            let pixinfo = draw_buffer.pixbuffer[depth_cell.pixinfo[depth_layer]];
+            let pixinfo = &draw_buffer.pixbuffer[depth_cell.pix_index(cell_idx, depth_layer)];
 
             apply_material(
                 pixinfo,
@@ -739,9 +1339,96 @@ pub fn apply_material_on<const TEXTURESIZE: usize, const DEPTHLAYER: usize>(
     }
 }
 
+/// Applies the material to every pixel like [`apply_material_on`], but material by
+/// material: the cells are counting-sorted on the material id of each layer, then
+/// every material shades its whole group in one go (see [`apply_material_bucket`]).
+///
+/// Scenes with many materials spread across the canvas keep one material's code and
+/// data hot at a time, instead of switching at every cell. The layers are still
+/// shaded from the back one to layer 0, so blending gives the same canvas.
+pub fn apply_material_on_sorted<const TEXTURESIZE: usize, const DEPTHLAYER: usize>(
+    draw_buffer: &mut DrawBuffer<DEPTHLAYER, f32>,
+    material_buffer: &MaterialBuffer,
+    texture_buffer: &TextureBuffer<TEXTURESIZE>,
+    uv_buffer: &UVBuffer<f32>,
+    primitive_buffer: &PrimitiveBuffer,
+) {
+    draw_buffer.resolve_visibility(primitive_buffer);
+    bump_material_apply_generation_for_pass();
+    let DrawBuffer {
+        depthbuffer,
+        canvas,
+        pixbuffer,
+        material_order,
+        material_ends,
+        ..
+    } = draw_buffer;
+    let material_count = material_buffer.mats.len();
+    material_order.resize(depthbuffer.len(), 0);
+
+    for depth_layer in (0..DEPTHLAYER).rev() {
+        // counts shifted by one, then their prefix sum: the start of each group
+        material_ends.clear();
+        material_ends.resize(material_count + 1, 0);
+        for (cell_idx, depth_cell) in depthbuffer.iter().enumerate() {
+            let pixinfo = &pixbuffer[depth_cell.pix_index(cell_idx, depth_layer)];
+            if !pixinfo.preshaded {
+                material_ends[pixinfo.material_id as usize + 1] += 1;
+            }
+        }
+        for material_id in 1..=material_count {
+            material_ends[material_id] += material_ends[material_id - 1];
+        }
+        // filling a group moves its start to its end
+        for (cell_idx, depth_cell) in depthbuffer.iter().enumerate() {
+            let pixinfo = &pixbuffer[depth_cell.pix_index(cell_idx, depth_layer)];
+            if pixinfo.preshaded {
+                continue;
+            }
+            let slot = &mut material_ends[pixinfo.material_id as usize];
+            material_order[*slot as usize] = cell_idx as u32;
+            *slot += 1;
+        }
+
+        let mut start = 0;
+        for (material_id, &end) in material_ends[..material_count].iter().enumerate() {
+            let end = end as usize;
+            if end > start {
+                apply_material_bucket(
+                    material_id,
+                    depth_layer,
+                    &material_order[start..end],
+                    material_buffer,
+                    texture_buffer,
+                    uv_buffer,
+                    primitive_buffer,
+                    depthbuffer,
+                    pixbuffer,
+                    canvas,
+                );
+            }
+            start = end;
+        }
+    }
+}
+
 use rayon::prelude::*;
 
+/// Load balance of a parallel material pass.
+#[derive(Clone, Debug, Default, PartialEq, Eq)]
+pub struct MaterialPassStats {
+    /// wall-clock time of the pass, in nanoseconds
+    pub wall_ns: u64,
+    /// time each thread of the pool spent shading, in nanoseconds
+    pub busy_ns: Vec<u64>,
+    /// work items the cells were split into
+    pub chunks: usize,
+}
+
 /// Applies the material to every pixel in parallel using the given Rayon pool.
+///
+/// The cells are split into small row chunks (see [`chunk_rows`]) that idle threads
+/// steal, so that a few expensive rows do not hold the whole pass on one thread.
 pub fn apply_material_on_parallel<const TEXTURESIZE: usize, const DEPTHLAYER: usize>(
     pool: &rayon::ThreadPool,
     draw_buffer: &mut DrawBuffer<DEPTHLAYER, f32>,
@@ -749,8 +1436,13 @@ pub fn apply_material_on_parallel<const TEXTURESIZE: usize, const DEPTHLAYER: us
     texture_buffer: &TextureBuffer<TEXTURESIZE>,
     uv_buffer: &UVBuffer<f32>,
     primitive_buffer: &PrimitiveBuffer,
-) {
+) -> MaterialPassStats {
+    let pass_start = Instant::now();
+    draw_buffer.resolve_visibility(primitive_buffer);
     bump_material_apply_generation_for_pass();
+    let thread_count = pool.current_num_threads();
+    let busy_ns: Vec<AtomicU64> = (0..thread_count).map(|_| AtomicU64::new(0)).collect();
+    let mut chunks = 0;
     pool.install(|| {
         let row_count = draw_buffer.row_count;
         let col_count = draw_buffer.col_count;
@@ -759,21 +1451,27 @@ pub fn apply_material_on_parallel<const TEXTURESIZE: usize, const DEPTHLAYER: us
             return;
         }
 
-        let threads = pool.current_num_threads().max(1);
-        let chunk_rows = (row_count + threads - 1) / threads;
+        let chunk_rows = chunk_rows(row_count, thread_count);
         let chunk_size = chunk_rows.saturating_mul(col_count).max(1);
+        chunks = len.div_ceil(chunk_size);
 
         let pixbuffer = &draw_buffer.pixbuffer;
-        let depth_sl = draw_buffer.depthbuffer.as_ref();
-        let canvas_sl = draw_buffer.canvas.as_mut();
+        let depth_sl = draw_buffer.depthbuffer.as_slice();
+        let canvas_sl = draw_buffer.canvas.as_mut_slice();
 
         depth_sl
             .par_chunks(chunk_size)
             .zip(canvas_sl.par_chunks_mut(chunk_size))
-            .for_each(|(depth_chunk, canvas_chunk)| {
-                for (depth_cell, canvas_cell) in depth_chunk.iter().zip(canvas_chunk.iter_mut()) {
+            .enumerate()
+            .for_each(|(chunk_idx, (depth_chunk, canvas_chunk))| {
+                let chunk_start = Instant::now();
+                let first_cell = chunk_idx * chunk_size;
+                for (offset, (depth_cell, canvas_cell)) in
+                    depth_chunk.iter().zip(canvas_chunk.iter_mut()).enumerate()
+                {
                     for depth_layer in (0..DEPTHLAYER).rev() {
-                        let pixinfo = pixbuffer[depth_cell.pixinfo[depth_layer]];
+                        let pixinfo =
+                            &pixbuffer[depth_cell.pix_index(first_cell + offset, depth_layer)];
 
                         apply_material(
                             pixinfo,
@@ -787,8 +1485,16 @@ pub fn apply_material_on_parallel<const TEXTURESIZE: usize, const DEPTHLAYER: us
                         );
                     }
                 }
+                let thread_idx = rayon::current_thread_index().unwrap_or(0);
+                busy_ns[thread_idx % thread_count]
+                    .fetch_add(chunk_start.elapsed().as_nanos() as u64, Ordering::Relaxed);
             });
     });
+    MaterialPassStats {
+        wall_ns: pass_start.elapsed().as_nanos() as u64,
+        busy_ns: busy_ns.into_iter().map(AtomicU64::into_inner).collect(),
+        chunks,
+    }
 }
 
 fn color_to_vec4(color: &Color) -> Vec4 {
@@ -801,13 +1507,14 @@ fn color_to_vec4(color: &Color) -> Vec4 {
 }
 
 pub fn apply_material_transparent_on<const TEXTURESIZE: usize, const DEPTHLAYER: usize>(
-    transparent_buffer: &DrawBuffer<DEPTHLAYER, f32>,
+    transparent_buffer: &mut DrawBuffer<DEPTHLAYER, f32>,
     opaque_buffer: &mut DrawBuffer<1, f32>,
     material_buffer: &MaterialBuffer,
     texture_buffer: &TextureBuffer<TEXTURESIZE>,
     uv_buffer: &UVBuffer<f32>,
     primitive_buffer: &PrimitiveBuffer,
 ) {
+    transparent_buffer.resolve_visibility(primitive_buffer);
     bump_material_apply_generation_for_pass();
     for idx in 0..transparent_buffer.depthbuffer.len() {
         let trans_cell = transparent_buffer.depthbuffer[idx];
@@ -815,7 +1522,7 @@ pub fn apply_material_transparent_on<const TEXTURESIZE: usize, const DEPTHLAYER:
         let dst_cell = &mut opaque_buffer.canvas[idx];
 
         for depth_layer in (0..DEPTHLAYER).rev() {
-            let pixinfo = transparent_buffer.pixbuffer[trans_cell.pixinfo[depth_layer]];
+            let pixinfo = &transparent_buffer.pixbuffer[trans_cell.pix_index(idx, depth_layer)];
             let trans_depth = trans_cell.depth[depth_layer];
             if trans_depth >= opaque_depth {
                 continue;
@@ -832,7 +1539,7 @@ pub fn apply_material_transparent_on<const TEXTURESIZE: usize, const DEPTHLAYER:
                 depth_layer,
                 &mut src_cell,
             );
-            let mat = &material_buffer.mats[pixinfo.material_id];
+            let mat = &material_buffer.mats[pixinfo.material_id as usize];
             let src_front = color_to_vec4(&src_cell.front_color);
             dst_cell.front_color = blend_front(&dst_cell.front_color, &src_front, mat.blend_mode());
             if mat.glyph_policy() == GlyphPolicy::ReplaceFromShader {
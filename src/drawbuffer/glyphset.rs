@@ -24,13 +24,19 @@ pub const GLYPH_STATIC_STR: [&str; 256] = [
 pub const SPACE: u8 = 1;
 pub const HALF_UPPER_BLOCK: u8 = 95;
 pub const HALF_LOWER_BLOCK: u8 = 99;
+pub const FULL_BLOCK: u8 = 103;
 
-/// return the first index of the glyph in the GLYPH_STATIC_STR array
-pub fn find_glyph_index(glyph: char) -> i8 {
-    let glyph_str = glyph.to_string();
+/// The first index of the glyph in the GLYPH_STATIC_STR array, if any.
+pub fn glyph_position(glyph: char) -> Option<u8> {
+    let mut utf8 = [0u8; 4];
+    let glyph_str: &str = glyph.encode_utf8(&mut utf8);
     GLYPH_STATIC_STR
         .iter()
         .position(|&g| g == glyph_str)
-        .map(|index| index as i8)
-        .unwrap_or(-1)
+        .map(|index| index as u8)
+}
+
+/// return the first index of the glyph in the GLYPH_STATIC_STR array
+pub fn find_glyph_index(glyph: char) -> i8 {
+    glyph_position(glyph).map(|index| index as i8).unwrap_or(-1)
 }
@@ -5,16 +5,18 @@ use pyo3::{
     prelude::*,
     types::{PyList, PyTuple},
 };
-use rayon::ThreadPool;
-use std::sync::Arc;
 pub mod drawbuffer;
 pub mod blend;
+pub mod coarse_depth;
 use drawbuffer::*;
 use pyo3::types::PyDict;
 pub mod glyphset;
 use glyphset::*;
 pub mod segment_cache;
-use crate::utils::{convert_glm_vec2, convert_glm_vec3};
+use crate::utils::{
+    convert_glm_vec2, convert_glm_vec3,
+    engine_pool::{build_pool, PoolChoice},
+};
 use segment_cache::*;
 
 #[pyclass]
@@ -24,10 +26,11 @@ pub struct DrawingBufferPy {
     max_row: usize,
     max_col: usize,
 
-    /// When `Some(n)`, parallel material shading uses `n` Rayon threads; `None` means serial-only.
-    #[pyo3(get)]
-    pub material_parallel_threads: Option<usize>,
-    pub(crate) material_pool: Option<Arc<ThreadPool>>,
+    /// Pool of the parallel material shading: serial, the shared engine pool, or a
+    /// pool of its own.
+    pub(crate) material_pool: PoolChoice,
+    /// Load balance of the last parallel material pass.
+    pub(crate) material_stats: MaterialPassStats,
 
     segment_class: Py<PyAny>,
     style_class: Py<PyAny>,
@@ -39,26 +42,16 @@ pub struct DrawingBufferPy {
     pub default_segment: Py<PyAny>,
 }
 
-fn build_material_thread_pool(num_threads: usize) -> Arc<ThreadPool> {
-    Arc::new(
-        rayon::ThreadPoolBuilder::new()
-            .num_threads(num_threads)
-            .build()
-            .expect("Failed to build material thread pool"),
-    )
-}
-
-/// Interprets optional kwarg from Python: omitted → 8 threads; explicit `None` → serial;
-/// `0` → serial; `n >= 1` → pool with `n` threads.
-fn material_parallelism_from_py(spec: Option<Option<usize>>) -> (Option<usize>, Option<Arc<ThreadPool>>) {
+/// Interprets optional kwarg from Python: omitted → the shared engine pool; explicit
+/// `None` → serial; `0` → serial; `n >= 1` → a pool of its own with `n` threads.
+fn material_parallelism_from_py(spec: Option<Option<usize>>) -> PoolChoice {
     match spec {
-        None => {
-            let n = 8;
-            (Some(n), Some(build_material_thread_pool(n)))
-        }
-        Some(None) => (None, None),
-        Some(Some(0)) => (None, None),
-        Some(Some(n)) => (Some(n), Some(build_material_thread_pool(n))),
+        None => PoolChoice::Engine,
+        Some(None) => PoolChoice::Serial,
+        Some(Some(0)) => PoolChoice::Serial,
+        Some(Some(n)) => PoolChoice::Dedicated(
+            build_pool(n, "tt3de-material").expect("Failed to build material thread pool"),
+        ),
     }
 }
 
@@ -80,7 +73,7 @@ impl DrawingBufferPy {
             n if n > 0 => Some(Some(n as usize)),
             _ => {
                 return Err(PyValueError::new_err(
-                    "material_parallel_threads must be -1 (default 8 threads), 0 (serial), or a positive count",
+                    "material_parallel_threads must be -1 (default, shared engine pool), 0 (serial), or a positive count",
                 ));
             }
         };
@@ -103,14 +96,14 @@ impl DrawingBufferPy {
             &segment_class,
             &style_class,
         );
-        let (material_parallel_threads, material_pool) = material_parallelism_from_py(spec);
+        let material_pool = material_parallelism_from_py(spec);
         Ok(DrawingBufferPy {
             opaque_db: DrawBuffer::new(max_row, max_col, 10.0, flip_x, flip_y),
             transparent_db: DrawBuffer::new(max_row, max_col, 10.0, flip_x, flip_y),
             max_row,
             max_col,
-            material_parallel_threads,
             material_pool,
+            material_stats: MaterialPassStats::default(),
             segment_class: segment_class.into(),
             style_class: style_class.into(),
             color_class: color_class.into(),
@@ -120,6 +113,19 @@ impl DrawingBufferPy {
         })
     }
 
+    /// Threads of the parallel material shading; `None` when serial-only.
+    #[getter]
+    pub fn material_parallel_threads(&self) -> Option<usize> {
+        self.material_pool.thread_count()
+    }
+
+    /// (wall time, busy time of every pool thread, work items) of the last parallel
+    /// material pass, times in nanoseconds.
+    pub fn material_pass_stats(&self) -> (u64, Vec<u64>, usize) {
+        let stats = &self.material_stats;
+        (stats.wall_ns, stats.busy_ns.clone(), stats.chunks)
+    }
+
     pub fn get_cache_size(&self) -> usize {
         self.seg_cache.get_cache_size()
     }
@@ -142,6 +148,37 @@ impl DrawingBufferPy {
         self.transparent_db.set_flip_y(v);
     }
 
+    /// Visibility-buffer mode: triangles only store depth, primitive id and barycentric
+    /// coordinates, the pixel info of the visible fragments is rebuilt before shading.
+    pub fn get_visibility_mode(&self) -> bool {
+        self.opaque_db.visibility_enabled()
+    }
+    pub fn set_visibility_mode(&mut self, enabled: bool) {
+        self.opaque_db.set_visibility_mode(enabled);
+        self.transparent_db.set_visibility_mode(enabled);
+    }
+
+    /// (tested, rejected, cells skipped) by the coarse depth test of both passes
+    /// since the last clear.
+    pub fn coarse_depth_stats(&self) -> (usize, usize, usize) {
+        let opaque = self.opaque_db.coarse.stats;
+        let transparent = self.transparent_db.coarse.stats;
+        (
+            opaque.tested + transparent.tested,
+            opaque.rejected + transparent.rejected,
+            opaque.cells_skipped + transparent.cells_skipped,
+        )
+    }
+
+    /// Resize both buffers in place, keeping the thread pool and the segment cache.
+    /// The content is reset to a depth of 10.0 and a blank canvas, like a new buffer.
+    pub fn resize(&mut self, max_row: usize, max_col: usize) {
+        self.opaque_db.resize(max_row, max_col, 10.0);
+        self.transparent_db.resize(max_row, max_col, 10.0);
+        self.max_row = max_row;
+        self.max_col = max_col;
+    }
+
     pub fn get_row_count(&self) -> usize {
         self.opaque_db.row_count
     }
@@ -158,11 +195,10 @@ impl DrawingBufferPy {
     }
 
     fn hard_clear(&mut self, init_value: f32) {
-        self.opaque_db.clear_depth(init_value);
-        self.opaque_db.clear_pixinfo();
+        // depth and pixel info: only the tiles written since the previous clear
+        self.opaque_db.fast_clear(init_value);
         self.opaque_db.canvas.fill(CANVAS_CELL_INIT);
-        self.transparent_db.clear_depth(init_value);
-        self.transparent_db.clear_pixinfo();
+        self.transparent_db.fast_clear(init_value);
         self.transparent_db.canvas.fill(CANVAS_CELL_INIT);
     }
 
@@ -264,7 +300,8 @@ impl DrawingBufferPy {
         let cell = self.opaque_db.get_depth_buffer_cell(row, col);
         let dict = PyDict::new(py);
 
-        let pix_info_element = self.opaque_db.pixbuffer[cell.pixinfo[0]];
+        let cell_idx = row * self.opaque_db.col_count + col;
+        let pix_info_element = self.opaque_db.pixbuffer[cell.pix_index(cell_idx, 0)];
 
         // Assuming DepthBufferCell has some fields `field1` and `field2`
         dict.set_item("depth", cell.depth[0]).unwrap();
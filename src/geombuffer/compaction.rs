@@ -0,0 +1,212 @@
+use nalgebra_glm::Vec4;
+use pyo3::prelude::*;
+
+use crate::vertexbuffer::{
+    uv_buffer::UVBuffer,
+    vertex_buffer::{TriangleBuffer, VertexBuffer},
+    vertex_buffer_py::VertexBufferPy,
+};
+
+use super::{GeomElement, GeometryBuffer, GeometryBufferPy};
+
+/// Old index to new index table of a packed buffer.
+struct Remap {
+    new_index: Vec<usize>,
+    kept: usize,
+}
+
+impl Remap {
+    fn from_used(used: &[bool]) -> Self {
+        let mut kept = 0;
+        let new_index = used
+            .iter()
+            .map(|&u| {
+                let idx = kept;
+                kept += u as usize;
+                idx
+            })
+            .collect();
+        Remap { new_index, kept }
+    }
+
+    #[inline]
+    fn map(&self, idx: usize) -> usize {
+        match self.new_index.get(idx) {
+            Some(&new_idx) => new_idx,
+            // indices past the end (e.g. the reserved geometry of an empty buffer)
+            None => self.kept + (idx - self.new_index.len()),
+        }
+    }
+}
+
+fn mark(used: &mut [bool], start: usize, count: usize) {
+    let end = (start + count).min(used.len());
+    if start < end {
+        used[start..end].fill(true);
+    }
+}
+
+/// Drop removed geometries and every vertex, uv and triangle no live geometry uses.
+///
+/// Live geometries keep their order; their ranges and the triangle vertex indices are
+/// rewritten to the packed buffers. Returns the new index of every former geometry
+/// slot, `None` for removed ones.
+pub fn compact_buffers(
+    geometry: &mut GeometryBuffer,
+    buffer3d: &mut VertexBuffer<Vec4>,
+    buffer2d: &mut VertexBuffer<Vec4>,
+    uv_buffer: &mut UVBuffer<f32>,
+    triangles: &mut TriangleBuffer,
+) -> Vec<Option<usize>> {
+    let mapping = geometry.compact_slots();
+    let live = &mut geometry.content[..geometry.current_size];
+
+    let mut used_3d = vec![false; buffer3d.len()];
+    let mut used_2d = vec![false; buffer2d.len()];
+    let mut used_uv = vec![false; uv_buffer.uv_size];
+    let mut used_triangles = vec![false; triangles.len()];
+    let mut triangle_is_2d = vec![false; triangles.len()];
+
+    for elem in live.iter() {
+        let used_vertices = if elem.is_2d() {
+            &mut used_2d
+        } else {
+            &mut used_3d
+        };
+        let (start, count) = elem.vertex_range();
+        mark(used_vertices, start, count);
+        let (start, count) = elem.uv_range();
+        mark(&mut used_uv, start, count);
+
+        // triangles may reference vertices outside the polygon vertex range
+        let (start, count) = elem.triangle_range();
+        mark(&mut used_triangles, start, count);
+        for triangle_idx in start..(start + count).min(triangles.len()) {
+            triangle_is_2d[triangle_idx] = elem.is_2d();
+            let (v0, v1, v2, _) = triangles.get_triangle(triangle_idx);
+            for v in [v0, v1, v2] {
+                mark(used_vertices, v, 1);
+            }
+        }
+    }
+
+    let map_3d = Remap::from_used(&used_3d);
+    let map_2d = Remap::from_used(&used_2d);
+    let map_uv = Remap::from_used(&used_uv);
+    let map_triangles = Remap::from_used(&used_triangles);
+
+    for triangle_idx in 0..triangles.len() {
+        if !used_triangles[triangle_idx] {
+            continue;
+        }
+        let map = if triangle_is_2d[triangle_idx] {
+            &map_2d
+        } else {
+            &map_3d
+        };
+        let (v0, v1, v2, normal) = triangles.get_triangle(triangle_idx);
+        let normal = *normal;
+        triangles.set_triangle(triangle_idx, map.map(v0), map.map(v1), map.map(v2), normal);
+    }
+
+    buffer3d.retain_used(&used_3d);
+    buffer2d.retain_used(&used_2d);
+    uv_buffer.retain_used(&used_uv);
+    triangles.retain_used(&used_triangles);
+
+    for elem in live.iter_mut() {
+        let map = if elem.is_2d() { &map_2d } else { &map_3d };
+        match elem {
+            GeomElement::Points2D(p)
+            | GeomElement::Rect2D(p)
+            | GeomElement::Line2D(p)
+            | GeomElement::Line3D(p) => {
+                p.point_start = map.map(p.point_start);
+                p.uv_idx = map_uv.map(p.uv_idx);
+            }
+            GeomElement::Point3D(p) => {
+                p.point_start = map.map(p.point_start);
+                p.uv_idx = map_uv.map(p.uv_idx);
+            }
+            GeomElement::Polygon2D(p) | GeomElement::Polygon3D(p) => {
+                p.p_start = map.map(p.p_start);
+                p.uv_start = map_uv.map(p.uv_start);
+                p.triangle_start = map_triangles.map(p.triangle_start);
+            }
+        }
+    }
+    mapping
+}
+
+/// Compact the geometry and vertex buffers in place; see `compact_buffers`.
+///
+/// Free ranges of the vertex buffer are dropped since the packed buffers have none.
+#[pyfunction]
+pub fn compact_buffers_py(
+    geometry_buffer: &mut GeometryBufferPy,
+    vertex_buffer: &mut VertexBufferPy,
+) -> Vec<Option<usize>> {
+    let mapping = compact_buffers(
+        &mut geometry_buffer.buffer,
+        &mut vertex_buffer.buffer3d,
+        &mut vertex_buffer.buffer2d,
+        &mut vertex_buffer.uv_array,
+        &mut vertex_buffer.triangle_buffer3d,
+    );
+    vertex_buffer.reset_free_ranges();
+    mapping
+}
+
+#[cfg(test)]
+mod test_compaction {
+    use nalgebra_glm::{vec2, vec3, vec4};
+
+    use super::*;
+
+    #[test]
+    fn test_compact_packs_live_geometries() {
+        let mut geometry = GeometryBuffer::new(8);
+        let mut buffer3d = VertexBuffer::<Vec4>::with_capacity(16);
+        let mut buffer2d = VertexBuffer::<Vec4>::with_capacity(4);
+        let mut uv_buffer = UVBuffer::<f32>::new(8);
+        let mut triangles = TriangleBuffer::new(8);
+
+        // reserved slot 0, using no data
+        geometry.add_points_2d(0, 0, 0, 0, 0, false);
+        // two single triangle polygons, the first one is removed
+        for k in 0..2 {
+            let base = buffer3d.len();
+            for i in 0..3 {
+                buffer3d.add_vertex(&vec4(k as f32, i as f32, 0.0, 1.0));
+            }
+            let uv = uv_buffer.add_uv(&vec2(0.0, 0.0), &vec2(1.0, 0.0), &vec2(0.0, 1.0));
+            let t = triangles.add_triangle(base, base + 1, base + 2, vec3(0.0, 0.0, 1.0));
+            geometry.add_polygon_3d(base, 3, uv, t, 1, k + 1, 0, false);
+        }
+        assert!(geometry.remove(1));
+
+        let mapping = compact_buffers(
+            &mut geometry,
+            &mut buffer3d,
+            &mut buffer2d,
+            &mut uv_buffer,
+            &mut triangles,
+        );
+        assert_eq!(mapping, vec![Some(0), None, Some(1)]);
+        assert_eq!(geometry.current_size, 2);
+        assert_eq!(buffer3d.len(), 3);
+        assert_eq!(uv_buffer.uv_size, 1);
+        assert_eq!(triangles.len(), 1);
+
+        // the remaining polygon points at the packed data
+        match &geometry.content[1] {
+            GeomElement::Polygon3D(p) => {
+                assert_eq!((p.p_start, p.uv_start, p.triangle_start), (0, 0, 0));
+                assert_eq!(p.geom_ref.node_id, 2);
+            }
+            _ => panic!("expected a polygon"),
+        }
+        assert_eq!(triangles.get_triangle(0).0, 0);
+        assert_eq!(buffer3d.get_vertex(0).x, 1.0);
+    }
+}
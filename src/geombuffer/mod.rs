@@ -1,4 +1,8 @@
-use pyo3::{prelude::*, types::PyDict};
+use pyo3::{exceptions::PyValueError, prelude::*, types::PyDict};
+
+use crate::utils::{buffer_full_error, grown_capacity, next_version_stamp, resize_boxed_slice};
+
+pub mod compaction;
 
 #[derive(Debug, Clone, Copy)]
 pub struct GeomReferences {
@@ -90,13 +94,261 @@ pub enum GeomElement {
     Line3D(Points),
     Polygon3D(Polygon),
 }
+
+impl GeomElement {
+    pub fn geom_ref(&self) -> &GeomReferences {
+        match self {
+            GeomElement::Points2D(p) => &p.geom_ref,
+            GeomElement::Rect2D(p) => &p.geom_ref,
+            GeomElement::Line2D(p) => &p.geom_ref,
+            GeomElement::Polygon2D(p) => &p.geom_ref,
+            GeomElement::Point3D(p) => &p.geom_ref,
+            GeomElement::Line3D(p) => &p.geom_ref,
+            GeomElement::Polygon3D(p) => &p.geom_ref,
+        }
+    }
+
+    /// true for elements projected with the 2D view matrix
+    pub fn is_2d(&self) -> bool {
+        matches!(
+            self,
+            GeomElement::Points2D(_)
+                | GeomElement::Rect2D(_)
+                | GeomElement::Line2D(_)
+                | GeomElement::Polygon2D(_)
+        )
+    }
+
+    /// `(start, count)` of the vertices used, in the 2D or 3D vertex buffer.
+    pub fn vertex_range(&self) -> (usize, usize) {
+        match self {
+            GeomElement::Points2D(p) | GeomElement::Rect2D(p) | GeomElement::Line2D(p) => {
+                (p.point_start, p.point_count)
+            }
+            GeomElement::Line3D(p) => (p.point_start, p.point_count),
+            GeomElement::Point3D(p) => (p.point_start, 1),
+            GeomElement::Polygon2D(p) | GeomElement::Polygon3D(p) => (p.p_start, p.p_count),
+        }
+    }
+
+    /// `(start, count)` of the uv triplets used.
+    pub fn uv_range(&self) -> (usize, usize) {
+        match self {
+            GeomElement::Points2D(p) => (p.uv_idx, p.point_count),
+            GeomElement::Rect2D(p) => (p.uv_idx, 1),
+            GeomElement::Line2D(p) | GeomElement::Line3D(p) => {
+                (p.uv_idx, p.point_count.saturating_sub(1))
+            }
+            GeomElement::Point3D(p) => (p.uv_idx, 1),
+            GeomElement::Polygon2D(p) | GeomElement::Polygon3D(p) => (p.uv_start, p.triangle_count),
+        }
+    }
+
+    /// `(start, count)` of the triangles used; empty for non polygon elements.
+    pub fn triangle_range(&self) -> (usize, usize) {
+        match self {
+            GeomElement::Polygon2D(p) | GeomElement::Polygon3D(p) => {
+                (p.triangle_start, p.triangle_count)
+            }
+            _ => (0, 0),
+        }
+    }
+}
 pub struct GeometryBuffer {
+    /// Allocated slots; grows on demand up to `hard_cap`.
     pub max_size: usize,
     pub content: Box<[GeomElement]>,
     pub current_size: usize,
+    pub hard_cap: Option<usize>,
+    /// Highest `current_size` reached before the last clear.
+    pub high_water: usize,
+
+    /// Version stamp of the last change of the buffer.
+    pub version: u64,
+    /// Version stamp of the last write of each geometry slot.
+    pub geometry_versions: Box<[u64]>,
+
+    /// False for removed (tombstoned) slots below `current_size`.
+    pub alive: Box<[bool]>,
+    /// Removed slots, reused last-in first-out by the next adds.
+    free_slots: Vec<usize>,
 }
 
 impl GeometryBuffer {
+    pub fn new(max_size: usize) -> Self {
+        Self::with_hard_cap(max_size, None)
+    }
+
+    pub fn with_hard_cap(max_size: usize, hard_cap: Option<usize>) -> Self {
+        let max_size = hard_cap.map_or(max_size, |cap| max_size.min(cap));
+        let polygon_init = vec![Polygon::default(); max_size];
+
+        let geom_elements: Vec<GeomElement> = polygon_init
+            .into_iter()
+            .map(GeomElement::Polygon2D)
+            .collect();
+        // Box the Vec<GeomElement>
+        let content = geom_elements.into_boxed_slice();
+        GeometryBuffer {
+            max_size,
+            content,
+            current_size: 0,
+            hard_cap,
+            high_water: 0,
+            version: 0,
+            geometry_versions: vec![0; max_size].into_boxed_slice(),
+            alive: vec![false; max_size].into_boxed_slice(),
+            free_slots: Vec::new(),
+        }
+    }
+
+    fn bump_version(&mut self) -> u64 {
+        self.version = next_version_stamp();
+        self.version
+    }
+
+    /// Make room for `additional` more geometries; false when the hard cap forbids it.
+    pub fn reserve(&mut self, additional: usize) -> bool {
+        let required = (self.current_size + additional).saturating_sub(self.free_slots.len());
+        if required <= self.max_size {
+            return true;
+        }
+        match grown_capacity(self.max_size, required, self.hard_cap) {
+            Some(capacity) => {
+                resize_boxed_slice(&mut self.content, capacity, || {
+                    GeomElement::Polygon2D(Polygon::default())
+                });
+                resize_boxed_slice(&mut self.geometry_versions, capacity, || 0);
+                resize_boxed_slice(&mut self.alive, capacity, || false);
+                self.max_size = capacity;
+                true
+            }
+            None => false,
+        }
+    }
+
+    pub fn high_water_mark(&self) -> usize {
+        self.high_water.max(self.current_size)
+    }
+
+    /// Store `elem` in a removed slot or the next one; returns `current_size` when the
+    /// hard cap is reached.
+    fn push(&mut self, elem: GeomElement) -> usize {
+        let slot = match self.free_slots.pop() {
+            Some(slot) => slot,
+            None => {
+                if !self.reserve(1) {
+                    return self.current_size;
+                }
+                self.current_size += 1;
+                self.current_size - 1
+            }
+        };
+        self.content[slot] = elem;
+        self.alive[slot] = true;
+        self.geometry_versions[slot] = self.bump_version();
+        slot
+    }
+
+    pub fn clear(&mut self) {
+        self.high_water = self.high_water_mark();
+        self.current_size = 0;
+        self.free_slots.clear();
+        self.bump_version();
+    }
+
+    #[inline]
+    pub fn is_alive(&self, geom_idx: usize) -> bool {
+        geom_idx < self.current_size && self.alive[geom_idx]
+    }
+
+    /// Number of geometries in use, removed slots excluded.
+    pub fn alive_count(&self) -> usize {
+        self.current_size - self.free_slots.len()
+    }
+
+    /// Number of removed slots waiting for reuse.
+    pub fn free_slot_count(&self) -> usize {
+        self.free_slots.len()
+    }
+
+    /// Tombstone a geometry; its slot is reused by the next add.
+    ///
+    /// Slot 0 is reserved and cannot be removed. Returns false when `geom_idx` is
+    /// not a live geometry.
+    pub fn remove(&mut self, geom_idx: usize) -> bool {
+        if geom_idx == 0 || !self.is_alive(geom_idx) {
+            return false;
+        }
+        self.alive[geom_idx] = false;
+        self.free_slots.push(geom_idx);
+        self.geometry_versions[geom_idx] = self.bump_version();
+        true
+    }
+
+    /// Move the geometry at `source_idx` into `geom_idx`, replacing its content, and
+    /// free `source_idx`.
+    pub fn replace(&mut self, geom_idx: usize, source_idx: usize) -> bool {
+        if geom_idx == 0 || geom_idx == source_idx {
+            return false;
+        }
+        if !self.is_alive(geom_idx) || !self.is_alive(source_idx) {
+            return false;
+        }
+        self.content.swap(geom_idx, source_idx);
+        self.geometry_versions[geom_idx] = self.bump_version();
+        self.remove(source_idx)
+    }
+
+    /// Move the live geometries down over the removed slots, keeping their order.
+    ///
+    /// Returns the new index of every former slot, `None` for removed ones.
+    pub fn compact_slots(&mut self) -> Vec<Option<usize>> {
+        let mut mapping = vec![None; self.current_size];
+        let mut write = 0;
+        for read in 0..self.current_size {
+            if !self.alive[read] {
+                continue;
+            }
+            if read != write {
+                self.content.swap(write, read);
+                self.alive[write] = true;
+                self.geometry_versions[write] = next_version_stamp();
+            }
+            mapping[read] = Some(write);
+            write += 1;
+        }
+        self.current_size = write;
+        self.free_slots.clear();
+        self.bump_version();
+        mapping
+    }
+
+    pub fn get_geometry_version(&self, geometry_id: usize) -> u64 {
+        self.geometry_versions[geometry_id]
+    }
+
+    pub fn update_geometry_material(&mut self, geom_idx: usize, new_material_id: usize) {
+        if !self.is_alive(geom_idx) {
+            return;
+        }
+
+        let geom_ref = match &mut self.content[geom_idx] {
+            GeomElement::Rect2D(pi) => &mut pi.geom_ref,
+            GeomElement::Points2D(pi) => &mut pi.geom_ref,
+            GeomElement::Point3D(pi) => &mut pi.geom_ref,
+            GeomElement::Line3D(l) => &mut l.geom_ref,
+            GeomElement::Polygon2D(p) => &mut p.geom_ref,
+            GeomElement::Polygon3D(p) => &mut p.geom_ref,
+            GeomElement::Line2D(points) => &mut points.geom_ref,
+        };
+        if geom_ref.material_id == new_material_id {
+            return;
+        }
+        geom_ref.material_id = new_material_id;
+        self.geometry_versions[geom_idx] = self.bump_version();
+    }
+
     fn add_line2d(
         &mut self,
         p_start: usize,
@@ -106,9 +358,6 @@ impl GeometryBuffer {
         material_id: usize,
         transparent: bool,
     ) -> usize {
-        if self.current_size >= self.max_size {
-            return self.current_size;
-        }
         let elem = GeomElement::Line2D(Points {
             geom_ref: GeomReferences {
                 node_id,
@@ -120,9 +369,7 @@ impl GeometryBuffer {
             uv_idx: uv_start,
         });
 
-        self.content[self.current_size] = elem;
-        self.current_size += 1;
-        self.current_size - 1
+        self.push(elem)
     }
     fn add_rect2d(
         &mut self,
@@ -132,10 +379,6 @@ impl GeometryBuffer {
         material_id: usize,
         transparent: bool,
     ) -> usize {
-        if self.current_size >= self.max_size {
-            return self.current_size;
-        }
-
         let elem = GeomElement::Rect2D(Points {
             geom_ref: GeomReferences {
                 node_id,
@@ -147,9 +390,7 @@ impl GeometryBuffer {
             uv_idx: uv_start,
         });
 
-        self.content[self.current_size] = elem;
-        self.current_size += 1;
-        self.current_size - 1
+        self.push(elem)
     }
     fn add_points_2d(
         &mut self,
@@ -160,10 +401,6 @@ impl GeometryBuffer {
         material_id: usize,
         transparent: bool,
     ) -> usize {
-        if self.current_size >= self.max_size {
-            return self.current_size;
-        }
-
         let elem = GeomElement::Points2D(Points {
             geom_ref: GeomReferences {
                 node_id,
@@ -175,9 +412,7 @@ impl GeometryBuffer {
             uv_idx,
         });
 
-        self.content[self.current_size] = elem;
-        self.current_size += 1;
-        self.current_size - 1
+        self.push(elem)
     }
     fn add_point_3d(
         &mut self,
@@ -187,10 +422,6 @@ impl GeometryBuffer {
         material_id: usize,
         transparent: bool,
     ) -> usize {
-        if self.current_size >= self.max_size {
-            return self.current_size;
-        }
-
         let elem = GeomElement::Point3D(Point {
             geom_ref: GeomReferences {
                 node_id,
@@ -201,9 +432,7 @@ impl GeometryBuffer {
             uv_idx,
         });
 
-        self.content[self.current_size] = elem;
-        self.current_size += 1;
-        self.current_size - 1
+        self.push(elem)
     }
 
     fn add_line3d(
@@ -215,9 +444,6 @@ impl GeometryBuffer {
         uv_start: usize,
         transparent: bool,
     ) -> usize {
-        if self.current_size >= self.max_size {
-            return self.current_size;
-        }
         let elem = GeomElement::Line3D(Points {
             geom_ref: GeomReferences {
                 node_id,
@@ -229,9 +455,7 @@ impl GeometryBuffer {
             uv_idx: uv_start,
         });
 
-        self.content[self.current_size] = elem;
-        self.current_size += 1;
-        self.current_size - 1
+        self.push(elem)
     }
 
     fn add_polygon2d(
@@ -245,10 +469,6 @@ impl GeometryBuffer {
         material_id: usize,
         transparent: bool,
     ) -> usize {
-        if self.current_size >= self.max_size {
-            return self.current_size;
-        }
-
         let elem = GeomElement::Polygon2D(Polygon {
             geom_ref: GeomReferences {
                 node_id,
@@ -262,9 +482,7 @@ impl GeometryBuffer {
             triangle_count,
         });
 
-        self.content[self.current_size] = elem;
-        self.current_size += 1;
-        self.current_size - 1
+        self.push(elem)
     }
 
     fn add_polygon_3d(
@@ -278,10 +496,6 @@ impl GeometryBuffer {
         material_id: usize,
         transparent: bool,
     ) -> usize {
-        if self.current_size >= self.max_size {
-            return self.current_size;
-        }
-
         let elem = GeomElement::Polygon3D(Polygon {
             geom_ref: GeomReferences {
                 node_id,
@@ -295,9 +509,7 @@ impl GeometryBuffer {
             triangle_count,
         });
 
-        self.content[self.current_size] = elem;
-        self.current_size += 1;
-        self.current_size - 1
+        self.push(elem)
     }
 }
 
@@ -306,25 +518,23 @@ pub struct GeometryBufferPy {
     pub buffer: GeometryBuffer,
 }
 
+impl GeometryBufferPy {
+    fn reserve_one(&mut self) -> PyResult<()> {
+        if self.buffer.free_slot_count() > 0 || self.buffer.reserve(1) {
+            Ok(())
+        } else {
+            Err(buffer_full_error("GeometryBuffer", self.buffer.hard_cap))
+        }
+    }
+}
+
 #[pymethods]
 impl GeometryBufferPy {
     #[new]
-    #[pyo3(signature = (max_size=64))]
-    fn new(max_size: usize) -> Self {
-        let polygon_init = vec![Polygon::default(); max_size];
-
-        let geom_elements: Vec<GeomElement> = polygon_init
-            .into_iter()
-            .map(GeomElement::Polygon2D)
-            .collect();
-        // Box the Vec<GeomElement>
-        let content = geom_elements.into_boxed_slice();
+    #[pyo3(signature = (max_size=64, hard_cap=None))]
+    fn new(max_size: usize, hard_cap: Option<usize>) -> Self {
         GeometryBufferPy {
-            buffer: GeometryBuffer {
-                max_size,
-                content,
-                current_size: 0,
-            },
+            buffer: GeometryBuffer::with_hard_cap(max_size, hard_cap),
         }
     }
     #[pyo3(signature = (p_start, point_count, uv_start, node_id, material_id, transparent=false))]
@@ -336,9 +546,16 @@ impl GeometryBufferPy {
         node_id: usize,
         material_id: usize,
         transparent: bool,
-    ) -> usize {
-        self.buffer
-            .add_line2d(p_start, point_count, uv_start, node_id, material_id, transparent)
+    ) -> PyResult<usize> {
+        self.reserve_one()?;
+        Ok(self.buffer.add_line2d(
+            p_start,
+            point_count,
+            uv_start,
+            node_id,
+            material_id,
+            transparent,
+        ))
     }
     #[pyo3(signature = (top_left, uv_start, node_id, material_id, transparent=false))]
     fn add_rect2d(
@@ -348,21 +565,108 @@ impl GeometryBufferPy {
         node_id: usize,
         material_id: usize,
         transparent: bool,
-    ) -> usize {
-        self.buffer
-            .add_rect2d(top_left, uv_start, node_id, material_id, transparent)
+    ) -> PyResult<usize> {
+        self.reserve_one()?;
+        Ok(self
+            .buffer
+            .add_rect2d(top_left, uv_start, node_id, material_id, transparent))
     }
     fn get_element(&self, py: Python, idx: usize) -> Py<PyDict> {
         geometry_into_dict(py, &self.buffer.content[idx])
     }
 
     fn clear(&mut self) {
-        self.buffer.current_size = 0;
+        self.buffer.clear();
     }
 
+    /// number of used slots, removed ones included
     fn geometry_count(&self) -> usize {
         self.buffer.current_size
     }
+
+    /// number of geometries in use, removed slots excluded
+    fn alive_count(&self) -> usize {
+        self.buffer.alive_count()
+    }
+
+    fn is_alive(&self, geom_idx: usize) -> bool {
+        self.buffer.is_alive(geom_idx)
+    }
+
+    /// The `(kind, start, count)` ranges of the vertex buffer that geometry
+    /// `geom_idx` uses, with kinds as in `VertexBufferPy.allocate_range`; the ranges
+    /// `compact_buffers` keeps for it.
+    fn geometry_ranges(&self, geom_idx: usize) -> PyResult<Vec<(&'static str, usize, usize)>> {
+        let elem = self
+            .buffer
+            .content
+            .get(geom_idx)
+            .filter(|_| geom_idx < self.buffer.current_size)
+            .ok_or_else(|| PyValueError::new_err("geometry index out of range"))?;
+        let vertex_kind = if elem.is_2d() { "2d" } else { "3d" };
+        let (vertex_start, vertex_count) = elem.vertex_range();
+        let (uv_start, uv_count) = elem.uv_range();
+        let (triangle_start, triangle_count) = elem.triangle_range();
+        Ok([
+            (vertex_kind, vertex_start, vertex_count),
+            ("uv", uv_start, uv_count),
+            ("triangle", triangle_start, triangle_count),
+        ]
+        .into_iter()
+        .filter(|&(_, _, count)| count > 0)
+        .collect())
+    }
+
+    /// Remove a geometry. Its slot is skipped by `build_primitives` and reused by
+    /// the next add; the vertex data it used is left in place (see
+    /// `VertexBufferPy.release_range` and `compact_buffers`).
+    fn remove_geometry(&mut self, geom_idx: usize) -> PyResult<()> {
+        if self.buffer.remove(geom_idx) {
+            Ok(())
+        } else {
+            Err(PyValueError::new_err(format!(
+                "geometry {} is not a removable geometry",
+                geom_idx
+            )))
+        }
+    }
+
+    /// Replace the geometry `geom_idx` by the geometry `source_idx`, typically one
+    /// that was just added, and free `source_idx`. Keeps `geom_idx` stable for the
+    /// nodes that reference it.
+    fn replace_geometry(&mut self, geom_idx: usize, source_idx: usize) -> PyResult<()> {
+        if self.buffer.replace(geom_idx, source_idx) {
+            Ok(())
+        } else {
+            Err(PyValueError::new_err(format!(
+                "cannot replace geometry {} with geometry {}",
+                geom_idx, source_idx
+            )))
+        }
+    }
+
+    /// number of allocated slots; grows on demand up to the hard cap
+    fn capacity(&self) -> usize {
+        self.buffer.max_size
+    }
+
+    /// highest geometry count reached, across clears
+    fn high_water_mark(&self) -> usize {
+        self.buffer.high_water_mark()
+    }
+
+    /// global version of the buffer; changes on every add, clear or material update
+    fn version(&self) -> u64 {
+        self.buffer.version
+    }
+
+    /// version stamp of a single geometry slot
+    fn geometry_version(&self, geom_idx: usize) -> PyResult<u64> {
+        if geom_idx >= self.buffer.current_size {
+            return Err(PyValueError::new_err("geometry index out of range"));
+        }
+        Ok(self.buffer.get_geometry_version(geom_idx))
+    }
     #[pyo3(signature = (p_idx, uv_idx, node_id, material_id, transparent=false))]
     fn add_point_3d(
         &mut self,
@@ -372,9 +676,11 @@ impl GeometryBufferPy {
         node_id: usize,
         material_id: usize,
         transparent: bool,
-    ) -> usize {
-        self.buffer
-            .add_point_3d(p_idx, uv_idx, node_id, material_id, transparent)
+    ) -> PyResult<usize> {
+        self.reserve_one()?;
+        Ok(self
+            .buffer
+            .add_point_3d(p_idx, uv_idx, node_id, material_id, transparent))
     }
     #[pyo3(signature = (p_idx, point_count, uv_idx, node_id, material_id, transparent=false))]
     fn add_points_2d(
@@ -386,9 +692,16 @@ impl GeometryBufferPy {
         node_id: usize,
         material_id: usize,
         transparent: bool,
-    ) -> usize {
-        self.buffer
-            .add_points_2d(p_idx, point_count, uv_idx, node_id, material_id, transparent)
+    ) -> PyResult<usize> {
+        self.reserve_one()?;
+        Ok(self.buffer.add_points_2d(
+            p_idx,
+            point_count,
+            uv_idx,
+            node_id,
+            material_id,
+            transparent,
+        ))
     }
     #[pyo3(signature = (p_start, p_count, uv_start, triangle_start, triangle_count, node_id, material_id, transparent=false))]
     fn add_polygon2d(
@@ -401,8 +714,9 @@ impl GeometryBufferPy {
         node_id: usize,
         material_id: usize,
         transparent: bool,
-    ) -> usize {
-        self.buffer.add_polygon2d(
+    ) -> PyResult<usize> {
+        self.reserve_one()?;
+        Ok(self.buffer.add_polygon2d(
             p_start,
             p_count,
             uv_start,
@@ -411,7 +725,7 @@ impl GeometryBufferPy {
             node_id,
             material_id,
             transparent,
-        )
+        ))
     }
 
     #[pyo3(signature = (p_start, p_count, uv_start, triangle_start, triangle_count, node_id, material_id, transparent=false))]
@@ -425,8 +739,9 @@ impl GeometryBufferPy {
         node_id: usize,
         material_id: usize,
         transparent: bool,
-    ) -> usize {
-        self.buffer.add_polygon_3d(
+    ) -> PyResult<usize> {
+        self.reserve_one()?;
+        Ok(self.buffer.add_polygon_3d(
             p_start,
             p_count,
             uv_start,
@@ -435,7 +750,7 @@ impl GeometryBufferPy {
             node_id,
             material_id,
             transparent,
-        )
+        ))
     }
 
     /// Add a 3D line to the geometry buffer
@@ -448,39 +763,21 @@ impl GeometryBufferPy {
         node_id: usize,
         material_id: usize,
         transparent: bool,
-    ) -> usize {
-        self.buffer
-            .add_line3d(p_start, point_count, node_id, material_id, uv_start, transparent)
+    ) -> PyResult<usize> {
+        self.reserve_one()?;
+        Ok(self.buffer.add_line3d(
+            p_start,
+            point_count,
+            node_id,
+            material_id,
+            uv_start,
+            transparent,
+        ))
     }
 
     pub fn update_geometry_material(&mut self, geom_idx: usize, new_material_id: usize) {
-        if geom_idx >= self.buffer.current_size {
-            return;
-        }
-
-        match &mut self.buffer.content[geom_idx] {
-            GeomElement::Rect2D(pi) => {
-                pi.geom_ref.material_id = new_material_id;
-            }
-            GeomElement::Points2D(pi) => {
-                pi.geom_ref.material_id = new_material_id;
-            }
-            GeomElement::Point3D(pi) => {
-                pi.geom_ref.material_id = new_material_id;
-            }
-            GeomElement::Line3D(l) => {
-                l.geom_ref.material_id = new_material_id;
-            }
-            GeomElement::Polygon2D(p) => {
-                p.geom_ref.material_id = new_material_id;
-            }
-            GeomElement::Polygon3D(p) => {
-                p.geom_ref.material_id = new_material_id;
-            }
-            GeomElement::Line2D(points) => {
-                points.geom_ref.material_id = new_material_id;
-            }
-        }
+        self.buffer
+            .update_geometry_material(geom_idx, new_material_id)
     }
 }
 
@@ -1,3 +1,4 @@
+pub mod assets;
 pub mod drawbuffer;
 pub mod geombuffer;
 pub mod material;
@@ -23,14 +24,19 @@ fn tt3de(m: &Bound<'_, PyModule>) -> PyResult<()> {
         vertexbuffer::{transform_pack_py::TransformPackPy, vertex_buffer_py::VertexBufferPy},
     };
     m.add_class::<texturebuffer::TextureBufferPy>()?;
+    m.add_class::<texturebuffer::DecodedImagePy>()?;
+    m.add_class::<texturebuffer::TexelsViewPy>()?;
     m.add_class::<material::MaterialBufferPy>()?;
     m.add_class::<geombuffer::GeometryBufferPy>()?;
     m.add_class::<drawbuffer::DrawingBufferPy>()?;
     m.add_class::<VertexBufferPy>()?;
     m.add_class::<TransformPackPy>()?;
+    m.add_class::<assets::obj_py::ObjMeshPy>()?;
+    m.add_class::<assets::baked_py::BakedAssetPy>()?;
 
     m.add_class::<primitivbuffer::PrimitiveBufferPy>()?;
     m.add_function(wrap_pyfunction!(primitiv_building::build_primitives_py, m)?)?;
+    m.add_function(wrap_pyfunction!(geombuffer::compaction::compact_buffers_py, m)?)?;
     m.add_function(wrap_pyfunction!(raster::raster_all_py, m)?)?;
     m.add_function(wrap_pyfunction!(primitiv_building::apply_material_py, m)?)?;
     m.add_function(wrap_pyfunction!(
@@ -38,6 +44,20 @@ fn tt3de(m: &Bound<'_, PyModule>) -> PyResult<()> {
         m
     )?)?;
 
+    m.add_function(wrap_pyfunction!(
+        utils::engine_pool::configure_engine_pool_py,
+        m
+    )?)?;
+    m.add_function(wrap_pyfunction!(
+        utils::engine_pool::engine_pool_config_py,
+        m
+    )?)?;
+
+    m.add_function(wrap_pyfunction!(assets::obj_py::load_obj_native, m)?)?;
+    m.add_function(wrap_pyfunction!(texturebuffer::decode_image_file, m)?)?;
+    m.add_function(wrap_pyfunction!(assets::baked_py::load_baked_asset, m)?)?;
+    m.add_function(wrap_pyfunction!(assets::baked_py::write_baked_asset, m)?)?;
+
     m.add_function(wrap_pyfunction!(drawbuffer::find_glyph_indices_py, m)?)?;
     m.add_function(wrap_pyfunction!(drawbuffer::get_glyph_set, m)?)?;
 
@@ -69,6 +89,7 @@ fn toglyphmethod(m: &Bound<'_, PyModule>) -> PyResult<()> {
     let submodule = PyModule::new(m.py(), "toglyphmethod")?;
     submodule.add_class::<texturebuffer::toglyph_methods_py::ToGlyphMethodPy>()?;
     submodule.add_class::<texturebuffer::toglyph_methods_py::ToGlyphMethodPyMap4Luminance>()?;
+    submodule.add_class::<texturebuffer::toglyph_methods_py::ToGlyphMethodPyMapNLuminance>()?;
     submodule.add_class::<texturebuffer::toglyph_methods_py::ToGlyphMethodPyStatic>()?;
     m.add_submodule(&submodule)?;
 
@@ -76,6 +76,30 @@ impl Material {
             _ => GlyphPolicy::PreserveExisting,
         }
     }
+
+    /// The cell this material writes whatever the fragment, when it overwrites the front,
+    /// the back and the glyph; `None` when the result depends on the fragment or on the
+    /// cell underneath.
+    pub fn constant_cell(&self) -> Option<CanvasCell> {
+        match self {
+            Material::StaticColor {
+                front: true,
+                back: true,
+                glyph: true,
+                front_color,
+                back_color,
+                glyph_idx,
+                ..
+            } => {
+                let mut cell = CanvasCell::default();
+                cell.front_color.copy_from(front_color);
+                cell.back_color.copy_from(back_color);
+                cell.glyph = *glyph_idx;
+                Some(cell)
+            }
+            _ => None,
+        }
+    }
 }
 pub trait RenderMaterial<const TEXTURE_BUFFER_SIZE: usize, const DEPTHLAYER: usize> {
     fn render_mat(
@@ -156,6 +156,7 @@ impl BaseTexturePy {
                 met_id: 0,
                 glyph_idx: 0,
                 glyph_set: (0, 0, 0, 0),
+                glyph_ramp: Vec::new(),
             },
         };
         PyClassInitializer::from(parent).add_subclass(BaseTexturePy {
@@ -5,7 +5,10 @@ use crate::{
     drawbuffer::drawbuffer::{CanvasCell, DepthBufferCell, PixInfo},
     drawbuffer::blend::{BlendMode, GlyphPolicy},
     primitivbuffer::primitivbuffer::PrimitiveBuffer,
-    utils::convert_tuple_rgba,
+    utils::{
+        buffer_full_error, convert_tuple_rgba, grown_capacity, next_version_stamp,
+        resize_boxed_slice,
+    },
 };
 
 use nalgebra_glm::Number;
@@ -34,36 +37,90 @@ use pyo3::{
 };
 
 pub struct MaterialBuffer {
+    /// Allocated slots; grows on demand up to `hard_cap`.
     pub max_size: usize,
     pub current_size: usize,
     pub mats: Box<[Material]>,
+    pub hard_cap: Option<usize>,
+    /// Highest `current_size` reached before the last clear.
+    pub high_water: usize,
+    /// Version stamp of the last change of any material or shader uniform.
+    pub version: u64,
 }
 
 impl MaterialBuffer {
-    fn new(max_size: usize) -> Self {
+    pub fn new(max_size: usize, hard_cap: Option<usize>) -> Self {
+        let max_size = hard_cap.map_or(max_size, |cap| max_size.min(cap));
         let mats = vec![Material::DoNothing {}; max_size].into_boxed_slice();
         MaterialBuffer {
             max_size,
             current_size: 0,
             mats,
+            hard_cap,
+            high_water: 0,
+            version: 0,
         }
     }
+    fn bump_version(&mut self) {
+        self.version = next_version_stamp();
+    }
     fn clear(&mut self) {
+        self.high_water = self.high_water_mark();
         self.current_size = 0;
+        self.bump_version();
+    }
+    /// Make room for `additional` more materials; false when the hard cap forbids it.
+    pub fn reserve(&mut self, additional: usize) -> bool {
+        let required = self.current_size + additional;
+        if required <= self.max_size {
+            return true;
+        }
+        match grown_capacity(self.max_size, required, self.hard_cap) {
+            Some(capacity) => {
+                resize_boxed_slice(&mut self.mats, capacity, || Material::DoNothing {});
+                self.max_size = capacity;
+                true
+            }
+            None => false,
+        }
     }
+    pub fn high_water_mark(&self) -> usize {
+        self.high_water.max(self.current_size)
+    }
+    /// True when any material is a shader reading time or frame inputs.
+    pub fn has_time_dependent_shader(&self) -> bool {
+        self.mats[..self.current_size].iter().any(|mat| match mat {
+            Material::Shader(shader) => shader.is_time_dependent(),
+            _ => false,
+        })
+    }
+    /// Append a material; returns `current_size` when the hard cap is reached.
     pub fn add_material(&mut self, mat: Material) -> usize {
+        if !self.reserve(1) {
+            return self.current_size;
+        }
+        self.bump_version();
         self.mats[self.current_size] = mat;
 
         self.current_size += 1;
         self.current_size - 1
     }
     pub fn set_material(&mut self, idx: usize, mat: Material) {
+        self.bump_version();
         self.mats[idx] = mat;
     }
 
-    fn add_static(&mut self, front_color: RGBA, back_color: RGBA, glyph_idx: u8) -> usize {
-        let retur = self.current_size;
-        self.mats[self.current_size] = Material::StaticColor {
+    /// Cell filled at raster time by each material slot, for
+    /// [`crate::drawbuffer::drawbuffer::DrawBuffer::set_constant_fills`].
+    pub fn constant_fills(&self) -> Vec<Option<CanvasCell>> {
+        self.mats[..self.current_size]
+            .iter()
+            .map(Material::constant_cell)
+            .collect()
+    }
+
+    pub fn add_static(&mut self, front_color: RGBA, back_color: RGBA, glyph_idx: u8) -> usize {
+        self.add_material(Material::StaticColor {
             front: true,
             back: true,
             glyph: true,
@@ -72,47 +129,31 @@ impl MaterialBuffer {
             glyph_idx,
             blend_mode: BlendMode::Replace,
             glyph_policy: GlyphPolicy::PreserveExisting,
-        };
-
-        self.current_size += 1;
-        retur
+        })
     }
     fn add_textured(&mut self, albedo_texture_idx: usize, glyph_idx: u8) -> usize {
-        self.mats[self.current_size] =
-            Material::Texture(Textured::new(albedo_texture_idx, glyph_idx));
-
-        self.current_size += 1;
-        self.current_size - 1
+        self.add_material(Material::Texture(Textured::new(
+            albedo_texture_idx,
+            glyph_idx,
+        )))
     }
 
     #[allow(dead_code)]
     fn add_noop(&mut self) -> usize {
-        let retur = self.current_size;
-        self.mats[self.current_size] = Material::DoNothing {};
-
-        self.current_size += 1;
-        retur
+        self.add_material(Material::DoNothing {})
     }
 
     fn add_debug_depth(&mut self, glyph_idx: u8) -> usize {
-        let retur = self.current_size;
-        self.mats[self.current_size] = Material::DebugDepth(DebugDepth::new(glyph_idx));
-
-        self.current_size += 1;
-        retur
+        self.add_material(Material::DebugDepth(DebugDepth::new(glyph_idx)))
     }
 
     fn add_debug_uv(&mut self, glyph_idx: u8) -> usize {
-        let retur = self.current_size;
-        self.mats[self.current_size] = Material::DebugUV(DebugUV::new(glyph_idx));
-
-        self.current_size += 1;
-        retur
+        self.add_material(Material::DebugUV(DebugUV::new(glyph_idx)))
     }
 }
 
 pub fn apply_material<const SIZE: usize, const DEPTHLAYER: usize>(
-    pixinfo: PixInfo<f32>,
+    pixinfo: &PixInfo<f32>,
     material_buffer: &MaterialBuffer,
     texture_buffer: &TextureBuffer<SIZE>,
     uv_buffer: &UVBuffer<f32>,
@@ -121,22 +162,115 @@ pub fn apply_material<const SIZE: usize, const DEPTHLAYER: usize>(
     depth_layer: usize,
     cell: &mut CanvasCell,
 ) {
-    let primitive_element = &primitive_buffer.content[pixinfo.primitive_id];
-    let mat = &material_buffer.mats[pixinfo.material_id];
+    if pixinfo.preshaded {
+        return;
+    }
+    let primitive_element = &primitive_buffer.content[pixinfo.primitive_id as usize];
+    let mat = &material_buffer.mats[pixinfo.material_id as usize];
     mat.render_mat(
         cell,
         depth_cell,
         depth_layer,
-        &pixinfo,
+        pixinfo,
         primitive_element,
         texture_buffer,
         uv_buffer,
     );
 }
 
+/// Shades the fragments of one material bucket: `cells` are the canvas cells whose
+/// `depth_layer` fragment uses `material_id`. The material is matched once for the
+/// whole bucket, and each variant runs its own loop; the shader variant keeps one
+/// seeded register file for all its fragments.
+pub fn apply_material_bucket<const SIZE: usize, const DEPTHLAYER: usize>(
+    material_id: usize,
+    depth_layer: usize,
+    cells: &[u32],
+    material_buffer: &MaterialBuffer,
+    texture_buffer: &TextureBuffer<SIZE>,
+    uv_buffer: &UVBuffer<f32>,
+    primitive_buffer: &PrimitiveBuffer,
+    depthbuffer: &[DepthBufferCell<f32, DEPTHLAYER>],
+    pixbuffer: &[PixInfo<f32>],
+    canvas: &mut [CanvasCell],
+) {
+    let bucket = MaterialBucket {
+        depth_layer,
+        cells,
+        texture_buffer,
+        uv_buffer,
+        primitive_buffer,
+        depthbuffer,
+        pixbuffer,
+    };
+    match &material_buffer.mats[material_id] {
+        Material::DoNothing {} => {}
+        Material::Texture(m) => bucket.shade(m, canvas),
+        Material::DebugDepth(m) => bucket.shade(m, canvas),
+        Material::DebugUV(m) => bucket.shade(m, canvas),
+        Material::Shader(m) => {
+            let mut regs = m.seed_regs.clone_registers();
+            for (cell_idx, depth_cell, pixinfo) in bucket.fragments() {
+                m.shade_seeded(
+                    &mut regs,
+                    &mut canvas[cell_idx],
+                    depth_cell,
+                    depth_layer,
+                    pixinfo,
+                    texture_buffer,
+                );
+            }
+        }
+        mat => bucket.shade(mat, canvas),
+    }
+}
+
+/// A canvas cell index with its depth cell and the pixel info of the bucket layer.
+type BucketFragment<'a, const DEPTHLAYER: usize> = (
+    usize,
+    &'a DepthBufferCell<f32, DEPTHLAYER>,
+    &'a PixInfo<f32>,
+);
+
+struct MaterialBucket<'a, const SIZE: usize, const DEPTHLAYER: usize> {
+    depth_layer: usize,
+    cells: &'a [u32],
+    texture_buffer: &'a TextureBuffer<SIZE>,
+    uv_buffer: &'a UVBuffer<f32>,
+    primitive_buffer: &'a PrimitiveBuffer,
+    depthbuffer: &'a [DepthBufferCell<f32, DEPTHLAYER>],
+    pixbuffer: &'a [PixInfo<f32>],
+}
+
+impl<'a, const SIZE: usize, const DEPTHLAYER: usize> MaterialBucket<'a, SIZE, DEPTHLAYER> {
+    fn fragments(&self) -> impl Iterator<Item = BucketFragment<'a, DEPTHLAYER>> + 'a {
+        let (cells, depthbuffer, pixbuffer) = (self.cells, self.depthbuffer, self.pixbuffer);
+        let depth_layer = self.depth_layer;
+        cells.iter().map(move |&cell_idx| {
+            let cell_idx = cell_idx as usize;
+            let depth_cell = &depthbuffer[cell_idx];
+            let pixinfo = &pixbuffer[depth_cell.pix_index(cell_idx, depth_layer)];
+            (cell_idx, depth_cell, pixinfo)
+        })
+    }
+
+    fn shade<M: RenderMaterial<SIZE, DEPTHLAYER>>(&self, mat: &M, canvas: &mut [CanvasCell]) {
+        for (cell_idx, depth_cell, pixinfo) in self.fragments() {
+            mat.render_mat(
+                &mut canvas[cell_idx],
+                depth_cell,
+                self.depth_layer,
+                pixinfo,
+                &self.primitive_buffer.content[pixinfo.primitive_id as usize],
+                self.texture_buffer,
+                self.uv_buffer,
+            );
+        }
+    }
+}
+
 pub fn apply_noise<T: Number>(noise: &NoiseMaterial, _pixinfo: &PixInfo<T>, u: f32, v: f32) -> f32 {
-    let noise = noise.make_instance();
-    let noise_val = noise.get_noise_2d(u, v);
+    let noise_val = noise.generator().get_noise_2d(u, v);
 
     (noise_val + 1.0) / 2.0
 }
@@ -146,13 +280,23 @@ pub struct MaterialBufferPy {
     pub content: MaterialBuffer,
 }
 
+impl MaterialBufferPy {
+    fn reserve_one(&mut self) -> PyResult<()> {
+        if self.content.reserve(1) {
+            Ok(())
+        } else {
+            Err(buffer_full_error("MaterialBuffer", self.content.hard_cap))
+        }
+    }
+}
+
 #[pymethods]
 impl MaterialBufferPy {
     #[new]
-    #[pyo3(signature = (max_size=64))]
-    fn new(max_size: usize) -> Self {
+    #[pyo3(signature = (max_size=64, hard_cap=None))]
+    fn new(max_size: usize, hard_cap: Option<usize>) -> Self {
         MaterialBufferPy {
-            content: MaterialBuffer::new(max_size),
+            content: MaterialBuffer::new(max_size, hard_cap),
         }
     }
     fn add_material(&mut self, _py: Python, _mat: Bound<'_, MaterialPy>) -> usize {
@@ -163,17 +307,21 @@ impl MaterialBufferPy {
         panic!("Not implemented");
     }
 
-    fn add_base_texture<'py>(&mut self, _py: Python<'py>, mat: &BaseTexturePy) -> usize {
-        self.content
-            .add_material(Material::BaseTexture(mat.to_native()))
+    fn add_base_texture<'py>(&mut self, _py: Python<'py>, mat: &BaseTexturePy) -> PyResult<usize> {
+        self.reserve_one()?;
+        Ok(self
+            .content
+            .add_material(Material::BaseTexture(mat.to_native())))
     }
 
-    fn add_static_color(&mut self, _py: Python, mat: &StaticColorPy) -> usize {
-        self.content.add_material(mat.to_native())
+    fn add_static_color(&mut self, _py: Python, mat: &StaticColorPy) -> PyResult<usize> {
+        self.reserve_one()?;
+        Ok(self.content.add_material(mat.to_native()))
     }
 
     fn add_shader(&mut self, py: Python<'_>, mat: &Bound<'_, ShaderPy>) -> PyResult<usize> {
         let native = mat.borrow().build_native(py)?;
+        self.reserve_one()?;
         Ok(self.content.add_material(Material::Shader(native)))
     }
 
@@ -183,9 +331,31 @@ impl MaterialBufferPy {
     fn count(&self) -> usize {
         self.content.current_size
     }
+    /// number of allocated slots; grows on demand up to the hard cap
+    fn capacity(&self) -> usize {
+        self.content.max_size
+    }
+    /// highest material count reached, across clears
+    fn high_water_mark(&self) -> usize {
+        self.content.high_water_mark()
+    }
+    /// version stamp of the last change of any material or bound shader uniform
+    fn version(&self) -> u64 {
+        self.content.version
+    }
+    /// true when a shader material reads ``tt_Time``, ``tt_DeltaTime`` or ``tt_Frame``
+    fn has_time_dependent_shader(&self) -> bool {
+        self.content.has_time_dependent_shader()
+    }
 
-    fn add_textured(&mut self, _py: Python, albedo_texture_idx: usize, glyph_idx: u8) -> usize {
-        self.content.add_textured(albedo_texture_idx, glyph_idx)
+    fn add_textured(
+        &mut self,
+        _py: Python,
+        albedo_texture_idx: usize,
+        glyph_idx: u8,
+    ) -> PyResult<usize> {
+        self.reserve_one()?;
+        Ok(self.content.add_textured(albedo_texture_idx, glyph_idx))
     }
 
     fn add_static(
@@ -194,18 +364,21 @@ impl MaterialBufferPy {
         front_rgba: &Bound<PyTuple>,
         back_rgba: &Bound<PyTuple>,
         glyph_idx: u8,
-    ) -> usize {
+    ) -> PyResult<usize> {
         let fr = convert_tuple_rgba(front_rgba).unwrap();
         let bg = convert_tuple_rgba(back_rgba).unwrap();
-        self.content.add_static(fr, bg, glyph_idx)
+        self.reserve_one()?;
+        Ok(self.content.add_static(fr, bg, glyph_idx))
     }
 
-    fn add_debug_depth(&mut self, _py: Python, glyph_idx: u8) -> usize {
-        self.content.add_debug_depth(glyph_idx)
+    fn add_debug_depth(&mut self, _py: Python, glyph_idx: u8) -> PyResult<usize> {
+        self.reserve_one()?;
+        Ok(self.content.add_debug_depth(glyph_idx))
     }
 
-    fn add_debug_uv(&mut self, _py: Python, glyph_idx: u8) -> usize {
-        self.content.add_debug_uv(glyph_idx)
+    fn add_debug_uv(&mut self, _py: Python, glyph_idx: u8) -> PyResult<usize> {
+        self.reserve_one()?;
+        Ok(self.content.add_debug_uv(glyph_idx))
     }
 
     fn set_shader_time(&mut self, material_idx: usize, time_seconds: f32) -> PyResult<()> {
@@ -213,15 +386,22 @@ impl MaterialBufferPy {
             return Err(PyValueError::new_err("material_idx out of range"));
         }
 
-        match &mut self.content.mats[material_idx] {
+        let bound = match &mut self.content.mats[material_idx] {
             Material::Shader(shader) => {
                 shader.set_time_seconds(time_seconds);
-                Ok(())
+                shader.input_binding.time_f32_reg.is_some()
+            }
+            _ => {
+                return Err(PyValueError::new_err(
+                    "material at material_idx is not a Shader material",
+                ))
             }
-            _ => Err(PyValueError::new_err(
-                "material at material_idx is not a Shader material",
-            )),
+        };
+        // uniforms the shader does not read leave its output unchanged
+        if bound {
+            self.content.bump_version();
         }
+        Ok(())
     }
 
     fn set_shader_delta_time(&mut self, material_idx: usize, dt_seconds: f32) -> PyResult<()> {
@@ -229,15 +409,22 @@ impl MaterialBufferPy {
             return Err(PyValueError::new_err("material_idx out of range"));
         }
 
-        match &mut self.content.mats[material_idx] {
+        let bound = match &mut self.content.mats[material_idx] {
             Material::Shader(shader) => {
                 shader.set_delta_time_seconds(dt_seconds);
-                Ok(())
+                shader.input_binding.delta_time_f32_reg.is_some()
+            }
+            _ => {
+                return Err(PyValueError::new_err(
+                    "material at material_idx is not a Shader material",
+                ))
             }
-            _ => Err(PyValueError::new_err(
-                "material at material_idx is not a Shader material",
-            )),
+        };
+        // uniforms the shader does not read leave its output unchanged
+        if bound {
+            self.content.bump_version();
         }
+        Ok(())
     }
 
     fn set_shader_frame(&mut self, material_idx: usize, frame: u32) -> PyResult<()> {
@@ -245,15 +432,22 @@ impl MaterialBufferPy {
             return Err(PyValueError::new_err("material_idx out of range"));
         }
 
-        match &mut self.content.mats[material_idx] {
+        let bound = match &mut self.content.mats[material_idx] {
             Material::Shader(shader) => {
                 shader.set_frame_counter(frame);
-                Ok(())
+                shader.input_binding.frame_i32_reg.is_some()
+            }
+            _ => {
+                return Err(PyValueError::new_err(
+                    "material at material_idx is not a Shader material",
+                ))
             }
-            _ => Err(PyValueError::new_err(
-                "material at material_idx is not a Shader material",
-            )),
+        };
+        // uniforms the shader does not read leave its output unchanged
+        if bound {
+            self.content.bump_version();
         }
+        Ok(())
     }
 
     fn set_shader_resolution(
@@ -266,15 +460,22 @@ impl MaterialBufferPy {
             return Err(PyValueError::new_err("material_idx out of range"));
         }
 
-        match &mut self.content.mats[material_idx] {
+        let bound = match &mut self.content.mats[material_idx] {
             Material::Shader(shader) => {
                 shader.set_resolution_cells(width_cells, height_cells);
-                Ok(())
+                shader.input_binding.resolution_v2_reg.is_some()
             }
-            _ => Err(PyValueError::new_err(
-                "material at material_idx is not a Shader material",
-            )),
+            _ => {
+                return Err(PyValueError::new_err(
+                    "material at material_idx is not a Shader material",
+                ))
+            }
+        };
+        // uniforms the shader does not read leave its output unchanged
+        if bound {
+            self.content.bump_version();
         }
+        Ok(())
     }
 
     fn set_shader_near(&mut self, material_idx: usize, near_clip_distance: f32) -> PyResult<()> {
@@ -282,15 +483,22 @@ impl MaterialBufferPy {
             return Err(PyValueError::new_err("material_idx out of range"));
         }
 
-        match &mut self.content.mats[material_idx] {
+        let bound = match &mut self.content.mats[material_idx] {
             Material::Shader(shader) => {
                 shader.set_near_clip_distance(near_clip_distance);
-                Ok(())
+                shader.input_binding.near_f32_reg.is_some()
             }
-            _ => Err(PyValueError::new_err(
-                "material at material_idx is not a Shader material",
-            )),
+            _ => {
+                return Err(PyValueError::new_err(
+                    "material at material_idx is not a Shader material",
+                ))
+            }
+        };
+        // uniforms the shader does not read leave its output unchanged
+        if bound {
+            self.content.bump_version();
         }
+        Ok(())
     }
 
     fn set_shader_far(&mut self, material_idx: usize, far_clip_distance: f32) -> PyResult<()> {
@@ -298,14 +506,21 @@ impl MaterialBufferPy {
             return Err(PyValueError::new_err("material_idx out of range"));
         }
 
-        match &mut self.content.mats[material_idx] {
+        let bound = match &mut self.content.mats[material_idx] {
             Material::Shader(shader) => {
                 shader.set_far_clip_distance(far_clip_distance);
-                Ok(())
+                shader.input_binding.far_f32_reg.is_some()
             }
-            _ => Err(PyValueError::new_err(
-                "material at material_idx is not a Shader material",
-            )),
+            _ => {
+                return Err(PyValueError::new_err(
+                    "material at material_idx is not a Shader material",
+                ))
+            }
+        };
+        // uniforms the shader does not read leave its output unchanged
+        if bound {
+            self.content.bump_version();
         }
+        Ok(())
     }
 }
@@ -1,10 +1,27 @@
-use fastnoise_lite::*;
+use fastnoise_lite::FastNoiseLite;
 
+use crate::texturebuffer::noise_texture::make_noise;
 
-#[derive(Clone, Debug)]
+/// Noise shaded per cell; the generator is built once, when the material is made.
 pub struct NoiseMaterial {
     pub int_config: i32,
     pub seed: i32,
+    noise: FastNoiseLite,
+}
+
+impl Clone for NoiseMaterial {
+    fn clone(&self) -> Self {
+        NoiseMaterial::new(self.int_config, self.seed)
+    }
+}
+
+impl std::fmt::Debug for NoiseMaterial {
+    fn fmt(&self, f: &mut std::fmt::Formatter<'_>) -> std::fmt::Result {
+        f.debug_struct("NoiseMaterial")
+            .field("int_config", &self.int_config)
+            .field("seed", &self.seed)
+            .finish()
+    }
 }
 
 impl NoiseMaterial {
@@ -12,18 +29,12 @@ impl NoiseMaterial {
         Self {
             int_config: config,
             seed,
+            noise: make_noise(seed, config),
         }
     }
-    pub fn make_instance(&self) -> FastNoiseLite {
-        let mut noise = FastNoiseLite::new();
-        match self.int_config {
-            0 => noise.set_noise_type(Some(NoiseType::OpenSimplex2)),
-            1 => noise.set_noise_type(Some(NoiseType::Cellular)),
-            2 => noise.set_noise_type(Some(NoiseType::Perlin)),
-            3 => noise.set_noise_type(Some(NoiseType::Value)),
-            _ => noise.set_noise_type(Some(NoiseType::OpenSimplex2)),
-        }
-        noise.set_seed(Some(self.seed));
-        noise
+    /// The prepared generator of the material.
+    #[inline(always)]
+    pub fn generator(&self) -> &FastNoiseLite {
+        &self.noise
     }
 }
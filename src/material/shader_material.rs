@@ -309,6 +309,14 @@ impl ShaderMaterial {
         self
     }
 
+    /// True when the shader reads ``tt_Time``, ``tt_DeltaTime`` or ``tt_Frame``, so its output
+    /// can change between frames even when the scene itself did not.
+    pub fn is_time_dependent(&self) -> bool {
+        self.input_binding.time_f32_reg.is_some()
+            || self.input_binding.delta_time_f32_reg.is_some()
+            || self.input_binding.frame_i32_reg.is_some()
+    }
+
     pub fn set_time_seconds(&mut self, seconds: f32) {
         if let Some(reg_id) = self.input_binding.time_f32_reg {
             self.seed_regs.set_f32(reg_id, seconds);
@@ -414,6 +422,41 @@ pub(super) fn test_only_force_tls_shader_cache_miss() {
     });
 }
 
+impl ShaderMaterial {
+    /// Shades one fragment with `regs`, which must hold the seed registers of this
+    /// material; they hold them again on return, so a run of fragments of the same
+    /// material (see [`super::apply_material_bucket`]) shares one register file.
+    pub(crate) fn shade_seeded<const TEXTURE_BUFFER_SIZE: usize, const DEPTHLAYER: usize>(
+        &self,
+        regs: &mut Registers,
+        cell: &mut CanvasCell,
+        depth_cell: &DepthBufferCell<f32, DEPTHLAYER>,
+        depth_layer: usize,
+        pixinfo: &PixInfo<f32>,
+        texture_buffer: &TextureBuffer<TEXTURE_BUFFER_SIZE>,
+    ) {
+        let bind = self.input_binding;
+        write_per_pixel_inputs_to_registers(&bind, pixinfo, depth_cell, depth_layer, regs);
+
+        let (front, back, glyph) =
+            run_ttsl(&self.instrs, regs, Some(texture_buffer as &dyn crate::ttsl::TtslTextureEnv));
+        cell.front_color = Color::new_from_vec4(&front);
+        cell.back_color = Color::new_from_vec4(&back);
+        if glyph == 0 {
+            if let Some(default_glyph) = self.default_glyph {
+                cell.glyph = default_glyph;
+            } else {
+                cell.glyph = 0;
+            }
+        } else {
+            cell.glyph = glyph.clamp(0, 255) as u8;
+        }
+
+        // Restore seed snapshot so that the next fragment starts from correct banks.
+        self.seed_regs.copy_seed_into(regs);
+    }
+}
+
 impl<const TEXTURE_BUFFER_SIZE: usize, const DEPTHLAYER: usize>
     RenderMaterial<TEXTURE_BUFFER_SIZE, DEPTHLAYER> for ShaderMaterial
 {
@@ -428,7 +471,7 @@ impl<const TEXTURE_BUFFER_SIZE: usize, const DEPTHLAYER: usize>
         _uv_buffer: &UVBuffer<f32>,
     ) {
         let self_bits = self as *const ShaderMaterial as usize;
-        let material_id = pixinfo.material_id;
+        let material_id = pixinfo.material_id as usize;
 
         SHADER_RENDER_TLS.with(|tls| {
             let mut t = tls.borrow_mut();
@@ -442,26 +485,14 @@ impl<const TEXTURE_BUFFER_SIZE: usize, const DEPTHLAYER: usize>
                 t.last_material_id = material_id;
             }
 
-            let bind = self.input_binding;
-            let regs = &mut t.regs;
-            write_per_pixel_inputs_to_registers(&bind, pixinfo, depth_cell, depth_layer, regs);
-
-            let (front, back, glyph) =
-                run_ttsl(&self.instrs, regs, Some(texture_buffer as &dyn crate::ttsl::TtslTextureEnv));
-            cell.front_color = Color::new_from_vec4(&front);
-            cell.back_color = Color::new_from_vec4(&back);
-            if glyph == 0 {
-                if let Some(default_glyph) = self.default_glyph {
-                    cell.glyph = default_glyph;
-                } else {
-                    cell.glyph = 0;
-                }
-            } else {
-                cell.glyph = glyph.clamp(0, 255) as u8;
-            }
-
-            // Restore seed snapshot so a cache hit on the next invocation starts from correct banks.
-            self.seed_regs.copy_seed_into(regs);
+            self.shade_seeded(
+                &mut t.regs,
+                cell,
+                depth_cell,
+                depth_layer,
+                pixinfo,
+                texture_buffer,
+            );
         });
     }
 }
@@ -97,10 +97,11 @@ impl<const TEXTURE_BUFFER_SIZE: usize, const DEPTHLAYER: usize>
                     applyied_glyph = Some(glyphidx);
                 }
                 _ => {
-                    let texture_color = texture_buffer.get_rgba_at_v(
+                    let texture_color = texture_buffer.get_rgba_at_lod(
                         self.glyph_texture_idx,
                         &uv,
                         self.glyph_texture_subid,
+                        &pixinfo.uv_footprint,
                     );
                     //cell.glyph = self.to_glyph_method.to_glyph_index(&texture_color);
                     applyied_glyph = Some(self.to_glyph_method.to_glyph_index(&texture_color));
@@ -112,7 +113,7 @@ impl<const TEXTURE_BUFFER_SIZE: usize, const DEPTHLAYER: usize>
             Some(glyphidx) => {
                 if glyphidx == HALF_UPPER_BLOCK && (self.front && self.back) {
                     // half upper block , we blend half to front color, half to back color
-                    let front_color = texture_buffer.get_rgba_at_v(
+                    let front_color = texture_buffer.get_rgba_at_lod(
                         self.albedo_texture_idx,
                         &{
                             if self.front_uv_0 {
@@ -122,9 +123,10 @@ impl<const TEXTURE_BUFFER_SIZE: usize, const DEPTHLAYER: usize>
                             }
                         },
                         self.albedo_texture_subid,
+                        &pixinfo.uv_footprint,
                     );
 
-                    let back_color = texture_buffer.get_rgba_at_v(
+                    let back_color = texture_buffer.get_rgba_at_lod(
                         self.albedo_texture_idx,
                         &{
                             if self.back_uv_0 {
@@ -134,6 +136,7 @@ impl<const TEXTURE_BUFFER_SIZE: usize, const DEPTHLAYER: usize>
                             }
                         },
                         self.albedo_texture_subid,
+                        &pixinfo.uv_footprint,
                     );
                     blend_half_upper_to_cell(cell, &front_color, &back_color);
                     return;
@@ -156,10 +159,11 @@ impl<const TEXTURE_BUFFER_SIZE: usize, const DEPTHLAYER: usize>
 
             //
 
-            let texture_color = texture_buffer.get_rgba_at_v(
+            let texture_color = texture_buffer.get_rgba_at_lod(
                 self.albedo_texture_idx,
                 &uv,
                 self.albedo_texture_subid,
+                &pixinfo.uv_footprint,
             );
 
             if self.front {
@@ -178,10 +182,11 @@ impl<const TEXTURE_BUFFER_SIZE: usize, const DEPTHLAYER: usize>
                         pixinfo.uv_1
                     }
                 };
-                let texture_color_front = texture_buffer.get_rgba_at_v(
+                let texture_color_front = texture_buffer.get_rgba_at_lod(
                     self.albedo_texture_idx,
                     &uv_front,
                     self.albedo_texture_subid,
+                    &pixinfo.uv_footprint,
                 );
                 blend_color_to_cell_single(&mut cell.front_color, &texture_color_front);
             }
@@ -193,10 +198,11 @@ impl<const TEXTURE_BUFFER_SIZE: usize, const DEPTHLAYER: usize>
                         pixinfo.uv_1
                     }
                 };
-                let texture_color_back = texture_buffer.get_rgba_at_v(
+                let texture_color_back = texture_buffer.get_rgba_at_lod(
                     self.albedo_texture_idx,
                     &uv_back,
                     self.albedo_texture_subid,
+                    &pixinfo.uv_footprint,
                 );
                 blend_color_to_cell_single(&mut cell.back_color, &texture_color_back);
             }
@@ -307,10 +313,10 @@ impl<const TEXTURE_BUFFER_SIZE: usize, const DEPTHLAYER: usize>
         let distance_shading = 1.0f32 - (world_dist.clamp(0.0, MAX_DISTANCE) / MAX_DISTANCE);
 
         let texture_color = texture_buffer
-            .get_rgba_at_v(self.albedo_texture_idx, &uv, 0)
+            .get_rgba_at_lod(self.albedo_texture_idx, &uv, 0, &pixinfo.uv_footprint)
             .mult_albedo(distance_shading);
         let texture_color1 = texture_buffer
-            .get_rgba_at_v(self.albedo_texture_idx, &uv1, 0)
+            .get_rgba_at_lod(self.albedo_texture_idx, &uv1, 0, &pixinfo.uv_footprint)
             .mult_albedo(distance_shading);
 
         cell.glyph = self.glyph_idx;
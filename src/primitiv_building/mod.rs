@@ -1,10 +1,13 @@
 use nalgebra_glm::{vec3, vec4, Number, Vec3, Vec4};
-use primitivbuffer::PrimitiveBuffer;
+use primitivbuffer::{PrimitiveBuffer, PrimitiveCacheKey};
 use pyo3::{exceptions::PyValueError, pyfunction, PyRefMut, PyResult};
 
 use crate::{
     drawbuffer::{
-        drawbuffer::{apply_material_on, apply_material_on_parallel, apply_material_transparent_on, DrawBuffer},
+        drawbuffer::{
+            apply_material_on, apply_material_on_parallel, apply_material_on_sorted,
+            apply_material_transparent_on, DrawBuffer,
+        },
         DrawingBufferPy,
     },
     geombuffer::{GeometryBuffer, GeometryBufferPy},
@@ -55,6 +58,33 @@ fn perspective_divide_triplet(va: &Vec4, vb: &Vec4, vc: &Vec4) -> (Vec4, Vec4, V
     )
 }
 
+/// Build the cache key of a geometry from the version stamps of everything it reads.
+fn primitive_cache_key(
+    geombuffer: &GeometryBuffer,
+    geometry_id: usize,
+    transform_pack: &TransformPack,
+    vertex_version: u64,
+    screen_size: (usize, usize),
+) -> PrimitiveCacheKey {
+    let geom_element = &geombuffer.content[geometry_id];
+    let (view_version, projection_version) = if geom_element.is_2d() {
+        (transform_pack.view_2d_version, 0)
+    } else {
+        (
+            transform_pack.view_3d_version,
+            transform_pack.projection_version,
+        )
+    };
+    PrimitiveCacheKey {
+        geometry_version: geombuffer.get_geometry_version(geometry_id),
+        node_version: transform_pack.get_node_version(geom_element.geom_ref().node_id),
+        view_version,
+        projection_version,
+        vertex_version,
+        screen_size,
+    }
+}
+
 pub fn build_primitives<const PIXCOUNT: usize, DEPTHACC: Number>(
     geombuffer: &GeometryBuffer,
     vertex_buffer_3d: &mut VertexBuffer<Vec4>,
@@ -62,10 +92,30 @@ pub fn build_primitives<const PIXCOUNT: usize, DEPTHACC: Number>(
     triangle_buffer: &TriangleBuffer,
     transform_pack: &TransformPack,
     uv_array_input: &UVBuffer<f32>,
+    vertex_version: u64,
     drawbuffer: &DrawBuffer<PIXCOUNT, DEPTHACC>,
     primitivbuffer: &mut PrimitiveBuffer,
 ) {
+    primitivbuffer.begin_build();
+    let screen_size = (drawbuffer.row_count, drawbuffer.col_count);
+
     for geometry_id in 1..geombuffer.current_size {
+        // removed slots are tombstoned until reused or compacted
+        if !geombuffer.alive[geometry_id] {
+            continue;
+        }
+        let cache_key = primitive_cache_key(
+            geombuffer,
+            geometry_id,
+            transform_pack,
+            vertex_version,
+            screen_size,
+        );
+        if primitivbuffer.reuse_cached(geometry_id, cache_key) {
+            continue;
+        }
+        let primitive_start = primitivbuffer.current_size;
+
         let geom_element = geombuffer.content.get(geometry_id).unwrap();
         match geom_element {
             crate::geombuffer::GeomElement::Rect2D(p) => {
@@ -340,6 +390,7 @@ pub fn build_primitives<const PIXCOUNT: usize, DEPTHACC: Number>(
                 primitivbuffer,
             ),
         }
+        primitivbuffer.store_cached(geometry_id, cache_key, primitive_start);
     }
 }
 
@@ -347,11 +398,13 @@ pub fn build_primitives<const PIXCOUNT: usize, DEPTHACC: Number>(
 pub fn build_primitives_py(
     geometry_buffer: &GeometryBufferPy,
     vbpy: &mut VertexBufferPy,
-    trbuffer_py: &TransformPackPy,
+    trbuffer_py: &mut TransformPackPy,
     dbpy: &DrawingBufferPy,
     primitivbuffer: &mut PrimitiveBufferPy,
 ) {
     let prim_content = &mut primitivbuffer.content;
+    // resolve the node hierarchy before reading any model matrix
+    trbuffer_py.data.update_global_transforms();
 
     build_primitives(
         &geometry_buffer.buffer,
@@ -360,13 +413,16 @@ pub fn build_primitives_py(
         &vbpy.triangle_buffer3d,
         &trbuffer_py.data,
         &vbpy.uv_array,
+        vbpy.version,
         &dbpy.opaque_db,
         prim_content,
     );
 }
 
+/// `sorted` shades the opaque pass material by material (see
+/// [`apply_material_on_sorted`]); the transparent pass ignores it.
 #[pyfunction]
-#[pyo3(signature = (material_buffer, texturebuffer, vertex_buffer, primitivbuffer, draw_buffer_py, pass_filter=None))]
+#[pyo3(signature = (material_buffer, texturebuffer, vertex_buffer, primitivbuffer, draw_buffer_py, pass_filter=None, sorted=false))]
 pub fn apply_material_py(
     material_buffer: &MaterialBufferPy,
     texturebuffer: &TextureBufferPy,
@@ -374,12 +430,13 @@ pub fn apply_material_py(
     primitivbuffer: &PrimitiveBufferPy,
     mut draw_buffer_py: PyRefMut<'_, DrawingBufferPy>,
     pass_filter: Option<&str>,
+    sorted: bool,
 ) {
     let draw_buf: &mut DrawingBufferPy = &mut draw_buffer_py;
 
     match pass_filter {
         Some("transparent") => {
-            let transparent_db = &draw_buf.transparent_db;
+            let transparent_db = &mut draw_buf.transparent_db;
             let opaque_db = &mut draw_buf.opaque_db;
             apply_material_transparent_on(
                 transparent_db,
@@ -390,6 +447,13 @@ pub fn apply_material_py(
                 &primitivbuffer.content,
             )
         }
+        _ if sorted => apply_material_on_sorted(
+            &mut draw_buf.opaque_db,
+            &material_buffer.content,
+            &texturebuffer.data,
+            &vertex_buffer.uv_array,
+            &primitivbuffer.content,
+        ),
         _ => apply_material_on(
             &mut draw_buf.opaque_db,
             &material_buffer.content,
@@ -411,15 +475,14 @@ pub fn apply_material_py_parallel(
     pass_filter: Option<&str>,
 ) -> PyResult<()> {
     let draw_buf: &mut DrawingBufferPy = &mut draw_buffer_py;
-    let material_pool = &draw_buf.material_pool;
-    let pool = material_pool.as_ref().ok_or_else(|| {
+    let pool = draw_buf.material_pool.pool().ok_or_else(|| {
         PyValueError::new_err(
             "DrawingBufferPy has no material thread pool (material_parallel_threads=None); \
              use apply_material_py for serial shading",
         )
     })?;
     if matches!(pass_filter, Some("transparent")) {
-        let transparent_db = &draw_buf.transparent_db;
+        let transparent_db = &mut draw_buf.transparent_db;
         let opaque_db = &mut draw_buf.opaque_db;
         apply_material_transparent_on(
             transparent_db,
@@ -430,7 +493,7 @@ pub fn apply_material_py_parallel(
             &primitivbuffer.content,
         );
     } else {
-        apply_material_on_parallel(
+        draw_buf.material_stats = apply_material_on_parallel(
             pool.as_ref(),
             &mut draw_buf.opaque_db,
             &material_buffer.content,
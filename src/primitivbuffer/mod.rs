@@ -25,10 +25,10 @@ pub struct PrimitiveBufferPy {
 #[pymethods]
 impl PrimitiveBufferPy {
     #[new]
-    #[pyo3(signature = (max_size=64))]
-    fn new(max_size: usize) -> Self {
+    #[pyo3(signature = (max_size=64, hard_cap=None))]
+    fn new(max_size: usize, hard_cap: Option<usize>) -> Self {
         // Step 3: Box the Vec<GeomElement>
-        let content = PrimitiveBuffer::new(max_size);
+        let content = PrimitiveBuffer::with_hard_cap(max_size, hard_cap);
         PrimitiveBufferPy { content }
     }
     fn clear(&mut self) {
@@ -37,6 +37,36 @@ impl PrimitiveBufferPy {
     fn primitive_count(&self) -> usize {
         self.content.current_size
     }
+    /// number of allocated slots; grows on demand up to the hard cap
+    fn capacity(&self) -> usize {
+        self.content.max_size
+    }
+    /// highest primitive count reached, across builds and clears
+    fn high_water_mark(&self) -> usize {
+        self.content.high_water_mark()
+    }
+    /// primitives dropped at the hard cap since the last build or clear
+    fn dropped_count(&self) -> usize {
+        self.content.dropped
+    }
+
+    /// enable or disable reuse of per-geometry primitives between builds
+    fn set_cache_enabled(&mut self, enabled: bool) {
+        self.content.cache_enabled = enabled;
+        if !enabled {
+            self.content.invalidate_cache();
+        }
+    }
+    fn cache_enabled(&self) -> bool {
+        self.content.cache_enabled
+    }
+    /// (hits, misses) of the primitive cache during the last build
+    fn cache_stats(&self) -> (usize, usize) {
+        (self.content.cache_hits, self.content.cache_misses)
+    }
+    fn invalidate_cache(&mut self) {
+        self.content.invalidate_cache();
+    }
 
     #[pyo3(signature = (node_id, geometry_id, material_id, row, col, depth, uv, transparent=false))]
     fn add_point(
@@ -50,6 +80,7 @@ impl PrimitiveBufferPy {
         uv: usize,
         transparent: bool,
     ) -> usize {
+        self.content.invalidate_cache();
         self.content
             .add_point(
                 node_id,
@@ -77,6 +108,7 @@ impl PrimitiveBufferPy {
         uv_b: Py<PyAny>,
         transparent: bool,
     ) -> usize {
+        self.content.invalidate_cache();
         self.content.add_line(
             node_id,
             geometry_id,
@@ -127,6 +159,7 @@ impl PrimitiveBufferPy {
             Vec3::zeros(),
         );
 
+        self.content.invalidate_cache();
         self.content
             .add_triangle(node_id, geometry_id, material_id, va, vb, vc, transparent)
     }
@@ -160,6 +193,7 @@ impl PrimitiveBufferPy {
             vec2(bottom_right_uv.0, bottom_right_uv.1),
             Vec3::zeros(),
         );
+        self.content.invalidate_cache();
         self.content
             .add_rect(
                 node_id,
@@ -3,6 +3,7 @@ use std::ops::{AddAssign, Div, Mul, Sub};
 use nalgebra_glm::{vec3, RealNumber, TVec3, Vec2, Vec3, Vec4};
 
 use crate::raster;
+use crate::utils::{grown_capacity, resize_boxed_slice};
 use raster::vertex::Vertex;
 
 use super::{PRect, PTriangle3D};
@@ -179,19 +180,81 @@ impl PrimitiveElements {
             PrimitiveElements::Rect(_r) => 0,
         }
     }
+
+    /// Smallest vertex depth of the primitive, used to raster front to back.
+    pub fn nearest_depth(&self) -> f32 {
+        match self {
+            PrimitiveElements::Point { point, .. } => point.depth(),
+            PrimitiveElements::Line { pa, pb, .. } => pa.pos.z.min(pb.pos.z),
+            PrimitiveElements::Triangle3D(t) => t.pa.pos.z.min(t.pb.pos.z).min(t.pc.pos.z),
+            PrimitiveElements::Rect(r) => r.top_left.pos.z.min(r.bottom_right.pos.z),
+            PrimitiveElements::Static { .. } => f32::NEG_INFINITY,
+        }
+    }
+
+    pub fn set_primitive_id(&mut self, primitive_id: usize) {
+        match self {
+            PrimitiveElements::Point { fds, .. }
+            | PrimitiveElements::Line { fds, .. }
+            | PrimitiveElements::Static { fds, .. } => fds.primitive_id = primitive_id,
+            PrimitiveElements::Triangle3D(t) => t.primitive_reference.primitive_id = primitive_id,
+            PrimitiveElements::Rect(r) => r.primitive_reference.primitive_id = primitive_id,
+        }
+    }
+}
+
+/// Everything the primitives of one geometry depend on.
+///
+/// When the key of a geometry is unchanged since the previous build, its
+/// primitives are copied from the previous frame instead of being rebuilt.
+#[derive(Clone, Copy, Debug, PartialEq, Eq)]
+pub struct PrimitiveCacheKey {
+    pub geometry_version: u64,
+    pub node_version: u64,
+    pub view_version: u64,
+    pub projection_version: u64,
+    pub vertex_version: u64,
+    pub screen_size: (usize, usize),
+}
+
+#[derive(Clone, Copy, Debug)]
+pub struct CachedPrimitiveRange {
+    pub key: PrimitiveCacheKey,
+    pub start: usize,
+    pub count: usize,
 }
 
 pub struct PrimitiveBuffer {
+    /// Allocated slots; grows on demand up to `hard_cap`.
     pub max_size: usize,
     pub current_size: usize,
     pub content: Box<[PrimitiveElements]>,
+    pub hard_cap: Option<usize>,
+    /// Highest `current_size` reached by a previous build.
+    pub high_water: usize,
+    /// primitives dropped because the hard cap was reached, since the last build
+    pub dropped: usize,
+
+    /// content of the previous build, swapped in by `begin_build`
+    pub previous: Box<[PrimitiveElements]>,
+    /// per geometry id, the range it produced during the previous build
+    pub geometry_cache: Vec<Option<CachedPrimitiveRange>>,
+    pub cache_enabled: bool,
+    pub cache_hits: usize,
+    pub cache_misses: usize,
 }
 
 impl PrimitiveBuffer {
     pub fn new(max_size: usize) -> Self {
+        Self::with_hard_cap(max_size, None)
+    }
+
+    pub fn with_hard_cap(max_size: usize, hard_cap: Option<usize>) -> Self {
+        let max_size = hard_cap.map_or(max_size, |cap| max_size.min(cap));
         let init_array: Vec<PrimitiveElements> =
             vec![PrimitiveElements::Triangle3D(PTriangle3D::zero()); max_size];
 
+        let previous = init_array.clone().into_boxed_slice();
         let content = init_array.into_boxed_slice();
 
         let current_size = 0;
@@ -199,7 +262,98 @@ impl PrimitiveBuffer {
             max_size,
             current_size,
             content,
+            hard_cap,
+            high_water: 0,
+            dropped: 0,
+            previous,
+            geometry_cache: Vec::new(),
+            cache_enabled: true,
+            cache_hits: 0,
+            cache_misses: 0,
+        }
+    }
+
+    /// Make room for `additional` more primitives; false when the hard cap forbids it.
+    pub fn reserve(&mut self, additional: usize) -> bool {
+        let required = self.current_size + additional;
+        if required <= self.max_size {
+            return true;
+        }
+        match grown_capacity(self.max_size, required, self.hard_cap) {
+            Some(capacity) => {
+                let fill = PrimitiveElements::Triangle3D(PTriangle3D::zero());
+                resize_boxed_slice(&mut self.content, capacity, || fill);
+                resize_boxed_slice(&mut self.previous, capacity, || fill);
+                self.max_size = capacity;
+                true
+            }
+            None => false,
+        }
+    }
+
+    /// Reserve one slot, counting a dropped primitive when the hard cap is reached.
+    fn reserve_one(&mut self) -> bool {
+        let room = self.reserve(1);
+        if !room {
+            self.dropped += 1;
         }
+        room
+    }
+
+    pub fn high_water_mark(&self) -> usize {
+        self.high_water.max(self.current_size)
+    }
+
+    /// Start a new build: the current content becomes the cache source.
+    pub fn begin_build(&mut self) {
+        std::mem::swap(&mut self.content, &mut self.previous);
+        self.high_water = self.high_water_mark();
+        self.current_size = 0;
+        self.dropped = 0;
+        self.cache_hits = 0;
+        self.cache_misses = 0;
+    }
+
+    /// Copy the primitives built for `geometry_id` during the previous build if
+    /// its key did not change. Returns false when the geometry must be rebuilt.
+    pub fn reuse_cached(&mut self, geometry_id: usize, key: PrimitiveCacheKey) -> bool {
+        let cached = match self.geometry_cache.get(geometry_id) {
+            Some(Some(cached)) if self.cache_enabled && cached.key == key => *cached,
+            _ => {
+                self.cache_misses += 1;
+                return false;
+            }
+        };
+
+        let start = self.current_size;
+        self.reserve(cached.count);
+        let count = cached.count.min(self.max_size - start);
+        self.dropped += cached.count - count;
+        for offset in 0..count {
+            let mut elem = self.previous[cached.start + offset];
+            elem.set_primitive_id(start + offset);
+            self.content[start + offset] = elem;
+        }
+        self.current_size += count;
+        self.geometry_cache[geometry_id] = Some(CachedPrimitiveRange { key, start, count });
+        self.cache_hits += 1;
+        true
+    }
+
+    /// Record the range `start..current_size` as the primitives of `geometry_id`.
+    pub fn store_cached(&mut self, geometry_id: usize, key: PrimitiveCacheKey, start: usize) {
+        if self.geometry_cache.len() <= geometry_id {
+            self.geometry_cache.resize(geometry_id + 1, None);
+        }
+        self.geometry_cache[geometry_id] = Some(CachedPrimitiveRange {
+            key,
+            start,
+            count: self.current_size - start,
+        });
+    }
+
+    pub fn invalidate_cache(&mut self) {
+        self.geometry_cache.clear();
     }
     pub fn add_rect(
         &mut self,
@@ -210,7 +364,7 @@ impl PrimitiveBuffer {
         bottom_right: Vertex,
         transparent: bool,
     ) -> usize {
-        if self.current_size == self.max_size {
+        if !self.reserve_one() {
             return self.current_size;
         }
 
@@ -239,7 +393,7 @@ impl PrimitiveBuffer {
         pc: Vertex,
         transparent: bool,
     ) -> usize {
-        if self.current_size == self.max_size {
+        if !self.reserve_one() {
             return self.current_size;
         }
 
@@ -270,7 +424,7 @@ impl PrimitiveBuffer {
         uv: usize,
         transparent: bool,
     ) -> usize {
-        if self.current_size == self.max_size {
+        if !self.reserve_one() {
             return self.current_size;
         }
         let pr = PrimitivReferences {
@@ -305,6 +459,9 @@ impl PrimitiveBuffer {
         uv_b: Vec2,
         transparent: bool,
     ) -> usize {
+        if !self.reserve_one() {
+            return self.current_size;
+        }
         let elem = PrimitiveElements::Line {
             fds: PrimitivReferences {
                 geometry_id,
@@ -328,6 +485,8 @@ impl PrimitiveBuffer {
     }
 
     pub fn clear(&mut self) {
+        self.high_water = self.high_water_mark();
         self.current_size = 0;
+        self.dropped = 0;
     }
 }
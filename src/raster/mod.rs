@@ -3,7 +3,11 @@ use primitivbuffer::{PointInfo, PrimitivReferences, PrimitiveBuffer, PrimitiveEl
 use pyo3::{pyfunction, PyRefMut, Python};
 
 use crate::{
-    drawbuffer::{drawbuffer::DrawBuffer, DrawingBufferPy},
+    drawbuffer::{
+        drawbuffer::{DepthPass, DrawBuffer},
+        DrawingBufferPy,
+    },
+    material::MaterialBufferPy,
     primitivbuffer::*,
     vertexbuffer::{vertex_buffer::VertexBuffer, vertex_buffer_py::VertexBufferPy},
 };
@@ -169,33 +173,103 @@ pub fn raster_all<const DEPTHCOUNT: usize>(
     }
 }
 
+/// Like [`raster_all`], nearest primitives first so that the depth tests (and the
+/// coarse tile test of triangles) reject as much of the hidden ones as possible.
+///
+/// The sort is stable: primitives at the same depth keep their buffer order.
+pub fn raster_all_front_to_back<const DEPTHCOUNT: usize>(
+    primitivbuffer: &PrimitiveBuffer,
+    vertexbuffer: &VertexBuffer<Vec4>,
+    drawing_buffer: &mut DrawBuffer<DEPTHCOUNT, f32>,
+    pass_filter: Option<PassTag>,
+) {
+    let mut order: Vec<(f32, usize)> = primitivbuffer.content[..primitivbuffer.current_size]
+        .iter()
+        .enumerate()
+        .filter(|(_, element)| primitive_matches_pass(element, pass_filter))
+        .map(|(idx, element)| (element.nearest_depth(), idx))
+        .collect();
+    order.sort_by(|a, b| a.0.total_cmp(&b.0));
+    for (_, primitiv_idx) in order {
+        raster_element(
+            &primitivbuffer.content[primitiv_idx],
+            vertexbuffer,
+            drawing_buffer,
+        )
+    }
+}
+
+/// Raster twice with a depth pre-pass: the first pass only settles the depth of every
+/// cell, the second one writes the pixel info of the fragments at that depth, once per
+/// cell. Pays off when the overdraw is high and the pixel info writes are expensive.
+pub fn raster_all_depth_prepass<const DEPTHCOUNT: usize>(
+    primitivbuffer: &PrimitiveBuffer,
+    vertexbuffer: &VertexBuffer<Vec4>,
+    drawing_buffer: &mut DrawBuffer<DEPTHCOUNT, f32>,
+    pass_filter: Option<PassTag>,
+    front_to_back: bool,
+) {
+    let raster = if front_to_back {
+        raster_all_front_to_back::<DEPTHCOUNT>
+    } else {
+        raster_all::<DEPTHCOUNT>
+    };
+    drawing_buffer.set_depth_pass(DepthPass::DepthOnly);
+    raster(primitivbuffer, vertexbuffer, drawing_buffer, pass_filter);
+    drawing_buffer.set_depth_pass(DepthPass::EqualDepth);
+    raster(primitivbuffer, vertexbuffer, drawing_buffer, pass_filter);
+    drawing_buffer.set_depth_pass(DepthPass::Full);
+}
+
+/// With a `material_buffer`, the opaque fragments of constant materials (see
+/// [`crate::drawbuffer::drawbuffer::DrawBuffer::set_depth_fill`]) are shaded during the
+/// raster, and the material pass skips them.
 #[pyfunction]
-#[pyo3(signature = (pb, vbuffpy, db, pass_filter=None))]
+#[pyo3(signature = (pb, vbuffpy, db, pass_filter=None, front_to_back=false, depth_prepass=false, material_buffer=None))]
 pub fn raster_all_py(
     _py: Python,
     pb: &PrimitiveBufferPy,
     vbuffpy: &VertexBufferPy,
     mut db: PyRefMut<'_, DrawingBufferPy>,
     pass_filter: Option<&str>,
+    front_to_back: bool,
+    depth_prepass: bool,
+    material_buffer: Option<&MaterialBufferPy>,
 ) {
     let primitivbuffer = &pb.content;
+    let fills = material_buffer.map_or_else(Vec::new, |mb| mb.content.constant_fills());
+    db.opaque_db.set_constant_fills(fills);
 
     let pass = match pass_filter {
         Some("opaque") => Some(PassTag::Opaque),
         Some("transparent") => Some(PassTag::Transparent),
         _ => None,
     };
+    let raster = if front_to_back {
+        raster_all_front_to_back::<1>
+    } else {
+        raster_all::<1>
+    };
     match pass {
         Some(PassTag::Transparent) => {
-            raster_all(
+            raster(
                 primitivbuffer,
                 &vbuffpy.buffer3d,
                 &mut db.transparent_db,
                 Some(PassTag::Transparent),
             );
         }
+        _ if depth_prepass => {
+            raster_all_depth_prepass::<1>(
+                primitivbuffer,
+                &vbuffpy.buffer3d,
+                &mut db.opaque_db,
+                Some(PassTag::Opaque),
+                front_to_back,
+            );
+        }
         _ => {
-            raster_all(
+            raster(
                 primitivbuffer,
                 &vbuffpy.buffer3d,
                 &mut db.opaque_db,
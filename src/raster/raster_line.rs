@@ -140,9 +140,9 @@ mod tests {
         // assert the line is rastered
         // get the point at 0, 0
         let pixinfo = drawing_buffer.get_pix_buffer_content_at_row_col(0, 0, 0);
-        assert_eq!(pixinfo.node_id, prim_ref.node_id);
-        assert_eq!(pixinfo.geometry_id, prim_ref.geometry_id);
-        assert_eq!(pixinfo.material_id, prim_ref.material_id);
+        assert_eq!(pixinfo.node_id as usize, prim_ref.node_id);
+        assert_eq!(pixinfo.geometry_id as usize, prim_ref.geometry_id);
+        assert_eq!(pixinfo.material_id as usize, prim_ref.material_id);
 
         assert_eq!(pixinfo.uv.x, 1.0);
         assert_eq!(pixinfo.uv.y, 0.0);
@@ -53,11 +53,20 @@ pub fn raster_prect<const DEPTHCOUNT: usize>(
     {
         println!(" prestep row : {:?}", it_row);
     }
+    // constant materials fill the canvas in whole spans, without the uv interpolation
+    let fill = drawing_buffer.constant_fill(prim_ref.material_id);
     for row in row_start..row_end {
         #[cfg(test)]
         {
             println!("draw_rectangle cols  : {:?},{:?}", col_start, col_end);
         }
+        if let Some(fill) = fill {
+            for col in col_start..col_end {
+                drawing_buffer.set_depth_fill(row, col, 0.01, &prim_ref, fill);
+            }
+            it_row += di_uv_row;
+            continue;
+        }
         let mut i_line = it_row;
         i_line += di_uv_col * (col_start as f32 + 0.5f32 - top_left.pos.x);
 
@@ -105,7 +114,7 @@ mod test_raster_rect {
     use nalgebra_glm::{vec2, vec3, vec4};
 
     use crate::{
-        drawbuffer::drawbuffer::DrawBuffer,
+        drawbuffer::drawbuffer::{CanvasCell, Color, DrawBuffer},
         raster::{primitivbuffer::PrimitivReferences, Vertex},
     };
 
@@ -203,4 +212,49 @@ mod test_raster_rect {
             }
         }
     }
+
+    #[test]
+    fn test_raster_rect_constant_fill() {
+        let mut drawing_buffer = DrawBuffer::<1, f32>::new(10, 10, 100.0, true, false);
+        let fill = CanvasCell::new(Color::new(1, 2, 3, 255), Color::new(4, 5, 6, 255), 7);
+        drawing_buffer.set_constant_fills(vec![None, None, Some(fill)]);
+
+        let vertex = |x: f32, y: f32| Vertex {
+            pos: vec4(x, y, 1.0, 1.0),
+            normal: vec3(0.0, 0.0, 0.0),
+            uv: vec2(x, y),
+            view_pos: vec3(0.0, 0.0, 0.0),
+        };
+        for (material_id, (x0, x1)) in [(2, (0.0, 3.0)), (1, (5.0, 8.0))] {
+            let rect = super::PRect {
+                top_left: vertex(x0, 0.0),
+                bottom_right: vertex(x1, 4.0),
+                primitive_reference: PrimitivReferences {
+                    geometry_id: 1,
+                    material_id,
+                    node_id: 3,
+                    primitive_id: 4,
+                    transparent: false,
+                },
+            };
+            raster_prect(&mut drawing_buffer, &rect);
+        }
+
+        for row in 0..4 {
+            for col in 0..3 {
+                let pixinfo = drawing_buffer.get_pix_buffer_content_at_row_col(row, col, 0);
+                assert_eq!(pixinfo.material_id, 2);
+                assert!(pixinfo.preshaded);
+                let cell = drawing_buffer.get_canvas_cell(row, col);
+                assert_eq!(cell.front_color, fill.front_color);
+                assert_eq!(cell.back_color, fill.back_color);
+                assert_eq!(cell.glyph, 7);
+            }
+            for col in 5..8 {
+                let pixinfo = drawing_buffer.get_pix_buffer_content_at_row_col(row, col, 0);
+                assert_eq!(pixinfo.material_id, 1);
+                assert!(!pixinfo.preshaded);
+            }
+        }
+    }
 }
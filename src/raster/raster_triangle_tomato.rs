@@ -1,11 +1,100 @@
 use nalgebra_glm::{vec2, TVec2};
 
-use crate::drawbuffer::drawbuffer::{
-    triangle_front_facing_submission_order_xy, DrawBuffer,
+use crate::drawbuffer::{
+    coarse_depth::COARSE_TILE_SIZE,
+    drawbuffer::{
+        oriented_area_2d_xy, triangle_front_facing_submission_order_xy, uv_footprint, DrawBuffer,
+    },
 };
 
 use super::{primitivbuffer::PrimitivReferences, Vertex};
 
+/// Screen-space barycentric coordinates of a triangle, as affine functions of the
+/// cell position.
+///
+/// `b1` and `b2` are the weights of `pb` and `pc` (the weight of `pa` being
+/// `1 - b1 - b2`), computed from the vertices in submission order. Used by the
+/// visibility-buffer mode to store fragments and to rebuild their attributes.
+#[derive(Clone, Copy, Debug)]
+pub struct BarycentricPlane {
+    ax: f32,
+    ay: f32,
+    // gradients of b1 and b2 along x (col) and y (row)
+    b1_dx: f32,
+    b1_dy: f32,
+    b2_dx: f32,
+    b2_dy: f32,
+    za: f32,
+    dzb: f32,
+    dzc: f32,
+    pub front_facing: bool,
+}
+
+impl BarycentricPlane {
+    /// `None` for a degenerate (zero area) triangle.
+    pub fn new(pa: &Vertex, pb: &Vertex, pc: &Vertex) -> Option<Self> {
+        let area = oriented_area_2d_xy(pa.pos.x, pa.pos.y, pb.pos.x, pb.pos.y, pc.pos.x, pc.pos.y);
+        if area == 0.0 || !area.is_finite() {
+            return None;
+        }
+        Some(BarycentricPlane {
+            ax: pa.pos.x,
+            ay: pa.pos.y,
+            b1_dx: (pc.pos.y - pa.pos.y) / area,
+            b1_dy: -(pc.pos.x - pa.pos.x) / area,
+            b2_dx: -(pb.pos.y - pa.pos.y) / area,
+            b2_dy: (pb.pos.x - pa.pos.x) / area,
+            za: pa.pos.z,
+            dzb: pb.pos.z - pa.pos.z,
+            dzc: pc.pos.z - pa.pos.z,
+            front_facing: triangle_front_facing_submission_order_xy(
+                pa.pos.x, pa.pos.y, pb.pos.x, pb.pos.y, pc.pos.x, pc.pos.y,
+            ),
+        })
+    }
+
+    /// `(b1, b2)` at the screen position `(x, y)`.
+    #[inline]
+    pub fn barycentric(&self, x: f32, y: f32) -> (f32, f32) {
+        let dx = x - self.ax;
+        let dy = y - self.ay;
+        (
+            self.b1_dx * dx + self.b1_dy * dy,
+            self.b2_dx * dx + self.b2_dy * dy,
+        )
+    }
+
+    /// Change of `(b1, b2)` for one row down.
+    #[inline]
+    pub fn row_step(&self) -> (f32, f32) {
+        (self.b1_dy, self.b2_dy)
+    }
+
+    /// Change of `(b1, b2)` for one column right.
+    #[inline]
+    pub fn col_step(&self) -> (f32, f32) {
+        (self.b1_dx, self.b2_dx)
+    }
+
+    #[inline]
+    pub fn depth(&self, b1: f32, b2: f32) -> f32 {
+        self.za + self.dzb * b1 + self.dzc * b2
+    }
+
+    /// Change of the depth for one row down.
+    #[inline]
+    pub fn depth_row_step(&self) -> f32 {
+        self.dzb * self.b1_dy + self.dzc * self.b2_dy
+    }
+
+    /// Screen-space interpolation of the vertices, before perspective correction
+    /// (attributes are still multiplied by `1/w`, like the raster interpolants).
+    #[inline]
+    pub fn interpolate(&self, pa: &Vertex, pb: &Vertex, pc: &Vertex, b1: f32, b2: f32) -> Vertex {
+        *pa + (*pb - *pa) * b1 + (*pc - *pa) * b2
+    }
+}
+
 /// Draws a triangle with a flat bottom edge.
 ///
 /// This function assumes that the triangle's vertices are pre-sorted such that:
@@ -31,6 +120,7 @@ use super::{primitivbuffer::PrimitivReferences, Vertex};
 /// - `pa`: The top vertex of the triangle.
 /// - `pb`: The left vertex on the horizontal bottom edge.
 /// - `pc`: The right vertex on the horizontal bottom edge.
+/// - `plane`: Barycentric plane of the whole triangle in visibility-buffer mode, `None` otherwise.
 ///
 /// # Type Parameters
 ///
@@ -46,6 +136,7 @@ pub fn draw_flat_bottom_triangle<const DEPTHCOUNT: usize>(
     pb: &Vertex,
     pc: &Vertex,
     front_facing: bool,
+    plane: Option<&BarycentricPlane>,
 ) {
     // calculate dVertex / d row
     let delta_row = pc.pos.y - pa.pos.y;
@@ -65,6 +156,7 @@ pub fn draw_flat_bottom_triangle<const DEPTHCOUNT: usize>(
         dit1,
         &mut it_edge1,
         front_facing,
+        plane,
     );
 }
 
@@ -92,6 +184,7 @@ pub fn draw_flat_bottom_triangle<const DEPTHCOUNT: usize>(
 /// - `pa`: The leftmost vertex on the top edge.
 /// - `pb`: The rightmost vertex on the top edge.
 /// - `pc`: The bottom vertex of the triangle.
+/// - `plane`: Barycentric plane of the whole triangle in visibility-buffer mode, `None` otherwise.
 ///
 /// # Type Parameters
 ///
@@ -107,6 +200,7 @@ pub fn draw_flat_top_triangle<const DEPTHCOUNT: usize>(
     pb: &Vertex,
     pc: &Vertex,
     front_facing: bool,
+    plane: Option<&BarycentricPlane>,
 ) {
     // calculate dVertex / d row
     let delta_row = pc.pos.y - pa.pos.y;
@@ -126,6 +220,7 @@ pub fn draw_flat_top_triangle<const DEPTHCOUNT: usize>(
         dit1,
         &mut it_edge1,
         front_facing,
+        plane,
     );
 }
 
@@ -295,6 +390,37 @@ pub fn tomato_draw_triangle<const DEPTHCOUNT: usize>(
         pc.pos.x,
         pc.pos.y,
     );
+    // the plane is built from the submission order, before the vertices are sorted
+    let triangle_plane = BarycentricPlane::new(pa, pb, pc);
+
+    // Whole triangle hidden behind the coarse depth of its bounding box. Samples are
+    // taken a quarter row above the cell centers, so the depth may reach a bit past
+    // the vertex values.
+    if let Some(triangle_plane) = triangle_plane.as_ref() {
+        let nearest =
+            pa.pos.z.min(pb.pos.z).min(pc.pos.z) - 0.25 * triangle_plane.depth_row_step().abs();
+        let rows = (
+            (pa.pos.y.min(pb.pos.y).min(pc.pos.y) - 0.5).ceil().max(0.0) as usize,
+            (pa.pos.y.max(pb.pos.y).max(pc.pos.y) - 0.5)
+                .ceil()
+                .min(drawing_buffer.row_count as f32) as usize,
+        );
+        let cols = (
+            (pa.pos.x.min(pb.pos.x).min(pc.pos.x) - 0.5).ceil().max(0.0) as usize,
+            (pa.pos.x.max(pb.pos.x).max(pc.pos.x) - 0.5)
+                .ceil()
+                .min(drawing_buffer.col_count as f32) as usize,
+        );
+        if drawing_buffer.coarse_rejects(rows, cols, nearest) {
+            return;
+        }
+    }
+
+    let plane = if drawing_buffer.visibility_enabled() {
+        triangle_plane.as_ref()
+    } else {
+        None
+    };
 
     // sorting vertices by y (row)
     let mut p0 = pa;
@@ -339,7 +465,7 @@ pub fn tomato_draw_triangle<const DEPTHCOUNT: usize>(
             std::mem::swap(&mut p0, &mut p1);
         }
 
-        draw_flat_top_triangle(drawing_buffer, prim_ref, p0, p1, p2, front_facing);
+        draw_flat_top_triangle(drawing_buffer, prim_ref, p0, p1, p2, front_facing, plane);
     } else if p1.pos.y == p2.pos.y {
         // flat bottom
         // For the flat bottom triangle (when p1.pos.y == p2.pos.y):
@@ -348,7 +474,7 @@ pub fn tomato_draw_triangle<const DEPTHCOUNT: usize>(
         if p2.pos.x < p1.pos.x {
             std::mem::swap(&mut p1, &mut p2);
         }
-        draw_flat_bottom_triangle(drawing_buffer, prim_ref, p0, p1, p2, front_facing);
+        draw_flat_bottom_triangle(drawing_buffer, prim_ref, p0, p1, p2, front_facing, plane);
     } else {
         // general case where we need to split the triangle in 2
         // and draw the top and bottom triangles separately
@@ -369,12 +495,44 @@ pub fn tomato_draw_triangle<const DEPTHCOUNT: usize>(
             {
                 println!("flat bottom  (a,b,split), then flat top (b , split , c");
             }
-            draw_flat_bottom_triangle(drawing_buffer, prim_ref, p0, p1, &p_split, front_facing);
-            draw_flat_top_triangle(drawing_buffer, prim_ref, p1, &p_split, p2, front_facing);
+            draw_flat_bottom_triangle(
+                drawing_buffer,
+                prim_ref,
+                p0,
+                p1,
+                &p_split,
+                front_facing,
+                plane,
+            );
+            draw_flat_top_triangle(
+                drawing_buffer,
+                prim_ref,
+                p1,
+                &p_split,
+                p2,
+                front_facing,
+                plane,
+            );
         } else {
             // major left
-            draw_flat_bottom_triangle(drawing_buffer, prim_ref, p0, &p_split, p1, front_facing);
-            draw_flat_top_triangle(drawing_buffer, prim_ref, &p_split, p1, p2, front_facing);
+            draw_flat_bottom_triangle(
+                drawing_buffer,
+                prim_ref,
+                p0,
+                &p_split,
+                p1,
+                front_facing,
+                plane,
+            );
+            draw_flat_top_triangle(
+                drawing_buffer,
+                prim_ref,
+                &p_split,
+                p1,
+                p2,
+                front_facing,
+                plane,
+            );
         }
     }
 }
@@ -389,6 +547,7 @@ pub fn draw_flat_triangle_double_raster<const DEPTHCOUNT: usize>(
     right_edge_step: Vertex,
     right_edge_interpolant: &mut Vertex,
     front_facing: bool,
+    plane: Option<&BarycentricPlane>,
 ) {
     // --- Edge Interpolant Initialization ---
     // Create an interpolant for the left edge, starting at the apex (pa).
@@ -420,6 +579,9 @@ pub fn draw_flat_triangle_double_raster<const DEPTHCOUNT: usize>(
         println!("draw_flat_triangle rows  : {:?}, {:?}", row_start, row_end);
     }
 
+    // Constant materials skip the attribute interpolation and fill the canvas directly.
+    let fill = drawing_buffer.constant_fill(prim_ref.material_id);
+
     // --- Rasterization Loop Over Scanlines ---
     for row in row_start..row_end {
         // Calculate the starting and ending column indices for the current scanline:
@@ -463,44 +625,113 @@ pub fn draw_flat_triangle_double_raster<const DEPTHCOUNT: usize>(
         let mut current_lower_scanline_interpolant = lower_left_edge
             + lower_scanline_step * ((col_start as f32 + 0.5f32) - lower_left_edge.pos.x);
 
-        // --- Rasterize the Current Scanline Pixel by Pixel ---
-        for col in col_start..col_end {
-            // --- Upper Sample Calculation ---
-            // Recover the interpolated reciprocal of w for the upper part.
-            // This value corrects perspective distortion for the current interpolated vertex.
-            let w_upper = 1.0f32 / current_upper_scanline_interpolant.pos.w;
-            // Apply perspective correction to obtain the vertex attributes for the upper sample.
-            let upper_attr = current_upper_scanline_interpolant * w_upper;
-            // --- Lower Sample Calculation ---
-            // Recover the interpolated reciprocal of w for the lower part.
-            let w_lower = 1.0f32 / current_lower_scanline_interpolant.pos.w;
-            // Apply perspective correction to obtain the vertex attributes for the lower sample.
-            let lower_attr = current_lower_scanline_interpolant * w_lower;
-
-            // Write the computed pixel data into the drawing buffer.
-            // - The depth (z value) is taken from the interpolated value (assumed similar for both samples).
-            // - `upper_attr.uv` provides the UV coordinates for the upper part of the rectangle.
-            // - `lower_attr.uv` provides the UV_1 coordinates for the lower part of the rectangle.
-            drawing_buffer.set_depth_content(
-                row,
-                col,
-                current_upper_scanline_interpolant.pos.z,
-                upper_attr.normal,
-                upper_attr.view_pos,
-                upper_attr.uv,
-                lower_attr.uv,
-                prim_ref.node_id,
-                prim_ref.geometry_id,
-                prim_ref.material_id,
-                prim_ref.primitive_id,
-                front_facing,
-                0.0,
-                vec2(0.0, 0.0),
-            );
+        // --- Rasterize the Current Scanline, one Coarse Depth Tile at a Time ---
+        let mut col = col_start;
+        while col < col_end {
+            let chunk_end = ((col / COARSE_TILE_SIZE + 1) * COARSE_TILE_SIZE).min(col_end);
+            let count = chunk_end - col;
+
+            // The depth is linear along the span, so its nearest value is at one end;
+            // the whole chunk is skipped when even that is hidden in its tile.
+            let first_depth = current_upper_scanline_interpolant.pos.z;
+            let last_depth = first_depth + upper_scanline_step.pos.z * (count - 1) as f32;
+            if drawing_buffer.coarse_rejects(
+                (row, row + 1),
+                (col, chunk_end),
+                first_depth.min(last_depth),
+            ) {
+                current_upper_scanline_interpolant += upper_scanline_step * count as f32;
+                current_lower_scanline_interpolant += lower_scanline_step * count as f32;
+                col = chunk_end;
+                continue;
+            }
 
-            // Advance the horizontal interpolants to the next column.
-            current_upper_scanline_interpolant += upper_scanline_step;
-            current_lower_scanline_interpolant += lower_scanline_step;
+            if let Some(plane) = plane {
+                // --- Visibility Buffer ---
+                // Only the barycentric coordinates of the cell center are stored; the
+                // attributes are rebuilt for the visible fragments by `resolve_visibility`.
+                // The depth is taken at the upper sample like below.
+                let (db1, db2) = plane.row_step();
+                for col in col..chunk_end {
+                    let (b1, b2) = plane.barycentric(col as f32 + 0.5, row as f32 + 0.5);
+                    let depth = plane.depth(b1 - 0.25 * db1, b2 - 0.25 * db2);
+                    drawing_buffer.set_depth_visibility(
+                        row,
+                        col,
+                        depth,
+                        prim_ref.primitive_id,
+                        b1,
+                        b2,
+                    );
+                }
+                current_upper_scanline_interpolant += upper_scanline_step * count as f32;
+                current_lower_scanline_interpolant += lower_scanline_step * count as f32;
+                col = chunk_end;
+                continue;
+            }
+
+            if let Some(fill) = fill {
+                // --- Constant Fill ---
+                // Same depth steps as below, so that a depth pre-pass matches them.
+                let mut depth = current_upper_scanline_interpolant.pos.z;
+                for col in col..chunk_end {
+                    drawing_buffer.set_depth_fill(row, col, depth, prim_ref, fill);
+                    depth += upper_scanline_step.pos.z;
+                }
+                current_upper_scanline_interpolant += upper_scanline_step * count as f32;
+                current_lower_scanline_interpolant += lower_scanline_step * count as f32;
+                col = chunk_end;
+                continue;
+            }
+
+            for col in col..chunk_end {
+                // --- Upper Sample Calculation ---
+                // Recover the interpolated reciprocal of w for the upper part.
+                // This value corrects perspective distortion for the current interpolated vertex.
+                let w_upper = 1.0f32 / current_upper_scanline_interpolant.pos.w;
+                // Apply perspective correction to obtain the vertex attributes for the upper sample.
+                let upper_attr = current_upper_scanline_interpolant * w_upper;
+                // --- Lower Sample Calculation ---
+                // Recover the interpolated reciprocal of w for the lower part.
+                let w_lower = 1.0f32 / current_lower_scanline_interpolant.pos.w;
+                // Apply perspective correction to obtain the vertex attributes for the lower sample.
+                let lower_attr = current_lower_scanline_interpolant * w_lower;
+
+                // Write the computed pixel data into the drawing buffer.
+                // - The depth (z value) is taken from the interpolated value (assumed similar for both samples).
+                // - `upper_attr.uv` provides the UV coordinates for the upper part of the rectangle.
+                // - `lower_attr.uv` provides the UV_1 coordinates for the lower part of the rectangle.
+                let written = drawing_buffer.set_depth_content(
+                    row,
+                    col,
+                    current_upper_scanline_interpolant.pos.z,
+                    upper_attr.normal,
+                    upper_attr.view_pos,
+                    upper_attr.uv,
+                    lower_attr.uv,
+                    prim_ref.node_id,
+                    prim_ref.geometry_id,
+                    prim_ref.material_id,
+                    prim_ref.primitive_id,
+                    front_facing,
+                    0.0,
+                    vec2(0.0, 0.0),
+                );
+                if let Some(pix_index) = written {
+                    // derivative of the perspective-corrected uv along the scanline:
+                    // d(uv) = (d(uv/w) - uv * d(1/w)) * w
+                    let duv_dcol = (upper_scanline_step.uv
+                        - upper_attr.uv * upper_scanline_step.pos.w)
+                        * w_upper;
+                    drawing_buffer.pixbuffer[pix_index].uv_footprint =
+                        uv_footprint(duv_dcol, lower_attr.uv - upper_attr.uv);
+                }
+
+                // Advance the horizontal interpolants to the next column.
+                current_upper_scanline_interpolant += upper_scanline_step;
+                current_lower_scanline_interpolant += lower_scanline_step;
+            }
+            col = chunk_end;
         }
 
         // --- Advance Vertical Edge Interpolants ---
@@ -582,6 +813,118 @@ mod test_raster_duo_triangle {
         assert_eq!(drawing_buffer.get_depth_buffer_cell(3, 4).depth[0], 0.0); // blit in middle
     }
 
+    #[test]
+    fn visibility_buffer_matches_direct_raster() {
+        use crate::primitivbuffer::primitivbuffer::{PrimitiveBuffer, PrimitiveElements};
+
+        // perspective: pos.w holds 1/w and the attributes are premultiplied by it
+        let (mut pa, mut pb, mut pc) = make_points_major_right();
+        pa.pos.z = 0.2;
+        pb.pos.z = 0.6;
+        pc.pos.z = 0.4;
+        for (p, inv_w) in [(&mut pa, 1.0f32), (&mut pb, 0.25), (&mut pc, 0.5)] {
+            p.pos.w = inv_w;
+            p.uv *= inv_w;
+            p.view_pos = Vec3::new(1.0, 2.0, 3.0) * inv_w;
+        }
+        let mut primitive_buffer = PrimitiveBuffer::new(4);
+        primitive_buffer.add_triangle(3, 1, 2, pa, pb, pc, false);
+        let PrimitiveElements::Triangle3D(t) = primitive_buffer.content[0] else {
+            panic!("expected a triangle");
+        };
+
+        let (mut direct, _) = setup_drawing();
+        tomato_draw_triangle(&mut direct, &t.primitive_reference, &t.pa, &t.pb, &t.pc);
+
+        let (mut visibility, _) = setup_drawing();
+        visibility.set_visibility_mode(true);
+        tomato_draw_triangle(&mut visibility, &t.primitive_reference, &t.pa, &t.pb, &t.pc);
+        visibility.resolve_visibility(&primitive_buffer);
+
+        let mut covered = 0;
+        for row in 0..8 {
+            for col in 0..10 {
+                let depth = direct.get_depth_buffer_cell(row, col).depth[0];
+                assert_abs_diff_eq!(
+                    visibility.get_depth_buffer_cell(row, col).depth[0],
+                    depth,
+                    epsilon = 1e-4
+                );
+                if depth >= 10.0 {
+                    continue;
+                }
+                covered += 1;
+                let a = direct.get_pix_buffer_content_at_row_col(row, col, 0);
+                let b = visibility.get_pix_buffer_content_at_row_col(row, col, 0);
+                assert_abs_diff_eq!(a.uv, b.uv, epsilon = 1e-3);
+                assert_abs_diff_eq!(a.uv_1, b.uv_1, epsilon = 1e-3);
+                assert_abs_diff_eq!(a.uv_footprint, b.uv_footprint, epsilon = 1e-3);
+                assert!(a.uv_footprint.x > 0.0 || a.uv_footprint.y > 0.0);
+                assert_abs_diff_eq!(a.view_pos, b.view_pos, epsilon = 1e-3);
+                assert_abs_diff_eq!(a.frag_pos, b.frag_pos, epsilon = 1e-6);
+                assert_eq!(a.front_facing, b.front_facing);
+                assert_eq!(
+                    (a.node_id, a.geometry_id, a.material_id),
+                    (b.node_id, b.geometry_id, b.material_id)
+                );
+            }
+        }
+        assert!(covered > 0);
+    }
+
+    #[test]
+    fn depth_prepass_matches_direct_raster() {
+        use crate::drawbuffer::drawbuffer::DepthPass;
+
+        // the same triangle twice, the second one nearer on one side only
+        let (pa, pb, pc) = make_points_major_right();
+        let (mut qa, mut qb, mut qc) = make_points_major_right();
+        qa.pos.z = -1.0;
+        qb.pos.z = 1.0;
+        qc.pos.z = 1.0;
+        let (mut direct, prim_ref) = setup_drawing();
+        let far = PrimitivReferences {
+            primitive_id: 1,
+            ..prim_ref
+        };
+        let near = PrimitivReferences {
+            primitive_id: 2,
+            ..prim_ref
+        };
+
+        tomato_draw_triangle(&mut direct, &far, &pa, &pb, &pc);
+        tomato_draw_triangle(&mut direct, &near, &qa, &qb, &qc);
+
+        let (mut prepass, _) = setup_drawing();
+        prepass.set_depth_pass(DepthPass::DepthOnly);
+        tomato_draw_triangle(&mut prepass, &far, &pa, &pb, &pc);
+        tomato_draw_triangle(&mut prepass, &near, &qa, &qb, &qc);
+        // nothing but depth so far
+        let untouched = prepass.get_pix_buffer_content_at_row_col(3, 5, 0);
+        assert_eq!(untouched.primitive_id, 0);
+        prepass.set_depth_pass(DepthPass::EqualDepth);
+        tomato_draw_triangle(&mut prepass, &far, &pa, &pb, &pc);
+        tomato_draw_triangle(&mut prepass, &near, &qa, &qb, &qc);
+        prepass.set_depth_pass(DepthPass::Full);
+
+        let mut ids = std::collections::HashSet::new();
+        for row in 0..8 {
+            for col in 0..10 {
+                assert_eq!(
+                    prepass.get_depth_buffer_cell(row, col).depth[0],
+                    direct.get_depth_buffer_cell(row, col).depth[0]
+                );
+                let a = direct.get_pix_buffer_content_at_row_col(row, col, 0);
+                let b = prepass.get_pix_buffer_content_at_row_col(row, col, 0);
+                assert_eq!(a.primitive_id, b.primitive_id);
+                assert_eq!(a.uv, b.uv);
+                ids.insert(a.primitive_id);
+            }
+        }
+        // both triangles are visible somewhere
+        assert!(ids.contains(&1) && ids.contains(&2));
+    }
+
     fn make_points_major_right() -> (Vertex, Vertex, Vertex) {
         let pa = Vertex::new(
             Vec4::new(7.0, 0.0, 0.0, 1.0),
@@ -0,0 +1,238 @@
+//! Native BMP and PNG decoding into texture pixels.
+//!
+//! Rows come out bottom-up, the order in which the python loaders hand pixels to
+//! `TextureBufferPy.add_texture`, so a file decodes to the same texture either way.
+
+use super::RGBA;
+
+#[derive(Clone, Debug, PartialEq)]
+pub struct DecodedImage {
+    pub width: usize,
+    pub height: usize,
+    /// `width * height` pixels, bottom row first
+    pub pixels: Vec<RGBA>,
+}
+
+const BI_RGB: u32 = 0;
+const BI_BITFIELDS: u32 = 3;
+const BI_ALPHABITFIELDS: u32 = 6;
+
+fn le_u16(bytes: &[u8], at: usize) -> Result<u16, String> {
+    bytes
+        .get(at..at + 2)
+        .map(|b| u16::from_le_bytes([b[0], b[1]]))
+        .ok_or_else(|| "BMP file is truncated".to_string())
+}
+
+fn le_u32(bytes: &[u8], at: usize) -> Result<u32, String> {
+    bytes
+        .get(at..at + 4)
+        .map(|b| u32::from_le_bytes([b[0], b[1], b[2], b[3]]))
+        .ok_or_else(|| "BMP file is truncated".to_string())
+}
+
+/// Channel of a 32-bit pixel selected by an 8-bit wide `mask`.
+fn masked_channel(pixel: u32, mask: u32) -> Option<u8> {
+    (mask != 0).then(|| ((pixel & mask) >> mask.trailing_zeros()) as u8)
+}
+
+/// Decode an uncompressed 24-bit, or 32-bit (plain or bit-field), BMP file.
+///
+/// Pixels without an alpha channel get `alpha`, like `asset_load.load_bmp`.
+pub fn decode_bmp(bytes: &[u8], alpha: u8) -> Result<DecodedImage, String> {
+    if bytes.get(..2) != Some(b"BM") {
+        return Err("Not a BMP file".to_string());
+    }
+    let pixel_offset = le_u32(bytes, 10)? as usize;
+    let dib_size = le_u32(bytes, 14)? as usize;
+    let width = le_u32(bytes, 18)? as i32;
+    let height = le_u32(bytes, 22)? as i32;
+    let bit_count = le_u16(bytes, 28)?;
+    let compression = le_u32(bytes, 30)?;
+    if width <= 0 || height == 0 {
+        return Err(format!("invalid BMP size {width}x{height}"));
+    }
+
+    // (red, green, blue, alpha) masks of the 32-bit pixels
+    let masks = match (bit_count, compression) {
+        (24, BI_RGB) => None,
+        (32, BI_RGB) => Some([0x00ff_0000, 0x0000_ff00, 0x0000_00ff, 0]),
+        (32, BI_BITFIELDS | BI_ALPHABITFIELDS) => {
+            // the masks follow a 40-byte header, or are part of a larger one
+            let alpha_mask = if compression == BI_ALPHABITFIELDS || dib_size >= 56 {
+                le_u32(bytes, 14 + 52)?
+            } else {
+                0
+            };
+            Some([
+                le_u32(bytes, 14 + 40)?,
+                le_u32(bytes, 14 + 44)?,
+                le_u32(bytes, 14 + 48)?,
+                alpha_mask,
+            ])
+        }
+        _ => {
+            return Err(format!(
+                "Only 24-bit and 32-bit uncompressed BMP files are supported, got {bit_count}-bit with compression {compression}"
+            ))
+        }
+    };
+
+    let width = width as usize;
+    let rows = height.unsigned_abs() as usize;
+    let pixel_size = bit_count as usize / 8;
+    let row_size = (width * pixel_size).next_multiple_of(4);
+    let data = bytes
+        .get(pixel_offset..pixel_offset + row_size * rows)
+        .ok_or("BMP pixel array is truncated")?;
+
+    let mut pixels = Vec::with_capacity(width * rows);
+    let mut push_row = |row: &[u8]| {
+        for px in row[..width * pixel_size].chunks_exact(pixel_size) {
+            pixels.push(match masks {
+                None => RGBA::new(px[2], px[1], px[0], alpha),
+                Some([r, g, b, a]) => {
+                    let pixel = u32::from_le_bytes([px[0], px[1], px[2], px[3]]);
+                    RGBA::new(
+                        masked_channel(pixel, r).unwrap_or(0),
+                        masked_channel(pixel, g).unwrap_or(0),
+                        masked_channel(pixel, b).unwrap_or(0),
+                        masked_channel(pixel, a).unwrap_or(alpha),
+                    )
+                }
+            });
+        }
+    };
+    // stored bottom-up unless the height is negative
+    if height > 0 {
+        data.chunks_exact(row_size).for_each(&mut push_row);
+    } else {
+        data.chunks_exact(row_size).rev().for_each(&mut push_row);
+    }
+    Ok(DecodedImage {
+        width,
+        height: rows,
+        pixels,
+    })
+}
+
+/// Decode a PNG file of any color type and bit depth, as 8-bit RGBA.
+pub fn decode_png(bytes: &[u8]) -> Result<DecodedImage, String> {
+    let mut decoder = png::Decoder::new(bytes);
+    decoder.set_transformations(png::Transformations::EXPAND | png::Transformations::STRIP_16);
+    let mut reader = decoder.read_info().map_err(|e| e.to_string())?;
+    let mut buffer = vec![0; reader.output_buffer_size()];
+    let info = reader.next_frame(&mut buffer).map_err(|e| e.to_string())?;
+    let (width, height) = (info.width as usize, info.height as usize);
+    let channels = info.color_type.samples();
+    let row_size = info.line_size;
+
+    let mut pixels = Vec::with_capacity(width * height);
+    // PNG rows are top-down
+    for row in buffer[..info.buffer_size()].chunks_exact(row_size).rev() {
+        for px in row[..width * channels].chunks_exact(channels) {
+            pixels.push(match px {
+                [l] => RGBA::new(*l, *l, *l, 255),
+                [l, a] => RGBA::new(*l, *l, *l, *a),
+                [r, g, b] => RGBA::new(*r, *g, *b, 255),
+                [r, g, b, a] => RGBA::new(*r, *g, *b, *a),
+                _ => unreachable!("expanded PNG pixels have 1 to 4 samples"),
+            });
+        }
+    }
+    Ok(DecodedImage {
+        width,
+        height,
+        pixels,
+    })
+}
+
+/// Decode a BMP or PNG file, recognized by its signature.
+pub fn decode_image(bytes: &[u8], alpha: u8) -> Result<DecodedImage, String> {
+    if bytes.starts_with(b"\x89PNG\r\n\x1a\n") {
+        decode_png(bytes)
+    } else if bytes.starts_with(b"BM") {
+        decode_bmp(bytes, alpha)
+    } else {
+        Err("Unsupported image format, expected BMP or PNG".to_string())
+    }
+}
+
+/// Make the pixels of the `transparent_colors` fully transparent.
+pub fn apply_color_key(pixels: &mut [RGBA], transparent_colors: &[(u8, u8, u8)]) {
+    if transparent_colors.is_empty() {
+        return;
+    }
+    for pixel in pixels {
+        if transparent_colors.contains(&(pixel.r, pixel.g, pixel.b)) {
+            pixel.a = 0;
+        }
+    }
+}
+
+#[cfg(test)]
+mod test_image_decode {
+    use super::*;
+
+    /// 2x2 BMP of `bit_count` bits, bottom row blue and white, top row red and green.
+    fn bmp(bit_count: u16, top_down: bool) -> Vec<u8> {
+        let pixel_size = bit_count as usize / 8;
+        let row_size = (2 * pixel_size).next_multiple_of(4);
+        let mut out = Vec::new();
+        out.extend_from_slice(b"BM");
+        out.extend_from_slice(&((54 + row_size * 2) as u32).to_le_bytes());
+        out.extend_from_slice(&[0; 4]);
+        out.extend_from_slice(&54u32.to_le_bytes());
+        out.extend_from_slice(&40u32.to_le_bytes());
+        out.extend_from_slice(&2i32.to_le_bytes());
+        out.extend_from_slice(&(if top_down { -2i32 } else { 2 }).to_le_bytes());
+        out.extend_from_slice(&1u16.to_le_bytes());
+        out.extend_from_slice(&bit_count.to_le_bytes());
+        out.extend_from_slice(&[0; 24]);
+        let bottom: [[u8; 3]; 2] = [[255, 0, 0], [255, 255, 255]];
+        let top: [[u8; 3]; 2] = [[0, 0, 255], [0, 255, 0]];
+        let rows = if top_down {
+            [top, bottom]
+        } else {
+            [bottom, top]
+        };
+        for row in rows {
+            let start = out.len();
+            for bgr in row {
+                out.extend_from_slice(&bgr);
+                if pixel_size == 4 {
+                    out.push(0);
+                }
+            }
+            out.resize(start + row_size, 0);
+        }
+        out
+    }
+
+    #[test]
+    fn test_decode_bmp() {
+        let expected = vec![
+            RGBA::new(0, 0, 255, 200),
+            RGBA::new(255, 255, 255, 200),
+            RGBA::new(255, 0, 0, 200),
+            RGBA::new(0, 255, 0, 200),
+        ];
+        for bit_count in [24, 32] {
+            for top_down in [false, true] {
+                let image = decode_bmp(&bmp(bit_count, top_down), 200).unwrap();
+                assert_eq!((image.width, image.height), (2, 2));
+                assert_eq!(image.pixels, expected);
+            }
+        }
+        assert!(decode_bmp(&bmp(24, false)[..60], 255).is_err());
+        assert!(decode_bmp(b"PNG", 255).is_err());
+    }
+
+    #[test]
+    fn test_color_key() {
+        let mut image = decode_image(&bmp(24, false), 255).unwrap();
+        apply_color_key(&mut image.pixels, &[(255, 255, 255)]);
+        assert_eq!(image.pixels[1], RGBA::new(255, 255, 255, 0));
+        assert_eq!(image.pixels[0].a, 255);
+    }
+}
@@ -0,0 +1,228 @@
+//! Mip chains: box-filtered copies of a texture at half, quarter... resolution.
+//!
+//! A terminal shows a 256x256 texture on a handful of cells; sampling the full
+//! resolution then aliases (shimmers) and reads texels all over the texture. The
+//! rasterizer stores in [`PixInfo::uv_footprint`] how much of the texture one sample
+//! covers, and the level whose texels match that footprint is sampled instead.
+//!
+//! [`PixInfo::uv_footprint`]: crate::drawbuffer::drawbuffer::PixInfo
+
+use nalgebra_glm::Vec2;
+
+use super::{lerp_rgba, FilterMode, RGBA};
+
+#[derive(Clone, Debug)]
+pub struct MipLevel {
+    pub width: usize,
+    pub height: usize,
+    pub data: Box<[RGBA]>,
+}
+
+impl MipLevel {
+    /// Half the size of `self` (at least one texel), each texel averaging a 2x2 block.
+    ///
+    /// Colors are weighted by alpha, so that the fully transparent texels of a color
+    /// keyed texture do not bleed into their neighbours.
+    fn downsample(&self) -> MipLevel {
+        let width = (self.width / 2).max(1);
+        let height = (self.height / 2).max(1);
+        let mut data = Vec::with_capacity(width * height);
+        for y in 0..height {
+            let y0 = (2 * y).min(self.height - 1);
+            let y1 = (2 * y + 1).min(self.height - 1);
+            for x in 0..width {
+                let x0 = (2 * x).min(self.width - 1);
+                let x1 = (2 * x + 1).min(self.width - 1);
+                let block = [
+                    self.data[y0 * self.width + x0],
+                    self.data[y0 * self.width + x1],
+                    self.data[y1 * self.width + x0],
+                    self.data[y1 * self.width + x1],
+                ];
+                data.push(average(&block));
+            }
+        }
+        MipLevel {
+            width,
+            height,
+            data: data.into_boxed_slice(),
+        }
+    }
+
+    /// Sample the level like `TextureCustom::uv_map_inline`.
+    #[inline]
+    pub fn sample(
+        &self,
+        u: f32,
+        v: f32,
+        repeat_x: bool,
+        repeat_y: bool,
+        filter_mode: FilterMode,
+    ) -> RGBA {
+        let w = self.width as isize;
+        let h = self.height as isize;
+        let wrap_x = |i: isize| {
+            if repeat_x {
+                i.rem_euclid(w) as usize
+            } else {
+                i.clamp(0, w - 1) as usize
+            }
+        };
+        let wrap_y = |i: isize| {
+            if repeat_y {
+                i.rem_euclid(h) as usize
+            } else {
+                i.clamp(0, h - 1) as usize
+            }
+        };
+
+        let tx = u * self.width as f32;
+        let ty = v * self.height as f32;
+        if filter_mode == FilterMode::Nearest {
+            let ix = wrap_x(tx.floor() as isize);
+            let iy = wrap_y(ty.floor() as isize);
+            return self.data[iy * self.width + ix];
+        }
+
+        let ix = tx.floor() as isize;
+        let iy = ty.floor() as isize;
+        let fx = tx - ix as f32;
+        let fy = ty - iy as f32;
+        let (ix0, ix1) = (wrap_x(ix), wrap_x(ix + 1));
+        let (row0, row1) = (wrap_y(iy) * self.width, wrap_y(iy + 1) * self.width);
+
+        lerp_rgba(
+            lerp_rgba(self.data[row0 + ix0], self.data[row0 + ix1], fx),
+            lerp_rgba(self.data[row1 + ix0], self.data[row1 + ix1], fx),
+            fy,
+        )
+    }
+}
+
+fn average(block: &[RGBA; 4]) -> RGBA {
+    let alpha: u32 = block.iter().map(|c| c.a as u32).sum();
+    let channel = |f: fn(&RGBA) -> u8| -> u8 {
+        if alpha == 0 {
+            let sum: u32 = block.iter().map(|c| f(c) as u32).sum();
+            ((sum + 2) / 4) as u8
+        } else {
+            let sum: u32 = block.iter().map(|c| f(c) as u32 * c.a as u32).sum();
+            ((sum + alpha / 2) / alpha) as u8
+        }
+    };
+    RGBA::new(
+        channel(|c| c.r),
+        channel(|c| c.g),
+        channel(|c| c.b),
+        ((alpha + 2) / 4) as u8,
+    )
+}
+
+/// Levels 1 and up of a texture, down to a single texel.
+#[derive(Clone, Debug)]
+pub struct MipChain {
+    pub levels: Vec<MipLevel>,
+}
+
+impl MipChain {
+    pub fn build(data: &[RGBA], width: usize, height: usize) -> MipChain {
+        let mut levels: Vec<MipLevel> = Vec::new();
+        let mut previous = MipLevel {
+            width,
+            height,
+            data: data.into(),
+        };
+        while previous.width > 1 || previous.height > 1 {
+            let next = previous.downsample();
+            levels.push(next.clone());
+            previous = next;
+        }
+        MipChain { levels }
+    }
+
+    /// The level to sample for a `footprint` (in uv units) on a `width` x `height`
+    /// texture; `None` for the texture itself.
+    ///
+    /// The nearest level is taken: one texel of it covers about one sample.
+    #[inline]
+    pub fn level_for(&self, width: usize, height: usize, footprint: &Vec2) -> Option<&MipLevel> {
+        let texels = (footprint.x * width as f32).max(footprint.y * height as f32);
+        // also false for NaN
+        if !(texels > std::f32::consts::SQRT_2) || self.levels.is_empty() {
+            return None;
+        }
+        let level = ((texels.log2() + 0.5) as usize).min(self.levels.len());
+        Some(&self.levels[level - 1])
+    }
+}
+
+#[cfg(test)]
+mod test_mipmap {
+    use super::*;
+
+    fn checker(size: usize) -> Vec<RGBA> {
+        (0..size * size)
+            .map(|i| {
+                if (i % size + i / size) % 2 == 0 {
+                    RGBA::new(255, 255, 255, 255)
+                } else {
+                    RGBA::new(0, 0, 0, 255)
+                }
+            })
+            .collect()
+    }
+
+    #[test]
+    fn test_build_chain() {
+        let chain = MipChain::build(&checker(8), 8, 8);
+        let sizes: Vec<(usize, usize)> = chain.levels.iter().map(|l| (l.width, l.height)).collect();
+        assert_eq!(sizes, vec![(4, 4), (2, 2), (1, 1)]);
+        // a checker board averages to grey
+        assert!(chain.levels[0]
+            .data
+            .iter()
+            .all(|c| *c == RGBA::new(128, 128, 128, 255)));
+
+        let chain = MipChain::build(&checker(4)[..8], 4, 2);
+        let sizes: Vec<(usize, usize)> = chain.levels.iter().map(|l| (l.width, l.height)).collect();
+        assert_eq!(sizes, vec![(2, 1), (1, 1)]);
+    }
+
+    #[test]
+    fn test_transparent_texels_do_not_bleed() {
+        let block = [
+            RGBA::new(200, 0, 0, 255),
+            RGBA::new(0, 0, 255, 0),
+            RGBA::new(200, 0, 0, 255),
+            RGBA::new(0, 0, 255, 0),
+        ];
+        assert_eq!(average(&block), RGBA::new(200, 0, 0, 128));
+    }
+
+    #[test]
+    fn test_level_selection() {
+        let chain = MipChain::build(&checker(8), 8, 8);
+        assert!(chain.level_for(8, 8, &Vec2::zeros()).is_none());
+        assert!(chain.level_for(8, 8, &Vec2::new(1.0 / 8.0, 0.0)).is_none());
+        assert_eq!(
+            chain
+                .level_for(8, 8, &Vec2::new(2.0 / 8.0, 0.0))
+                .unwrap()
+                .width,
+            4
+        );
+        assert_eq!(
+            chain
+                .level_for(8, 8, &Vec2::new(0.0, 4.0 / 8.0))
+                .unwrap()
+                .width,
+            2
+        );
+        // past the last level
+        assert_eq!(
+            chain.level_for(8, 8, &Vec2::new(4.0, 4.0)).unwrap().width,
+            1
+        );
+        assert!(chain.level_for(8, 8, &Vec2::new(f32::NAN, 0.0)).is_none());
+    }
+}
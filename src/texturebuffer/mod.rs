@@ -1,10 +1,17 @@
+use crate::drawbuffer::DrawingBufferPy;
 use crate::utils::convert_tuple_texture_rgba;
+use nalgebra_glm::Vec2;
 use pyo3::{
-    exceptions::PyValueError,
-    pyclass, pymethods,
-    types::{PyAnyMethods, PyList},
-    Bound, Py, PyAny, PyResult, Python,
+    buffer::PyBuffer,
+    exceptions::{PyBufferError, PyIOError, PyIndexError, PyValueError},
+    ffi, pyclass, pyfunction, pymethods,
+    types::{PyAnyMethods, PyList, PyMemoryView},
+    Bound, Py, PyAny, PyRef, PyResult, Python,
 };
+use std::ffi::{c_char, c_int, c_void};
+use std::path::{Path, PathBuf};
+use std::sync::atomic::{AtomicBool, AtomicUsize, Ordering};
+use std::sync::Arc;
 
 pub mod noise_texture;
 use noise_texture::*;
@@ -12,11 +19,19 @@ pub mod atlas_texture;
 use atlas_texture::*;
 pub mod texture_buffer;
 use texture_buffer::*;
+pub mod mipmap;
+use mipmap::MipChain;
+pub mod texel_layout;
+pub use texel_layout::TexelLayout;
+use texel_layout::{texel_index, to_linear, to_tiled};
+pub mod image_decode;
+use image_decode::{apply_color_key, decode_image, DecodedImage};
 
 pub mod toglyph_methods_py;
 pub mod toglyph_methods;
 
 #[derive(Clone, Copy, PartialEq, Debug)]
+#[repr(C)]
 pub struct RGBA {
     pub r: u8,
     pub g: u8,
@@ -48,6 +63,12 @@ impl RGBA {
     pub fn luminance(&self) -> f32 {
         0.2126 * (self.r as f32) + 0.7152 * (self.g as f32) + 0.0722 * (self.b as f32)
     }
+    /// `luminance` in integer arithmetic (weights 54, 183, 19 over 256), at most
+    /// about one level off.
+    #[inline(always)]
+    pub fn luminance_u8(&self) -> u8 {
+        ((54 * self.r as u32 + 183 * self.g as u32 + 19 * self.b as u32 + 128) >> 8) as u8
+    }
 }
 
 #[derive(Clone, Copy, PartialEq, Debug)]
@@ -70,6 +91,12 @@ pub trait UvMapper {
     fn get_width(&self) -> usize;
     fn get_height(&self) -> usize;
     fn uv_map(&self, u: f32, v: f32, idx: usize) -> RGBA;
+    /// Like `uv_map`, from the mip level matching the `footprint` of the sample when
+    /// the texture has mipmaps.
+    #[inline]
+    fn uv_map_lod(&self, u: f32, v: f32, idx: usize, _footprint: &Vec2) -> RGBA {
+        self.uv_map(u, v, idx)
+    }
 }
 
 impl<const SIZE: usize> UvMapper for Texture<SIZE> {
@@ -82,6 +109,12 @@ impl<const SIZE: usize> UvMapper for Texture<SIZE> {
     fn uv_map(&self, u: f32, v: f32, _idx: usize) -> RGBA {
         self.uv_map_inline(u, v)
     }
+    fn uv_map_lod(&self, u: f32, v: f32, _idx: usize, footprint: &Vec2) -> RGBA {
+        match self.mip_level(SIZE, SIZE, footprint) {
+            Some(level) => level.sample(u, v, self.repeat_x, self.repeat_y, self.filter_mode),
+            None => self.uv_map_inline(u, v),
+        }
+    }
 }
 impl<const SIZE: usize> UvMapper for TextureCustom<SIZE> {
     fn get_width(&self) -> usize {
@@ -93,15 +126,23 @@ impl<const SIZE: usize> UvMapper for TextureCustom<SIZE> {
     fn uv_map(&self, u: f32, v: f32, _idx: usize) -> RGBA {
         self.uv_map_inline(u, v)
     }
+    fn uv_map_lod(&self, u: f32, v: f32, _idx: usize, footprint: &Vec2) -> RGBA {
+        match self.texture.mip_level(self.width, self.height, footprint) {
+            Some(level) => level.sample(u, v, self.repeat_x, self.repeat_y, self.filter_mode),
+            None => self.uv_map_inline(u, v),
+        }
+    }
 }
 
-
 #[derive(Clone)]
 pub struct Texture<const SIZE: usize> {
     data: Box<[RGBA]>,
     repeat_x: bool,
     repeat_y: bool,
     filter_mode: FilterMode,
+    /// levels 1 and up, see `build_mipmaps`
+    mips: Option<Box<MipChain>>,
+    layout: TexelLayout,
 }
 
 impl<const SIZE: usize> Texture<SIZE> {
@@ -112,6 +153,8 @@ impl<const SIZE: usize> Texture<SIZE> {
             repeat_x,
             repeat_y,
             filter_mode,
+            mips: None,
+            layout: TexelLayout::Linear,
         }
     }
     pub fn from_iter<I: IntoIterator<Item = RGBA>>(
@@ -126,8 +169,85 @@ impl<const SIZE: usize> Texture<SIZE> {
             repeat_x,
             repeat_y,
             filter_mode,
+            mips: None,
+            layout: TexelLayout::Linear,
         }
     }
+
+    /// Build the mip chain of the `width` x `height` texture held in `data`.
+    pub fn build_mipmaps(&mut self, width: usize, height: usize) {
+        let data = self.linear_data(width, height);
+        self.mips = Some(Box::new(MipChain::build(&data, width, height)));
+    }
+
+    pub fn texels_mut(&mut self) -> &mut [RGBA] {
+        &mut self.data
+    }
+
+    /// Overwrite `w` texels per row from (`x`, `y`) of the `width` x `height`
+    /// texture, then rebuild its mip chain if it has one.
+    pub fn write_region<I: Iterator<Item = RGBA>>(
+        &mut self,
+        width: usize,
+        height: usize,
+        x: usize,
+        y: usize,
+        w: usize,
+        pixels: I,
+    ) {
+        for (i, color) in pixels.enumerate() {
+            let index = texel_index(self.layout, x + i % w, y + i / w, width);
+            self.data[index] = color;
+        }
+        if self.mips.is_some() {
+            self.build_mipmaps(width, height);
+        }
+    }
+
+    pub fn layout(&self) -> TexelLayout {
+        self.layout
+    }
+
+    /// Reorder the texels of the `width` x `height` texture held in `data`.
+    pub fn set_layout(&mut self, layout: TexelLayout, width: usize, height: usize) {
+        if layout == self.layout {
+            return;
+        }
+        self.data = match layout {
+            TexelLayout::Linear => to_linear(&self.data, width, height),
+            TexelLayout::Tiled => to_tiled(&self.data, width, height),
+        };
+        self.layout = layout;
+    }
+
+    /// The texels in row-major order, whatever the layout.
+    fn linear_data(&self, width: usize, height: usize) -> Box<[RGBA]> {
+        match self.layout {
+            TexelLayout::Linear => self.data.clone(),
+            TexelLayout::Tiled => to_linear(&self.data, width, height),
+        }
+    }
+
+    #[inline(always)]
+    fn texel(&self, ix: usize, iy: usize, width: usize) -> RGBA {
+        self.data[texel_index(self.layout, ix, iy, width)]
+    }
+
+    /// Number of mip levels, the texture itself included.
+    pub fn mip_level_count(&self) -> usize {
+        1 + self.mips.as_ref().map_or(0, |mips| mips.levels.len())
+    }
+
+    #[inline]
+    fn mip_level(
+        &self,
+        width: usize,
+        height: usize,
+        footprint: &Vec2,
+    ) -> Option<&mipmap::MipLevel> {
+        self.mips.as_ref()?.level_for(width, height, footprint)
+    }
+
     #[inline(always)]
     pub fn uv_map_inline(&self, u: f32, v: f32) -> RGBA {
         let tx = u * (SIZE as f32);
@@ -150,8 +270,7 @@ impl<const SIZE: usize> Texture<SIZE> {
             } else {
                 iy.clamp(0, (SIZE - 1) as isize) as usize
             };
-            let shift = SIZE.trailing_zeros() as usize;
-            return self.data[(iy0 << shift) + ix0];
+            return self.texel(ix0, iy0, SIZE);
         }
 
         let ix1 = if self.repeat_x {
@@ -170,14 +289,10 @@ impl<const SIZE: usize> Texture<SIZE> {
             (iy + 1).clamp(0, (SIZE - 1) as isize) as usize
         };
 
-        let shift = SIZE.trailing_zeros() as usize;
-        let row0 = iy0 << shift;
-        let row1 = iy1 << shift;
-
-        let c00 = self.data[row0 + ix0];
-        let c10 = self.data[row0 + ix1];
-        let c01 = self.data[row1 + ix0];
-        let c11 = self.data[row1 + ix1];
+        let c00 = self.texel(ix0, iy0, SIZE);
+        let c10 = self.texel(ix1, iy0, SIZE);
+        let c01 = self.texel(ix0, iy1, SIZE);
+        let c11 = self.texel(ix1, iy1, SIZE);
 
         lerp_rgba(lerp_rgba(c00, c10, fx), lerp_rgba(c01, c11, fx), fy)
     }
@@ -213,6 +328,8 @@ impl<const SIZE: usize> TextureCustom<SIZE> {
                 repeat_x,
                 repeat_y,
                 filter_mode,
+                mips: None,
+                layout: TexelLayout::Linear,
             },
             width,
             height,
@@ -222,6 +339,18 @@ impl<const SIZE: usize> TextureCustom<SIZE> {
         }
     }
 
+    pub fn build_mipmaps(&mut self) {
+        self.texture.build_mipmaps(self.width, self.height);
+    }
+
+    pub fn mip_level_count(&self) -> usize {
+        self.texture.mip_level_count()
+    }
+
+    pub fn set_layout(&mut self, layout: TexelLayout) {
+        self.texture.set_layout(layout, self.width, self.height);
+    }
+
     pub fn uv_map_inline(&self, u: f32, v: f32) -> RGBA {
         let u_val = if self.repeat_x {
             u.rem_euclid(1.0)
@@ -259,7 +388,7 @@ impl<const SIZE: usize> TextureCustom<SIZE> {
             } else {
                 iy.clamp(0, hm1) as usize
             };
-            return self.texture.data[iy0 * self.width + ix0];
+            return self.texture.texel(ix0, iy0, self.width);
         }
 
         let ix1 = if self.repeat_x {
@@ -278,10 +407,10 @@ impl<const SIZE: usize> TextureCustom<SIZE> {
             (iy + 1).clamp(0, hm1) as usize
         };
 
-        let c00 = self.texture.data[iy0 * self.width + ix0];
-        let c10 = self.texture.data[iy0 * self.width + ix1];
-        let c01 = self.texture.data[iy1 * self.width + ix0];
-        let c11 = self.texture.data[iy1 * self.width + ix1];
+        let c00 = self.texture.texel(ix0, iy0, self.width);
+        let c10 = self.texture.texel(ix1, iy0, self.width);
+        let c01 = self.texture.texel(ix0, iy1, self.width);
+        let c11 = self.texture.texel(ix1, iy1, self.width);
 
         lerp_rgba(lerp_rgba(c00, c10, fx), lerp_rgba(c01, c11, fx), fy)
     }
@@ -294,6 +423,8 @@ pub enum TextureType<const SIZE: usize> {
     AtlasCustom(TextureAtlas<TextureCustom<SIZE>, SIZE>),
     Atlas(TextureAtlas<Texture<SIZE>, SIZE>),
     Noise(NoiseTexture),
+    /// Canvas of an offscreen pass, see `TextureBuffer::write_render_target`.
+    RenderTarget(TextureCustom<SIZE>),
 }
 
 impl<const SIZE: usize> UvMapper for TextureType<SIZE> {
@@ -304,6 +435,16 @@ impl<const SIZE: usize> UvMapper for TextureType<SIZE> {
             TextureType::Atlas(t) => t.uv_map(u, v, idx),
             TextureType::Noise(t) => t.uv_map(u, v, 0),
             TextureType::AtlasCustom(texture_atlas) => texture_atlas.uv_map(u, v, idx),
+            TextureType::RenderTarget(t) => t.uv_map(u, v, 0),
+        }
+    }
+
+    #[inline]
+    fn uv_map_lod(&self, u: f32, v: f32, idx: usize, footprint: &Vec2) -> RGBA {
+        match self {
+            TextureType::Custom(t) => t.uv_map_lod(u, v, 0, footprint),
+            TextureType::Fixed(t) => t.uv_map_lod(u, v, 0, footprint),
+            _ => self.uv_map(u, v, idx),
         }
     }
 
@@ -314,6 +455,7 @@ impl<const SIZE: usize> UvMapper for TextureType<SIZE> {
             TextureType::Atlas(t) => t.get_width(),
             TextureType::Noise(_) => SIZE,
             TextureType::AtlasCustom(texture_atlas) => texture_atlas.get_width(),
+            TextureType::RenderTarget(t) => t.get_width(),
         }
     }
 
@@ -324,11 +466,12 @@ impl<const SIZE: usize> UvMapper for TextureType<SIZE> {
             TextureType::Atlas(t) => t.get_height(),
             TextureType::Noise(_) => SIZE,
             TextureType::AtlasCustom(texture_atlas) => texture_atlas.get_height(),
+            TextureType::RenderTarget(t) => t.get_height(),
         }
     }
 }
 
-fn parse_filter_mode(mode: &str) -> PyResult<FilterMode> {
+pub(crate) fn parse_filter_mode(mode: &str) -> PyResult<FilterMode> {
     match mode.to_lowercase().as_str() {
         "nearest" => Ok(FilterMode::Nearest),
         "bilinear" => Ok(FilterMode::Bilinear),
@@ -338,6 +481,16 @@ fn parse_filter_mode(mode: &str) -> PyResult<FilterMode> {
     }
 }
 
+pub(crate) fn parse_layout(layout: &str) -> PyResult<TexelLayout> {
+    match layout.to_lowercase().as_str() {
+        "linear" => Ok(TexelLayout::Linear),
+        "tiled" => Ok(TexelLayout::Tiled),
+        _ => Err(PyValueError::new_err(format!(
+            "Unknown layout: '{layout}'. Expected 'linear' or 'tiled'."
+        ))),
+    }
+}
+
 pub struct TextureIterator<'a> {
     py: Python<'a>,
     pix_list: &'a Bound<'a, PyList>,
@@ -375,6 +528,178 @@ pub struct TextureBufferPy {
 
     #[pyo3(get)]
     pub max_texture_size: usize,
+
+    exports: Arc<BufferExports>,
+}
+
+/// Writable views of texels handed out by `texture_as_buffer`.
+#[derive(Default)]
+struct BufferExports {
+    /// views alive
+    count: AtomicUsize,
+    /// a view was released since the last `version()`
+    released: AtomicBool,
+}
+
+/// Exports the texels of one texture through the buffer protocol, as a
+/// (height, width, 4) array of bytes; see `TextureBufferPy.texture_as_buffer`.
+#[pyclass]
+pub struct TexelsViewPy {
+    owner: Py<TextureBufferPy>,
+    idx: usize,
+    exports: Arc<BufferExports>,
+}
+
+#[pymethods]
+impl TexelsViewPy {
+    unsafe fn __getbuffer__(
+        slf: Bound<'_, Self>,
+        view: *mut ffi::Py_buffer,
+        flags: c_int,
+    ) -> PyResult<()> {
+        if view.is_null() {
+            return Err(PyBufferError::new_err("View is null"));
+        }
+        let this = slf.borrow();
+        let mut owner = this.owner.bind(slf.py()).try_borrow_mut()?;
+        let (texels, width, height) = owner
+            .data
+            .texels_mut(this.idx)
+            .map_err(PyBufferError::new_err)?;
+
+        // shape then strides, freed by __releasebuffer__
+        let layout: *mut [isize; 6] = Box::into_raw(Box::new([
+            height as isize,
+            width as isize,
+            4,
+            (width * 4) as isize,
+            4,
+            1,
+        ]));
+        let view = &mut *view;
+        view.obj = slf.clone().into_any().into_ptr();
+        view.buf = texels.as_mut_ptr() as *mut c_void;
+        // RGBA is four u8 fields, #[repr(C)]
+        view.len = (texels.len() * 4) as isize;
+        view.readonly = 0;
+        view.itemsize = 1;
+        view.format = if flags & ffi::PyBUF_FORMAT == ffi::PyBUF_FORMAT {
+            b"B\0".as_ptr() as *mut c_char
+        } else {
+            std::ptr::null_mut()
+        };
+        if flags & ffi::PyBUF_ND == ffi::PyBUF_ND {
+            view.ndim = 3;
+            view.shape = layout as *mut isize;
+        } else {
+            view.ndim = 1;
+            view.shape = std::ptr::null_mut();
+        }
+        view.strides = if flags & ffi::PyBUF_STRIDES == ffi::PyBUF_STRIDES {
+            (layout as *mut isize).add(3)
+        } else {
+            std::ptr::null_mut()
+        };
+        view.suboffsets = std::ptr::null_mut();
+        view.internal = layout as *mut c_void;
+
+        this.exports.count.fetch_add(1, Ordering::Relaxed);
+        Ok(())
+    }
+
+    unsafe fn __releasebuffer__(&self, view: *mut ffi::Py_buffer) {
+        drop(Box::from_raw((*view).internal as *mut [isize; 6]));
+        self.exports.released.store(true, Ordering::Relaxed);
+        self.exports.count.fetch_sub(1, Ordering::Relaxed);
+    }
+}
+
+/// Read, decode and color-key an image file; runs without the GIL.
+fn read_image_file(
+    path: &Path,
+    alpha: u8,
+    transparent_colors: Option<Vec<(u8, u8, u8)>>,
+) -> PyResult<DecodedImage> {
+    let bytes = std::fs::read(path)
+        .map_err(|e| PyIOError::new_err(format!("{}: {}", path.display(), e)))?;
+    let mut image = decode_image(&bytes, alpha)
+        .map_err(|e| PyValueError::new_err(format!("{}: {}", path.display(), e)))?;
+    apply_color_key(
+        &mut image.pixels,
+        transparent_colors.as_deref().unwrap_or_default(),
+    );
+    Ok(image)
+}
+
+/// An image decoded off the render thread, waiting for
+/// `TextureBufferPy.add_decoded_image`.
+#[pyclass]
+pub struct DecodedImagePy {
+    image: DecodedImage,
+}
+
+#[pymethods]
+impl DecodedImagePy {
+    fn width(&self) -> usize {
+        self.image.width
+    }
+
+    fn height(&self) -> usize {
+        self.image.height
+    }
+}
+
+/// Decode a BMP or PNG file, releasing the GIL; see `add_texture_from_file`.
+#[pyfunction]
+#[pyo3(signature = (path, transparent_colors=None, alpha=255))]
+pub fn decode_image_file(
+    py: Python,
+    path: PathBuf,
+    transparent_colors: Option<Vec<(u8, u8, u8)>>,
+    alpha: u8,
+) -> PyResult<DecodedImagePy> {
+    let image = py.detach(|| read_image_file(&path, alpha, transparent_colors))?;
+    Ok(DecodedImagePy { image })
+}
+
+impl TextureBufferPy {
+    fn finish_texture(
+        &mut self,
+        idx: usize,
+        mipmaps: bool,
+        layout: TexelLayout,
+    ) -> PyResult<usize> {
+        if mipmaps {
+            self.data
+                .build_mipmaps(idx)
+                .map_err(PyValueError::new_err)?;
+        }
+        self.data
+            .set_layout(idx, layout)
+            .map_err(PyValueError::new_err)?;
+        Ok(idx)
+    }
+
+    /// Error instead of reallocating or reordering texels that a
+    /// `texture_as_buffer` view still points to.
+    fn check_no_exports(&self) -> PyResult<()> {
+        if self.exports.count.load(Ordering::Relaxed) > 0 {
+            return Err(PyBufferError::new_err(
+                "Cannot change texels while texture_as_buffer views are alive",
+            ));
+        }
+        Ok(())
+    }
+
+    /// Error instead of the panic of a full buffer, or of adding a texture while
+    /// texels are exported.
+    pub fn check_room(&self) -> PyResult<()> {
+        self.check_no_exports()?;
+        if self.data.current_size >= self.data.max_size {
+            return Err(PyValueError::new_err("Texture buffer is full"));
+        }
+        Ok(())
+    }
 }
 
 #[pymethods]
@@ -385,6 +710,7 @@ impl TextureBufferPy {
         TextureBufferPy {
             data: tb,
             max_texture_size: 256,
+            exports: Arc::default(),
         }
     }
     fn size(&self) -> usize {
@@ -394,7 +720,7 @@ impl TextureBufferPy {
         self.data.get_wh_of(idx)
     }
 
-    #[pyo3(signature = (width,height,pixels,repeat_width=true,repeat_height=true,filter_mode="bilinear"))]
+    #[pyo3(signature = (width,height,pixels,repeat_width=true,repeat_height=true,filter_mode="bilinear",mipmaps=false, layout="linear"))]
     fn add_texture(
         &mut self,
         py: Python,
@@ -404,19 +730,121 @@ impl TextureBufferPy {
         repeat_width: bool,
         repeat_height: bool,
         filter_mode: &str,
+        mipmaps: bool,
+        layout: &str,
     ) -> PyResult<usize> {
         let fm = parse_filter_mode(filter_mode)?;
+        let layout = parse_layout(layout)?;
+        self.check_room()?;
         let pixel_iter = pixels.bind(py).cast::<PyList>().unwrap();
         let texture_iter = TextureIterator::new(py, pixel_iter);
 
-        Ok(self.data.add_texture_from_iter(
+        let idx = self.data.add_texture_from_iter(
             width,
             height,
             texture_iter,
             repeat_width,
             repeat_height,
             fm,
-        ))
+        );
+        self.finish_texture(idx, mipmaps, layout)
+    }
+
+    /// Add a texture from RGBA bytes, in the row order of `add_texture`; pixels of
+    /// the `transparent_colors` get a zero alpha.
+    #[pyo3(signature = (width, height, rgba_bytes, repeat_width=true, repeat_height=true, filter_mode="bilinear", transparent_colors=None, mipmaps=false, layout="linear"))]
+    fn add_texture_from_bytes(
+        &mut self,
+        width: usize,
+        height: usize,
+        rgba_bytes: &[u8],
+        repeat_width: bool,
+        repeat_height: bool,
+        filter_mode: &str,
+        transparent_colors: Option<Vec<(u8, u8, u8)>>,
+        mipmaps: bool,
+        layout: &str,
+    ) -> PyResult<usize> {
+        let fm = parse_filter_mode(filter_mode)?;
+        let layout = parse_layout(layout)?;
+        if rgba_bytes.len() != width * height * 4 {
+            return Err(PyValueError::new_err(format!(
+                "expected {} bytes for a {width}x{height} RGBA texture, got {}",
+                width * height * 4,
+                rgba_bytes.len()
+            )));
+        }
+        self.check_room()?;
+        let mut pixels: Vec<RGBA> = rgba_bytes
+            .chunks_exact(4)
+            .map(|p| RGBA::new(p[0], p[1], p[2], p[3]))
+            .collect();
+        apply_color_key(
+            &mut pixels,
+            transparent_colors.as_deref().unwrap_or_default(),
+        );
+        let idx =
+            self.data
+                .add_texture_from_iter(width, height, pixels, repeat_width, repeat_height, fm);
+        self.finish_texture(idx, mipmaps, layout)
+    }
+
+    /// Decode a BMP (24 or 32-bit) or PNG file natively and add it as a texture.
+    ///
+    /// Pixels without alpha get `alpha`; pixels of the `transparent_colors` get a
+    /// zero alpha, like `asset_load.load_bmp`.
+    #[pyo3(signature = (path, repeat_width=true, repeat_height=true, filter_mode="bilinear", transparent_colors=None, alpha=255, mipmaps=false, layout="linear"))]
+    fn add_texture_from_file(
+        &mut self,
+        py: Python,
+        path: PathBuf,
+        repeat_width: bool,
+        repeat_height: bool,
+        filter_mode: &str,
+        transparent_colors: Option<Vec<(u8, u8, u8)>>,
+        alpha: u8,
+        mipmaps: bool,
+        layout: &str,
+    ) -> PyResult<usize> {
+        let fm = parse_filter_mode(filter_mode)?;
+        let layout = parse_layout(layout)?;
+        self.check_room()?;
+        let image = py.detach(|| read_image_file(&path, alpha, transparent_colors))?;
+        let idx = self.data.add_texture_from_iter(
+            image.width,
+            image.height,
+            image.pixels,
+            repeat_width,
+            repeat_height,
+            fm,
+        );
+        self.finish_texture(idx, mipmaps, layout)
+    }
+
+    /// Add an image decoded by `decode_image_file`.
+    #[pyo3(signature = (image, repeat_width=true, repeat_height=true, filter_mode="bilinear", mipmaps=false, layout="linear"))]
+    fn add_decoded_image(
+        &mut self,
+        image: PyRef<DecodedImagePy>,
+        repeat_width: bool,
+        repeat_height: bool,
+        filter_mode: &str,
+        mipmaps: bool,
+        layout: &str,
+    ) -> PyResult<usize> {
+        let fm = parse_filter_mode(filter_mode)?;
+        let layout = parse_layout(layout)?;
+        self.check_room()?;
+        let image = &image.image;
+        let idx = self.data.add_texture_from_iter(
+            image.width,
+            image.height,
+            image.pixels.iter().copied(),
+            repeat_width,
+            repeat_height,
+            fm,
+        );
+        self.finish_texture(idx, mipmaps, layout)
     }
 
     #[pyo3(signature = (width, height, pixels, pix_size_width, pix_size_height, filter_mode="bilinear"))]
@@ -431,6 +859,7 @@ impl TextureBufferPy {
         filter_mode: &str,
     ) -> PyResult<usize> {
         let fm = parse_filter_mode(filter_mode)?;
+        self.check_room()?;
         let pixel_iter = pixels.bind(py).cast::<PyList>().unwrap();
         let texture_iter = TextureIterator::new(py, pixel_iter);
 
@@ -443,8 +872,166 @@ impl TextureBufferPy {
             fm,
         ))
     }
-    fn add_noise_texture(&mut self, seed: i32, int_config: i32) -> usize {
-        self.data.add_noise_texture(seed, int_config)
+    /// Add a `width` x `height` texture that receives the canvas of an offscreen
+    /// drawing buffer through `update_render_target`.
+    #[pyo3(signature = (width, height, filter_mode="bilinear"))]
+    fn add_render_target(
+        &mut self,
+        width: usize,
+        height: usize,
+        filter_mode: &str,
+    ) -> PyResult<usize> {
+        let fm = parse_filter_mode(filter_mode)?;
+        self.check_room()?;
+        Ok(self.data.add_render_target(width, height, fm))
+    }
+
+    /// Copy the canvas of `drawing_buffer` into the render target `idx`, two texel
+    /// rows per canvas row; the texture takes the size of the canvas.
+    fn update_render_target(
+        &mut self,
+        idx: usize,
+        drawing_buffer: PyRef<DrawingBufferPy>,
+    ) -> PyResult<()> {
+        self.check_no_exports()?;
+        let db = &drawing_buffer.opaque_db;
+        self.data
+            .write_render_target(idx, db.col_count, 2 * db.row_count, db.canvas_texels())
+            .map_err(PyValueError::new_err)
+    }
+
+    /// Add a noise texture, computed at every sample; with `bake_size`, computed
+    /// once into a `bake_size` square texture, or an atlas of `frames` of them.
+    #[pyo3(signature = (seed, int_config, bake_size=None, frames=1, filter_mode="bilinear"))]
+    fn add_noise_texture(
+        &mut self,
+        seed: i32,
+        int_config: i32,
+        bake_size: Option<usize>,
+        frames: usize,
+        filter_mode: &str,
+    ) -> PyResult<usize> {
+        let fm = parse_filter_mode(filter_mode)?;
+        self.check_room()?;
+        match bake_size {
+            None => Ok(self.data.add_noise_texture(seed, int_config)),
+            Some(0) => Err(PyValueError::new_err("bake_size must be positive")),
+            Some(size) => Ok(self
+                .data
+                .add_baked_noise_texture(seed, int_config, size, frames, fm)),
+        }
+    }
+
+    /// Build the mip chain of the texture `idx`, like the `mipmaps` argument of the
+    /// `add_texture` methods.
+    fn build_mipmaps(&mut self, idx: usize) -> PyResult<()> {
+        self.check_no_exports()?;
+        self.data.build_mipmaps(idx).map_err(PyValueError::new_err)
+    }
+
+    /// Store the texels of texture `idx` in `layout`, like the `layout` argument
+    /// of the `add_texture` methods.
+    fn set_layout(&mut self, idx: usize, layout: &str) -> PyResult<()> {
+        let layout = parse_layout(layout)?;
+        self.check_no_exports()?;
+        self.data
+            .set_layout(idx, layout)
+            .map_err(PyValueError::new_err)
+    }
+
+    fn mip_level_count(&self, idx: usize) -> PyResult<usize> {
+        if idx >= self.data.current_size {
+            return Err(PyIndexError::new_err(format!(
+                "Texture index {idx} out of range"
+            )));
+        }
+        Ok(self.data.mip_level_count(idx))
+    }
+
+    /// Overwrite the `w` x `h` texels of texture `idx` starting at column `x` of row
+    /// `y`, in place. `rgba_bytes` is any buffer of bytes (bytes, bytearray,
+    /// memoryview, uint8 NumPy array), read without copy when contiguous, rows in
+    /// the order of `add_texture`.
+    fn update_texture_region(
+        &mut self,
+        py: Python,
+        idx: usize,
+        x: usize,
+        y: usize,
+        w: usize,
+        h: usize,
+        rgba_bytes: PyBuffer<u8>,
+    ) -> PyResult<()> {
+        self.check_no_exports()?;
+        if rgba_bytes.item_count() != w * h * 4 {
+            return Err(PyValueError::new_err(format!(
+                "expected {} bytes for a {w}x{h} RGBA region, got {}",
+                w * h * 4,
+                rgba_bytes.item_count()
+            )));
+        }
+        let result = match rgba_bytes.as_slice(py) {
+            Some(cells) => self.data.update_region(
+                idx,
+                x,
+                y,
+                w,
+                h,
+                cells
+                    .chunks_exact(4)
+                    .map(|p| RGBA::new(p[0].get(), p[1].get(), p[2].get(), p[3].get())),
+            ),
+            None => {
+                let bytes = rgba_bytes.to_vec(py)?;
+                self.data.update_region(
+                    idx,
+                    x,
+                    y,
+                    w,
+                    h,
+                    bytes
+                        .chunks_exact(4)
+                        .map(|p| RGBA::new(p[0], p[1], p[2], p[3])),
+                )
+            }
+        };
+        result.map_err(PyValueError::new_err)
+    }
+
+    /// A writable memoryview of the texels of texture `idx`, shaped
+    /// (height, width, 4) with the bottom row first, for in-place edits (e.g. with
+    /// `numpy.asarray`). Only plain textures in the linear layout can be viewed;
+    /// mipmaps are not refreshed by writes through the view.
+    fn texture_as_buffer<'py>(
+        slf: Bound<'py, Self>,
+        idx: usize,
+    ) -> PyResult<Bound<'py, PyMemoryView>> {
+        let exports = {
+            let mut this = slf.borrow_mut();
+            this.data.texels_mut(idx).map_err(PyValueError::new_err)?;
+            this.exports.clone()
+        };
+        let view = Bound::new(
+            slf.py(),
+            TexelsViewPy {
+                owner: slf.clone().unbind(),
+                idx,
+                exports,
+            },
+        )?;
+        PyMemoryView::from(view.as_any())
+    }
+
+    /// Version stamp of the last change of any texture. While `texture_as_buffer`
+    /// views are alive, and once after they are released, every call returns a new
+    /// stamp: writes through them cannot be tracked.
+    fn version(&mut self) -> u64 {
+        if self.exports.count.load(Ordering::Relaxed) > 0
+            || self.exports.released.swap(false, Ordering::Relaxed)
+        {
+            self.data.bump_version();
+        }
+        self.data.version
     }
 
     fn get_rgba_at(&self, idx: usize, u: f32, v: f32) -> (u8, u8, u8, u8) {
@@ -608,4 +1195,84 @@ mod tests {
         let result = tex.uv_map_inline(1.25, 0.25);
         assert_eq!(result, RGBA::new(25, 0, 0, 255));
     }
+
+    #[test]
+    fn test_tiled_layout_samples_like_linear() {
+        let ramp = |w: usize, h: usize| {
+            (0..w * h).map(move |i| RGBA::new((i * 7 % 256) as u8, (i / w * 20) as u8, 0, 255))
+        };
+        let uvs = [(0.1, 0.1), (0.37, 0.81), (0.99, 0.5), (1.3, -0.2)];
+
+        let linear = Texture::<8>::from_iter(ramp(8, 8), true, true, FilterMode::Bilinear);
+        let mut tiled = linear.clone();
+        tiled.set_layout(TexelLayout::Tiled, 8, 8);
+        for (u, v) in uvs {
+            assert_eq!(tiled.uv_map_inline(u, v), linear.uv_map_inline(u, v));
+        }
+
+        let mut linear =
+            TextureCustom::<8>::new(ramp(6, 3), 6, 3, false, true, FilterMode::Nearest);
+        let mut tiled = linear.clone();
+        tiled.set_layout(TexelLayout::Tiled);
+        for (u, v) in uvs {
+            assert_eq!(tiled.uv_map_inline(u, v), linear.uv_map_inline(u, v));
+        }
+        // mip levels are built from the texels in row order
+        linear.build_mipmaps();
+        tiled.build_mipmaps();
+        let first_level =
+            |t: &TextureCustom<8>| t.texture.mips.as_ref().unwrap().levels[0].data.clone();
+        assert_eq!(first_level(&tiled), first_level(&linear));
+
+        tiled.set_layout(TexelLayout::Linear);
+        assert_eq!(tiled.texture.data, linear.texture.data);
+    }
+
+    #[test]
+    fn test_update_region() {
+        let mut buffer = TextureBuffer::<4>::new(3);
+        for layout in [TexelLayout::Linear, TexelLayout::Tiled] {
+            let idx = buffer.add_texture_from_iter(
+                6,
+                3,
+                vec![RGBA::new(0, 0, 0, 255); 18],
+                false,
+                false,
+                FilterMode::Nearest,
+            );
+            buffer.set_layout(idx, layout).unwrap();
+            let version = buffer.version;
+            let red = RGBA::new(255, 0, 0, 255);
+            buffer.update_region(idx, 4, 1, 2, 2, vec![red; 4]).unwrap();
+            assert!(buffer.version > version);
+            assert_eq!(buffer.get_rgba_at(idx, 0.9, 0.5, 0), red);
+            assert_eq!(buffer.get_rgba_at(idx, 0.9, 0.1, 0).r, 0);
+            assert_eq!(buffer.get_rgba_at(idx, 0.6, 0.9, 0).r, 0);
+            assert!(buffer.update_region(idx, 5, 0, 2, 1, vec![red; 2]).is_err());
+            assert!(buffer.update_region(idx, 0, 0, 2, 1, vec![red; 3]).is_err());
+        }
+        let noise = buffer.add_noise_texture(1, 0);
+        let black = vec![RGBA::new(0, 0, 0, 0)];
+        assert!(buffer.update_region(noise, 0, 0, 1, 1, black).is_err());
+    }
+
+    #[test]
+    fn test_render_target() {
+        let mut buffer = TextureBuffer::<4>::new(2);
+        let idx = buffer.add_render_target(2, 2, FilterMode::Nearest);
+        assert_eq!(buffer.get_rgba_at(idx, 0.5, 0.5, 0), RGBA::new(0, 0, 0, 0));
+
+        let red = RGBA::new(255, 0, 0, 255);
+        buffer.write_render_target(idx, 2, 2, vec![red; 4]).unwrap();
+        assert_eq!(buffer.get_rgba_at(idx, 0.5, 0.5, 0), red);
+        // a resized offscreen pass resizes the texture
+        buffer
+            .write_render_target(idx, 3, 4, vec![red; 12])
+            .unwrap();
+        assert_eq!(buffer.get_wh_of(idx), (3, 4));
+
+        let plain =
+            buffer.add_texture_from_iter(1, 1, vec![red], false, false, FilterMode::Nearest);
+        assert!(buffer.write_render_target(plain, 1, 1, vec![red]).is_err());
+    }
 }
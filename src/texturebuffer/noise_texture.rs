@@ -2,6 +2,34 @@ use fastnoise_lite::{FastNoiseLite, NoiseType};
 
 use super::RGBA;
 
+/// A generator configured for `seed` and `int_config` (0: OpenSimplex2, 1: Cellular,
+/// 2: Perlin, 3: Value, others: OpenSimplex2).
+///
+/// Building one computes its tables; keep it around rather than calling this per sample.
+pub fn make_noise(seed: i32, int_config: i32) -> FastNoiseLite {
+    let mut noise = FastNoiseLite::new();
+    noise.set_seed(Some(seed));
+    match int_config {
+        0 => noise.set_noise_type(Some(NoiseType::OpenSimplex2)),
+        1 => noise.set_noise_type(Some(NoiseType::Cellular)),
+        2 => noise.set_noise_type(Some(NoiseType::Perlin)),
+        3 => noise.set_noise_type(Some(NoiseType::Value)),
+        _ => noise.set_noise_type(Some(NoiseType::OpenSimplex2)),
+    }
+    noise
+}
+
+/// Grey level of a noise value, negative values clamp to black.
+#[inline(always)]
+fn noise_to_rgba(nv: f32) -> RGBA {
+    RGBA {
+        r: (nv * 255.0) as u8,
+        g: (nv * 255.0) as u8,
+        b: (nv * 255.0) as u8,
+        a: 255,
+    }
+}
+
 pub struct NoiseTexture {
     pub seed: i32,
     pub int_config: i32,
@@ -10,47 +38,83 @@ pub struct NoiseTexture {
 
 impl Clone for NoiseTexture {
     fn clone(&self) -> Self {
-        let mut noise = FastNoiseLite::new();
-        noise.set_seed(Some(self.seed));
-        match self.int_config {
-            0 => noise.set_noise_type(Some(NoiseType::OpenSimplex2)),
-            1 => noise.set_noise_type(Some(NoiseType::Cellular)),
-            2 => noise.set_noise_type(Some(NoiseType::Perlin)),
-            3 => noise.set_noise_type(Some(NoiseType::Value)),
-            _ => noise.set_noise_type(Some(NoiseType::OpenSimplex2)),
-        }
-        NoiseTexture {
-            seed: self.seed,
-            int_config: self.int_config,
-            noise,
-        }
+        NoiseTexture::new(self.seed, self.int_config)
     }
 }
 
 impl NoiseTexture {
     pub fn new(seed: i32, int_config: i32) -> Self {
-        let mut noise = FastNoiseLite::new();
-        noise.set_seed(Some(seed));
-        match int_config {
-            0 => noise.set_noise_type(Some(NoiseType::OpenSimplex2)),
-            1 => noise.set_noise_type(Some(NoiseType::Cellular)),
-            2 => noise.set_noise_type(Some(NoiseType::Perlin)),
-            3 => noise.set_noise_type(Some(NoiseType::Value)),
-            _ => noise.set_noise_type(Some(NoiseType::OpenSimplex2)),
-        }
         Self {
             seed,
             int_config,
-            noise,
+            noise: make_noise(seed, int_config),
         }
     }
     pub fn uv_map(&self, u: f32, v: f32, _idx: usize) -> RGBA {
-        let nv = self.noise.get_noise_2d(u, v);
-        RGBA {
-            r: (nv * 255.0) as u8,
-            g: (nv * 255.0) as u8,
-            b: (nv * 255.0) as u8,
-            a: 255,
+        noise_to_rgba(self.noise.get_noise_2d(u, v))
+    }
+
+    /// The texels of `frames` square `size` x `size` tiles laid out as an atlas
+    /// (`TextureAtlas` order: left to right, top to bottom, on a square grid), of
+    /// side `size * ceil(sqrt(frames))`, bottom row first.
+    ///
+    /// A single frame samples `uv_map` at the texel centers, so the baked texture
+    /// looks like the procedural one; frame `k` of an animation is the slice
+    /// `z = k` of the 3D noise, one frame step spanning one texture width.
+    pub fn bake(&self, size: usize, frames: usize) -> (usize, Vec<RGBA>) {
+        let per_row = (1..).find(|n| n * n >= frames.max(1)).unwrap();
+        let side = size * per_row;
+        let mut texels = Vec::with_capacity(side * side);
+        for y in 0..side {
+            // atlas rows count from the top, texture rows from the bottom
+            let tile_row = per_row - 1 - y / size;
+            let v = ((y % size) as f32 + 0.5) / size as f32;
+            for x in 0..side {
+                let frame = tile_row * per_row + x / size;
+                let u = ((x % size) as f32 + 0.5) / size as f32;
+                texels.push(if frames <= 1 {
+                    self.uv_map(u, v, 0)
+                } else if frame < frames {
+                    noise_to_rgba(self.noise.get_noise_3d(u, v, frame as f32))
+                } else {
+                    RGBA::new(0, 0, 0, 0)
+                });
+            }
         }
+        (side, texels)
+    }
+}
+
+#[cfg(test)]
+mod test_noise_texture {
+    use super::*;
+
+    #[test]
+    fn test_bake_matches_procedural_texture() {
+        let noise = NoiseTexture::new(3, 2);
+        let (side, texels) = noise.bake(8, 1);
+        assert_eq!(side, 8);
+        assert_eq!(texels.len(), 64);
+        assert_eq!(texels[2 * 8 + 5], noise.uv_map(5.5 / 8.0, 2.5 / 8.0, 0));
+    }
+
+    #[test]
+    fn test_bake_frames_in_atlas_order() {
+        let noise = NoiseTexture::new(3, 2);
+        let (side, texels) = noise.bake(4, 3);
+        // three frames fit a 2x2 grid, the last tile stays empty
+        assert_eq!(side, 8);
+        // frame 0 is the top left tile: upper rows of the texture
+        let top_left = texels[4 * 8];
+        assert_eq!(
+            top_left,
+            noise_to_rgba(noise.noise.get_noise_3d(0.125, 0.125, 0.0))
+        );
+        // frame 2 is the bottom left tile
+        assert_eq!(
+            texels[0],
+            noise_to_rgba(noise.noise.get_noise_3d(0.125, 0.125, 2.0))
+        );
+        assert_eq!(texels[4].a, 0);
     }
 }
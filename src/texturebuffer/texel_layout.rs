@@ -0,0 +1,114 @@
+//! Order of the texels of a texture in memory.
+//!
+//! Row-major storage puts the two rows read by a bilinear lookup `width * 4` bytes
+//! apart, so triangles walking a texture vertically or diagonally touch a new cache
+//! line for almost every sample. The tiled layout stores 4x4 blocks of texels
+//! contiguously (64 bytes, one cache line): the four texels of a lookup, and most
+//! of the next lookups, share a block whatever the direction of the walk.
+
+use super::RGBA;
+
+/// Side of a tile, in texels.
+pub const TILE_SIZE: usize = 4;
+const TILE_SHIFT: u32 = TILE_SIZE.trailing_zeros();
+const TILE_MASK: usize = TILE_SIZE - 1;
+
+#[derive(Clone, Copy, PartialEq, Debug)]
+pub enum TexelLayout {
+    /// Row after row, bottom row first.
+    Linear,
+    /// 4x4 tiles, row-major inside a tile and tile after tile along a row of tiles.
+    Tiled,
+}
+
+/// Number of tiles covering `size` texels.
+#[inline(always)]
+pub fn tile_count(size: usize) -> usize {
+    (size + TILE_MASK) >> TILE_SHIFT
+}
+
+/// Position of the texel (`ix`, `iy`) in the data of a tiled texture `width` wide.
+#[inline(always)]
+pub fn tiled_index(ix: usize, iy: usize, width: usize) -> usize {
+    let tile = (iy >> TILE_SHIFT) * tile_count(width) + (ix >> TILE_SHIFT);
+    (tile << (2 * TILE_SHIFT)) + ((iy & TILE_MASK) << TILE_SHIFT) + (ix & TILE_MASK)
+}
+
+/// Position of the texel (`ix`, `iy`) in the data of a `width` wide texture.
+#[inline(always)]
+pub fn texel_index(layout: TexelLayout, ix: usize, iy: usize, width: usize) -> usize {
+    match layout {
+        TexelLayout::Linear => iy * width + ix,
+        TexelLayout::Tiled => tiled_index(ix, iy, width),
+    }
+}
+
+/// Tiled copy of row-major `data`; the tiles overhanging the texture are padded
+/// with transparent black.
+pub fn to_tiled(data: &[RGBA], width: usize, height: usize) -> Box<[RGBA]> {
+    let size = tile_count(width) * tile_count(height) * TILE_SIZE * TILE_SIZE;
+    let mut tiled = vec![RGBA::new(0, 0, 0, 0); size];
+    for iy in 0..height {
+        for ix in 0..width {
+            tiled[tiled_index(ix, iy, width)] = data[iy * width + ix];
+        }
+    }
+    tiled.into_boxed_slice()
+}
+
+/// Row-major copy of tiled `data`.
+pub fn to_linear(data: &[RGBA], width: usize, height: usize) -> Box<[RGBA]> {
+    let mut linear = Vec::with_capacity(width * height);
+    for iy in 0..height {
+        for ix in 0..width {
+            linear.push(data[tiled_index(ix, iy, width)]);
+        }
+    }
+    linear.into_boxed_slice()
+}
+
+#[cfg(test)]
+mod test_texel_layout {
+    use super::*;
+
+    fn ramp(width: usize, height: usize) -> Vec<RGBA> {
+        (0..width * height)
+            .map(|i| RGBA::new((i % width) as u8, (i / width) as u8, 0, 255))
+            .collect()
+    }
+
+    #[test]
+    fn test_tiled_index() {
+        // the first tile holds the 4x4 bottom left texels
+        assert_eq!(tiled_index(0, 0, 8), 0);
+        assert_eq!(tiled_index(3, 0, 8), 3);
+        assert_eq!(tiled_index(0, 1, 8), 4);
+        assert_eq!(tiled_index(3, 3, 8), 15);
+        // then the tile on its right, then the next row of tiles
+        assert_eq!(tiled_index(4, 0, 8), 16);
+        assert_eq!(tiled_index(0, 4, 8), 32);
+        // partial tiles count as whole ones
+        assert_eq!(tiled_index(0, 4, 6), 32);
+    }
+
+    #[test]
+    fn test_round_trip() {
+        for (width, height) in [(8, 8), (6, 3), (1, 1), (5, 9)] {
+            let data = ramp(width, height);
+            let tiled = to_tiled(&data, width, height);
+            assert_eq!(
+                tiled.len(),
+                tile_count(width) * tile_count(height) * TILE_SIZE * TILE_SIZE
+            );
+            for iy in 0..height {
+                for ix in 0..width {
+                    assert_eq!(
+                        tiled[texel_index(TexelLayout::Tiled, ix, iy, width)],
+                        data[texel_index(TexelLayout::Linear, ix, iy, width)]
+                    );
+                }
+            }
+            assert_eq!(&to_linear(&tiled, width, height)[..], &data[..]);
+        }
+    }
+}
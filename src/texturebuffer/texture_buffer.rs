@@ -1,13 +1,18 @@
 use nalgebra_glm::{Vec2, Vec4};
 
 use crate::texturebuffer::UvMapper;
+use crate::utils::next_version_stamp;
 
-use super::{FilterMode, NoiseTexture, Texture, TextureAtlas, TextureCustom, TextureType, RGBA};
+use super::{
+    FilterMode, NoiseTexture, TexelLayout, Texture, TextureAtlas, TextureCustom, TextureType, RGBA,
+};
 
 pub struct TextureBuffer<const SIZE: usize> {
     pub max_size: usize,
     pub current_size: usize,
     pub textures: Box<[TextureType<SIZE>]>,
+    /// Version stamp of the last change of any texture.
+    pub version: u64,
 }
 
 fn make_texture<const SIZE: usize>(
@@ -53,9 +58,76 @@ impl<const SIZE: usize> TextureBuffer<SIZE> {
             max_size,
             current_size: 0,
             textures,
+            version: 0,
         }
     }
 
+    pub fn bump_version(&mut self) {
+        self.version = next_version_stamp();
+    }
+
+    /// The texels of texture `idx` with its width and height, for plain textures.
+    fn plain_texture_mut(
+        &mut self,
+        idx: usize,
+    ) -> Result<(&mut Texture<SIZE>, usize, usize), String> {
+        if idx >= self.current_size {
+            return Err(format!("Texture index {idx} out of range"));
+        }
+        match &mut self.textures[idx] {
+            TextureType::Fixed(t) => Ok((t, SIZE, SIZE)),
+            TextureType::Custom(t) => Ok((&mut t.texture, t.width, t.height)),
+            _ => Err("Only plain textures can be written to".to_string()),
+        }
+    }
+
+    /// Overwrite the `w` x `h` texels of texture `idx` starting at column `x` of
+    /// row `y`, rows in the order of `add_texture_from_iter`. The mip chain, if
+    /// any, is rebuilt.
+    pub fn update_region<I>(
+        &mut self,
+        idx: usize,
+        x: usize,
+        y: usize,
+        w: usize,
+        h: usize,
+        pixels: I,
+    ) -> Result<(), String>
+    where
+        I: IntoIterator<Item = RGBA>,
+        I::IntoIter: ExactSizeIterator,
+    {
+        let pixels = pixels.into_iter();
+        let (texture, width, height) = self.plain_texture_mut(idx)?;
+        if x + w > width || y + h > height {
+            return Err(format!(
+                "Region {w}x{h} at ({x}, {y}) is outside of the {width}x{height} texture"
+            ));
+        }
+        if pixels.len() != w * h {
+            return Err(format!(
+                "expected {} pixels for a {w}x{h} region, got {}",
+                w * h,
+                pixels.len()
+            ));
+        }
+        texture.write_region(width, height, x, y, w, pixels);
+        self.bump_version();
+        Ok(())
+    }
+
+    /// The texels of texture `idx`, row-major and bottom row first, with its width
+    /// and height. Fails for tiled textures.
+    ///
+    /// The version is not bumped: the caller does it once the texels are written.
+    pub fn texels_mut(&mut self, idx: usize) -> Result<(&mut [RGBA], usize, usize), String> {
+        let (texture, width, height) = self.plain_texture_mut(idx)?;
+        if texture.layout() != TexelLayout::Linear {
+            return Err("Only textures in the linear layout can be accessed directly".to_string());
+        }
+        Ok((texture.texels_mut(), width, height))
+    }
+
     pub fn get_rgba_at(&self, texture_idx: usize, u: f32, v: f32, uv_idx: usize) -> RGBA {
         let atexture = &self.textures[texture_idx];
 
@@ -68,6 +140,50 @@ impl<const SIZE: usize> TextureBuffer<SIZE> {
         atexture.uv_map(uv.x, uv.y, uv_idx)
     }
 
+    /// Like `get_rgba_at_v`, from the mip level matching `footprint` (see
+    /// `PixInfo::uv_footprint`) when the texture has mipmaps.
+    #[inline]
+    pub fn get_rgba_at_lod(&self, idx: usize, uv: &Vec2, uv_idx: usize, footprint: &Vec2) -> RGBA {
+        self.textures[idx].uv_map_lod(uv.x, uv.y, uv_idx, footprint)
+    }
+
+    /// Build the mip chain of the texture `idx`; atlas and noise textures have none.
+    pub fn build_mipmaps(&mut self, idx: usize) -> Result<(), String> {
+        if idx >= self.current_size {
+            return Err(format!("Texture index {idx} out of range"));
+        }
+        match &mut self.textures[idx] {
+            TextureType::Fixed(t) => t.build_mipmaps(SIZE, SIZE),
+            TextureType::Custom(t) => t.build_mipmaps(),
+            _ => return Err("Only plain textures can have mipmaps".to_string()),
+        }
+        self.bump_version();
+        Ok(())
+    }
+
+    /// Store the texels of texture `idx` in `layout`.
+    pub fn set_layout(&mut self, idx: usize, layout: TexelLayout) -> Result<(), String> {
+        if idx >= self.current_size {
+            return Err(format!("Texture index {idx} out of range"));
+        }
+        match &mut self.textures[idx] {
+            TextureType::Fixed(t) => t.set_layout(layout, SIZE, SIZE),
+            TextureType::Custom(t) => t.set_layout(layout),
+            _ => return Err("Only plain textures can change layout".to_string()),
+        }
+        self.bump_version();
+        Ok(())
+    }
+
+    /// Number of mip levels of the texture `idx`, the texture itself included.
+    pub fn mip_level_count(&self, idx: usize) -> usize {
+        match &self.textures[idx] {
+            TextureType::Fixed(t) => t.mip_level_count(),
+            TextureType::Custom(t) => t.mip_level_count(),
+            _ => 1,
+        }
+    }
+
     pub fn get_wh_of(&self, idx: usize) -> (usize, usize) {
         let atext = &self.textures[idx];
 
@@ -76,7 +192,8 @@ impl<const SIZE: usize> TextureBuffer<SIZE> {
             TextureType::Fixed(_) => (SIZE, SIZE),
             TextureType::Atlas(_) => (SIZE, SIZE),
             TextureType::Noise(_) => (SIZE, SIZE),
-            TextureType::AtlasCustom(_texture_atlas) => todo!(),
+            TextureType::AtlasCustom(t) => (t.texture.width, t.texture.height),
+            TextureType::RenderTarget(t) => (t.width, t.height),
         }
     }
     pub fn add_texture_from_iter<I: IntoIterator<Item = RGBA>>(
@@ -96,9 +213,59 @@ impl<const SIZE: usize> TextureBuffer<SIZE> {
 
         self.textures[self.current_size] = texture_type;
         self.current_size += 1;
+        self.bump_version();
 
         self.current_size - 1
     }
+    /// Add a `width` x `height` texture, transparent until an offscreen pass is
+    /// copied in with `write_render_target`.
+    pub fn add_render_target(
+        &mut self,
+        width: usize,
+        height: usize,
+        filter_mode: FilterMode,
+    ) -> usize {
+        if self.current_size >= self.max_size {
+            panic!("Texture buffer is full");
+        }
+
+        let texels = vec![RGBA::new(0, 0, 0, 0); width * height];
+        let texture = TextureCustom::<SIZE>::new(texels, width, height, false, false, filter_mode);
+        self.textures[self.current_size] = TextureType::RenderTarget(texture);
+        self.current_size += 1;
+        self.bump_version();
+        self.current_size - 1
+    }
+
+    /// Replace the texels of the render target `idx` by the `width` x `height`
+    /// `texels`, e.g. `DrawBuffer::canvas_texels`; the texture is reallocated when
+    /// its size changes.
+    pub fn write_render_target<I: IntoIterator<Item = RGBA>>(
+        &mut self,
+        idx: usize,
+        width: usize,
+        height: usize,
+        texels: I,
+    ) -> Result<(), String> {
+        if idx >= self.current_size {
+            return Err(format!("Texture index {idx} out of range"));
+        }
+        let TextureType::RenderTarget(target) = &mut self.textures[idx] else {
+            return Err(format!("Texture {idx} is not a render target"));
+        };
+        if target.width == width && target.height == height {
+            let data = target.texture.texels_mut();
+            for (texel, color) in data.iter_mut().zip(texels) {
+                *texel = color;
+            }
+        } else {
+            *target =
+                TextureCustom::<SIZE>::new(texels, width, height, false, false, target.filter_mode);
+        }
+        self.bump_version();
+        Ok(())
+    }
+
     pub fn add_noise_texture(&mut self, seed: i32, int_config: i32) -> usize {
         if self.current_size >= self.max_size {
             panic!("Texture buffer is full");
@@ -108,8 +275,29 @@ impl<const SIZE: usize> TextureBuffer<SIZE> {
 
         self.textures[self.current_size] = TextureType::Noise(noise_texture);
         self.current_size += 1;
+        self.bump_version();
         self.current_size - 1
     }
+
+    /// Add the noise of `add_noise_texture` baked into a repeating `bake_size` square
+    /// texture, sampled like any other; with several `frames`, an atlas of the
+    /// frames of an animation (see `NoiseTexture::bake`) whose sub-texture index
+    /// picks the frame.
+    pub fn add_baked_noise_texture(
+        &mut self,
+        seed: i32,
+        int_config: i32,
+        bake_size: usize,
+        frames: usize,
+        filter_mode: FilterMode,
+    ) -> usize {
+        let (side, texels) = NoiseTexture::new(seed, int_config).bake(bake_size, frames);
+        if frames <= 1 {
+            self.add_texture_from_iter(side, side, texels, true, true, filter_mode)
+        } else {
+            self.add_atlas_texture_from_iter(side, side, bake_size, bake_size, texels, filter_mode)
+        }
+    }
     pub fn add_atlas_texture_from_iter<I: IntoIterator<Item = RGBA>>(
         &mut self,
         width: usize,
@@ -150,6 +338,7 @@ impl<const SIZE: usize> TextureBuffer<SIZE> {
             self.textures[self.current_size] = text;
         }
         self.current_size += 1;
+        self.bump_version();
         self.current_size - 1
     }
 }
@@ -4,51 +4,116 @@ pub trait ToGlyphIndex {
     fn to_glyph_index(&self, color: &RGBA) -> u8;
 }
 
+/// Glyph of every 0..=255 level, built once from a ramp of glyphs.
+///
+/// The ramp splits the levels in equal buckets, darkest first: a 4 glyph ramp
+/// gives the buckets `< 64`, `< 128`, `< 192` and the rest. A lookup costs the same
+/// whatever the length of the ramp.
+#[derive(Clone, Copy, PartialEq)]
+pub struct GlyphLut {
+    pub table: [u8; 256],
+}
+
+impl GlyphLut {
+    /// Panics on an empty ramp or one longer than 256 glyphs.
+    pub fn from_ramp(ramp: &[u8]) -> Self {
+        assert!(
+            !ramp.is_empty() && ramp.len() <= 256,
+            "a glyph ramp holds 1 to 256 glyphs"
+        );
+        let mut table = [0u8; 256];
+        for (level, glyph) in table.iter_mut().enumerate() {
+            *glyph = ramp[level * ramp.len() / 256];
+        }
+        Self { table }
+    }
+
+    #[inline(always)]
+    pub fn get(&self, level: u8) -> u8 {
+        self.table[level as usize]
+    }
+}
+
+impl std::fmt::Debug for GlyphLut {
+    fn fmt(&self, f: &mut std::fmt::Formatter<'_>) -> std::fmt::Result {
+        // the ramp, without its repetitions
+        let mut ramp: Vec<u8> = self.table.to_vec();
+        ramp.dedup();
+        f.debug_tuple("GlyphLut").field(&ramp).finish()
+    }
+}
+
 #[derive(Clone, Copy, Debug)]
 pub enum ToGlyphMethod {
     Static(u8),
     FromAlpha,
-    Map4Luminance(u8, u8, u8, u8),
-    Map4Color(u8, u8, u8, u8),
+    /// Glyph by luminance.
+    MapLuminance(GlyphLut),
+    /// Glyph by the red channel.
+    MapColor(GlyphLut),
 }
 
-fn map4<T: PartialOrd<u8> + From<u8>>(value: T, g0: u8, g1: u8, g2: u8, g3: u8) -> u8 {
-    if value < 64u8 {
-        g0
-    } else if value < 128 {
-        g1
-    } else if value < 192 {
-        g2
-    } else {
-        g3
+impl ToGlyphMethod {
+    pub fn map4_luminance(g0: u8, g1: u8, g2: u8, g3: u8) -> Self {
+        ToGlyphMethod::MapLuminance(GlyphLut::from_ramp(&[g0, g1, g2, g3]))
     }
-}
-fn map4f<T: PartialOrd<f32> + From<f32>>(value: T, g0: u8, g1: u8, g2: u8, g3: u8) -> u8 {
-    if value < 64.0 {
-        g0
-    } else if value < 128.0 {
-        g1
-    } else if value < 192.0 {
-        g2
-    } else {
-        g3
+    pub fn map4_color(g0: u8, g1: u8, g2: u8, g3: u8) -> Self {
+        ToGlyphMethod::MapColor(GlyphLut::from_ramp(&[g0, g1, g2, g3]))
+    }
+    /// Map the luminance over `ramp`, darkest glyph first (an ASCII density ramp
+    /// such as `" .:-=+*#%@"`).
+    pub fn mapn_luminance(ramp: &[u8]) -> Self {
+        ToGlyphMethod::MapLuminance(GlyphLut::from_ramp(ramp))
+    }
+    pub fn mapn_color(ramp: &[u8]) -> Self {
+        ToGlyphMethod::MapColor(GlyphLut::from_ramp(ramp))
     }
 }
 
 impl ToGlyphIndex for ToGlyphMethod {
+    #[inline]
     fn to_glyph_index(&self, color: &RGBA) -> u8 {
         match self {
             ToGlyphMethod::FromAlpha => color.a,
-            ToGlyphMethod::Map4Luminance(g0, g1, g2, g3) => {
-                let lum = color.luminance();
-                // map lum [0..255] to one of the four glyphs
-                map4f(lum, *g0, *g1, *g2, *g3)
-            }
-            ToGlyphMethod::Map4Color(g0, g1, g2, g3) => {
-                let lum = color.r;
-                map4(lum, *g0, *g1, *g2, *g3)
-            }
+            ToGlyphMethod::MapLuminance(lut) => lut.get(color.luminance_u8()),
+            ToGlyphMethod::MapColor(lut) => lut.get(color.r),
             ToGlyphMethod::Static(glyphidx) => *glyphidx,
         }
     }
 }
+
+#[cfg(test)]
+mod test_toglyph_methods {
+    use super::*;
+
+    #[test]
+    fn test_map4_buckets() {
+        let method = ToGlyphMethod::map4_color(10, 11, 12, 13);
+        for (r, glyph) in [
+            (0, 10),
+            (63, 10),
+            (64, 11),
+            (127, 11),
+            (128, 12),
+            (192, 13),
+            (255, 13),
+        ] {
+            assert_eq!(method.to_glyph_index(&RGBA::new(r, 0, 0, 255)), glyph);
+        }
+    }
+
+    #[test]
+    fn test_mapn_luminance() {
+        let ramp: Vec<u8> = (0..16).collect();
+        let method = ToGlyphMethod::mapn_luminance(&ramp);
+        let grey = |l: u8| RGBA::new(l, l, l, 255);
+        assert_eq!(method.to_glyph_index(&grey(0)), 0);
+        assert_eq!(method.to_glyph_index(&grey(16)), 1);
+        assert_eq!(method.to_glyph_index(&grey(255)), 15);
+        // green weighs more than red
+        assert!(
+            method.to_glyph_index(&RGBA::new(0, 200, 0, 255))
+                > method.to_glyph_index(&RGBA::new(200, 0, 0, 255))
+        );
+    }
+}
@@ -1,5 +1,7 @@
+use pyo3::exceptions::PyValueError;
 use pyo3::prelude::*;
 
+use crate::drawbuffer::glyphset::glyph_position;
 use crate::texturebuffer::toglyph_methods::ToGlyphMethod;
 
 #[derive(Clone)]
@@ -8,17 +10,19 @@ pub struct ToGlyphMethodPy {
     pub met_id: usize,
     pub glyph_idx: u8,
     pub glyph_set: (u8, u8, u8, u8),
+    pub glyph_ramp: Vec<u8>,
 }
 impl ToGlyphMethodPy {
     pub fn to_method(&self) -> ToGlyphMethod {
         match self.met_id {
             0 => ToGlyphMethod::Static(self.glyph_idx),
-            1 => ToGlyphMethod::Map4Luminance(
+            1 => ToGlyphMethod::map4_luminance(
                 self.glyph_set.0,
                 self.glyph_set.1,
                 self.glyph_set.2,
                 self.glyph_set.3,
             ),
+            2 => ToGlyphMethod::mapn_luminance(&self.glyph_ramp),
             _ => panic!("Unknown ToGlyphMethodPy id"),
         }
     }
@@ -41,6 +45,7 @@ impl ToGlyphMethodPyStatic {
             met_id: 0,
             glyph_idx,
             glyph_set: (0, 0, 0, 0),
+            glyph_ramp: Vec::new(),
         };
         PyClassInitializer::from(parent).add_subclass(ToGlyphMethodPyStatic { glyph_idx })
     }
@@ -63,7 +68,54 @@ impl ToGlyphMethodPyMap4Luminance {
             met_id: 1,
             glyph_idx: 0,
             glyph_set,
+            glyph_ramp: Vec::new(),
         };
         PyClassInitializer::from(parent).add_subclass(ToGlyphMethodPyMap4Luminance { glyph_set })
     }
 }
+
+/// MapN Luminance
+///
+/// Calculate the luminance of the texture color and map it over a ramp of glyphs,
+/// darkest first, at the cost of Map4 whatever the length of the ramp.
+#[pyclass(extends=ToGlyphMethodPy)]
+#[derive(Clone)]
+pub struct ToGlyphMethodPyMapNLuminance {
+    #[pyo3(get)]
+    pub glyph_ramp: Vec<u8>,
+}
+impl ToGlyphMethodPyMapNLuminance {
+    fn init(glyph_ramp: Vec<u8>) -> PyResult<PyClassInitializer<Self>> {
+        if glyph_ramp.is_empty() || glyph_ramp.len() > 256 {
+            return Err(PyValueError::new_err("glyph_ramp holds 1 to 256 glyphs"));
+        }
+        let parent = ToGlyphMethodPy {
+            met_id: 2,
+            glyph_idx: 0,
+            glyph_set: (0, 0, 0, 0),
+            glyph_ramp: glyph_ramp.clone(),
+        };
+        Ok(PyClassInitializer::from(parent)
+            .add_subclass(ToGlyphMethodPyMapNLuminance { glyph_ramp }))
+    }
+}
+#[pymethods]
+impl ToGlyphMethodPyMapNLuminance {
+    #[new]
+    fn new(glyph_ramp: Vec<u8>) -> PyResult<PyClassInitializer<Self>> {
+        Self::init(glyph_ramp)
+    }
+
+    /// Ramp of the glyphs of `chars`, e.g. `" .:-=+*#%@"`.
+    #[staticmethod]
+    fn from_chars(py: Python, chars: &str) -> PyResult<Py<Self>> {
+        let glyph_ramp = chars
+            .chars()
+            .map(|c| {
+                glyph_position(c)
+                    .ok_or_else(|| PyValueError::new_err(format!("{c:?} is not in the glyph set")))
+            })
+            .collect::<PyResult<Vec<u8>>>()?;
+        Py::new(py, Self::init(glyph_ramp)?)
+    }
+}
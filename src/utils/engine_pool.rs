@@ -0,0 +1,198 @@
+use std::sync::{Arc, RwLock};
+
+use once_cell::sync::Lazy;
+use pyo3::{
+    exceptions::PyValueError,
+    pyfunction,
+    types::{PyDict, PyDictMethods},
+    Bound, PyResult, Python,
+};
+use rayon::{ThreadPool, ThreadPoolBuildError};
+
+/// Thread count of the engine pool until [`configure_engine_pool`] is called.
+pub const DEFAULT_ENGINE_THREADS: usize = 8;
+
+/// Work items per thread of the parallel cell passes when the chunk size is automatic.
+pub const CHUNKS_PER_THREAD: usize = 8;
+
+/// Settings of the process-wide engine pool.
+#[derive(Clone, Debug, PartialEq, Eq)]
+pub struct EnginePoolConfig {
+    pub num_threads: usize,
+    /// worker threads are named `{thread_name}-{index}`
+    pub thread_name: String,
+    /// Rows of cells per work item of the parallel cell passes; `0` picks about
+    /// [`CHUNKS_PER_THREAD`] items per thread. Smaller items balance uneven rows
+    /// better, at the price of more work-stealing.
+    pub chunk_rows: usize,
+}
+
+impl Default for EnginePoolConfig {
+    fn default() -> Self {
+        EnginePoolConfig {
+            num_threads: DEFAULT_ENGINE_THREADS,
+            thread_name: "tt3de-worker".to_string(),
+            chunk_rows: 0,
+        }
+    }
+}
+
+struct EnginePool {
+    config: EnginePoolConfig,
+    // built on first use
+    pool: Option<Arc<ThreadPool>>,
+}
+
+// One pool for every render context of the process, so that several contexts do
+// not each spawn their own workers and oversubscribe the machine.
+static ENGINE: Lazy<RwLock<EnginePool>> = Lazy::new(|| {
+    RwLock::new(EnginePool {
+        config: EnginePoolConfig::default(),
+        pool: None,
+    })
+});
+
+/// Build a Rayon pool of `num_threads` workers named `{thread_name}-{index}`.
+pub fn build_pool(
+    num_threads: usize,
+    thread_name: &str,
+) -> Result<Arc<ThreadPool>, ThreadPoolBuildError> {
+    let thread_name = thread_name.to_string();
+    rayon::ThreadPoolBuilder::new()
+        .num_threads(num_threads)
+        .thread_name(move |idx| format!("{thread_name}-{idx}"))
+        .build()
+        .map(Arc::new)
+}
+
+/// The engine pool, built with the current configuration on first use.
+pub fn engine_pool() -> Arc<ThreadPool> {
+    if let Some(pool) = ENGINE.read().unwrap().pool.as_ref() {
+        return pool.clone();
+    }
+    let mut engine = ENGINE.write().unwrap();
+    if engine.pool.is_none() {
+        let pool = build_pool(engine.config.num_threads, &engine.config.thread_name)
+            .expect("Failed to build the engine thread pool");
+        engine.pool = Some(pool);
+    }
+    engine.pool.as_ref().unwrap().clone()
+}
+
+pub fn engine_config() -> EnginePoolConfig {
+    ENGINE.read().unwrap().config.clone()
+}
+
+/// Replace the engine pool. Passes already running keep the previous pool until they
+/// finish; it is dropped with its last user.
+pub fn configure_engine_pool(config: EnginePoolConfig) -> Result<(), ThreadPoolBuildError> {
+    let pool = build_pool(config.num_threads, &config.thread_name)?;
+    let mut engine = ENGINE.write().unwrap();
+    engine.config = config;
+    engine.pool = Some(pool);
+    Ok(())
+}
+
+/// Rows per work item of a parallel pass over `row_count` rows on `threads` threads.
+pub fn chunk_rows(row_count: usize, threads: usize) -> usize {
+    match engine_config().chunk_rows {
+        0 => row_count
+            .div_ceil(threads.max(1) * CHUNKS_PER_THREAD)
+            .max(1),
+        rows => rows,
+    }
+}
+
+/// Which pool the parallel passes of a render context run on.
+#[derive(Clone)]
+pub enum PoolChoice {
+    Serial,
+    /// the process-wide engine pool
+    Engine,
+    /// a pool owned by the context
+    Dedicated(Arc<ThreadPool>),
+}
+
+impl PoolChoice {
+    pub fn pool(&self) -> Option<Arc<ThreadPool>> {
+        match self {
+            PoolChoice::Serial => None,
+            PoolChoice::Engine => Some(engine_pool()),
+            PoolChoice::Dedicated(pool) => Some(pool.clone()),
+        }
+    }
+
+    pub fn thread_count(&self) -> Option<usize> {
+        match self {
+            PoolChoice::Serial => None,
+            PoolChoice::Engine => Some(engine_config().num_threads),
+            PoolChoice::Dedicated(pool) => Some(pool.current_num_threads()),
+        }
+    }
+}
+
+/// Configure the process-wide thread pool shared by the parallel passes of every
+/// render context; arguments left to `None` keep their current value.
+#[pyfunction]
+#[pyo3(signature = (num_threads=None, thread_name=None, chunk_rows=None))]
+pub fn configure_engine_pool_py(
+    num_threads: Option<usize>,
+    thread_name: Option<String>,
+    chunk_rows: Option<usize>,
+) -> PyResult<()> {
+    let mut config = engine_config();
+    if let Some(num_threads) = num_threads {
+        if num_threads == 0 {
+            return Err(PyValueError::new_err("num_threads must be positive"));
+        }
+        config.num_threads = num_threads;
+    }
+    if let Some(thread_name) = thread_name {
+        config.thread_name = thread_name;
+    }
+    if let Some(chunk_rows) = chunk_rows {
+        config.chunk_rows = chunk_rows;
+    }
+    configure_engine_pool(config).map_err(|e| PyValueError::new_err(e.to_string()))
+}
+
+/// Current settings of the engine pool, as a dict.
+#[pyfunction]
+pub fn engine_pool_config_py(py: Python<'_>) -> PyResult<Bound<'_, PyDict>> {
+    let config = engine_config();
+    let dict = PyDict::new(py);
+    dict.set_item("num_threads", config.num_threads)?;
+    dict.set_item("thread_name", config.thread_name)?;
+    dict.set_item("chunk_rows", config.chunk_rows)?;
+    Ok(dict)
+}
+
+#[cfg(test)]
+mod test_engine_pool {
+    use super::*;
+
+    #[test]
+    fn test_configure_engine_pool() {
+        configure_engine_pool(EnginePoolConfig {
+            num_threads: 3,
+            thread_name: "test-worker".to_string(),
+            chunk_rows: 0,
+        })
+        .unwrap();
+        let pool = engine_pool();
+        assert_eq!(pool.current_num_threads(), 3);
+        let name = pool.install(|| std::thread::current().name().map(str::to_string));
+        assert!(name.unwrap().starts_with("test-worker-"));
+        assert_eq!(chunk_rows(10, 3), 1);
+        assert_eq!(chunk_rows(120, 3), 5);
+        assert_eq!(PoolChoice::Engine.thread_count(), Some(3));
+        assert!(PoolChoice::Serial.pool().is_none());
+
+        configure_engine_pool(EnginePoolConfig {
+            chunk_rows: 2,
+            ..engine_config()
+        })
+        .unwrap();
+        assert_eq!(chunk_rows(10, 3), 2);
+    }
+}
@@ -1,14 +1,60 @@
 use std::collections::HashMap;
+use std::sync::atomic::{AtomicU64, Ordering};
 
 use nalgebra_glm::{Mat4, Vec2, Vec3, Vec4};
 use once_cell::sync::OnceCell;
 use pyo3::{
+    exceptions::PyValueError,
     types::{PyAnyMethods, PyDict, PyDictMethods, PyList, PyTuple, PyTupleMethods},
-    Bound, Py, PyAny, PyResult, Python,
+    Bound, Py, PyAny, PyErr, PyResult, Python,
 };
 
 use super::texturebuffer::RGBA;
 
+pub mod engine_pool;
+
+// process-wide source of version stamps for the buffer change counters
+static VERSION_STAMP: AtomicU64 = AtomicU64::new(1);
+
+/// Return a fresh, strictly increasing version stamp.
+///
+/// Stamps are shared by every buffer so that two different buffers never hand out
+/// the same value; caches can then compare stamps without tracking buffer identity.
+pub fn next_version_stamp() -> u64 {
+    VERSION_STAMP.fetch_add(1, Ordering::Relaxed)
+}
+
+/// Capacity a buffer of `capacity` slots grows to so it can hold `required` slots.
+///
+/// Growth is amortized (doubling) and clamped to `hard_cap`; returns `None` when
+/// `required` is above the cap.
+pub fn grown_capacity(capacity: usize, required: usize, hard_cap: Option<usize>) -> Option<usize> {
+    if hard_cap.map_or(false, |cap| required > cap) {
+        return None;
+    }
+    let mut new_capacity = capacity.max(16);
+    while new_capacity < required {
+        new_capacity *= 2;
+    }
+    Some(hard_cap.map_or(new_capacity, |cap| new_capacity.min(cap)))
+}
+
+/// Resize a boxed slice to `new_len`, filling new slots with `fill()`.
+pub fn resize_boxed_slice<T>(slice: &mut Box<[T]>, new_len: usize, fill: impl FnMut() -> T) {
+    let mut content = std::mem::take(slice).into_vec();
+    content.resize_with(new_len, fill);
+    *slice = content.into_boxed_slice();
+}
+
+/// Error raised by the python bindings when a buffer reached its hard cap.
+pub fn buffer_full_error(buffer_name: &str, hard_cap: Option<usize>) -> PyErr {
+    PyValueError::new_err(format!(
+        "{} is full (hard cap of {} elements)",
+        buffer_name,
+        hard_cap.unwrap_or(0)
+    ))
+}
+
 // caching the glm.vec2, vec3, vec4 constructors
 static GLM_VEC2: OnceCell<Py<PyAny>> = OnceCell::new();
 static GLM_VEC3: OnceCell<Py<PyAny>> = OnceCell::new();
@@ -1,3 +1,4 @@
+pub mod range_allocator;
 pub mod transform_pack;
 #[cfg(feature = "python-binding")]
 pub mod transform_pack_py;
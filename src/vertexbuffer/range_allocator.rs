@@ -0,0 +1,95 @@
+/// Free-list of released `[start, start + count)` ranges in an append-only buffer.
+///
+/// Ranges are kept sorted by start and merged with their neighbours on release, so
+/// the list stays short. Allocation is first-fit; when no released range is large
+/// enough the caller appends at the end of the buffer instead.
+#[derive(Debug, Default)]
+pub struct RangeAllocator {
+    free: Vec<(usize, usize)>,
+}
+
+impl RangeAllocator {
+    pub fn new() -> Self {
+        Self { free: Vec::new() }
+    }
+
+    /// Take `count` slots out of a released range; `None` when nothing fits.
+    pub fn allocate(&mut self, count: usize) -> Option<usize> {
+        if count == 0 {
+            return None;
+        }
+        let pos = self.free.iter().position(|&(_, len)| len >= count)?;
+        let (start, len) = self.free[pos];
+        if len == count {
+            self.free.remove(pos);
+        } else {
+            self.free[pos] = (start + count, len - count);
+        }
+        Some(start)
+    }
+
+    /// Give `[start, start + count)` back to the allocator.
+    pub fn release(&mut self, start: usize, count: usize) {
+        if count == 0 {
+            return;
+        }
+        let pos = self.free.partition_point(|&(s, _)| s < start);
+        self.free.insert(pos, (start, count));
+
+        // merge with the next range, then with the previous one
+        if pos + 1 < self.free.len() {
+            let (next_start, next_len) = self.free[pos + 1];
+            if start + count >= next_start {
+                let end = (next_start + next_len).max(start + count);
+                self.free[pos].1 = end - start;
+                self.free.remove(pos + 1);
+            }
+        }
+        if pos > 0 {
+            let (prev_start, prev_len) = self.free[pos - 1];
+            if prev_start + prev_len >= start {
+                let end = (start + self.free[pos].1).max(prev_start + prev_len);
+                self.free[pos - 1].1 = end - prev_start;
+                self.free.remove(pos);
+            }
+        }
+    }
+
+    /// Total number of released slots.
+    pub fn free_count(&self) -> usize {
+        self.free.iter().map(|&(_, len)| len).sum()
+    }
+
+    pub fn clear(&mut self) {
+        self.free.clear();
+    }
+}
+
+#[cfg(test)]
+mod test_range_allocator {
+    use super::RangeAllocator;
+
+    #[test]
+    fn test_first_fit_and_merge() {
+        let mut alloc = RangeAllocator::new();
+        assert_eq!(alloc.allocate(3), None);
+
+        alloc.release(10, 4);
+        alloc.release(2, 2);
+        assert_eq!(alloc.free_count(), 6);
+
+        // first fit picks the lowest range large enough
+        assert_eq!(alloc.allocate(3), Some(10));
+        assert_eq!(alloc.allocate(2), Some(2));
+        assert_eq!(alloc.allocate(2), None);
+        assert_eq!(alloc.allocate(1), Some(13));
+        assert_eq!(alloc.free_count(), 0);
+
+        // adjacent releases merge into a single range
+        alloc.release(0, 2);
+        alloc.release(4, 2);
+        alloc.release(2, 2);
+        assert_eq!(alloc.allocate(6), Some(0));
+        assert_eq!(alloc.free_count(), 0);
+    }
+}
@@ -1,50 +1,500 @@
 use nalgebra_glm::{Mat4, Vec3};
+use rayon::prelude::*;
 
+use crate::utils::{
+    engine_pool::engine_pool, grown_capacity, next_version_stamp, resize_boxed_slice,
+};
+
+/// Hierarchy levels with at least this many nodes are composed in parallel.
+pub const PARALLEL_LEVEL_MIN_NODES: usize = 1024;
+
+/// Model transforms of every node of the scene.
+///
+/// Each node stores a local transform and an optional parent. The global transforms
+/// (`model_transforms`) are composed natively by `update_global_transforms`, one
+/// hierarchy level after the other, so parents are always resolved before children.
 pub struct TransformPack {
+    /// Global transforms, computed from the local transforms and the parents.
     pub model_transforms: Box<[Mat4]>,
+    pub local_transforms: Box<[Mat4]>,
+    pub parents: Box<[Option<usize>]>,
     pub view_matrix_2d: Mat4,
     pub view_matrix_3d: Mat4,
     pub projection_matrix_3d: Mat4,
     pub environment_light: Vec3,
 
+    /// Allocated node slots; grows on demand up to `hard_cap`.
     pub max_node_count: usize,
     pub current_count: usize,
+    pub hard_cap: Option<usize>,
+    /// Highest `current_count` reached before the last clear.
+    pub high_water: usize,
+    /// Slots of removed nodes, reused by the next added nodes.
+    pub free_nodes: Vec<usize>,
+
+    /// Version stamp of the last effective change of the pack.
+    pub version: u64,
+    /// Version stamp of the last change of each matrix.
+    pub view_2d_version: u64,
+    pub view_3d_version: u64,
+    pub projection_version: u64,
+    pub node_versions: Box<[u64]>,
+
+    /// Compose large hierarchy levels on the engine pool.
+    pub parallel_update: bool,
+
+    local_dirty: Box<[bool]>,
+    any_dirty: bool,
+    // node ids grouped by depth in the hierarchy; rebuilt when the structure changes
+    levels: Vec<Vec<usize>>,
+    levels_dirty: bool,
+    // per node: recomputed during the current update
+    recomputed: Box<[bool]>,
+    scratch: Vec<Option<Mat4>>,
 }
 
 impl TransformPack {
     pub fn new(max_node: usize) -> Self {
+        Self::with_hard_cap(max_node, None)
+    }
+
+    pub fn with_hard_cap(max_node: usize, hard_cap: Option<usize>) -> Self {
+        let max_node = hard_cap.map_or(max_node, |cap| max_node.min(cap));
         let v3 = Vec3::zeros();
         let node_tr = vec![Mat4::identity(); max_node].into_boxed_slice();
 
         TransformPack {
-            model_transforms: node_tr,
+            model_transforms: node_tr.clone(),
+            local_transforms: node_tr,
+            parents: vec![None; max_node].into_boxed_slice(),
             view_matrix_2d: Mat4::identity(),
             view_matrix_3d: Mat4::identity(),
             projection_matrix_3d: Mat4::identity(),
             environment_light: v3,
             max_node_count: max_node,
             current_count: 0,
+            hard_cap,
+            high_water: 0,
+            free_nodes: Vec::new(),
+            version: 0,
+            view_2d_version: 0,
+            view_3d_version: 0,
+            projection_version: 0,
+            node_versions: vec![0; max_node].into_boxed_slice(),
+            parallel_update: true,
+            local_dirty: vec![false; max_node].into_boxed_slice(),
+            any_dirty: false,
+            levels: Vec::new(),
+            levels_dirty: false,
+            recomputed: vec![false; max_node].into_boxed_slice(),
+            scratch: Vec::new(),
+        }
+    }
+
+    fn bump_version(&mut self) -> u64 {
+        self.version = next_version_stamp();
+        self.version
+    }
+
+    /// Make room for `additional` more nodes; false when the hard cap forbids it.
+    pub fn reserve(&mut self, additional: usize) -> bool {
+        let required = self.current_count + additional;
+        if required <= self.max_node_count {
+            return true;
+        }
+        match grown_capacity(self.max_node_count, required, self.hard_cap) {
+            Some(capacity) => {
+                resize_boxed_slice(&mut self.model_transforms, capacity, Mat4::identity);
+                resize_boxed_slice(&mut self.local_transforms, capacity, Mat4::identity);
+                resize_boxed_slice(&mut self.parents, capacity, || None);
+                resize_boxed_slice(&mut self.node_versions, capacity, || 0);
+                resize_boxed_slice(&mut self.local_dirty, capacity, || false);
+                resize_boxed_slice(&mut self.recomputed, capacity, || false);
+                self.max_node_count = capacity;
+                true
+            }
+            None => false,
         }
     }
 
+    pub fn high_water_mark(&self) -> usize {
+        self.high_water.max(self.current_count)
+    }
+
+    /// Number of nodes in use: the slots minus the removed ones.
+    pub fn node_count(&self) -> usize {
+        self.current_count - self.free_nodes.len()
+    }
+
+    /// True when `node_id` is an added node that was not removed.
+    pub fn is_live(&self, node_id: usize) -> bool {
+        node_id < self.current_count && !self.free_nodes.contains(&node_id)
+    }
+
+    /// Make room for one more node, in a removed slot or by growing the pack.
+    pub fn reserve_node(&mut self) -> bool {
+        !self.free_nodes.is_empty() || self.reserve(1)
+    }
+
     pub fn clear(&mut self) {
-        self.current_count = 0
+        self.high_water = self.high_water_mark();
+        self.current_count = 0;
+        self.free_nodes.clear();
+        self.any_dirty = false;
+        self.levels_dirty = true;
+        self.bump_version();
     }
 
     pub fn add_node_transform(&mut self, m4: Mat4) -> usize {
-        if self.current_count >= self.max_node_count {
-            return self.current_count;
+        self.add_child_node_transform(m4, None)
+    }
+
+    /// Add a node with local transform `m4` under `parent`.
+    ///
+    /// `parent` must be an already added node. A root node has its global transform
+    /// set right away; a child is composed on the next `update_global_transforms`.
+    /// The slot of the last removed node is reused first. Returns `current_count`
+    /// when the hard cap is reached.
+    pub fn add_child_node_transform(&mut self, m4: Mat4, parent: Option<usize>) -> usize {
+        let node_id = match self.free_nodes.pop() {
+            Some(node_id) => node_id,
+            None if self.reserve(1) => {
+                self.current_count += 1;
+                self.current_count - 1
+            }
+            None => return self.current_count,
+        };
+        let parent = parent.filter(|&p| p != node_id && self.is_live(p));
+
+        self.local_transforms[node_id] = m4;
+        self.parents[node_id] = parent;
+        if parent.is_none() {
+            self.model_transforms[node_id] = m4;
+        }
+        self.local_dirty[node_id] = parent.is_some();
+        self.any_dirty |= parent.is_some();
+        self.levels_dirty = true;
+        self.node_versions[node_id] = self.bump_version();
+        node_id
+    }
+
+    /// Remove a node and give its slot back for the next added node.
+    ///
+    /// Its children become roots; remove them first to drop a whole subtree.
+    pub fn remove_node(&mut self, node_id: usize) -> Result<(), String> {
+        if !self.is_live(node_id) {
+            return Err(format!("node index {} is not a live node", node_id));
+        }
+        for (parent, dirty) in self.parents[..self.current_count]
+            .iter_mut()
+            .zip(self.local_dirty.iter_mut())
+        {
+            if *parent == Some(node_id) {
+                *parent = None;
+                *dirty = true;
+                self.any_dirty = true;
+            }
         }
-        self.model_transforms[self.current_count] = m4;
-        self.current_count += 1;
-        self.current_count - 1
+        self.parents[node_id] = None;
+        self.local_transforms[node_id] = Mat4::identity();
+        self.model_transforms[node_id] = Mat4::identity();
+        self.local_dirty[node_id] = false;
+        self.levels_dirty = true;
+        self.node_versions[node_id] = self.bump_version();
+        self.free_nodes.push(node_id);
+        Ok(())
     }
 
+    /// Set the local transform of a node; the node version only moves when the
+    /// resulting global transform actually changes.
     pub fn set_node_transform(&mut self, node_id: usize, m4: Mat4) {
-        self.model_transforms[node_id] = m4;
+        if self.local_transforms[node_id] == m4 {
+            return;
+        }
+        self.local_transforms[node_id] = m4;
+        // roots are resolved right away, their subtree on the next update
+        if self.parents[node_id].is_none() {
+            self.model_transforms[node_id] = m4;
+            self.node_versions[node_id] = self.bump_version();
+        }
+        self.local_dirty[node_id] = true;
+        self.any_dirty = true;
+    }
+
+    /// Attach `node_id` under `parent`, or make it a root with `None`.
+    pub fn set_node_parent(&mut self, node_id: usize, parent: Option<usize>) -> Result<(), String> {
+        if node_id >= self.current_count {
+            return Err(format!("node index {} out of range", node_id));
+        }
+        if let Some(p) = parent {
+            if !self.is_live(p) {
+                return Err(format!("parent index {} out of range", p));
+            }
+            // walking up from the new parent must not reach the node itself
+            let mut current = Some(p);
+            while let Some(c) = current {
+                if c == node_id {
+                    return Err(format!(
+                        "parenting node {} under {} would create a cycle",
+                        node_id, p
+                    ));
+                }
+                current = self.parents[c];
+            }
+        }
+        if self.parents[node_id] == parent {
+            return Ok(());
+        }
+        self.parents[node_id] = parent;
+        self.local_dirty[node_id] = true;
+        self.any_dirty = true;
+        self.levels_dirty = true;
+        Ok(())
+    }
+
+    pub fn get_node_parent(&self, node_id: usize) -> Option<usize> {
+        self.parents[node_id]
     }
 
+    /// Global transform of a node, as of the last `update_global_transforms`.
     pub fn get_node_transform(&self, node_id: usize) -> &Mat4 {
         &self.model_transforms[node_id]
     }
+
+    pub fn get_local_transform(&self, node_id: usize) -> &Mat4 {
+        &self.local_transforms[node_id]
+    }
+
+    pub fn get_node_version(&self, node_id: usize) -> u64 {
+        self.node_versions[node_id]
+    }
+
+    fn rebuild_levels(&mut self) {
+        // depth of each node; parents are always resolved first by walking up
+        let count = self.current_count;
+        let mut depths: Vec<Option<usize>> = vec![None; count];
+        let mut chain: Vec<usize> = Vec::new();
+        for node_id in 0..count {
+            // climb until a node of known depth (or past a root, counted as depth -1),
+            // then resolve the chain downwards
+            let mut current = node_id;
+            let mut depth = loop {
+                if let Some(d) = depths[current] {
+                    break d;
+                }
+                chain.push(current);
+                match self.parents[current] {
+                    Some(p) => current = p,
+                    None => break usize::MAX,
+                }
+            };
+            while let Some(n) = chain.pop() {
+                depth = depth.wrapping_add(1);
+                depths[n] = Some(depth);
+            }
+        }
+
+        for level in self.levels.iter_mut() {
+            level.clear();
+        }
+        for (node_id, depth) in depths.iter().enumerate() {
+            let depth = depth.unwrap();
+            if self.levels.len() <= depth {
+                self.levels.resize_with(depth + 1, Vec::new);
+            }
+            self.levels[depth].push(node_id);
+        }
+        while matches!(self.levels.last(), Some(level) if level.is_empty()) {
+            self.levels.pop();
+        }
+        self.levels_dirty = false;
+    }
+
+    /// Compose the global transforms of every node whose local transform, or one
+    /// of whose ancestors, changed since the last update.
+    pub fn update_global_transforms(&mut self) {
+        if !self.any_dirty {
+            return;
+        }
+        if self.levels_dirty {
+            self.rebuild_levels();
+        }
+
+        let TransformPack {
+            model_transforms,
+            local_transforms,
+            parents,
+            node_versions,
+            local_dirty,
+            levels,
+            recomputed,
+            scratch,
+            parallel_update,
+            version,
+            ..
+        } = self;
+
+        for level in levels.iter() {
+            {
+                let compose = |&node_id: &usize| -> Option<Mat4> {
+                    let parent = parents[node_id];
+                    let dirty = local_dirty[node_id] || parent.map_or(false, |p| recomputed[p]);
+                    if !dirty {
+                        return None;
+                    }
+                    Some(match parent {
+                        Some(p) => model_transforms[p] * local_transforms[node_id],
+                        None => local_transforms[node_id],
+                    })
+                };
+                if *parallel_update && level.len() >= PARALLEL_LEVEL_MIN_NODES {
+                    engine_pool()
+                        .install(|| level.par_iter().map(compose).collect_into_vec(scratch));
+                } else {
+                    scratch.clear();
+                    scratch.extend(level.iter().map(compose));
+                }
+            }
+
+            for (&node_id, global) in level.iter().zip(scratch.iter()) {
+                recomputed[node_id] = global.is_some();
+                local_dirty[node_id] = false;
+                if let Some(global) = global {
+                    if model_transforms[node_id] != *global {
+                        model_transforms[node_id] = *global;
+                        *version = next_version_stamp();
+                        node_versions[node_id] = *version;
+                    }
+                }
+            }
+        }
+        self.any_dirty = false;
+    }
+
+    pub fn set_view_matrix_2d(&mut self, m4: Mat4) {
+        if self.view_matrix_2d == m4 {
+            return;
+        }
+        self.view_matrix_2d = m4;
+        self.view_2d_version = self.bump_version();
+    }
+
+    pub fn set_view_matrix_3d(&mut self, m4: Mat4) {
+        if self.view_matrix_3d == m4 {
+            return;
+        }
+        self.view_matrix_3d = m4;
+        self.view_3d_version = self.bump_version();
+    }
+
+    pub fn set_projection_matrix(&mut self, m4: Mat4) {
+        if self.projection_matrix_3d == m4 {
+            return;
+        }
+        self.projection_matrix_3d = m4;
+        self.projection_version = self.bump_version();
+    }
+}
+
+#[cfg(test)]
+mod test_transform_pack {
+    use nalgebra_glm::{translation, vec3, Mat4};
+
+    use super::TransformPack;
+
+    #[test]
+    fn test_versions_only_move_on_change() {
+        let mut pack = TransformPack::new(4);
+        let node = pack.add_node_transform(Mat4::identity());
+        let v_node = pack.get_node_version(node);
+
+        pack.set_node_transform(node, Mat4::identity());
+        assert_eq!(pack.get_node_version(node), v_node);
+
+        pack.set_node_transform(node, translation(&vec3(1.0, 0.0, 0.0)));
+        assert!(pack.get_node_version(node) > v_node);
+
+        let v = pack.version;
+        pack.set_view_matrix_3d(Mat4::identity());
+        pack.set_projection_matrix(Mat4::identity());
+        assert_eq!(pack.version, v);
+
+        pack.set_view_matrix_3d(translation(&vec3(0.0, 1.0, 0.0)));
+        assert_eq!(pack.view_3d_version, pack.version);
+        assert!(pack.version > v);
+    }
+
+    #[test]
+    fn test_hierarchy_is_composed_parents_first() {
+        let mut pack = TransformPack::new(8);
+        let root = pack.add_node_transform(translation(&vec3(1.0, 0.0, 0.0)));
+        let child = pack.add_child_node_transform(translation(&vec3(0.0, 2.0, 0.0)), Some(root));
+        let grandchild =
+            pack.add_child_node_transform(translation(&vec3(0.0, 0.0, 3.0)), Some(child));
+        pack.update_global_transforms();
+        assert_eq!(
+            *pack.get_node_transform(grandchild),
+            translation(&vec3(1.0, 2.0, 3.0))
+        );
+
+        // moving the root moves the whole subtree
+        let v_grandchild = pack.get_node_version(grandchild);
+        pack.set_node_transform(root, translation(&vec3(5.0, 0.0, 0.0)));
+        pack.update_global_transforms();
+        assert_eq!(
+            *pack.get_node_transform(grandchild),
+            translation(&vec3(5.0, 2.0, 3.0))
+        );
+        assert!(pack.get_node_version(grandchild) > v_grandchild);
+
+        // reparenting under a later node is resolved by the level order
+        let other = pack.add_node_transform(translation(&vec3(0.0, 10.0, 0.0)));
+        pack.set_node_parent(root, Some(other)).unwrap();
+        pack.update_global_transforms();
+        assert_eq!(
+            *pack.get_node_transform(grandchild),
+            translation(&vec3(5.0, 12.0, 3.0))
+        );
+
+        assert!(pack.set_node_parent(other, Some(grandchild)).is_err());
+    }
+
+    #[test]
+    fn test_grows_up_to_hard_cap() {
+        let mut pack = TransformPack::with_hard_cap(1, Some(40));
+        for i in 0..40 {
+            assert_eq!(pack.add_node_transform(Mat4::identity()), i);
+        }
+        assert_eq!(pack.max_node_count, 40);
+        // full: the sentinel `current_count` is returned
+        assert_eq!(pack.add_node_transform(Mat4::identity()), 40);
+
+        pack.clear();
+        assert_eq!(pack.high_water_mark(), 40);
+    }
+
+    #[test]
+    fn test_removed_slots_are_reused() {
+        let mut pack = TransformPack::with_hard_cap(1, Some(3));
+        let root = pack.add_node_transform(translation(&vec3(1.0, 0.0, 0.0)));
+        let child = pack.add_child_node_transform(translation(&vec3(0.0, 2.0, 0.0)), Some(root));
+        for _ in 0..100 {
+            let bullet = pack.add_child_node_transform(Mat4::identity(), Some(root));
+            assert_eq!(bullet, 2);
+            pack.remove_node(bullet).unwrap();
+        }
+        assert_eq!(pack.high_water_mark(), 3);
+        assert_eq!(pack.node_count(), 2);
+        assert!(pack.remove_node(2).is_err());
+        assert!(pack.set_node_parent(child, Some(2)).is_err());
+
+        // the children of a removed node become roots
+        pack.remove_node(root).unwrap();
+        pack.update_global_transforms();
+        assert_eq!(pack.get_node_parent(child), None);
+        assert_eq!(
+            *pack.get_node_transform(child),
+            translation(&vec3(0.0, 2.0, 0.0))
+        );
+    }
 }
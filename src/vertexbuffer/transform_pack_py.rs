@@ -1,10 +1,8 @@
-use pyo3::{
-    prelude::*,
-    types::PyTuple,
-};
+use nalgebra_glm::Mat4;
+use pyo3::{buffer::PyBuffer, exceptions::PyValueError, prelude::*, types::PyTuple};
 
 use crate::{
-    utils::{convert_pymat4, mat4_to_pyglm, mat4_to_slicelist},
+    utils::{buffer_full_error, convert_pymat4, mat4_to_pyglm, mat4_to_slicelist},
     vertexbuffer::transform_pack::TransformPack,
 };
 
@@ -16,51 +14,178 @@ pub struct TransformPackPy {
 #[pymethods]
 impl TransformPackPy {
     #[new]
-    fn new(max_node: usize) -> TransformPackPy {
+    #[pyo3(signature = (max_node, hard_cap=None))]
+    fn new(max_node: usize, hard_cap: Option<usize>) -> TransformPackPy {
         TransformPackPy {
-            data: TransformPack::new(max_node),
+            data: TransformPack::with_hard_cap(max_node, hard_cap),
         }
     }
     fn clear(&mut self) {
         self.data.clear()
     }
+    /// number of nodes in use, removed nodes excluded
     fn node_count(&self) -> usize {
-        self.data.current_count
+        self.data.node_count()
+    }
+    /// number of allocated node slots; grows on demand up to the hard cap
+    fn capacity(&self) -> usize {
+        self.data.max_node_count
     }
-    fn add_node_transform(&mut self, py: Python, value: Py<PyAny>) -> usize {
+    /// highest node count reached, across clears
+    fn high_water_mark(&self) -> usize {
+        self.data.high_water_mark()
+    }
+    /// add a node with the given local transform, optionally under `parent`
+    #[pyo3(signature = (value, parent=None))]
+    fn add_node_transform(
+        &mut self,
+        py: Python,
+        value: Py<PyAny>,
+        parent: Option<usize>,
+    ) -> PyResult<usize> {
+        if let Some(p) = parent {
+            if !self.data.is_live(p) {
+                return Err(PyValueError::new_err("parent index out of range"));
+            }
+        }
+        if !self.data.reserve_node() {
+            return Err(buffer_full_error("TransformPack", self.data.hard_cap));
+        }
         let m4 = convert_pymat4(py, &value);
-        self.data.add_node_transform(m4)
+        Ok(self.data.add_child_node_transform(m4, parent))
+    }
+    /// remove a node; its slot is reused by the next added node and its children
+    /// become roots
+    fn remove_node(&mut self, idx: usize) -> PyResult<()> {
+        self.data.remove_node(idx).map_err(PyValueError::new_err)
     }
+    /// set the local transform of a node
     fn set_node_transform(&mut self, py: Python, idx: usize, value: Py<PyAny>) {
         let m4 = convert_pymat4(py, &value);
         self.data.set_node_transform(idx, m4);
     }
+    /// attach a node under `parent`, or make it a root with `None`
+    #[pyo3(signature = (idx, parent=None))]
+    fn set_node_parent(&mut self, idx: usize, parent: Option<usize>) -> PyResult<()> {
+        self.data
+            .set_node_parent(idx, parent)
+            .map_err(PyValueError::new_err)
+    }
+    fn get_node_parent(&self, idx: usize) -> PyResult<Option<usize>> {
+        if idx >= self.data.current_count {
+            return Err(PyValueError::new_err("node index out of range"));
+        }
+        Ok(self.data.get_node_parent(idx))
+    }
+    /// compose the global transforms of the nodes changed since the last update
+    fn update_global_transforms(&mut self) {
+        self.data.update_global_transforms()
+    }
+    /// compose large hierarchy levels on the thread pool
+    fn set_parallel_update(&mut self, enabled: bool) {
+        self.data.parallel_update = enabled;
+    }
 
+    /// Set many node transforms in one call.
+    ///
+    /// `matrices` is any buffer holding `16 * len(node_ids)` float32 values, one
+    /// column-major matrix after the other: raw bytes (e.g. `b"".join(bytes(m) for m in mats)`
+    /// with `glm.mat4` values), `array("f")` or a float32 numpy array.
+    fn set_node_transforms(
+        &mut self,
+        py: Python,
+        node_ids: Vec<usize>,
+        matrices: &Bound<'_, PyAny>,
+    ) -> PyResult<()> {
+        let values = read_f32_buffer(py, matrices)?;
+        if values.len() != node_ids.len() * 16 {
+            return Err(PyValueError::new_err(format!(
+                "expected {} float32 values for {} matrices, got {}",
+                node_ids.len() * 16,
+                node_ids.len(),
+                values.len()
+            )));
+        }
+        if let Some(bad) = node_ids.iter().find(|&&id| id >= self.data.current_count) {
+            return Err(PyValueError::new_err(format!(
+                "node index {} out of range",
+                bad
+            )));
+        }
+        for (node_id, m) in node_ids.iter().zip(values.chunks_exact(16)) {
+            self.data
+                .set_node_transform(*node_id, Mat4::from_column_slice(m));
+        }
+        Ok(())
+    }
+
+    /// global transform of a node, as of the last `update_global_transforms`
     fn get_node_transform(&self, py: Python, idx: usize) -> Py<PyTuple> {
         let t = PyTuple::new(py, self.data.get_node_transform(idx).as_slice()).unwrap();
         t.into()
     }
+    fn get_local_transform(&self, py: Python, idx: usize) -> Py<PyTuple> {
+        let t = PyTuple::new(py, self.data.get_local_transform(idx).as_slice()).unwrap();
+        t.into()
+    }
 
     fn set_view_matrix_glm(&mut self, py: Python, value_glm: Py<PyAny>) {
-        self.data.view_matrix_2d = convert_pymat4(py, &value_glm)
+        self.data.set_view_matrix_2d(convert_pymat4(py, &value_glm))
     }
     fn get_view_matrix(&self, py: Python) -> Py<PyAny> {
         mat4_to_pyglm(py, self.data.view_matrix_2d).into()
     }
 
     fn set_view_matrix_3d(&mut self, py: Python, value: Py<PyAny>) {
-        self.data.view_matrix_3d = convert_pymat4(py, &value)
+        self.data.set_view_matrix_3d(convert_pymat4(py, &value))
     }
     fn get_view_matrix_3d(&self, py: Python) -> Py<PyAny> {
-        mat4_to_slicelist(py, self.data.view_matrix_2d)
+        mat4_to_slicelist(py, self.data.view_matrix_3d)
     }
 
     /// set the projection matrix
     fn set_projection_matrix(&mut self, py: Python, value: Py<PyAny>) {
-        self.data.projection_matrix_3d = convert_pymat4(py, &value)
+        self.data.set_projection_matrix(convert_pymat4(py, &value))
     }
     /// get the projection matrix
     fn get_projection_matrix(&self, py: Python) -> Py<PyAny> {
         mat4_to_slicelist(py, self.data.projection_matrix_3d)
     }
+
+    /// global version of the pack; changes whenever a matrix actually changes
+    fn version(&self) -> u64 {
+        self.data.version
+    }
+    /// version stamp of the given node transform
+    fn node_version(&self, idx: usize) -> PyResult<u64> {
+        if idx >= self.data.current_count {
+            return Err(PyValueError::new_err("node index out of range"));
+        }
+        Ok(self.data.get_node_version(idx))
+    }
+    /// version stamps of (view_2d, view_3d, projection)
+    fn view_versions(&self) -> (u64, u64, u64) {
+        (
+            self.data.view_2d_version,
+            self.data.view_3d_version,
+            self.data.projection_version,
+        )
+    }
+}
+
+/// Read a buffer of float32 values, accepting both typed (`f`) and raw byte buffers.
+fn read_f32_buffer(py: Python, obj: &Bound<'_, PyAny>) -> PyResult<Vec<f32>> {
+    if let Ok(buffer) = PyBuffer::<f32>::get(obj) {
+        return buffer.to_vec(py);
+    }
+    let raw = PyBuffer::<u8>::get(obj)?.to_vec(py)?;
+    if raw.len() % 4 != 0 {
+        return Err(PyValueError::new_err(
+            "byte buffer length is not a multiple of 4",
+        ));
+    }
+    Ok(raw
+        .chunks_exact(4)
+        .map(|b| f32::from_ne_bytes([b[0], b[1], b[2], b[3]]))
+        .collect())
 }
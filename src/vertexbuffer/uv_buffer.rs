@@ -4,6 +4,10 @@ use nalgebra_glm::{Number, TVec2};
 pub struct UVBuffer<UVACC: Number> {
     pub uv_array: Vec<TVec2<UVACC>>,
     pub uv_size: usize,
+    /// growth limit in uv triplets, None for unbounded
+    pub hard_cap: Option<usize>,
+    /// highest `uv_size` reached before the last clear
+    pub high_water: usize,
 }
 
 impl Default for UVBuffer<f32> {
@@ -17,9 +21,21 @@ impl<UVACC: Number> UVBuffer<UVACC> {
         UVBuffer {
             uv_array: Vec::with_capacity(initial_capacity * 3), // Each "UV" is a triplet
             uv_size: 0,
+            hard_cap: None,
+            high_water: 0,
         }
     }
 
+    /// True when `additional` more uv triplets fit under the hard cap.
+    pub fn has_room(&self, additional: usize) -> bool {
+        self.hard_cap
+            .map_or(true, |cap| self.uv_size + additional <= cap)
+    }
+
+    pub fn high_water_mark(&self) -> usize {
+        self.high_water.max(self.uv_size)
+    }
+
     pub fn set_uv(&mut self, uv: &TVec2<UVACC>, idx: usize) {
         if idx < self.uv_array.len() {
             self.uv_array[idx] = *uv;
@@ -42,6 +58,46 @@ impl<UVACC: Number> UVBuffer<UVACC> {
         returned
     }
 
+    /// Overwrite the uv triplet `idx`.
+    pub fn set_uv_triplet(
+        &mut self,
+        idx: usize,
+        uva: &TVec2<UVACC>,
+        uvb: &TVec2<UVACC>,
+        uvc: &TVec2<UVACC>,
+    ) {
+        let base_idx = idx * 3;
+        self.uv_array[base_idx] = *uva;
+        self.uv_array[base_idx + 1] = *uvb;
+        self.uv_array[base_idx + 2] = *uvc;
+    }
+
+    /// Append `count` zeroed uv triplets, returning the index of the first one.
+    pub fn extend_zeroed(&mut self, count: usize) -> usize {
+        self.uv_array
+            .resize((self.uv_size + count) * 3, TVec2::<UVACC>::zeros());
+        self.uv_size += count;
+        self.uv_size - count
+    }
+
+    /// Keep the uv triplets flagged in `used`, packed to the front in their original order.
+    pub fn retain_used(&mut self, used: &[bool]) {
+        self.high_water = self.high_water_mark();
+        let mut write = 0;
+        for read in 0..self.uv_size {
+            if used.get(read).copied().unwrap_or(false) {
+                if read != write {
+                    for k in 0..3 {
+                        self.uv_array[write * 3 + k] = self.uv_array[read * 3 + k];
+                    }
+                }
+                write += 1;
+            }
+        }
+        self.uv_size = write;
+        self.uv_array.truncate(write * 3);
+    }
+
     pub fn get_uv(&self, idx: usize) -> (&TVec2<UVACC>, &TVec2<UVACC>, &TVec2<UVACC>) {
         let base_idx = idx * 3;
         (
@@ -52,6 +108,7 @@ impl<UVACC: Number> UVBuffer<UVACC> {
     }
 
     pub fn clear(&mut self) {
+        self.high_water = self.high_water_mark();
         self.uv_size = 0;
         self.uv_array.clear(); // Clear the Vec, maintaining its capacity
     }
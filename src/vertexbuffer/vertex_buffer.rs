@@ -2,6 +2,8 @@ use std::mem::MaybeUninit;
 
 use nalgebra_glm::{Mat3, Mat4, Vec3, Vec4};
 
+use crate::utils::grown_capacity;
+
 pub trait AllowedVec {
     fn zeros() -> Self;
 }
@@ -25,15 +27,43 @@ pub struct VertexPair<T: AllowedVec> {
 pub struct VertexBuffer<T: AllowedVec> {
     data: Vec<MaybeUninit<VertexPair<T>>>, // contiguous storage
     len: usize,                            // number of initialized pairs
+    pub hard_cap: Option<usize>,           // growth limit, None for unbounded
+    pub high_water: usize,                 // highest `len` reached before the last compaction
 }
 
 impl<T: AllowedVec> VertexBuffer<T> {
     /// Preallocate `cap` slots without initializing them.
     pub fn with_capacity(cap: usize) -> Self {
+        Self::with_hard_cap(cap, None)
+    }
+
+    /// Preallocate `cap` slots; the buffer grows on demand up to `hard_cap`.
+    pub fn with_hard_cap(cap: usize, hard_cap: Option<usize>) -> Self {
+        let cap = hard_cap.map_or(cap, |hard| cap.min(hard));
         let mut data = Vec::with_capacity(cap);
         // Fill with uninitialized slots
         data.resize_with(cap, || MaybeUninit::uninit());
-        Self { data, len: 0 }
+        Self {
+            data,
+            len: 0,
+            hard_cap,
+            high_water: 0,
+        }
+    }
+
+    /// Make room for `additional` more vertices; false when the hard cap forbids it.
+    pub fn reserve(&mut self, additional: usize) -> bool {
+        let required = self.len + additional;
+        if required <= self.capacity() {
+            return true;
+        }
+        match grown_capacity(self.capacity(), required, self.hard_cap) {
+            Some(capacity) => {
+                self.data.resize_with(capacity, || MaybeUninit::uninit());
+                true
+            }
+            None => false,
+        }
     }
     /// Current initialized length.
     #[inline]
@@ -46,6 +76,11 @@ impl<T: AllowedVec> VertexBuffer<T> {
         self.data.len()
     }
 
+    /// Highest number of vertices held at once.
+    pub fn high_water_mark(&self) -> usize {
+        self.high_water.max(self.len)
+    }
+
     #[inline]
     pub fn is_empty(&self) -> bool {
         self.len == 0
@@ -80,6 +115,39 @@ impl<T: AllowedVec> VertexBuffer<T> {
     pub fn get_mut(&mut self, idx: usize) -> &mut VertexPair<T> {
         unsafe { self.data.get_unchecked_mut(idx).assume_init_mut() }
     }
+
+    /// Append `count` zeroed vertices, returning the index of the first one.
+    pub fn extend_zeroed(&mut self, count: usize) -> usize {
+        assert!(self.reserve(count), "VertexBuffer hard cap exceeded");
+        let start = self.len;
+        for slot in &mut self.data[start..start + count] {
+            slot.write(VertexPair {
+                v: T::zeros(),
+                mvp: T::zeros(),
+            });
+        }
+        self.len += count;
+        start
+    }
+}
+
+impl<T: AllowedVec + Copy> VertexBuffer<T> {
+    /// Keep the vertices flagged in `used` (indexed like the buffer), packed to the
+    /// front in their original order.
+    pub fn retain_used(&mut self, used: &[bool]) {
+        self.high_water = self.high_water_mark();
+        let mut write = 0;
+        for read in 0..self.len {
+            if used.get(read).copied().unwrap_or(false) {
+                if read != write {
+                    let pair = *self.get(read);
+                    self.data[write].write(pair);
+                }
+                write += 1;
+            }
+        }
+        self.len = write;
+    }
 }
 impl VertexBuffer<Vec3> {
     #[inline]
@@ -89,7 +157,7 @@ impl VertexBuffer<Vec3> {
     }
     /// Add a vertex, returning its index.
     pub fn add_vertex(&mut self, vert: &Vec3) -> usize {
-        assert!(self.len < self.capacity(), "VertexBuffer capacity exceeded");
+        assert!(self.reserve(1), "VertexBuffer hard cap exceeded");
         self.data[self.len].write(VertexPair {
             v: *vert,
             mvp: Vec3::zeros(),
@@ -120,7 +188,7 @@ impl VertexBuffer<Vec4> {
     }
     /// Add a vertex, returning its index.
     pub fn add_vertex(&mut self, vert: &Vec4) -> usize {
-        assert!(self.len < self.capacity(), "VertexBuffer capacity exceeded");
+        assert!(self.reserve(1), "VertexBuffer hard cap exceeded");
         self.data[self.len].write(VertexPair {
             v: *vert,
             mvp: Vec4::zeros(),
@@ -154,6 +222,8 @@ pub struct TriangleBuffer {
     // lifespan of TriangleBuffer is tied to ActualVertextData
     pub point_addr: Vec<(usize, usize, usize)>, //  Index of triangle vertices , from the ActualVertextData Struct, for each triangle allowind points[point_addr.0] to get the actual Vec4
     pub normal_vector: Vec<Vec3>,               // normal vector for each triangle
+    pub hard_cap: Option<usize>,                // growth limit, None for unbounded
+    pub high_water: usize, // highest `len()` reached before the last compaction
 }
 
 impl TriangleBuffer {
@@ -161,9 +231,26 @@ impl TriangleBuffer {
         TriangleBuffer {
             point_addr: Vec::with_capacity(capacity),
             normal_vector: Vec::with_capacity(capacity),
+            hard_cap: None,
+            high_water: 0,
         }
     }
 
+    pub fn len(&self) -> usize {
+        self.point_addr.len()
+    }
+
+    /// Highest number of triangles held at once.
+    pub fn high_water_mark(&self) -> usize {
+        self.high_water.max(self.len())
+    }
+
+    /// True when `additional` more triangles fit under the hard cap.
+    pub fn has_room(&self, additional: usize) -> bool {
+        self.hard_cap
+            .map_or(true, |cap| self.len() + additional <= cap)
+    }
+
     pub fn add_triangle(&mut self, v0: usize, v1: usize, v2: usize, normal: Vec3) -> usize {
         self.point_addr.push((v0, v1, v2));
         self.normal_vector.push(normal);
@@ -171,6 +258,34 @@ impl TriangleBuffer {
         self.point_addr.len() - 1
     }
 
+    /// Append `count` degenerate triangles, returning the index of the first one.
+    pub fn extend_zeroed(&mut self, count: usize) -> usize {
+        let start = self.len();
+        self.point_addr.resize(start + count, (0, 0, 0));
+        self.normal_vector.resize(start + count, Vec3::zeros());
+        start
+    }
+
+    pub fn set_triangle(&mut self, idx: usize, v0: usize, v1: usize, v2: usize, normal: Vec3) {
+        self.point_addr[idx] = (v0, v1, v2);
+        self.normal_vector[idx] = normal;
+    }
+
+    /// Keep the triangles flagged in `used`, packed to the front in their original order.
+    pub fn retain_used(&mut self, used: &[bool]) {
+        self.high_water = self.high_water_mark();
+        let mut idx = 0;
+        self.point_addr.retain(|_| {
+            idx += 1;
+            used.get(idx - 1).copied().unwrap_or(false)
+        });
+        idx = 0;
+        self.normal_vector.retain(|_| {
+            idx += 1;
+            used.get(idx - 1).copied().unwrap_or(false)
+        });
+    }
+
     pub fn get_triangle(&self, idx: usize) -> (usize, usize, usize, &Vec3) {
         let (v0, v1, v2) = unsafe { self.point_addr.get_unchecked(idx) };
 
@@ -1,12 +1,15 @@
 use nalgebra_glm::{Mat4, Vec2, Vec3, Vec4};
 use pyo3::{
+    exceptions::{PyTypeError, PyValueError},
     prelude::*,
     types::PyTuple,
 };
 
 use crate::{
-    utils::{convert_glm_vec2, convert_glm_vec3},
+    assets::{baked_py::BakedAssetPy, obj_py::ObjMeshPy, SubmeshView},
+    utils::{buffer_full_error, convert_glm_vec2, convert_glm_vec3, next_version_stamp},
     vertexbuffer::{
+        range_allocator::RangeAllocator,
         transform_pack::TransformPack,
         transform_pack_py::TransformPackPy,
         uv_buffer::UVBuffer,
@@ -20,8 +23,150 @@ pub struct VertexBufferPy {
     pub triangle_buffer3d: TriangleBuffer,
     pub uv_array: UVBuffer<f32>,
     pub buffer2d: VertexBuffer<Vec4>,
+    /// bumped whenever vertex, uv or triangle inputs are added
+    pub version: u64,
+
+    // released ranges, reused by `allocate_range`
+    free_3d: RangeAllocator,
+    free_2d: RangeAllocator,
+    free_uv: RangeAllocator,
+    free_triangles: RangeAllocator,
 }
 impl VertexBufferPy {
+    /// Forget every released range, e.g. after the buffers were compacted.
+    pub fn reset_free_ranges(&mut self) {
+        self.free_3d.clear();
+        self.free_2d.clear();
+        self.free_uv.clear();
+        self.free_triangles.clear();
+        self.version = next_version_stamp();
+    }
+
+    fn allocator_mut(&mut self, kind: &str) -> PyResult<&mut RangeAllocator> {
+        match kind {
+            "3d" => Ok(&mut self.free_3d),
+            "2d" => Ok(&mut self.free_2d),
+            "uv" => Ok(&mut self.free_uv),
+            "triangle" => Ok(&mut self.free_triangles),
+            _ => Err(PyValueError::new_err(format!(
+                "unknown range kind {:?}, expected \"3d\", \"2d\", \"uv\" or \"triangle\"",
+                kind
+            ))),
+        }
+    }
+
+    /// See `allocate_range`.
+    fn allocate(&mut self, kind: &str, count: usize) -> PyResult<usize> {
+        if let Some(start) = self.allocator_mut(kind)?.allocate(count) {
+            return Ok(start);
+        }
+        // `kind` was checked by `allocator_mut`
+        let start = match kind {
+            "3d" => {
+                if !self.buffer3d.reserve(count) {
+                    return Err(buffer_full_error(
+                        "VertexBuffer (3d)",
+                        self.buffer3d.hard_cap,
+                    ));
+                }
+                self.buffer3d.extend_zeroed(count)
+            }
+            "2d" => {
+                if !self.buffer2d.reserve(count) {
+                    return Err(buffer_full_error(
+                        "VertexBuffer (2d)",
+                        self.buffer2d.hard_cap,
+                    ));
+                }
+                self.buffer2d.extend_zeroed(count)
+            }
+            "uv" => {
+                if !self.uv_array.has_room(count) {
+                    return Err(buffer_full_error("UVBuffer", self.uv_array.hard_cap));
+                }
+                self.uv_array.extend_zeroed(count)
+            }
+            _ => {
+                if !self.triangle_buffer3d.has_room(count) {
+                    return Err(buffer_full_error(
+                        "TriangleBuffer",
+                        self.triangle_buffer3d.hard_cap,
+                    ));
+                }
+                self.triangle_buffer3d.extend_zeroed(count)
+            }
+        };
+        self.version = next_version_stamp();
+        Ok(start)
+    }
+
+    /// Number of elements currently stored for `kind`.
+    fn range_len(&self, kind: &str) -> usize {
+        match kind {
+            "3d" => self.buffer3d.len(),
+            "2d" => self.buffer2d.len(),
+            "uv" => self.uv_array.uv_size,
+            _ => self.triangle_buffer3d.len(),
+        }
+    }
+
+    /// Store the vertices of `submesh`, then one uv triplet and one triangle (with
+    /// its face normal) per triangle, in ranges taken like `allocate_range`.
+    fn add_submesh(
+        &mut self,
+        submesh: &SubmeshView,
+    ) -> PyResult<(usize, usize, usize, usize, usize)> {
+        let vertex_count = submesh.positions.len();
+        let triangle_count = submesh.triangles.len();
+        let vertex_start = self.allocate("3d", vertex_count)?;
+        let uv_start = match self.allocate("uv", triangle_count) {
+            Ok(start) => start,
+            Err(err) => {
+                self.free_3d.release(vertex_start, vertex_count);
+                return Err(err);
+            }
+        };
+        let triangle_start = match self.allocate("triangle", triangle_count) {
+            Ok(start) => start,
+            Err(err) => {
+                self.free_3d.release(vertex_start, vertex_count);
+                self.free_uv.release(uv_start, triangle_count);
+                return Err(err);
+            }
+        };
+        self.version = next_version_stamp();
+
+        for (i, &[x, y, z]) in submesh.positions.iter().enumerate() {
+            self.buffer3d
+                .set_vertex(&Vec4::new(x, y, z, 1.0), vertex_start + i);
+        }
+        for (i, triangle) in submesh.triangles.iter().enumerate() {
+            let [a, b, c] = triangle.map(|v| v as usize);
+            let [uva, uvb, uvc] = [a, b, c].map(|v| Vec2::from(submesh.uvs[v]));
+            self.uv_array.set_uv_triplet(uv_start + i, &uva, &uvb, &uvc);
+
+            let [pa, pb, pc] = [a, b, c].map(|v| Vec3::from(submesh.positions[v]));
+            let normal = (pb - pa)
+                .cross(&(pc - pa))
+                .try_normalize(f32::EPSILON)
+                .unwrap_or_else(Vec3::zeros);
+            self.triangle_buffer3d.set_triangle(
+                triangle_start + i,
+                vertex_start + a,
+                vertex_start + b,
+                vertex_start + c,
+                normal,
+            );
+        }
+        Ok((
+            vertex_start,
+            vertex_count,
+            uv_start,
+            triangle_start,
+            triangle_count,
+        ))
+    }
+
     /// Function to return the internal Buffers as tuple of mutable references
     pub fn get_internal_buffers_mut(
         &mut self,
@@ -35,21 +180,109 @@ impl VertexBufferPy {
 }
 #[pymethods]
 impl VertexBufferPy {
+    /// The sizes are initial capacities; every buffer grows on demand. `hard_cap`
+    /// bounds each of them (in vertices, uv triplets and triangles).
     #[new]
-    fn new(buffer3d_size: usize, uv_array_size: usize, buffer2d_size: usize) -> VertexBufferPy {
+    #[pyo3(signature = (buffer3d_size, uv_array_size, buffer2d_size, hard_cap=None))]
+    fn new(
+        buffer3d_size: usize,
+        uv_array_size: usize,
+        buffer2d_size: usize,
+        hard_cap: Option<usize>,
+    ) -> VertexBufferPy {
+        let mut uv_array = UVBuffer::new(uv_array_size);
+        uv_array.hard_cap = hard_cap;
+        let mut triangle_buffer3d = TriangleBuffer::new(buffer3d_size / 3);
+        triangle_buffer3d.hard_cap = hard_cap;
         VertexBufferPy {
-            buffer3d: VertexBuffer::with_capacity(buffer3d_size),
-            uv_array: UVBuffer::new(uv_array_size),
-            buffer2d: VertexBuffer::with_capacity(buffer2d_size),
-            triangle_buffer3d: TriangleBuffer::new(buffer3d_size / 3),
+            buffer3d: VertexBuffer::with_hard_cap(buffer3d_size, hard_cap),
+            uv_array,
+            buffer2d: VertexBuffer::with_hard_cap(buffer2d_size, hard_cap),
+            triangle_buffer3d,
+            version: 0,
+            free_3d: RangeAllocator::new(),
+            free_2d: RangeAllocator::new(),
+            free_uv: RangeAllocator::new(),
+            free_triangles: RangeAllocator::new(),
         }
     }
 
-    fn add_uv(&mut self, py: Python, uva: Py<PyAny>, uvb: Py<PyAny>, uvc: Py<PyAny>) -> usize {
+    /// Reserve `count` consecutive elements of `kind` ("3d", "2d", "uv" or
+    /// "triangle") and return the first index.
+    ///
+    /// Released ranges are reused first-fit; otherwise zeroed elements are appended.
+    /// Fill the range with the `set_*` methods.
+    fn allocate_range(&mut self, kind: &str, count: usize) -> PyResult<usize> {
+        self.allocate(kind, count)
+    }
+
+    /// Give back a range obtained from `allocate_range` or the `add_*` methods.
+    ///
+    /// The data stays in place until the range is reused or the buffers are
+    /// compacted; remove the geometries using it first.
+    fn release_range(&mut self, kind: &str, start: usize, count: usize) -> PyResult<()> {
+        let len = self.range_len(kind);
+        let allocator = self.allocator_mut(kind)?;
+        if start + count > len {
+            return Err(PyValueError::new_err("range out of bounds"));
+        }
+        allocator.release(start, count);
+        Ok(())
+    }
+
+    /// Number of released elements of `kind` waiting for reuse.
+    fn free_count(&mut self, kind: &str) -> PyResult<usize> {
+        Ok(self.allocator_mut(kind)?.free_count())
+    }
+
+    /// highest element counts reached: (3d vertices, uv triplets, 2d vertices, triangles)
+    fn high_water_marks(&self) -> (usize, usize, usize, usize) {
+        (
+            self.buffer3d.high_water_mark(),
+            self.uv_array.high_water_mark(),
+            self.buffer2d.high_water_mark(),
+            self.triangle_buffer3d.high_water_mark(),
+        )
+    }
+
+    /// version of the vertex/uv/triangle inputs; changes on every add
+    fn version(&self) -> u64 {
+        self.version
+    }
+
+    fn add_uv(
+        &mut self,
+        py: Python,
+        uva: Py<PyAny>,
+        uvb: Py<PyAny>,
+        uvc: Py<PyAny>,
+    ) -> PyResult<usize> {
+        if !self.uv_array.has_room(1) {
+            return Err(buffer_full_error("UVBuffer", self.uv_array.hard_cap));
+        }
         let va: Vec2 = convert_glm_vec2(py, uva);
         let vb: Vec2 = convert_glm_vec2(py, uvb);
         let vc: Vec2 = convert_glm_vec2(py, uvc);
-        self.uv_array.add_uv(&va, &vb, &vc)
+        self.version = next_version_stamp();
+        Ok(self.uv_array.add_uv(&va, &vb, &vc))
+    }
+    fn set_uv(
+        &mut self,
+        py: Python,
+        idx: usize,
+        uva: Py<PyAny>,
+        uvb: Py<PyAny>,
+        uvc: Py<PyAny>,
+    ) -> PyResult<()> {
+        if idx >= self.uv_array.uv_size {
+            return Err(PyValueError::new_err("uv index out of range"));
+        }
+        let va: Vec2 = convert_glm_vec2(py, uva);
+        let vb: Vec2 = convert_glm_vec2(py, uvb);
+        let vc: Vec2 = convert_glm_vec2(py, uvc);
+        self.version = next_version_stamp();
+        self.uv_array.set_uv_triplet(idx, &va, &vb, &vc);
+        Ok(())
     }
     fn get_uv_size(&self, _py: Python) -> usize {
         self.uv_array.uv_size
@@ -70,9 +303,24 @@ impl VertexBufferPy {
         self.uv_array.uv_array.capacity()
     }
     // 2d section
-    fn add_2d_vertex(&mut self, x: f32, y: f32, z: f32) -> usize {
+    fn add_2d_vertex(&mut self, x: f32, y: f32, z: f32) -> PyResult<usize> {
+        if !self.buffer2d.reserve(1) {
+            return Err(buffer_full_error(
+                "VertexBuffer (2d)",
+                self.buffer2d.hard_cap,
+            ));
+        }
         let ve = Vec4::new(x, y, z, 1.0);
-        self.buffer2d.add_vertex(&ve)
+        self.version = next_version_stamp();
+        Ok(self.buffer2d.add_vertex(&ve))
+    }
+    fn set_2d_vertex(&mut self, idx: usize, x: f32, y: f32, z: f32) -> PyResult<()> {
+        if idx >= self.buffer2d.len() {
+            return Err(PyValueError::new_err("vertex index out of range"));
+        }
+        self.version = next_version_stamp();
+        self.buffer2d.set_vertex(&Vec4::new(x, y, z, 1.0), idx);
+        Ok(())
     }
     fn get_2d_vertex_tuple(&self, py: Python, idx: usize) -> Py<PyTuple> {
         let result = self.buffer2d.get_vertex(idx);
@@ -115,9 +363,16 @@ impl VertexBufferPy {
         self.buffer3d.len()
     }
 
-    fn add_3d_vertex(&mut self, x: f32, y: f32, z: f32) -> usize {
+    fn add_3d_vertex(&mut self, x: f32, y: f32, z: f32) -> PyResult<usize> {
+        if !self.buffer3d.reserve(1) {
+            return Err(buffer_full_error(
+                "VertexBuffer (3d)",
+                self.buffer3d.hard_cap,
+            ));
+        }
         let ve = Vec4::new(x, y, z, 1.0);
-        self.buffer3d.add_vertex(&ve)
+        self.version = next_version_stamp();
+        Ok(self.buffer3d.add_vertex(&ve))
     }
 
     fn add_3d_triangle(
@@ -130,15 +385,78 @@ impl VertexBufferPy {
         uvb: Py<PyAny>,
         uvc: Py<PyAny>,
         normal: Py<PyAny>,
-    ) -> (usize, usize) {
+    ) -> PyResult<(usize, usize)> {
+        if !self.uv_array.has_room(1) {
+            return Err(buffer_full_error("UVBuffer", self.uv_array.hard_cap));
+        }
+        if !self.triangle_buffer3d.has_room(1) {
+            return Err(buffer_full_error(
+                "TriangleBuffer",
+                self.triangle_buffer3d.hard_cap,
+            ));
+        }
         let va: Vec2 = convert_glm_vec2(py, uva);
         let vb: Vec2 = convert_glm_vec2(py, uvb);
         let vc: Vec2 = convert_glm_vec2(py, uvc);
 
         let normal_vec: Vec3 = convert_glm_vec3(py, normal);
+        self.version = next_version_stamp();
         let uv_index = self.uv_array.add_uv(&va, &vb, &vc);
         let triangle_index = self.triangle_buffer3d.add_triangle(v0, v1, v2, normal_vec);
-        (uv_index, triangle_index)
+        Ok((uv_index, triangle_index))
+    }
+
+    /// Add submesh `submesh` of a mesh loaded by `load_obj_native` or of an asset
+    /// loaded by `load_baked_asset`: its vertices, one uv triplet and one triangle
+    /// (with its face normal) per triangle, reusing released ranges first.
+    ///
+    /// Returns (vertex start, vertex count, uv start, triangle start, triangle
+    /// count), the arguments of `GeometryBufferPy.add_polygon_3d`.
+    fn add_obj_submesh(
+        &mut self,
+        mesh: &Bound<'_, PyAny>,
+        submesh: usize,
+    ) -> PyResult<(usize, usize, usize, usize, usize)> {
+        if let Ok(mesh) = mesh.cast::<ObjMeshPy>() {
+            let mesh = mesh.borrow();
+            self.add_submesh(&mesh.submesh(submesh)?.view())
+        } else if let Ok(asset) = mesh.cast::<BakedAssetPy>() {
+            let asset = asset.borrow();
+            self.add_submesh(&asset.submesh(submesh)?)
+        } else {
+            Err(PyTypeError::new_err(
+                "expected an ObjMeshPy or a BakedAssetPy",
+            ))
+        }
+    }
+
+    fn set_3d_vertex(&mut self, idx: usize, x: f32, y: f32, z: f32) -> PyResult<()> {
+        if idx >= self.buffer3d.len() {
+            return Err(PyValueError::new_err("vertex index out of range"));
+        }
+        self.version = next_version_stamp();
+        self.buffer3d.set_vertex(&Vec4::new(x, y, z, 1.0), idx);
+        Ok(())
+    }
+
+    /// Overwrite triangle `idx`; `v0`, `v1` and `v2` are vertex indices.
+    fn set_3d_triangle(
+        &mut self,
+        py: Python,
+        idx: usize,
+        v0: usize,
+        v1: usize,
+        v2: usize,
+        normal: Py<PyAny>,
+    ) -> PyResult<()> {
+        if idx >= self.triangle_buffer3d.len() {
+            return Err(PyValueError::new_err("triangle index out of range"));
+        }
+        let normal_vec: Vec3 = convert_glm_vec3(py, normal);
+        self.version = next_version_stamp();
+        self.triangle_buffer3d
+            .set_triangle(idx, v0, v1, v2, normal_vec);
+        Ok(())
     }
 
     fn get_3d_vertex_tuple(&self, py: Python, idx: usize) -> Py<PyTuple> {
@@ -120,3 +120,47 @@ class Test_2DBuildPrimitives(unittest.TestCase):
         self.assertEqual(primitive_buffer.primitive_count(), 1)
         rect_prim = primitive_buffer.get_primitive(0)
         self.assertEqual(rect_prim["_type"], "rect")
+
+    def test_primitive_cache(self):
+        geom_buffer = self.geom_buffer
+        geom_buffer.add_point_3d(0, 0, node_id=0, material_id=0)
+        vertex_buffer = self.vertex_buffer
+        transform_buffer = self.transform_buffer
+        primitive_buffer = self.primitive_buffer
+
+        node_id = transform_buffer.add_node_transform(glm.mat4(1.0))
+        transform_buffer.set_view_matrix_glm(glm.scale(glm.vec3(0.1, 0.1, 1.0)))
+        for i in range(5):
+            vertex_buffer.add_2d_vertex(float(i), float(i * 2), 0.1)
+        geom_buffer.add_points_2d(0, 5, 0, node_id, 0)
+
+        def build():
+            primitive_buffer.clear()
+            build_primitives_py(
+                geom_buffer,
+                vertex_buffer,
+                transform_buffer,
+                self.drawing_buffer,
+                primitive_buffer,
+            )
+
+        build()
+        self.assertEqual(primitive_buffer.cache_stats(), (0, 1))
+        first = primitive_buffer.get_all_as_dicts()
+
+        # nothing changed: the primitives are reused as they are
+        build()
+        self.assertEqual(primitive_buffer.cache_stats(), (1, 0))
+        self.assertEqual(primitive_buffer.get_all_as_dicts(), first)
+
+        # moving the node invalidates the geometry
+        transform_buffer.set_node_transform(
+            node_id, glm.translate(glm.vec3(1.0, 0.0, 0.0))
+        )
+        build()
+        self.assertEqual(primitive_buffer.cache_stats(), (0, 1))
+
+        primitive_buffer.set_cache_enabled(False)
+        build()
+        self.assertEqual(primitive_buffer.cache_stats(), (0, 1))
+        self.assertEqual(primitive_buffer.primitive_count(), 5)
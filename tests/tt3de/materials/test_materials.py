@@ -15,6 +15,7 @@ from tt3de.tt3de import apply_material_py
 from tt3de.tt3de import toglyphmethod
 from tt3de.tt3de.toglyphmethod import (
     ToGlyphMethodPyMap4Luminance,
+    ToGlyphMethodPyMapNLuminance,
     ToGlyphMethodPyStatic,
 )
 from tt3de.asset_fastloader import fast_load
@@ -94,6 +95,53 @@ class Test_BaseTextured(InitSetup):
         self.assertNotEqual(cell_dict["b_b"], 0)
         self.assertEqual(cell_dict["glyph"], 65)
 
+    def test_textured_density_ramp(self):
+        mb = self.mb
+        tex_idx = self.texture_buffer.add_texture_from_bytes(
+            1, 1, bytes([200, 200, 200, 255])
+        )
+        glyph_method = ToGlyphMethodPyMapNLuminance.from_chars(" .:-=+*#%@")
+        self.assertEqual(len(glyph_method.glyph_ramp), 10)
+        material_idx = mb.add_base_texture(
+            materials.BaseTexturePy(
+                albedo_texture_idx=tex_idx,
+                albedo_texture_subid=0,
+                glyph_texture_idx=tex_idx,
+                glyph_texture_subid=0,
+                front=True,
+                back=True,
+                glyph=True,
+                glyph_method=glyph_method,
+            )
+        )
+        self.drawing_buffer.set_depth_content(
+            0,
+            0,
+            glm.vec3(0, 0, 1),
+            1.0,
+            glm.vec2(0, 0),
+            glm.vec2(0, 0),
+            0,
+            1,
+            material_idx,
+            0,
+        )
+        apply_material_py(
+            self.mb,
+            self.texture_buffer,
+            self.vertex_buffer,
+            self.primitive_buffer,
+            self.drawing_buffer,
+        )
+        # luminance 200 falls in the 8th of 10 buckets: "#"
+        cell_dict = self.drawing_buffer.get_canvas_cell(0, 0)
+        self.assertEqual(cell_dict["glyph"], glyph_method.glyph_ramp[7])
+
+        with self.assertRaises(ValueError):
+            ToGlyphMethodPyMapNLuminance([])
+        with self.assertRaises(ValueError):
+            ToGlyphMethodPyMapNLuminance.from_chars("é")
+
     def test_textured_flips(self):
         mb = self.mb
         img: ImageTexture = fast_load("models/test_screen32.bmp")
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from tt3de.asset_async import AsyncAssetLoader
+from tt3de.render_context_rust import RustRenderContext
+
+
+class Test_AsyncAssetLoader(unittest.TestCase):
+    def test_commit_on_render_thread(self):
+        rc = RustRenderContext(16, 16, material_parallel_threads=None)
+        loader = AsyncAssetLoader(rc, max_workers=2)
+        ready = []
+        texture_job = loader.load_texture("models/test_screen32.bmp", ready.append)
+        mesh_job = loader.load_obj("models/cube.obj")
+        self.assertEqual(loader.progress(), 0.0)
+        # nothing reaches the buffers before a commit
+        self.assertEqual(rc.texture_buffer.size(), 0)
+
+        loader.wait()
+        self.assertFalse(loader.is_loading())
+        self.assertEqual(loader.progress(), 1.0)
+        self.assertEqual(ready, [texture_job.result])
+        self.assertEqual(rc.texture_buffer.get_wh_of(texture_job.result), (32, 32))
+        (mesh,) = mesh_job.result.values()
+        rc.append_root(mesh)
+        self.assertGreater(rc.vertex_buffer.get_3d_len(), 0)
+        loader.shutdown()
+
+    def test_failed_job(self):
+        rc = RustRenderContext(16, 16, material_parallel_threads=None)
+        loader = AsyncAssetLoader(rc)
+        job = loader.load_texture("models/missing.bmp", lambda index: None)
+        loader.wait()
+        self.assertIsInstance(job.error, OSError)
+        self.assertEqual(loader.errors, [("models/missing.bmp", job.error)])
+        self.assertEqual(loader.progress(), 1.0)
+        loader.shutdown()
+
+    def test_raising_on_ready_commits_once(self):
+        rc = RustRenderContext(16, 16, material_parallel_threads=None)
+        loader = AsyncAssetLoader(rc)
+        ready = []
+
+        def fail(index):
+            raise RuntimeError("no room for the texture")
+
+        failing_job = loader.load_texture("models/test_screen32.bmp", fail)
+        job = loader.load_texture("models/test_screen32.bmp", ready.append)
+        with self.assertLogs("tt3de.asset_async", level="ERROR") as logs:
+            loader.wait()
+        self.assertIn("models/test_screen32.bmp", logs.output[0])
+        self.assertEqual(loader.commit_ready(None), 0)
+
+        self.assertIsInstance(failing_job.error, RuntimeError)
+        self.assertEqual(
+            loader.errors, [("models/test_screen32.bmp", failing_job.error)]
+        )
+        self.assertEqual(ready, [job.result])
+        self.assertEqual(rc.texture_buffer.size(), 2)
+        self.assertEqual(loader.progress(), 1.0)
+        loader.shutdown()
+
+    def test_shutdown_drops_pending_jobs_from_progress(self):
+        rc = RustRenderContext(16, 16, material_parallel_threads=None)
+        loader = AsyncAssetLoader(rc)
+        done = loader.load_texture("models/test_screen32.bmp")
+        loader.wait()
+        loader.load_texture("models/test_screen32.bmp")
+        loader.shutdown()
+        self.assertTrue(done.done)
+        self.assertFalse(loader.is_loading())
+        self.assertEqual(loader.progress(), 1.0)
@@ -8,7 +8,11 @@ from tt3de.tt3de import (
     PrimitiveBufferPy,
     TextureBufferPy,
     VertexBufferPy,
+    apply_material_py,
     apply_material_py_parallel,
+    configure_engine_pool_py,
+    engine_pool_config_py,
+    raster_all_py,
 )
 
 
@@ -17,6 +21,24 @@ def test_drawing_buffer_default_parallel_threads_is_eight():
     assert db.material_parallel_threads == 8
 
 
+def test_drawing_buffer_dedicated_pool():
+    db = DrawingBufferPy(4, 4, material_parallel_threads=3)
+    assert db.material_parallel_threads == 3
+
+
+def test_engine_pool_shared_by_default():
+    config = engine_pool_config_py()
+    assert config["num_threads"] == 8
+    db = DrawingBufferPy(4, 4)
+    try:
+        configure_engine_pool_py(num_threads=2, chunk_rows=4)
+        assert engine_pool_config_py()["chunk_rows"] == 4
+        assert db.material_parallel_threads == 2
+    finally:
+        configure_engine_pool_py(**config)
+    assert db.material_parallel_threads == 8
+
+
 def test_drawing_buffer_serial_has_no_pool():
     db = DrawingBufferPy(4, 4, material_parallel_threads=0)
     assert db.material_parallel_threads is None
@@ -42,3 +64,64 @@ def test_rust_render_context_default_parallel_threads_eight():
     rc = RustRenderContext(16, 16)
     assert rc._material_parallel_threads == 8
     assert rc.drawing_buffer.material_parallel_threads == 8
+
+
+def test_material_pass_stats():
+    db = DrawingBufferPy(16, 16, material_parallel_threads=2)
+    db.hard_clear(1000.0)
+    assert db.material_pass_stats() == (0, [], 0)
+    mb = MaterialBufferPy(4)
+    tb = TextureBufferPy(4)
+    vb = VertexBufferPy(4, 4, 4)
+    pb = PrimitiveBufferPy(4)
+    apply_material_py_parallel(mb, tb, vb, pb, db)
+    wall, busy, chunks = db.material_pass_stats()
+    assert wall > 0
+    assert len(busy) == 2
+    # 16 rows in small chunks that the threads steal
+    assert chunks == 16
+
+
+def test_apply_material_sorted_matches_cell_order():
+    mb = MaterialBufferPy(8)
+    for idx in range(4):
+        mb.add_static((idx * 60, 0, 0), (0, idx * 60, 0), idx + 1)
+    tb = TextureBufferPy(4)
+    vb = VertexBufferPy(4, 4, 4)
+    pb = PrimitiveBufferPy(8)
+    pb.add_triangle(1, 1, 1, 0, 0, 2.0, 0, 28, 2.0, 24, 0, 2.0)
+    pb.add_triangle(2, 2, 2, 0, 0, 1.0, 0, 20, 1.0, 20, 0, 1.0)
+    pb.add_triangle(3, 3, 3, 31, 31, 1.0, 8, 31, 1.0, 31, 8, 1.0)
+
+    canvases = []
+    for sorted_ in (False, True):
+        db = DrawingBufferPy(32, 32, material_parallel_threads=0)
+        db.hard_clear(10)
+        raster_all_py(pb, vb, db)
+        apply_material_py(mb, tb, vb, pb, db, sorted=sorted_)
+        canvases.append(
+            [db.get_canvas_cell(i, j) for i in range(32) for j in range(32)]
+        )
+    assert canvases[0] == canvases[1]
+
+
+def test_raster_constant_fill_matches_material_pass():
+    mb = MaterialBufferPy(8)
+    for idx in range(4):
+        mb.add_static((idx * 60, 0, 0), (0, idx * 60, 0), idx + 1)
+    tb = TextureBufferPy(4)
+    vb = VertexBufferPy(4, 4, 4)
+    pb = PrimitiveBufferPy(8)
+    pb.add_triangle(1, 1, 1, 0, 0, 2.0, 0, 28, 2.0, 24, 0, 2.0)
+    pb.add_triangle(2, 2, 2, 0, 0, 1.0, 0, 20, 1.0, 20, 0, 1.0)
+
+    canvases = []
+    for material_buffer in (None, mb):
+        db = DrawingBufferPy(32, 32, material_parallel_threads=0)
+        db.hard_clear(10)
+        raster_all_py(pb, vb, db, material_buffer=material_buffer)
+        apply_material_py(mb, tb, vb, pb, db)
+        canvases.append(
+            [db.get_canvas_cell(i, j) for i in range(32) for j in range(32)]
+        )
+    assert canvases[0] == canvases[1]
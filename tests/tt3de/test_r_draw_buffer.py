@@ -90,6 +90,76 @@ class Test_DrawBuffer(unittest.TestCase):
         self.assertEqual(drawbuffer.get_row_count(), 23)
         self.assertEqual(drawbuffer.get_col_count(), 178)
 
+    def test_resize(self):
+        drawbuffer = DrawingBufferPy(max_row=23, max_col=178)
+        drawbuffer.set_visibility_mode(True)
+        drawbuffer.hard_clear(1000.0)
+        for rows, cols in [(40, 200), (10, 20)]:
+            drawbuffer.resize(rows, cols)
+            self.assertEqual(drawbuffer.get_row_count(), rows)
+            self.assertEqual(drawbuffer.get_col_count(), cols)
+            self.assertTrue(drawbuffer.get_visibility_mode())
+            cell = drawbuffer.get_depth_buffer_cell(rows - 1, cols - 1, 0)
+            self.assertEqual(cell["depth"], 10.0)
+            self.assertEqual(cell["pix_info"], rows * cols - 1)
+            self.assertEqual(len(drawbuffer.to_textual_2(0, cols, 0, rows)), rows)
+
+    def test_visibility_mode(self):
+        drawbuffer = DrawingBufferPy(max_row=8, max_col=8)
+        self.assertFalse(drawbuffer.get_visibility_mode())
+        drawbuffer.set_visibility_mode(True)
+        self.assertTrue(drawbuffer.get_visibility_mode())
+
+        # full pixel info writes are unaffected by the mode
+        drawbuffer.hard_clear(1000.0)
+        drawbuffer.set_depth_content(
+            0, 0, glm.vec3(0, 0, 1), 1.0, glm.vec2(2, 3), glm.vec2(5, 6), 1, 2, 3, 4
+        )
+        assertPixInfoEqual(
+            drawbuffer.get_pix_info_element(0),
+            {
+                "uv": [2.0, 3.0],
+                "uv_1": [5.0, 6.0],
+                "node_id": 1,
+                "geometry_id": 2,
+                "material_id": 3,
+                "primitive_id": 4,
+            },
+        )
+        drawbuffer.set_visibility_mode(False)
+        self.assertFalse(drawbuffer.get_visibility_mode())
+
+    def test_coarse_depth_stats(self):
+        drawbuffer = DrawingBufferPy(max_row=16, max_col=16)
+        drawbuffer.hard_clear(1000.0)
+        self.assertEqual(drawbuffer.coarse_depth_stats(), (0, 0, 0))
+
+    def test_hard_clear_after_writes(self):
+        drawbuffer = DrawingBufferPy(max_row=32, max_col=32)
+        drawbuffer.hard_clear(1000.0)
+        for row, col in [(0, 0), (20, 30)]:
+            drawbuffer.set_depth_content(
+                row,
+                col,
+                glm.vec3(0, 0, 1),
+                1.0,
+                glm.vec2(2, 3),
+                glm.vec2(5, 6),
+                1,
+                2,
+                3,
+                4,
+            )
+        self.assertEqual(drawbuffer.get_depth_buffer_cell(20, 30, 0)["node_id"], 1)
+
+        # same depth: only the written tiles are reset, then a new depth
+        for depth in [1000.0, 500.0]:
+            drawbuffer.hard_clear(depth)
+            for row, col in [(0, 0), (20, 30), (31, 31)]:
+                cell = drawbuffer.get_depth_buffer_cell(row, col, 0)
+                self.assertEqual(cell["depth"], depth)
+                self.assertEqual(cell["node_id"], 0)
+
     def test_clear_canvas(self):
         drawbuffer = DrawingBufferPy(512, 512)
 
@@ -129,13 +129,72 @@ class Test_GeometryBuffer(unittest.TestCase):
         self.assertEqual(geom_buffer.geometry_count(), 0)
 
     def test_buffer_overflow(self):
-        """Test it does not crash and ignore stuff."""
+        """Test the buffer grows past its initial size."""
         geom_buffer = GeometryBufferPy(
             10
         )  # Start with a small buffer size to test resizing
         for i in range(100):  # Add more items than the initial size
-            geom_buffer.add_point_3d(0, 0, 100, 200)
+            self.assertEqual(geom_buffer.add_point_3d(0, 0, 100, 200), i)
 
-        self.assertEqual(geom_buffer.geometry_count(), 10)
+        self.assertEqual(geom_buffer.geometry_count(), 100)
+        self.assertGreaterEqual(geom_buffer.capacity(), 100)
         geom_buffer.clear()
         self.assertEqual(geom_buffer.geometry_count(), 0)
+        self.assertEqual(geom_buffer.high_water_mark(), 100)
+
+    def test_buffer_hard_cap(self):
+        geom_buffer = GeometryBufferPy(4, hard_cap=10)
+        for i in range(10):
+            geom_buffer.add_point_3d(0, 0, 100, 200)
+        with self.assertRaises(ValueError):
+            geom_buffer.add_point_3d(0, 0, 100, 200)
+        self.assertEqual(geom_buffer.geometry_count(), 10)
+        self.assertEqual(geom_buffer.capacity(), 10)
+
+    def test_versions(self):
+        geom_buffer = GeometryBufferPy(10)
+        geom_a = geom_buffer.add_point_3d(0, 0, node_id=0, material_id=1)
+        geom_b = geom_buffer.add_point_3d(1, 0, node_id=0, material_id=1)
+        version_a = geom_buffer.geometry_version(geom_a)
+        version_b = geom_buffer.geometry_version(geom_b)
+        self.assertGreater(version_b, version_a)
+
+        # same material: nothing changes
+        geom_buffer.update_geometry_material(geom_a, 1)
+        self.assertEqual(geom_buffer.geometry_version(geom_a), version_a)
+
+        geom_buffer.update_geometry_material(geom_a, 2)
+        self.assertGreater(geom_buffer.geometry_version(geom_a), version_b)
+        self.assertEqual(geom_buffer.geometry_version(geom_b), version_b)
+        self.assertEqual(geom_buffer.version(), geom_buffer.geometry_version(geom_a))
+
+        with self.assertRaises(ValueError):
+            geom_buffer.geometry_version(5)
+
+    def test_remove_and_reuse(self):
+        geom_buffer = GeometryBufferPy(10)
+        geom_buffer.add_point_3d(0, 0, node_id=0, material_id=0)
+        geom_a = geom_buffer.add_point_3d(1, 0, node_id=0, material_id=1)
+        geom_b = geom_buffer.add_point_3d(2, 0, node_id=0, material_id=1)
+
+        version = geom_buffer.version()
+        geom_buffer.remove_geometry(geom_a)
+        self.assertGreater(geom_buffer.version(), version)
+        self.assertFalse(geom_buffer.is_alive(geom_a))
+        self.assertEqual(geom_buffer.alive_count(), 2)
+        self.assertEqual(geom_buffer.geometry_count(), 3)
+
+        with self.assertRaises(ValueError):
+            geom_buffer.remove_geometry(geom_a)
+        with self.assertRaises(ValueError):
+            geom_buffer.remove_geometry(0)
+
+        # the removed slot is reused by the next add
+        self.assertEqual(geom_buffer.add_point_3d(3, 0, 0, 1), geom_a)
+        self.assertEqual(geom_buffer.geometry_count(), 3)
+
+        # replace keeps the index and frees the source slot
+        geom_c = geom_buffer.add_point_3d(4, 0, 0, 2)
+        geom_buffer.replace_geometry(geom_b, geom_c)
+        self.assertEqual(geom_buffer.get_element(geom_b)["p_start"], 4)
+        self.assertFalse(geom_buffer.is_alive(geom_c))
@@ -103,7 +103,7 @@ class Test_PrimitivesBuffer(unittest.TestCase):
         self.assertEqual(primitive_buffer.primitive_count(), 0)
 
     def test_add_point_overflow(self):
-        primitive_buffer = PrimitiveBufferPy(10)
+        primitive_buffer = PrimitiveBufferPy(10, hard_cap=10)
         self.assertEqual(primitive_buffer.primitive_count(), 0)
 
         for i in range(100):
@@ -115,6 +115,18 @@ class Test_PrimitivesBuffer(unittest.TestCase):
                 node_id, geom_id, material_id, row=1, col=2, depth=3.0, uv=1
             )
         self.assertEqual(primitive_buffer.primitive_count(), 10)
+        self.assertEqual(primitive_buffer.dropped_count(), 90)
+
+    def test_add_point_grows(self):
+        primitive_buffer = PrimitiveBufferPy(10)
+        for i in range(100):
+            primitive_buffer.add_point(1, 2, 3, row=1, col=2, depth=3.0, uv=1)
+        self.assertEqual(primitive_buffer.primitive_count(), 100)
+        self.assertEqual(primitive_buffer.dropped_count(), 0)
+
+        primitive_buffer.clear()
+        self.assertEqual(primitive_buffer.high_water_mark(), 100)
+        self.assertGreaterEqual(primitive_buffer.capacity(), 100)
 
     def test_add_point(self):
         primitive_buffer = PrimitiveBufferPy(10)
@@ -205,6 +205,29 @@ class Test_Rust_RasterTriangle(unittest.TestCase):
         )  # 336= 24*28/2  is the surface of the triangle
         # we migh have the diagonal ; like ~20 pix, to explaing this gap.
 
+    def test_raster_depth_prepass(self):
+        vertex_buffer = VertexBufferPy(128, 128, 128)
+        primitive_buffer = PrimitiveBufferPy(10)
+        # far triangle first, then a nearer one hiding part of it
+        primitive_buffer.add_triangle(1, 1, 1, 0, 0, 2.0, 0, 28, 2.0, 24, 0, 2.0)
+        primitive_buffer.add_triangle(2, 2, 2, 0, 0, 1.0, 0, 20, 1.0, 20, 0, 1.0)
+
+        direct = DrawingBufferPy(32, 32)
+        direct.hard_clear(10)
+        raster_all_py(primitive_buffer, vertex_buffer, direct)
+
+        prepass = DrawingBufferPy(32, 32)
+        prepass.hard_clear(10)
+        raster_all_py(primitive_buffer, vertex_buffer, prepass, depth_prepass=True)
+
+        node_ids = set()
+        for i in range(32):
+            for j in range(32):
+                elem = prepass.get_depth_buffer_cell(i, j, 0)
+                self.assertEqual(elem, direct.get_depth_buffer_cell(i, j, 0))
+                node_ids.add(elem["node_id"])
+        self.assertEqual(node_ids, {0, 1, 2})
+
     def test_raster_one_triangle_outbound(self):
         drawing_buffer = DrawingBufferPy(32, 32)
         drawing_buffer.hard_clear(2)
@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
+import os
+import struct
+import tempfile
 import unittest
+import zlib
 import pytest
 from tt3de.asset_fastloader import fast_load
 from tt3de.richtexture import ImageTexture
@@ -8,6 +12,56 @@ from tt3de import tt3de
 
 from tt3de.tt3de import TextureBufferPy
 
+# 2x2 image, top row red and green, bottom row blue and white
+TOP_DOWN_RGBA = [
+    [(255, 0, 0, 255), (0, 255, 0, 128)],
+    [(0, 0, 255, 0), (255, 255, 255, 255)],
+]
+
+
+def png_bytes(rows, with_alpha: bool) -> bytes:
+    """An 8-bit RGB or RGBA PNG file of `rows`, top row first."""
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    channels = 4 if with_alpha else 3
+    raw = b"".join(
+        b"\0" + bytes(c for pixel in row for c in pixel[:channels]) for row in rows
+    )
+    header = struct.pack(
+        ">IIBBBBB", len(rows[0]), len(rows), 8, 6 if with_alpha else 2, 0, 0, 0
+    )
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
+
+
+def bmp_bytes(rows) -> bytes:
+    """A 24-bit BMP file of `rows`, top row first."""
+    row_size = (len(rows[0]) * 3 + 3) // 4 * 4
+    pixels = b"".join(
+        bytes(c for r, g, b, _ in row for c in (b, g, r)).ljust(row_size, b"\0")
+        for row in reversed(rows)
+    )
+    header = struct.pack(
+        "<2sI4xIIiiHHI20x",
+        b"BM",
+        54 + len(pixels),
+        54,
+        40,
+        len(rows[0]),
+        len(rows),
+        1,
+        24,
+        0,
+    )
+    return header + pixels
+
 
 class Test_TextureArray(unittest.TestCase):
     def test_create(self):
@@ -129,3 +183,168 @@ class Test_TextureArray(unittest.TestCase):
         tb = TextureBufferPy(4)
         with self.assertRaises(ValueError):
             tb.add_texture(1, 1, [(0, 0, 0, 255)], True, True, filter_mode="trilinear")
+
+    def test_add_texture_from_file_matches_python_loader(self):
+        img: ImageTexture = fast_load("models/test_screen32.bmp")
+        python_tb = TextureBufferPy(4)
+        python_tb.add_texture(img.image_width, img.image_height, img.chained_data())
+        native_tb = TextureBufferPy(4)
+        native_tb.add_texture_from_file("models/test_screen32.bmp")
+
+        self.assertEqual(native_tb.get_wh_of(0), (32, 32))
+        for u, v in [(0.0, 0.0), (0.1, 0.7), (0.5, 0.5), (0.9, 0.2)]:
+            self.assertEqual(
+                native_tb.get_rgba_at(0, u, v), python_tb.get_rgba_at(0, u, v)
+            )
+
+    def test_add_texture_from_bytes(self):
+        tb = TextureBufferPy(4)
+        rgba = bytes([10, 20, 30, 255, 0, 0, 255, 255])
+        tb.add_texture_from_bytes(
+            2, 1, rgba, filter_mode="nearest", transparent_colors=[(0, 0, 255)]
+        )
+        self.assertEqual(tb.get_rgba_at(0, 0.25, 0.5), (10, 20, 30, 255))
+        self.assertEqual(tb.get_rgba_at(0, 0.75, 0.5), (0, 0, 255, 0))
+        with self.assertRaises(ValueError):
+            tb.add_texture_from_bytes(2, 2, rgba)
+        with self.assertRaises(OSError):
+            tb.add_texture_from_file("models/missing.bmp")
+
+    def test_mipmaps(self):
+        tb = TextureBufferPy(4)
+        tb.add_texture_from_file("models/test_screen32.bmp", mipmaps=True)
+        tb.add_texture_from_file("models/test_screen32.bmp")
+        self.assertEqual(tb.mip_level_count(0), 6)
+        self.assertEqual(tb.mip_level_count(1), 1)
+        # plain lookups keep reading the full resolution texture
+        self.assertEqual(tb.get_rgba_at(0, 0.1, 0.7), tb.get_rgba_at(1, 0.1, 0.7))
+
+        tb.build_mipmaps(1)
+        self.assertEqual(tb.mip_level_count(1), 6)
+        with self.assertRaises(ValueError):
+            tb.build_mipmaps(2)
+        with self.assertRaises(IndexError):
+            tb.mip_level_count(2)
+
+    def test_tiled_layout(self):
+        tb = TextureBufferPy(4)
+        tb.add_texture_from_file("models/test_screen32.bmp")
+        tb.add_texture_from_file("models/test_screen32.bmp", layout="tiled")
+        uvs = [(0.0, 0.0), (0.1, 0.7), (0.5, 0.5), (0.93, 0.21), (1.4, -0.3)]
+        for u, v in uvs:
+            self.assertEqual(tb.get_rgba_at(1, u, v), tb.get_rgba_at(0, u, v))
+
+        tb.set_layout(1, "linear")
+        for u, v in uvs:
+            self.assertEqual(tb.get_rgba_at(1, u, v), tb.get_rgba_at(0, u, v))
+        with self.assertRaises(ValueError):
+            tb.set_layout(1, "morton")
+        with self.assertRaises(ValueError):
+            tb.set_layout(2, "tiled")
+
+    def test_update_texture_region(self):
+        tb = TextureBufferPy(4)
+        tb.add_texture_from_bytes(4, 2, bytes(32), filter_mode="nearest")
+        version = tb.version()
+        # the top right 2x1 texels
+        tb.update_texture_region(0, 2, 1, 2, 1, bytearray([9, 8, 7, 255] * 2))
+        self.assertGreater(tb.version(), version)
+        self.assertEqual(tb.get_rgba_at(0, 0.9, 0.9), (9, 8, 7, 255))
+        self.assertEqual(tb.get_rgba_at(0, 0.1, 0.9), (0, 0, 0, 0))
+        self.assertEqual(tb.get_rgba_at(0, 0.9, 0.1), (0, 0, 0, 0))
+
+        with self.assertRaises(ValueError):
+            tb.update_texture_region(0, 3, 0, 2, 1, bytes(8))
+        with self.assertRaises(ValueError):
+            tb.update_texture_region(0, 0, 0, 2, 1, bytes(4))
+
+    def test_texture_as_buffer(self):
+        tb = TextureBufferPy(4)
+        tb.add_texture_from_bytes(4, 2, bytes(32), filter_mode="nearest")
+        view = tb.texture_as_buffer(0)
+        self.assertEqual(view.shape, (2, 4, 4))
+        self.assertFalse(view.readonly)
+        view[1, 0, 0] = 200
+        self.assertEqual(tb.get_rgba_at(0, 0.1, 0.9), (200, 0, 0, 0))
+
+        # writes through the view are not tracked, the version keeps moving
+        self.assertNotEqual(tb.version(), tb.version())
+        with self.assertRaises(BufferError):
+            tb.set_layout(0, "tiled")
+        view.release()
+        tb.version()
+        self.assertEqual(tb.version(), tb.version())
+
+        tb.set_layout(0, "tiled")
+        with self.assertRaises(ValueError):
+            tb.texture_as_buffer(0)
+
+    def test_texture_as_buffer_blocks_texel_changes(self):
+        tb = TextureBufferPy(4)
+        tb.add_texture_from_bytes(4, 2, bytes(32), filter_mode="nearest")
+        view = tb.texture_as_buffer(0)
+        with self.assertRaises(BufferError):
+            tb.update_texture_region(0, 0, 0, 1, 1, bytes([1, 2, 3, 4]))
+        with self.assertRaises(BufferError):
+            tb.build_mipmaps(0)
+        with self.assertRaises(BufferError):
+            tb.add_texture_from_bytes(2, 2, bytes(16))
+        with self.assertRaises(BufferError):
+            tb.add_render_target(4, 2)
+        self.assertEqual(tb.size(), 1)
+        view[0, 0, 0] = 7
+        self.assertEqual(tb.get_rgba_at(0, 0.1, 0.1), (7, 0, 0, 0))
+
+        view.release()
+        tb.update_texture_region(0, 0, 0, 1, 1, bytes([1, 2, 3, 4]))
+        self.assertEqual(tb.add_render_target(4, 2), 1)
+
+    def test_baked_noise_texture(self):
+        tb = TextureBufferPy(4)
+        noise = tb.add_noise_texture(3, 2)
+        baked = tb.add_noise_texture(3, 2, bake_size=8, filter_mode="nearest")
+        self.assertEqual(tb.get_wh_of(baked), (8, 8))
+        for u, v in [(0.5 / 8, 0.5 / 8), (5.5 / 8, 2.5 / 8)]:
+            self.assertEqual(tb.get_rgba_at(baked, u, v), tb.get_rgba_at(noise, u, v))
+
+        # three frames on a 2x2 grid of 4x4 tiles
+        frames = tb.add_noise_texture(3, 2, bake_size=4, frames=3)
+        self.assertEqual(tb.get_wh_of(frames), (8, 8))
+
+        with self.assertRaises(ValueError):
+            tb.add_noise_texture(3, 2, bake_size=0)
+
+    def test_add_texture_from_png_matches_bmp(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = {}
+            for name, content in [
+                ("image.bmp", bmp_bytes(TOP_DOWN_RGBA)),
+                ("rgb.png", png_bytes(TOP_DOWN_RGBA, with_alpha=False)),
+                ("rgba.png", png_bytes(TOP_DOWN_RGBA, with_alpha=True)),
+            ]:
+                paths[name] = os.path.join(directory, name)
+                with open(paths[name], "wb") as f:
+                    f.write(content)
+
+            tb = TextureBufferPy(8)
+            for path in paths.values():
+                tb.add_texture_from_file(path, filter_mode="nearest")
+                tb.add_texture_from_file(
+                    path, filter_mode="nearest", transparent_colors=[(0, 255, 0)]
+                )
+        texels = [tb.texture_as_buffer(idx).tolist() for idx in range(6)]
+
+        # same pixels, bottom row first, whatever the format
+        opaque = [[list(p[:3]) + [255] for p in row] for row in TOP_DOWN_RGBA[::-1]]
+        self.assertEqual(texels[0], opaque)
+        self.assertEqual(texels[2], texels[0])
+        self.assertEqual(
+            texels[4], [[list(p) for p in row] for row in TOP_DOWN_RGBA[::-1]]
+        )
+        self.assertEqual(tb.get_rgba_at(4, 0.25, 0.75), (255, 0, 0, 255))
+
+        # the transparent colors get a zero alpha in every format
+        for keyed in texels[1::2]:
+            self.assertEqual(keyed[1][1], [0, 255, 0, 0])
+            self.assertEqual(keyed[1][0], [255, 0, 0, 255])
+        self.assertEqual(texels[1], texels[3])
@@ -42,3 +42,88 @@ class Test_TransformationPack(unittest.TestCase):
             abuffer.add_3d_vertex(1 + i, 2 + i, 3 + i)
 
         abuffer.apply_mv(trpack, node_id=0, start=0, end=32)
+
+    def test_versions(self):
+        trpack = TransformPackPy(12)
+        node_id = trpack.add_node_transform(glm.mat4(1.0))
+        v_node = trpack.node_version(node_id)
+        v_pack = trpack.version()
+
+        # writing the same matrix again is not a change
+        trpack.set_node_transform(node_id, glm.mat4(1.0))
+        self.assertEqual(trpack.node_version(node_id), v_node)
+        self.assertEqual(trpack.version(), v_pack)
+
+        trpack.set_node_transform(node_id, glm.translate(glm.vec3(1, 2, 3)))
+        self.assertGreater(trpack.node_version(node_id), v_node)
+        self.assertGreater(trpack.version(), v_pack)
+
+        _, view_3d_version, _ = trpack.view_versions()
+        trpack.set_view_matrix_3d(glm.translate(glm.vec3(0, 0, -1)))
+        self.assertGreater(trpack.view_versions()[1], view_3d_version)
+
+        with self.assertRaises(ValueError):
+            trpack.node_version(5)
+
+    def test_set_node_transforms_batch(self):
+        trpack = TransformPackPy(12)
+        ids = [trpack.add_node_transform(glm.mat4(1.0)) for _ in range(3)]
+        matrices = [glm.translate(glm.vec3(i, 2 * i, 3 * i)) for i in range(3)]
+
+        trpack.set_node_transforms(ids, b"".join(bytes(m) for m in matrices))
+        for node_id, m in zip(ids, matrices):
+            self.assertEqual(
+                trpack.get_node_transform(node_id),
+                tuple(v for col in m.to_tuple() for v in col),
+            )
+
+        with self.assertRaises(ValueError):
+            trpack.set_node_transforms(ids, bytes(matrices[0]))
+        with self.assertRaises(ValueError):
+            trpack.set_node_transforms([42], bytes(matrices[0]))
+
+    def test_hierarchy(self):
+        trpack = TransformPackPy(12)
+        root = trpack.add_node_transform(glm.translate(glm.vec3(1, 0, 0)))
+        child = trpack.add_node_transform(glm.translate(glm.vec3(0, 2, 0)), parent=root)
+        self.assertEqual(trpack.get_node_parent(child), root)
+
+        def flat(m):
+            return tuple(v for col in m.to_tuple() for v in col)
+
+        trpack.update_global_transforms()
+        self.assertEqual(
+            trpack.get_node_transform(child), flat(glm.translate(glm.vec3(1, 2, 0)))
+        )
+        self.assertEqual(
+            trpack.get_local_transform(child), flat(glm.translate(glm.vec3(0, 2, 0)))
+        )
+
+        # moving the parent only uploads the parent; the child follows on update
+        trpack.set_node_transform(root, glm.translate(glm.vec3(5, 0, 0)))
+        trpack.update_global_transforms()
+        self.assertEqual(
+            trpack.get_node_transform(child), flat(glm.translate(glm.vec3(5, 2, 0)))
+        )
+
+        trpack.set_node_parent(child, None)
+        trpack.update_global_transforms()
+        self.assertEqual(
+            trpack.get_node_transform(child), flat(glm.translate(glm.vec3(0, 2, 0)))
+        )
+
+        with self.assertRaises(ValueError):
+            trpack.set_node_parent(root, root)
+        with self.assertRaises(ValueError):
+            trpack.add_node_transform(glm.mat4(1.0), parent=7)
+
+    def test_grows_up_to_hard_cap(self):
+        trpack = TransformPackPy(2, hard_cap=20)
+        for i in range(20):
+            self.assertEqual(trpack.add_node_transform(glm.mat4(1.0)), i)
+        self.assertEqual(trpack.capacity(), 20)
+        with self.assertRaises(ValueError):
+            trpack.add_node_transform(glm.mat4(1.0))
+
+        trpack.clear()
+        self.assertEqual(trpack.high_water_mark(), 20)
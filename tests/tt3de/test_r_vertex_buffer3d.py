@@ -1,9 +1,24 @@
 # -*- coding: utf-8 -*-
+import os
+import sys
+import tempfile
 from typing import Dict
 import unittest
 
 from pyglm import glm
-from tt3de.tt3de import VertexBufferPy, TransformPackPy
+from tt3de.asset_bake import bake_asset, ensure_baked, is_baked_stale, load_baked
+from tt3de.obj_loader import load_obj_meshes, obj_materials
+from tt3de.tt3de import (
+    GeometryBufferPy,
+    MaterialBufferPy,
+    TextureBufferPy,
+    TransformPackPy,
+    VertexBufferPy,
+    compact_buffers_py,
+    load_baked_asset,
+    load_obj_native,
+    write_baked_asset,
+)
 
 
 class Test_VertexBuffer(unittest.TestCase):
@@ -15,6 +30,21 @@ class Test_VertexBuffer(unittest.TestCase):
         self.assertEqual(abuffer.get_3d_vertex_tuple(0), (1.0, 2.0, 3.0, 1.0))
         self.assertEqual(abuffer.get_3d_len(), 1)
 
+    def test_grows_up_to_hard_cap(self):
+        abuffer = VertexBufferPy(4, 4, 4, hard_cap=40)
+        for i in range(40):
+            self.assertEqual(abuffer.add_3d_vertex(i, 0, 0), i)
+        self.assertEqual(abuffer.get_3d_capacity(), 40)
+        self.assertEqual(abuffer.get_3d_vertex_tuple(39), (39.0, 0.0, 0.0, 1.0))
+        with self.assertRaises(ValueError):
+            abuffer.add_3d_vertex(0, 0, 0)
+        self.assertEqual(abuffer.high_water_marks()[0], 40)
+        # the error names the buffer that ran out
+        with self.assertRaisesRegex(ValueError, "UVBuffer"):
+            abuffer.allocate_range("uv", 41)
+        with self.assertRaisesRegex(ValueError, "TriangleBuffer"):
+            abuffer.allocate_range("triangle", 41)
+
     def test_add_vertex(self):
         abuffer = VertexBufferPy(32, 32, 32)
         self.assertEqual(abuffer.get_3d_len(), 0)
@@ -78,3 +108,228 @@ class Test_VertexBuffer(unittest.TestCase):
         # check conformal with glm calculation :
         res = glm.translate(glm.vec3(1, 2, 3)) * glm.mat4(1) * glm.vec4(1, 2, 3, 1)
         self.assertEqual(z0_mv, res.to_tuple())
+
+    def test_range_reuse_and_compaction(self):
+        abuffer = VertexBufferPy(8, 8, 8)
+        geom_buffer = GeometryBufferPy(8)
+        geom_buffer.add_point_3d(0, 0, node_id=0, material_id=0)
+
+        start = abuffer.allocate_range("3d", 4)
+        self.assertEqual(start, 0)
+        for i in range(4):
+            abuffer.set_3d_vertex(start + i, i, 0, 0)
+        uv = abuffer.allocate_range("uv", 3)
+        first = geom_buffer.add_line3d(start, 2, uv, 0, 1)
+        second = geom_buffer.add_line3d(start + 2, 2, uv + 1, 0, 1)
+
+        # released ranges are reused before appending
+        geom_buffer.remove_geometry(first)
+        abuffer.release_range("3d", start, 2)
+        self.assertEqual(abuffer.free_count("3d"), 2)
+        self.assertEqual(abuffer.allocate_range("3d", 2), start)
+        self.assertEqual(abuffer.allocate_range("3d", 2), 4)
+        abuffer.release_range("3d", start, 2)
+        with self.assertRaises(ValueError):
+            abuffer.allocate_range("4d", 1)
+
+        mapping = compact_buffers_py(geom_buffer, abuffer)
+        self.assertEqual(mapping, [0, None, 1])
+        self.assertEqual(abuffer.free_count("3d"), 0)
+        self.assertEqual(abuffer.get_3d_len(), 3)
+        # the peak usage survives the compaction
+        self.assertEqual(abuffer.high_water_marks(), (6, 3, 0, 0))
+        element = geom_buffer.get_element(1)
+        self.assertEqual(element["point_start"], 1)
+        self.assertEqual(element["uv_idx"], 1)
+        self.assertEqual(abuffer.get_3d_vertex_tuple(1), (2.0, 0.0, 0.0, 1.0))
+
+    def test_add_obj_submesh(self):
+        obj_text = "\n".join(
+            [
+                "mtllib quad.mtl",
+                "v 0 0 0",
+                "v 1 0 0",
+                "v 1 1 0",
+                "v 0 1 0",
+                "vt 0 0",
+                "vt 1 0",
+                "vt 1 1",
+                "vt 0 1",
+                "usemtl red",
+                "f 1/1 2/2 3/3 4/4",
+                "usemtl blue",
+                "f -4/-4 -2/-2 -1/-1",
+            ]
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "quad.obj")
+            with open(path, "w") as f:
+                f.write(obj_text)
+            mesh = load_obj_native(path)
+            with self.assertRaises(OSError):
+                load_obj_native(os.path.join(directory, "missing.obj"))
+
+        self.assertEqual(mesh.mtllibs(), ["quad.mtl"])
+        self.assertEqual(mesh.material_names(), ["red", "blue"])
+        self.assertEqual(mesh.vertex_count(0), 4)
+        self.assertEqual(mesh.indices(0), [0, 1, 2, 0, 2, 3])
+        self.assertEqual(mesh.uvs(0)[2:4], [1.0, 0.0])
+
+        abuffer = VertexBufferPy(8, 8, 8)
+        abuffer.add_3d_vertex(9, 9, 9)
+        self.assertEqual(abuffer.add_obj_submesh(mesh, 1), (1, 3, 0, 0, 1))
+        self.assertEqual(abuffer.add_obj_submesh(mesh, 0), (4, 4, 1, 1, 2))
+        self.assertEqual(abuffer.get_3d_vertex_tuple(6), (1.0, 1.0, 0.0, 1.0))
+        self.assertEqual(abuffer.get_uv(2), ((0.0, 0.0), (1.0, 1.0), (0.0, 1.0)))
+        with self.assertRaises(IndexError):
+            abuffer.add_obj_submesh(mesh, 2)
+
+    def test_baked_asset_round_trip(self):
+        obj_text = "v 0 0 0\nv 1 0 0\nv 1 1 0\nvt 0 0\nvt 1 1\n"
+        obj_text += "usemtl wood\nf 1/1 2/2 3/2\n"
+        with tempfile.TemporaryDirectory() as directory:
+            obj_path = os.path.join(directory, "tri.obj")
+            baked_path = os.path.join(directory, "tri.tt3d")
+            with open(obj_path, "w") as f:
+                f.write(obj_text)
+            mesh = load_obj_native(obj_path)
+            pixels = bytes([255, 0, 0, 255, 0, 255, 0, 255])
+            write_baked_asset(
+                baked_path, mesh, [("wood", 0, 95)], [(2, 1, pixels, True, True)]
+            )
+            asset = load_baked_asset(baked_path)
+
+            self.assertEqual(asset.material_names(), ["wood"])
+            self.assertEqual(asset.materials(), [("wood", 0, 95)])
+            self.assertEqual(asset.texture_info(0), (2, 1, True, True))
+
+            from_obj = VertexBufferPy(8, 8, 8)
+            from_baked = VertexBufferPy(8, 8, 8)
+            self.assertEqual(
+                from_obj.add_obj_submesh(mesh, 0),
+                from_baked.add_obj_submesh(asset, 0),
+            )
+            for idx in range(3):
+                self.assertEqual(
+                    from_obj.get_3d_vertex_tuple(idx),
+                    from_baked.get_3d_vertex_tuple(idx),
+                )
+            self.assertEqual(from_obj.get_uv(0), from_baked.get_uv(0))
+
+            texture_buffer = TextureBufferPy(2)
+            self.assertEqual(asset.add_texture_to(texture_buffer, 0), 0)
+            self.assertEqual(texture_buffer.get_wh_of(0), (2, 1))
+            with self.assertRaises(IndexError):
+                asset.add_texture_to(texture_buffer, 1)
+
+            # rebaking replaces the file; the loaded asset keeps its own map.
+            # Windows refuses to replace a mapped file, and leaves it as is.
+            if sys.platform == "win32":
+                with self.assertRaises(OSError):
+                    write_baked_asset(baked_path, mesh, [], [])
+            else:
+                write_baked_asset(baked_path, mesh, [], [])
+                self.assertEqual(load_baked_asset(baked_path).texture_count(), 0)
+            self.assertEqual(asset.texture_count(), 1)
+            self.assertEqual(asset.triangle_count(0), 1)
+            self.assertEqual(sorted(os.listdir(directory)), ["tri.obj", "tri.tt3d"])
+
+            bad_path = os.path.join(directory, "bad.tt3d")
+            with open(bad_path, "wb") as f:
+                f.write(b"not an asset")
+            with self.assertRaises(ValueError):
+                load_baked_asset(bad_path)
+
+    def test_obj_materials(self):
+        obj_text = "mtllib missing.mtl\nmtllib sub/mats.mtl\n"
+        obj_text += "v 0 0 0\nv 1 0 0\nv 1 1 0\nvt 0 0\n"
+        obj_text += "usemtl wood\nf 1/1 2/1 3/1\nusemtl plain\nf 3 2 1\n"
+        with tempfile.TemporaryDirectory() as directory:
+            obj_path = os.path.join(directory, "tri.obj")
+            with open(obj_path, "w") as f:
+                f.write(obj_text)
+            os.mkdir(os.path.join(directory, "sub"))
+            mtl_path = os.path.join(directory, "sub", "mats.mtl")
+            with open(mtl_path, "w") as f:
+                f.write("newmtl wood\nmap_Kd wood.bmp\nnewmtl plain\nKd 1 1 1\n")
+            texture_path = os.path.join(directory, "sub", "wood.bmp")
+            with open("models/test_screen32.bmp", "rb") as fin:
+                with open(texture_path, "wb") as fout:
+                    fout.write(fin.read())
+
+            materials = obj_materials(obj_path, ["missing.mtl", "sub/mats.mtl"])
+            self.assertEqual(
+                [(path, m.name, texture) for path, m, texture in materials],
+                [(mtl_path, "wood", texture_path), (mtl_path, "plain", None)],
+            )
+
+            texture_buffer = TextureBufferPy(2)
+            material_buffer = MaterialBufferPy()
+            material_buffer.add_static((0, 0, 0), (0, 0, 0), 0)
+            meshes = load_obj_meshes(obj_path, texture_buffer, material_buffer)
+        self.assertEqual(texture_buffer.size(), 1)
+        self.assertEqual(meshes["wood"].material_id, 1)
+        self.assertEqual(meshes["plain"].material_id, 0)
+
+    def test_baked_asset_is_stale_when_a_source_changes(self):
+        obj_text = "mtllib mats.mtl\nmtllib extra.mtl\n"
+        obj_text += "v 0 0 0\nv 1 0 0\nv 1 1 0\nvt 0 0\nusemtl wood\nf 1/1 2/1 3/1\n"
+        with tempfile.TemporaryDirectory() as directory:
+
+            def path(name):
+                return os.path.join(directory, name)
+
+            def touch(name, later=10):
+                mtime = os.path.getmtime(path("tri.tt3d")) + later
+                os.utime(path(name), (mtime, mtime))
+
+            with open(path("tri.obj"), "w") as f:
+                f.write(obj_text)
+            with open(path("mats.mtl"), "w") as f:
+                f.write("newmtl wood\nmap_Kd wood.bmp\n")
+            with open("models/test_screen32.bmp", "rb") as fin:
+                with open(path("wood.bmp"), "wb") as fout:
+                    fout.write(fin.read())
+
+            self.assertEqual(ensure_baked(path("tri.obj")), path("tri.tt3d"))
+            self.assertEqual(
+                load_baked_asset(path("tri.tt3d")).sources(),
+                ["tri.obj", "mats.mtl", "extra.mtl", "wood.bmp"],
+            )
+            self.assertFalse(is_baked_stale(path("tri.tt3d")))
+            for name in ["tri.obj", "mats.mtl", "wood.bmp"]:
+                touch(name)
+                self.assertTrue(is_baked_stale(path("tri.tt3d")), name)
+                touch(name, later=-10)
+                self.assertFalse(is_baked_stale(path("tri.tt3d")), name)
+
+            # a missing MTL file that shows up later
+            with open(path("extra.mtl"), "w") as f:
+                f.write("newmtl stone\n")
+            touch("extra.mtl")
+            self.assertTrue(is_baked_stale(path("tri.tt3d")))
+            with open(path("tri.tt3d"), "wb") as f:
+                f.write(b"TT3DBAKE")
+            self.assertTrue(is_baked_stale(path("tri.tt3d")))
+            self.assertTrue(is_baked_stale(path("missing.tt3d")))
+
+    def test_baked_asset_without_mtl_keeps_every_submesh(self):
+        obj_text = "mtllib missing.mtl\nv 0 0 0\nv 1 0 0\nv 1 1 0\nv 0 1 0\n"
+        obj_text += "usemtl roof\nf 1 2 3\nusemtl wall\nf 1 3 4\nusemtl door\nf 2 3 4\n"
+        with tempfile.TemporaryDirectory() as directory:
+            obj_path = os.path.join(directory, "house.obj")
+            baked_path = os.path.join(directory, "house.tt3d")
+            with open(obj_path, "w") as f:
+                f.write(obj_text)
+            bake_asset(obj_path, baked_path)
+            self.assertEqual(
+                load_baked_asset(baked_path).material_names(), ["roof", "wall", "door"]
+            )
+            meshes, texture_ids = load_baked(
+                baked_path, TextureBufferPy(2), MaterialBufferPy()
+            )
+
+        self.assertEqual(texture_ids, [])
+        self.assertEqual(sorted(meshes), ["door", "roof", "wall"])
+        self.assertEqual(sorted(mesh.submesh for mesh in meshes.values()), [0, 1, 2])
+        self.assertTrue(all(mesh.material_id == 0 for mesh in meshes.values()))
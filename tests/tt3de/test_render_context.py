@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+import pytest
+from pyglm import glm
+
+from tt3de.glm_camera import GLMCamera
+from tt3de.render_context_rust import RustRenderContext
+
+
+def _render_frame(rc: RustRenderContext, camera: GLMCamera):
+    rc.clear_canvas()
+    rc.render(camera)
+
+
+def test_unchanged_frame_is_skipped():
+    rc = RustRenderContext(16, 16, material_parallel_threads=None)
+    camera = GLMCamera(glm.vec3(0, 0, -5), 16, 16)
+
+    _render_frame(rc, camera)
+    assert not rc.last_frame_skipped
+
+    _render_frame(rc, camera)
+    assert rc.last_frame_skipped
+
+    camera.move(glm.vec3(0.0, 0.0, 1.0))
+    _render_frame(rc, camera)
+    assert not rc.last_frame_skipped
+
+
+def test_render_toggles_invalidate_frame():
+    rc = RustRenderContext(16, 16, material_parallel_threads=None)
+    camera = GLMCamera(glm.vec3(0, 0, -5), 16, 16)
+    _render_frame(rc, camera)
+
+    for toggle in ["front_to_back", "depth_prepass", "material_sorted"]:
+        setattr(rc, toggle, not getattr(rc, toggle))
+        _render_frame(rc, camera)
+        assert not rc.last_frame_skipped, toggle
+        _render_frame(rc, camera)
+        assert rc.last_frame_skipped, toggle
+
+    rc.drawing_buffer.set_visibility_mode(True)
+    _render_frame(rc, camera)
+    assert not rc.last_frame_skipped
+
+
+def test_texture_update_invalidates_frame():
+    rc = RustRenderContext(16, 16, material_parallel_threads=None)
+    camera = GLMCamera(glm.vec3(0, 0, -5), 16, 16)
+    rc.texture_buffer.add_texture_from_bytes(2, 2, bytes(16))
+
+    _render_frame(rc, camera)
+    _render_frame(rc, camera)
+    assert rc.last_frame_skipped
+
+    rc.texture_buffer.update_texture_region(0, 1, 1, 1, 1, bytes([255] * 4))
+    _render_frame(rc, camera)
+    assert not rc.last_frame_skipped
+
+
+def test_frame_cache_can_be_disabled():
+    rc = RustRenderContext(16, 16, material_parallel_threads=None)
+    rc.frame_cache_enabled = False
+    camera = GLMCamera(glm.vec3(0, 0, -5), 16, 16)
+
+    _render_frame(rc, camera)
+    _render_frame(rc, camera)
+    assert not rc.last_frame_skipped
+
+
+def test_process_dirty_only_syncs_dirty_subtrees():
+    from tt3de.tt_3dnodes import TT3DNode
+
+    rc = RustRenderContext(16, 16, material_parallel_threads=None)
+    root = TT3DNode()
+    child = TT3DNode(transform=glm.translate(glm.vec3(1.0, 0.0, 0.0)))
+    root.add_child(child)
+    rc.append_root(root)
+    assert set(rc._dirty_nodes) == {root, child}
+
+    rc.process_dirty()
+    assert not rc._dirty_nodes
+    assert not child.global_transform_dirty
+
+    # only the root is uploaded, the child is composed by the transform buffer
+    root.set_local_transform(glm.translate(glm.vec3(0.0, 2.0, 0.0)))
+    assert list(rc._dirty_nodes) == [root]
+    rc.process_dirty()
+    expected = glm.translate(glm.vec3(1.0, 2.0, 0.0))
+    assert child.global_transform() == expected
+    assert rc.transform_buffer.get_node_transform(child.node_id) == tuple(
+        v for col in expected.to_tuple() for v in col
+    )
+
+
+def test_global_transform_is_read_from_the_transform_buffer():
+    from tt3de.tt_3dnodes import TT3DNode
+
+    root = TT3DNode(transform=glm.translate(glm.vec3(0.0, 2.0, 0.0)))
+    child = TT3DNode(transform=glm.translate(glm.vec3(1.0, 0.0, 0.0)))
+    root.add_child(child)
+    expected = glm.translate(glm.vec3(1.0, 2.0, 0.0))
+    # composed from the ancestors until inserted
+    assert child.global_transform_matrix == expected
+
+    rc = RustRenderContext(16, 16, material_parallel_threads=None)
+    rc.append_root(root)
+    root.set_local_transform(glm.translate(glm.vec3(0.0, 3.0, 0.0)))
+    # the pending change is synced before reading the native transform
+    expected = glm.translate(glm.vec3(1.0, 3.0, 0.0))
+    assert child.global_transform_matrix == expected
+    assert not rc._dirty_nodes
+    assert rc.transform_buffer.get_node_transform(child.node_id) == tuple(
+        v for col in expected.to_tuple() for v in col
+    )
+
+
+def test_add_child_after_insertion_links_transforms():
+    from tt3de.tt_3dnodes import TT3DNode
+
+    rc = RustRenderContext(16, 16, material_parallel_threads=None)
+    root = TT3DNode(transform=glm.translate(glm.vec3(0.0, 3.0, 0.0)))
+    child = TT3DNode(transform=glm.translate(glm.vec3(1.0, 0.0, 0.0)))
+    rc.append_root(root)
+    rc.append_root(child)
+    root.add_child(child)
+
+    rc.process_dirty()
+    assert rc.transform_buffer.get_node_parent(child.node_id) == root.node_id
+    expected = glm.translate(glm.vec3(1.0, 3.0, 0.0))
+    assert rc.transform_buffer.get_node_transform(child.node_id) == tuple(
+        v for col in expected.to_tuple() for v in col
+    )
+
+
+def test_render_targets_are_drawn_in_dependency_order():
+    rc = RustRenderContext(16, 16, material_parallel_threads=None)
+    camera = GLMCamera(glm.vec3(0, 0, -5), 16, 16)
+    mirror = rc.add_render_target(GLMCamera(glm.vec3(0, 0, 5), 8, 4), 8, 4)
+    monitor = rc.add_render_target(
+        GLMCamera(glm.vec3(0, 0, -5), 4, 2), 4, 2, depends_on=[mirror], every=2
+    )
+    # two texels per cell
+    assert rc.texture_buffer.get_wh_of(mirror.texture_idx) == (8, 8)
+    assert rc.scheduled_render_targets() == [mirror, monitor]
+
+    _render_frame(rc, camera)
+    version = rc.texture_buffer.version()
+    _render_frame(rc, camera)
+    assert not rc.last_frame_skipped
+    assert rc.texture_buffer.version() > version
+
+    mirror.depends_on = [monitor]
+    with pytest.raises(ValueError):
+        rc.scheduled_render_targets()
+
+    rc.remove_render_target(monitor)
+    mirror.depends_on = []
+    assert rc.scheduled_render_targets() == [mirror]
+
+
+def test_removed_nodes_give_their_ranges_back():
+    from tt3de.prefab3d import Prefab3D
+
+    rc = RustRenderContext(16, 16, material_parallel_threads=None)
+    keep = Prefab3D.unitary_triangle()
+    rc.append_root(keep)
+
+    def buffer_lens():
+        vb = rc.vertex_buffer
+        return vb.get_3d_len(), vb.get_uv_size(), vb.high_water_marks()[3]
+
+    # a bullet spawned and despawned every frame
+    bullet = Prefab3D.unitary_square()
+    rc.append_root(bullet)
+    assert sorted(kind for kind, _, _ in bullet.buffer_ranges) == [
+        "3d",
+        "triangle",
+        "uv",
+    ]
+    lens = buffer_lens()
+    for _ in range(5):
+        rc.remove_geometry(bullet)
+        assert bullet.buffer_ranges == []
+        bullet = Prefab3D.unitary_square()
+        rc.append_root(bullet)
+        assert buffer_lens() == lens
+
+    rc.remove_geometry(bullet)
+    rc.compact()
+    assert rc.vertex_buffer.get_3d_len() == 3
+    assert keep.buffer_ranges == [("3d", 0, 3), ("uv", 0, 1), ("triangle", 0, 1)]
+
+
+def test_removed_nodes_give_their_transform_slots_back():
+    from tt3de.prefab3d import Prefab3D
+    from tt3de.tt_3dnodes import TT3DNode
+
+    rc = RustRenderContext(16, 16, material_parallel_threads=None)
+    camera = GLMCamera(glm.vec3(0, 0, -5), 16, 16)
+    keep = Prefab3D.unitary_triangle()
+    rc.append_root(keep)
+
+    def spawn():
+        bullet = TT3DNode()
+        bullet.add_child(Prefab3D.unitary_square())
+        rc.append_root(bullet)
+        return bullet
+
+    rc.remove_node(spawn())
+    _render_frame(rc, camera)
+    stats = rc.buffer_stats()
+    for _ in range(50):
+        bullet = spawn()
+        bullet.set_local_transform(glm.translate(glm.vec3(1.0, 0.0, 0.0)))
+        _render_frame(rc, camera)
+        rc.remove_node(bullet)
+        assert bullet.node_id is None and bullet.elements[0].node_id is None
+    _render_frame(rc, camera)
+
+    assert rc.roots_nodes == [keep]
+    assert rc.transform_buffer.node_count() == 1
+    assert rc.buffer_stats()["transform"] == stats["transform"]
+    assert rc.buffer_stats()["vertex"] == stats["vertex"]
+
+    # a removed subtree can be appended again
+    rc.append_root(bullet)
+    assert rc.transform_buffer.node_count() == 3
+    assert rc.transform_buffer.get_node_parent(bullet.elements[0].node_id) == (
+        bullet.node_id
+    )